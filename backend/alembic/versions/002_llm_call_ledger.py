@@ -0,0 +1,46 @@
+"""Add LLM call ledger
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # LLM调用流水表
+    op.create_table('llm_call_ledger',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('template_id', sa.String(100), nullable=False),
+        sa.Column('source', sa.String(20), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('role', sa.String(20), nullable=True),
+        sa.Column('provider', sa.String(20), nullable=True),
+        sa.Column('model', sa.String(50), nullable=True),
+        sa.Column('tier', sa.String(20), nullable=True),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=True, default=0),
+        sa.Column('completion_tokens', sa.Integer(), nullable=True, default=0),
+        sa.Column('latency_ms', sa.Float(), nullable=True),
+        sa.Column('cache_hit', sa.Boolean(), nullable=True, default=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('error', sa.String(255), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_llm_call_ledger_created_at', 'llm_call_ledger', ['created_at'])
+    op.create_index('ix_llm_call_ledger_template_created', 'llm_call_ledger', ['template_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_llm_call_ledger_template_created', table_name='llm_call_ledger')
+    op.drop_index('ix_llm_call_ledger_created_at', table_name='llm_call_ledger')
+    op.drop_table('llm_call_ledger')
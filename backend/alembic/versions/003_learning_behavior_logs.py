@@ -0,0 +1,36 @@
+"""Add learning behavior logs
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 学习行为日志表
+    op.create_table('learning_behavior_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('action_type', sa.String(50), nullable=False),
+        sa.Column('action_data', sa.JSON(), nullable=True),
+        sa.Column('session_duration', sa.Integer(), nullable=True, default=0),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_learning_behavior_logs_student_id', 'learning_behavior_logs', ['student_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_learning_behavior_logs_student_id', table_name='learning_behavior_logs')
+    op.drop_table('learning_behavior_logs')
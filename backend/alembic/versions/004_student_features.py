@@ -0,0 +1,36 @@
+"""Add student features
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '004'
+down_revision: Union[str, None] = '003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 学生特征表
+    op.create_table('student_features',
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('mastery_avg', sa.Float(), nullable=True),
+        sa.Column('weak_count', sa.Integer(), nullable=True, default=0),
+        sa.Column('activity_count_7d', sa.Integer(), nullable=True, default=0),
+        sa.Column('study_seconds_7d', sa.Integer(), nullable=True, default=0),
+        sa.Column('accuracy_7d', sa.Float(), nullable=True),
+        sa.Column('raw', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['student_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('student_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('student_features')
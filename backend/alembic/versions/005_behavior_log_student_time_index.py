@@ -0,0 +1,27 @@
+"""Index learning behavior logs by student and time
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '005'
+down_revision: Union[str, None] = '004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 组合索引覆盖按学生的时间范围查询，单列 student_id 索引随之冗余
+    op.create_index('ix_learning_behavior_logs_student_time', 'learning_behavior_logs', ['student_id', 'timestamp'])
+    op.drop_index('ix_learning_behavior_logs_student_id', table_name='learning_behavior_logs')
+
+
+def downgrade() -> None:
+    op.create_index('ix_learning_behavior_logs_student_id', 'learning_behavior_logs', ['student_id'])
+    op.drop_index('ix_learning_behavior_logs_student_time', table_name='learning_behavior_logs')
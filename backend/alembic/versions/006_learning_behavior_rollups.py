@@ -0,0 +1,116 @@
+"""Add learning behavior rollups
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+learning_behaviors = sa.table(
+    'learning_behaviors',
+    sa.column('id', sa.Integer),
+    sa.column('student_id', sa.Integer),
+    sa.column('date', sa.DateTime),
+    sa.column('study_duration', sa.Integer),
+    sa.column('resource_views', sa.Integer),
+    sa.column('question_attempts', sa.Integer),
+    sa.column('correct_rate', sa.Float),
+    sa.column('focus_duration', sa.Integer),
+    sa.column('activity_type', sa.String),
+    sa.column('created_at', sa.DateTime)
+)
+
+
+def _merge_daily_rows() -> None:
+    """原表允许同一学生同一天有多行（如每种活动类型一行，date 不一定是零点），
+    建唯一索引前把这些行合并为零点的一行：时长、次数相加，专注时长取最大，
+    正确率按答题数加权，活动类型取学习时长最长的一行"""
+    bind = op.get_bind()
+    days = {}
+    for row in bind.execute(sa.select(learning_behaviors).order_by(learning_behaviors.c.id)):
+        day = datetime.combine(row.date.date(), datetime.min.time())
+        days.setdefault((row.student_id, day), []).append(row)
+
+    for (student_id, day), rows in days.items():
+        if len(rows) == 1 and rows[0].date == day:
+            continue
+        attempts = sum(row.question_attempts or 0 for row in rows)
+        rated = [row for row in rows if row.correct_rate is not None]
+        if attempts and rated:
+            correct_rate = sum(row.correct_rate * (row.question_attempts or 0) for row in rated) / attempts
+        elif rated:
+            correct_rate = sum(row.correct_rate for row in rated) / len(rated)
+        else:
+            correct_rate = None
+        main = max(rows, key=lambda row: row.study_duration or 0)
+
+        bind.execute(learning_behaviors.delete().where(learning_behaviors.c.id.in_([row.id for row in rows])))
+        bind.execute(learning_behaviors.insert().values(
+            student_id=student_id,
+            date=day,
+            study_duration=sum(row.study_duration or 0 for row in rows),
+            resource_views=sum(row.resource_views or 0 for row in rows),
+            question_attempts=attempts,
+            correct_rate=correct_rate,
+            focus_duration=max(row.focus_duration or 0 for row in rows),
+            activity_type=main.activity_type,
+            created_at=min((row.created_at for row in rows if row.created_at), default=None)
+        ))
+
+
+def upgrade() -> None:
+    # 小时汇总表
+    op.create_table('learning_behavior_hourly',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('action_type', sa.String(50), nullable=False),
+        sa.Column('event_count', sa.Integer(), nullable=False, default=0),
+        sa.Column('duration_seconds', sa.Integer(), nullable=False, default=0),
+        sa.Column('max_duration', sa.Integer(), nullable=False, default=0),
+        sa.Column('answered_count', sa.Integer(), nullable=False, default=0),
+        sa.Column('correct_count', sa.Integer(), nullable=False, default=0),
+        sa.ForeignKeyConstraint(['student_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'uq_learning_behavior_hourly_student_hour_action', 'learning_behavior_hourly',
+        ['student_id', 'hour', 'action_type'], unique=True
+    )
+    op.create_index('ix_learning_behavior_hourly_hour', 'learning_behavior_hourly', ['hour'])
+
+    # 汇总高水位表
+    op.create_table('rollup_watermarks',
+        sa.Column('name', sa.String(50), nullable=False),
+        sa.Column('watermark', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    # 日汇总写入 learning_behaviors，每个学生每天一行；已有的同日多行先合并
+    op.add_column('learning_behaviors', sa.Column('activity_count', sa.Integer(), nullable=True))
+    _merge_daily_rows()
+    op.create_index('uq_learning_behaviors_student_date', 'learning_behaviors', ['student_id', 'date'], unique=True)
+    op.create_index('ix_learning_behaviors_date', 'learning_behaviors', ['date'])
+
+    # 汇总任务按时间范围扫描行为日志
+    op.create_index('ix_learning_behavior_logs_timestamp', 'learning_behavior_logs', ['timestamp'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_learning_behavior_logs_timestamp', table_name='learning_behavior_logs')
+    op.drop_index('ix_learning_behaviors_date', table_name='learning_behaviors')
+    op.drop_index('uq_learning_behaviors_student_date', table_name='learning_behaviors')
+    op.drop_column('learning_behaviors', 'activity_count')
+    op.drop_table('rollup_watermarks')
+    op.drop_table('learning_behavior_hourly')
@@ -0,0 +1,66 @@
+"""Partition learning behavior logs by month
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 预先创建的未来月份分区数，之后由 scripts/archive_behavior_logs.py 补充
+MONTHS_AHEAD = 3
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _partitions(first: datetime, last: datetime) -> str:
+    """从 first 所在月到 last 所在月每月一个分区，另加 pmax"""
+    month = datetime(first.year, first.month, 1)
+    definitions = []
+    while month <= last:
+        upper = _add_months(month, 1)
+        definitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{upper:%Y-%m-%d}')")
+        month = upper
+    definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return ",\n    ".join(definitions)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        # 仅MySQL使用分区；其他数据库上归档任务按时间范围删除
+        return
+
+    # 分区表不支持外键，且分区列必须包含在主键中；转换会重建整张表，请在维护窗口执行
+    for foreign_key in sa.inspect(bind).get_foreign_keys('learning_behavior_logs'):
+        op.drop_constraint(foreign_key['name'], 'learning_behavior_logs', type_='foreignkey')
+    op.execute("ALTER TABLE learning_behavior_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, `timestamp`)")
+
+    now = datetime.now()
+    first = bind.execute(sa.text("SELECT MIN(`timestamp`) FROM learning_behavior_logs")).scalar() or now
+    op.execute(
+        "ALTER TABLE learning_behavior_logs PARTITION BY RANGE COLUMNS(`timestamp`) (\n    "
+        + _partitions(min(first, now), _add_months(now, MONTHS_AHEAD)) + "\n)"
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+
+    op.execute("ALTER TABLE learning_behavior_logs REMOVE PARTITIONING")
+    op.execute("ALTER TABLE learning_behavior_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    op.create_foreign_key(None, 'learning_behavior_logs', 'users', ['student_id'], ['id'])
@@ -0,0 +1,39 @@
+"""Store precomputed recommendations with expiry
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 预计算的推荐保存完整内容和过期时间；学习路径、复习等推荐没有单一学科
+    op.add_column('learning_recommendations', sa.Column('payload', sa.JSON(), nullable=True))
+    op.add_column('learning_recommendations', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.alter_column('learning_recommendations', 'subject_id', existing_type=sa.Integer(), nullable=True)
+    op.create_index(
+        'ix_learning_recommendations_student_expires', 'learning_recommendations', ['student_id', 'expires_at']
+    )
+    op.create_index(
+        'ix_learning_resource_recommendations_student_expires', 'learning_resource_recommendations',
+        ['student_id', 'expires_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_learning_resource_recommendations_student_expires', table_name='learning_resource_recommendations')
+    op.drop_index('ix_learning_recommendations_student_expires', table_name='learning_recommendations')
+    op.execute("DELETE FROM learning_recommendations WHERE subject_id IS NULL")
+    op.alter_column('learning_recommendations', 'subject_id', existing_type=sa.Integer(), nullable=False)
+    op.drop_column('learning_recommendations', 'expires_at')
+    op.drop_column('learning_recommendations', 'payload')
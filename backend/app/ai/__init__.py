@@ -15,6 +15,28 @@ def init_ai_system():
         
         ai_coordinator.register_agent_type("student", StudentAIAgent)
         
+        # 接管异常退出的进程遗留的行为日志
+        from app.ai.knowledge.behavior_log_buffer import behavior_log_buffer
+        recovered = behavior_log_buffer.recover()
+        if recovered:
+            print(f"📝 恢复未写入的行为日志 {recovered} 条")
+        
+        # 构建题目倒排索引，失败时推荐回落到数据库查询
+        from app.ai.knowledge.question_index import question_index
+        if question_index.enabled:
+            try:
+                print(f"📚 题目索引构建完成: {question_index.build()} 题")
+            except Exception as e:
+                print(f"❌ 题目索引构建失败: {e}")
+        
+        # 加载知识点图谱，失败时紧急度和学习路径不考虑依赖关系
+        from app.ai.knowledge.knowledge_graph import knowledge_graph
+        if knowledge_graph.enabled:
+            try:
+                print(f"🧭 知识点图谱加载完成: {knowledge_graph.load()} 个知识点")
+            except Exception as e:
+                print(f"❌ 知识点图谱加载失败: {e}")
+        
         # TODO: 在后续步骤中注册其他代理
         # ai_coordinator.register_agent_type("teacher", TeacherAIAgent)
         # ai_coordinator.register_agent_type("parent", ParentAIAgent)
@@ -32,4 +54,58 @@ def init_ai_system():
 
 def get_ai_coordinator() -> AICoordinationEngine:
     """获取AI协调引擎实例"""
-    return ai_coordinator
\ No newline at end of file
+    return ai_coordinator
+
+def get_ai_metrics() -> dict:
+    """汇总AI子系统运行指标"""
+    from app.ai.engines.llm_cache import llm_response_cache
+    from app.ai.engines.semantic_cache import semantic_cache
+    from app.ai.engines.single_flight import llm_single_flight
+    from app.ai.engines.llm_scheduler import llm_scheduler
+    from app.ai.engines.model_router import model_router
+    from app.ai.engines.context_builder import context_builder
+    from app.ai.knowledge.conversation_store import conversation_store
+    from app.ai.engines.llm_ledger import llm_ledger
+    from app.ai.knowledge.behavior_log_buffer import behavior_log_buffer
+    from app.ai.knowledge.student_feature_store import student_feature_store
+    from app.ai.knowledge.behavior_rollup import behavior_rollup
+    from app.ai.knowledge.behavior_log_archive import behavior_log_archive
+    from app.ai.knowledge.question_usage_store import question_usage_store
+    from app.ai.knowledge.question_index import question_index
+    from app.ai.engines.recommendation_precompute import recommendation_precomputer
+    from app.ai.knowledge.knowledge_graph import knowledge_graph
+    
+    return {
+        "llm_cache": llm_response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "llm_single_flight": llm_single_flight.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "model_router": model_router.stats(),
+        "context_builder": context_builder.stats(),
+        "conversation_store": conversation_store.stats(),
+        "llm_ledger": llm_ledger.stats(),
+        "agents": ai_coordinator.stats(),
+        "behavior_log": behavior_log_buffer.stats(),
+        "student_features": student_feature_store.stats(),
+        "behavior_rollup": behavior_rollup.stats(),
+        "behavior_log_archive": behavior_log_archive.stats(),
+        "question_usage": question_usage_store.stats(),
+        "question_index": question_index.stats(),
+        "recommendation_precompute": recommendation_precomputer.stats(),
+        "knowledge_graph": knowledge_graph.stats()
+    }
+
+async def shutdown_ai_system():
+    """关闭AI系统，写出缓冲中的数据"""
+    from app.ai.engines.llm_ledger import llm_ledger
+    from app.ai.knowledge.behavior_log_buffer import behavior_log_buffer
+    from app.ai.knowledge.student_feature_store import student_feature_store
+    
+    try:
+        # 先关闭agent（会记录关闭日志），再写出剩余的行为日志、学生特征和调用流水
+        await ai_coordinator.shutdown()
+        await behavior_log_buffer.shutdown()
+        await student_feature_store.shutdown()
+        await llm_ledger.shutdown()
+    except Exception as e:
+        print(f"❌ AI系统关闭失败: {e}")
\ No newline at end of file
@@ -11,7 +11,7 @@ from datetime import datetime
 from app.core.database import get_db
 from app.models.user import User
 from app.models.analytics import StudentProfile, LearningBehaviorLog
-from app.ai.engines.llm_client import LLMClient
+from app.ai.engines.llm_client import llm_client
 
 
 class BaseAgent(ABC):
@@ -20,15 +20,35 @@ class BaseAgent(ABC):
     def __init__(self, user_id: int, knowledge_base: 'CentralKnowledgeBase'):
         self.user_id = user_id
         self.knowledge_base = knowledge_base
-        self.llm_client = LLMClient()
+        self.llm_client = llm_client
         self.session_context = {}
+        self.startup_result = {}
         self.active = False
+        # 外部会话存储中的版本号与状态摘要
+        self.session_version = 0
+        self.session_digest = None
         
     async def startup(self) -> Dict[str, Any]:
         """启动AI代理"""
         self.active = True
         self.session_context = await self.initialize_context()
-        return await self.on_startup()
+        self.startup_result = await self.on_startup()
+        return self.startup_result
+    
+    def export_state(self) -> Dict[str, Any]:
+        """导出可在其他worker上恢复的会话状态"""
+        return {
+            "session_context": self.session_context,
+            "startup_result": self.startup_result
+        }
+    
+    def restore_state(self, state: Dict[str, Any], version: int, digest: Optional[str] = None):
+        """从会话存储恢复状态，不重复执行启动流程"""
+        self.session_context = state.get("session_context", {})
+        self.startup_result = state.get("startup_result", {})
+        self.session_version = version
+        self.session_digest = digest
+        self.active = True
     
     async def shutdown(self):
         """关闭AI代理"""
@@ -3,13 +3,17 @@
 学生AI Agent - 实现完整的学生学习支持流程
 """
 import asyncio
-from typing import Dict, Any, List, Optional
+from collections import Counter
+from typing import Dict, Any, List, Optional, AsyncIterator
 from datetime import datetime, timedelta
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from app.ai.agents.base_agent import BaseAgent
-from app.models.question import Question
-from app.models.analytics import StudentKnowledgeMastery, MistakeCollection
+from app.ai.engines.llm_client import FALLBACK_RESPONSE
+from app.ai.knowledge.conversation_store import conversation_store
+from app.ai.knowledge.student_feature_store import student_feature_store
+from app.models.question import Question, QuestionKnowledge
+from app.models.analytics import MistakeCollection, LearningBehaviorLog
 from app.models.homework import Homework
 from app.models.exam import Exam
 from app.core.database import get_db
@@ -37,25 +41,52 @@ class Recommendation:
     data: Dict[str, Any]
 
 
+@dataclass
+class StudentSnapshot:
+    """启动流程共用的学生数据快照，各步骤不再单独查询"""
+    profile: Dict[str, Any]
+    activities: List[Dict[str, Any]]  # 最近24小时，按时间倒序
+    features: Dict[str, Any]  # 预计算的学生特征（掌握度、7天活动与正确率）
+    mistakes: List[Dict[str, Any]]  # 未掌握的错题
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+    def recent_activities(self, hours: int) -> List[Dict[str, Any]]:
+        since_time = self.loaded_at - timedelta(hours=hours)
+        return [a for a in self.activities if _as_datetime(a["timestamp"]) >= since_time]
+
+    @property
+    def weak_points(self) -> List[str]:
+        # 特征中的薄弱点已按掌握度升序排列
+        weak = [point["id"] for point in self.features["mastery"]["weak_points"] if point["mastery_level"] < 0.6]
+        return weak[:5]
+
+
+def _as_datetime(value: Any) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
 class StudentAIAgent(BaseAgent):
     """学生AI Agent - 实现完整的学生学习支持流程"""
     
     async def on_startup(self) -> Dict[str, Any]:
         """Agent启动流程"""
+        # 一次并发加载启动所需的全部数据
+        snapshot = await self.load_snapshot()
+        
         # 检测学习状态 - 对应流程图S3
-        learning_state = await self.detect_learning_state()
+        learning_state = await self.detect_learning_state(snapshot)
         
         if learning_state.is_new_session:
             # 获取学习进度 - 对应流程图S4
-            progress = await self.get_learning_progress()
+            progress = await self.get_learning_progress(snapshot)
             context = {"type": "new_session", "progress": progress}
         else:
             # 分析当前行为 - 对应流程图S5
-            behavior = await self.analyze_current_behavior()
+            behavior = await self.analyze_current_behavior(snapshot)
             context = {"type": "continuing", "behavior": behavior}
         
         # 生成个性化推荐 - 对应流程图S6
-        recommendations = await self.generate_personalized_recommendations(context)
+        recommendations = await self.generate_personalized_recommendations(context, snapshot)
         
         return {
             "status": "active",
@@ -90,17 +121,144 @@ class StudentAIAgent(BaseAgent):
             return await self._handle_request_help(action)
         elif action_type == "complete_homework":
             return await self._handle_complete_homework(action)
+        elif action_type == "ai_chat":
+            return await self._handle_ai_chat(action)
         else:
             return await self._handle_general_action(action)
     
-    async def detect_learning_state(self) -> LearningState:
+    async def stream_chat(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式AI对话
+        
+        对话内容在流正常结束后才写入学习记录和对话记忆
+        """
+        prompt = await self._build_chat_prompt(message, history)
+        
+        chunks = []
+        async for chunk in self.llm_client.generate_stream(prompt, {"role": "student"}, task="ai_chat"):
+            chunks.append(chunk)
+            yield {"event": "token", "data": {"content": chunk}}
+        
+        ai_response = "".join(chunks)
+        await self._remember_chat(message, context, ai_response)
+        
+        yield {"event": "final", "data": {
+            "suggestions": [],
+            "actions": [],
+            "context": context or {}
+        }}
+    
+    async def _handle_ai_chat(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        """处理AI对话"""
+        data = action.get("data", {})
+        message = data.get("message", "")
+        context = data.get("context")
+        
+        prompt = await self._build_chat_prompt(message, data.get("history"))
+        ai_response = await self.llm_client.generate(prompt, {"role": "student"}, task="ai_chat")
+        await self._remember_chat(message, context, ai_response, record=False)
+        
+        return {
+            "type": "ai_chat",
+            "ai_response": ai_response,
+            "suggestions": [],
+            "actions": [],
+            "context": context or {}
+        }
+    
+    async def _remember_chat(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]],
+        ai_response: str,
+        record: bool = True
+    ):
+        """保存一轮对话：写入对话记忆，并按需记录学习数据"""
+        if conversation_store.enabled and ai_response != FALLBACK_RESPONSE:
+            await conversation_store.append_exchange(self.user_id, message, ai_response)
+        
+        if record:
+            # 记录对话历史 - 对应流程图S8
+            await self.record_learning_data("ai_chat", {
+                "type": "ai_chat",
+                "data": {
+                    "message": message,
+                    "context": context,
+                    "ai_response": ai_response
+                }
+            })
+    
+    async def _build_chat_prompt(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> str:
+        """构建对话提示词
+        
+        启用对话记忆时使用服务端的滚动摘要和最近几轮原文，客户端传入的history被忽略
+        """
+        summary = ""
+        if conversation_store.enabled:
+            memory = await conversation_store.get_memory(self.user_id)
+            summary, history = memory["summary"], memory["turns"]
+        
+        lines = []
+        if summary:
+            lines.append(f"此前对话摘要: {summary}")
+        
+        for turn in history or []:
+            role = "学生" if turn.get("role") == "user" else "AI助手"
+            lines.append(f"{role}: {turn.get('content', '')}")
+        
+        lines.append(f"学生: {message}")
+        return "\n".join(lines)
+    
+    async def load_snapshot(self) -> StudentSnapshot:
+        """并发执行几条集合查询，构建学生数据快照"""
+        profile, activities, features, mistakes = await asyncio.gather(
+            self.knowledge_base.get_user_profile(self.user_id),
+            asyncio.to_thread(self._query_activities, 24),
+            asyncio.to_thread(student_feature_store.get, self.user_id),
+            asyncio.to_thread(self._query_open_mistakes)
+        )
+        return StudentSnapshot(profile=profile, activities=activities, features=features, mistakes=mistakes)
+    
+    def _query_activities(self, hours: int) -> List[Dict[str, Any]]:
+        with next(get_db()) as db:
+            rows = db.query(
+                LearningBehaviorLog.id,
+                LearningBehaviorLog.action_type,
+                LearningBehaviorLog.action_data,
+                LearningBehaviorLog.session_duration,
+                LearningBehaviorLog.timestamp
+            ).filter(
+                LearningBehaviorLog.student_id == self.user_id,
+                LearningBehaviorLog.timestamp >= datetime.now() - timedelta(hours=hours)
+            ).order_by(LearningBehaviorLog.timestamp.desc()).limit(50).all()
+            return [dict(row._mapping) for row in rows]
+    
+    def _query_open_mistakes(self) -> List[Dict[str, Any]]:
+        with next(get_db()) as db:
+            rows = db.query(
+                MistakeCollection.id,
+                MistakeCollection.question_id,
+                MistakeCollection.mistake_type,
+                MistakeCollection.review_count
+            ).filter(
+                MistakeCollection.student_id == self.user_id,
+                MistakeCollection.status == 1  # 未掌握
+            ).order_by(MistakeCollection.created_at.desc()).limit(5).all()
+            return [dict(row._mapping) for row in rows]
+    
+    async def detect_learning_state(self, snapshot: Optional[StudentSnapshot] = None) -> LearningState:
         """检测学习状态 - 对应流程图S3"""
+        snapshot = snapshot or await self.load_snapshot()
         # 获取最近活动
-        recent_activities = await self.knowledge_base.get_recent_activities(self.user_id, hours=1)
+        recent_activities = snapshot.recent_activities(hours=1)
         
         last_activity = None
         if recent_activities:
-            last_activity = datetime.fromisoformat(recent_activities[0]['timestamp'])
+            last_activity = _as_datetime(recent_activities[0]['timestamp'])
         
         # 判断是否为新会话
         is_new_session = (
@@ -130,31 +288,31 @@ class StudentAIAgent(BaseAgent):
             context_type=context_type
         )
     
-    async def get_learning_progress(self) -> Dict[str, Any]:
+    async def get_learning_progress(self, snapshot: Optional[StudentSnapshot] = None) -> Dict[str, Any]:
         """获取学习进度 - 对应流程图S4"""
-        with next(get_db()) as db:
-            # 获取知识点掌握情况
-            mastery_records = db.query(StudentKnowledgeMastery).filter(
-                StudentKnowledgeMastery.student_id == self.user_id
-            ).all()
-            
-            total_points = len(mastery_records) if mastery_records else 1
-            mastered_points = len([m for m in mastery_records if m.mastery_level >= 0.8])
-            
-            progress = {
-                "overall_progress": mastered_points / total_points,
-                "total_knowledge_points": total_points,
-                "mastered_points": mastered_points,
-                "weak_points": await self._identify_weak_points(),
-                "recent_improvements": await self._get_recent_improvements(),
-                "next_goals": await self._suggest_next_goals()
-            }
-            
-            return progress
+        snapshot = snapshot or await self.load_snapshot()
+        # 知识点掌握情况
+        mastery = snapshot.features["mastery"]
+        
+        total_points = mastery["count"] or 1
+        mastered_points = mastery["mastered"]
+        weak_points = snapshot.weak_points
+        
+        progress = {
+            "overall_progress": mastered_points / total_points,
+            "total_knowledge_points": total_points,
+            "mastered_points": mastered_points,
+            "weak_points": weak_points,
+            "recent_improvements": await self._get_recent_improvements(),
+            "next_goals": await self._suggest_next_goals(weak_points)
+        }
+        
+        return progress
     
-    async def analyze_current_behavior(self) -> Dict[str, Any]:
+    async def analyze_current_behavior(self, snapshot: Optional[StudentSnapshot] = None) -> Dict[str, Any]:
         """分析当前行为 - 对应流程图S5"""
-        recent_activities = await self.knowledge_base.get_recent_activities(self.user_id, hours=24)
+        snapshot = snapshot or await self.load_snapshot()
+        recent_activities = snapshot.recent_activities(hours=24)
         
         if not recent_activities:
             return {"type": "inactive", "patterns": []}
@@ -177,18 +335,23 @@ class StudentAIAgent(BaseAgent):
             "preferred_times": await self._identify_preferred_learning_times(recent_activities)
         }
     
-    async def generate_personalized_recommendations(self, context: Dict[str, Any]) -> List[Recommendation]:
+    async def generate_personalized_recommendations(
+        self,
+        context: Dict[str, Any],
+        snapshot: Optional[StudentSnapshot] = None
+    ) -> List[Recommendation]:
         """生成个性化推荐 - 对应流程图S6"""
+        snapshot = snapshot or await self.load_snapshot()
         recommendations = []
         
-        # 获取学生画像
-        profile = await self.knowledge_base.get_user_profile(self.user_id)
+        # 学生画像
+        profile = snapshot.profile
         
-        # 获取薄弱知识点
-        weak_points = await self._identify_weak_points()
+        # 薄弱知识点
+        weak_points = snapshot.weak_points
         
-        # 获取学习偏好
-        preferences = await self._get_learning_preferences()
+        # 学习偏好
+        preferences = await self._get_learning_preferences(profile)
         
         # 基于上下文生成不同类型的推荐
         if context["type"] == "new_session":
@@ -197,7 +360,7 @@ class StudentAIAgent(BaseAgent):
             recommendations.extend(await self._generate_continuation_recommendations(context, weak_points))
         
         # 添加错题复习推荐
-        mistake_recommendations = await self._generate_mistake_review_recommendations()
+        mistake_recommendations = await self._generate_mistake_review_recommendations(snapshot.mistakes)
         recommendations.extend(mistake_recommendations)
         
         # 添加学习路径推荐
@@ -210,48 +373,76 @@ class StudentAIAgent(BaseAgent):
         return recommendations[:5]  # 返回前5个推荐
     
     async def execute_recommendations(self, recommendations: List[Recommendation]) -> List[Dict[str, Any]]:
-        """执行推荐动作 - 对应流程图S7"""
-        actions = []
-        
-        for rec in recommendations:
-            if rec.type == "practice_questions":
-                # 推送练习题 - S7a
-                questions = await self._get_recommended_questions(rec.knowledge_points)
-                actions.append({
-                    "type": "push_questions",
-                    "data": questions,
-                    "knowledge_points": rec.knowledge_points,
-                    "priority": rec.priority
-                })
-            
-            elif rec.type == "video_content":
-                # 推荐学习视频 - S7b
-                videos = await self._get_recommended_videos(rec.data.get("topic"))
-                actions.append({
-                    "type": "recommend_video",
-                    "data": videos,
-                    "topic": rec.data.get("topic"),
-                    "priority": rec.priority
-                })
-            
-            elif rec.type == "mistake_analysis":
-                # 错题分析 - S7c
-                mistakes = await self._get_mistake_analysis()
-                actions.append({
-                    "type": "mistake_analysis",
-                    "data": mistakes,
-                    "priority": rec.priority
-                })
-            
-            elif rec.type == "learning_path":
-                # 学习路径推荐
-                actions.append({
-                    "type": "learning_path",
-                    "data": rec.data,
-                    "priority": rec.priority
-                })
-        
-        return actions
+        """执行推荐动作 - 对应流程图S7（各推荐互不依赖，并发执行）"""
+        actions = await asyncio.gather(*(self._execute_recommendation(rec) for rec in recommendations))
+        return [action for action in actions if action]
+    
+    async def _execute_recommendation(self, rec: Recommendation) -> Optional[Dict[str, Any]]:
+        if rec.type == "practice_questions":
+            # 推送练习题 - S7a
+            questions = await self._get_recommended_questions(rec.knowledge_points)
+            return {
+                "type": "push_questions",
+                "data": questions,
+                "knowledge_points": rec.knowledge_points,
+                "priority": rec.priority
+            }
+        
+        elif rec.type == "video_content":
+            # 推荐学习视频 - S7b
+            videos = await self._get_recommended_videos(rec.data.get("topic"))
+            return {
+                "type": "recommend_video",
+                "data": videos,
+                "topic": rec.data.get("topic"),
+                "priority": rec.priority
+            }
+        
+        elif rec.type == "mistake_analysis":
+            # 错题分析 - S7c
+            mistakes = await self._get_mistake_analysis(rec.data.get("mistakes", []))
+            return {
+                "type": "mistake_analysis",
+                "data": mistakes,
+                "priority": rec.priority
+            }
+        
+        elif rec.type == "learning_path":
+            # 学习路径推荐
+            return {
+                "type": "learning_path",
+                "data": rec.data,
+                "priority": rec.priority
+            }
+        
+        return None
+    
+    async def _get_recommended_questions(self, knowledge_points: List[str], limit: int = 10) -> List[Dict[str, Any]]:
+        """按知识点推荐练习题"""
+        return await asyncio.to_thread(self._query_questions, knowledge_points, limit)
+    
+    @staticmethod
+    def _query_questions(knowledge_points: List[str], limit: int) -> List[Dict[str, Any]]:
+        with next(get_db()) as db:
+            query = db.query(Question.id, Question.question_id, Question.title, Question.difficult_name)
+            if knowledge_points:
+                query = query.join(QuestionKnowledge, QuestionKnowledge.question_id == Question.id).filter(
+                    QuestionKnowledge.knowledge_id.in_(knowledge_points)
+                ).distinct()
+            rows = query.order_by(Question.id.desc()).limit(limit).all()
+            return [dict(row._mapping) for row in rows]
+    
+    async def _get_recommended_videos(self, topic: Optional[str]) -> List[Dict[str, Any]]:
+        """推荐学习视频（暂无视频资源库）"""
+        return []
+    
+    async def _get_mistake_analysis(self, mistakes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """错题分析：按错误类型汇总"""
+        return {
+            "total": len(mistakes),
+            "by_type": dict(Counter(m.get("mistake_type") or "unknown" for m in mistakes)),
+            "mistakes": mistakes
+        }
     
     async def record_learning_data(self, action_type: str, data: Dict[str, Any]):
         """记录学习数据 - 对应流程图S8"""
@@ -343,10 +534,11 @@ class StudentAIAgent(BaseAgent):
         
         # 使用AI生成帮助内容
         help_prompt = await self._build_help_prompt(help_type, context)
+        # 同一题目的求助内容可在学生之间共享，允许缓存
         ai_response = await self.llm_client.generate(help_prompt, {
             "role": "student",
             "user_profile": await self.knowledge_base.get_user_profile(self.user_id)
-        })
+        }, cache_nondeterministic=True, task="request_help")
         
         # 推荐相关资源
         resources = await self._recommend_help_resources(help_type, context)
@@ -394,22 +586,19 @@ class StudentAIAgent(BaseAgent):
     
     async def _identify_weak_points(self) -> List[str]:
         """识别薄弱知识点"""
-        with next(get_db()) as db:
-            weak_masteries = db.query(StudentKnowledgeMastery).filter(
-                StudentKnowledgeMastery.student_id == self.user_id,
-                StudentKnowledgeMastery.mastery_level < 0.6
-            ).order_by(StudentKnowledgeMastery.mastery_level).limit(5).all()
-            
-            return [mastery.knowledge_point_id for mastery in weak_masteries]
+        features = await asyncio.to_thread(student_feature_store.get, self.user_id)
+        weak_points = features["mastery"]["weak_points"]
+        return [point["id"] for point in weak_points if point["mastery_level"] < 0.6][:5]
     
     async def _get_recent_improvements(self) -> List[Dict[str, Any]]:
         """获取最近的进步"""
         # 这里可以实现更复杂的进步检测逻辑
         return []
     
-    async def _suggest_next_goals(self) -> List[str]:
+    async def _suggest_next_goals(self, weak_points: Optional[List[str]] = None) -> List[str]:
         """建议下一步学习目标"""
-        weak_points = await self._identify_weak_points()
+        if weak_points is None:
+            weak_points = await self._identify_weak_points()
         
         goals = []
         for point in weak_points[:3]:  # 前3个最薄弱的
@@ -417,6 +606,30 @@ class StudentAIAgent(BaseAgent):
         
         return goals
     
+    async def _analyze_focus_trends(self, activities: List[Dict]) -> Dict[str, float]:
+        """专注度趋势：比较较早与最近一半活动的专注度"""
+        half = len(activities) // 2
+        if half == 0:
+            return {"earlier": 0.5, "recent": 0.5}
+        # 活动按时间倒序，前一半为最近的
+        return {
+            "earlier": await self._calculate_focus_level(activities[half:]),
+            "recent": await self._calculate_focus_level(activities[:half])
+        }
+    
+    async def _identify_preferred_learning_times(self, activities: List[Dict]) -> List[int]:
+        """最常学习的小时（前3个）"""
+        hours = Counter(_as_datetime(a['timestamp']).hour for a in activities if a.get('timestamp'))
+        return [hour for hour, _ in hours.most_common(3)]
+    
+    async def _get_learning_preferences(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """从学生画像提取学习偏好"""
+        return {
+            "learning_style": profile.get("learning_style", "mixed"),
+            "preferred_content_type": profile.get("preferred_content_type"),
+            "attention_duration": profile.get("attention_duration")
+        }
+    
     async def _analyze_behavior_patterns(self, activities: List[Dict]) -> List[str]:
         """分析行为模式"""
         patterns = []
@@ -425,7 +638,7 @@ class StudentAIAgent(BaseAgent):
             return patterns
         
         # 检测学习时间模式
-        hours = [datetime.fromisoformat(a['timestamp']).hour for a in activities if 'timestamp' in a]
+        hours = [_as_datetime(a['timestamp']).hour for a in activities if 'timestamp' in a]
         if hours:
             most_active_hour = max(set(hours), key=hours.count)
             patterns.append(f"最活跃时间: {most_active_hour}:00-{most_active_hour+1}:00")
@@ -522,24 +735,24 @@ class StudentAIAgent(BaseAgent):
         
         return recommendations
     
-    async def _generate_mistake_review_recommendations(self) -> List[Recommendation]:
+    async def _generate_mistake_review_recommendations(
+        self,
+        recent_mistakes: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Recommendation]:
         """生成错题复习推荐"""
-        with next(get_db()) as db:
-            recent_mistakes = db.query(MistakeCollection).filter(
-                MistakeCollection.student_id == self.user_id,
-                MistakeCollection.status == 1  # 未掌握
-            ).limit(5).all()
-            
-            if recent_mistakes:
-                return [Recommendation(
-                    type="mistake_analysis",
-                    title="错题复习",
-                    description=f"复习 {len(recent_mistakes)} 道错题",
-                    priority=4,
-                    knowledge_points=[],
-                    estimated_time=15,
-                    data={"mistake_ids": [m.id for m in recent_mistakes]}
-                )]
+        if recent_mistakes is None:
+            recent_mistakes = await asyncio.to_thread(self._query_open_mistakes)
+        
+        if recent_mistakes:
+            return [Recommendation(
+                type="mistake_analysis",
+                title="错题复习",
+                description=f"复习 {len(recent_mistakes)} 道错题",
+                priority=4,
+                knowledge_points=[],
+                estimated_time=15,
+                data={"mistake_ids": [m["id"] for m in recent_mistakes], "mistakes": recent_mistakes}
+            )]
         
         return []
     
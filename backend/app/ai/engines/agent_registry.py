@@ -0,0 +1,205 @@
+# backend/app/ai/engines/agent_registry.py
+"""
+有界AI Agent注册表：LRU容量上限 + 空闲超时回收
+"""
+import sys
+import time
+import types
+import random
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Iterator
+
+from app.core.config import settings
+
+
+def estimate_object_size(obj: Any, exclude: tuple = ()) -> int:
+    """估算对象及其引用的容器、实例属性占用的字节数（排除共享对象）"""
+    seen = {id(item) for item in exclude}
+    stack, total = [obj], 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, types.ModuleType) or callable(current):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__"):
+            stack.append(current.__dict__)
+    return total
+
+
+class AgentRegistry:
+    """按用户缓存的AI Agent
+
+    超过容量时淘汰最久未使用的agent，空闲超过 idle_ttl 的agent由后台任务回收；
+    被淘汰的agent在后台异步调用 shutdown()，不阻塞当前请求。
+    """
+
+    def __init__(
+        self,
+        max_agents: int = settings.AI_AGENT_MAX_ACTIVE,
+        idle_ttl: float = settings.AI_AGENT_TIMEOUT,
+        on_evict: Optional[Callable[[int], None]] = None,
+        size_sample: int = 50
+    ):
+        self.max_agents = max_agents
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self.size_sample = size_sample
+        self._agents: "OrderedDict[int, Any]" = OrderedDict()
+        self._last_used: Dict[int, float] = {}
+        self._shutdowns: set = set()
+        self._sweep_task: Optional[asyncio.Task] = None
+
+        # 统计指标
+        self.created = 0
+        self.lru_evictions = 0
+        self.idle_evictions = 0
+        self.shutdown_errors = 0
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._agents
+
+    def __getitem__(self, user_id: int):
+        return self._agents[user_id]
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._agents))
+
+    def get(self, user_id: int):
+        """获取agent并刷新最近使用时间"""
+        agent = self._agents.get(user_id)
+        if agent is not None:
+            self._agents.move_to_end(user_id)
+            self._last_used[user_id] = time.monotonic()
+        return agent
+
+    def put(self, user_id: int, agent: Any):
+        """登记agent，超过容量时淘汰最久未使用的agent"""
+        previous = self._agents.get(user_id)
+        if previous is not None and previous is not agent:
+            # 并发初始化产生的旧实例同样需要关闭
+            self._schedule_shutdown(previous)
+
+        self._agents[user_id] = agent
+        self._agents.move_to_end(user_id)
+        self._last_used[user_id] = time.monotonic()
+        self.created += 1
+
+        while len(self._agents) > self.max_agents:
+            oldest_id = next(iter(self._agents))
+            self._evict(oldest_id)
+            self.lru_evictions += 1
+
+        self._ensure_sweeper()
+
+    def pop(self, user_id: int):
+        """移除agent但不关闭，由调用方负责关闭"""
+        self._last_used.pop(user_id, None)
+        agent = self._agents.pop(user_id, None)
+        if agent is not None and self.on_evict:
+            self.on_evict(user_id)
+        return agent
+
+    def _evict(self, user_id: int):
+        agent = self.pop(user_id)
+        if agent is not None:
+            self._schedule_shutdown(agent)
+
+    def _schedule_shutdown(self, agent: Any):
+        try:
+            task = asyncio.get_running_loop().create_task(self._shutdown_agent(agent))
+        except RuntimeError:
+            agent.active = False
+            return
+        self._shutdowns.add(task)
+        task.add_done_callback(self._shutdowns.discard)
+
+    async def _shutdown_agent(self, agent: Any):
+        try:
+            await agent.shutdown()
+        except Exception as e:
+            self.shutdown_errors += 1
+            print(f"Agent shutdown failed for user {getattr(agent, 'user_id', None)}: {e}")
+
+    def sweep(self) -> int:
+        """回收空闲超时的agent，返回回收数量"""
+        cutoff = time.monotonic() - self.idle_ttl
+        # 按最近使用排序，遇到未超时的即可停止
+        expired = []
+        for user_id in self._agents:
+            if self._last_used.get(user_id, 0) > cutoff:
+                break
+            expired.append(user_id)
+
+        for user_id in expired:
+            self._evict(user_id)
+        self.idle_evictions += len(expired)
+        return len(expired)
+
+    def _ensure_sweeper(self):
+        if self._sweep_task is not None and not self._sweep_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._sweep_task = loop.create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        interval = max(1.0, min(self.idle_ttl / 4, 60.0))
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    async def shutdown(self):
+        """关闭全部agent并等待后台关闭任务完成"""
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            self._sweep_task = None
+
+        for user_id in list(self._agents):
+            self._evict(user_id)
+        if self._shutdowns:
+            await asyncio.gather(*list(self._shutdowns), return_exceptions=True)
+
+    def _agent_bytes(self, agent: Any) -> int:
+        # 共享的知识库和LLM客户端不计入单个agent
+        shared = tuple(
+            value for value in (getattr(agent, "knowledge_base", None), getattr(agent, "llm_client", None))
+            if value is not None
+        )
+        return estimate_object_size(agent, exclude=shared)
+
+    def stats(self) -> Dict[str, Any]:
+        """注册表统计，单agent内存为抽样估算"""
+        agents = list(self._agents.values())
+        sample = random.sample(agents, min(self.size_sample, len(agents)))
+        avg_bytes = sum(self._agent_bytes(agent) for agent in sample) / len(sample) if sample else 0.0
+
+        # 最久未使用的agent位于有序字典头部
+        oldest_id = next(iter(self._agents), None)
+        oldest_idle = time.monotonic() - self._last_used[oldest_id] if oldest_id is not None else 0.0
+
+        return {
+            "active_agents": len(agents),
+            "max_agents": self.max_agents,
+            "idle_ttl": self.idle_ttl,
+            "created": self.created,
+            "lru_evictions": self.lru_evictions,
+            "idle_evictions": self.idle_evictions,
+            "pending_shutdowns": len(self._shutdowns),
+            "shutdown_errors": self.shutdown_errors,
+            "oldest_idle_seconds": round(oldest_idle, 1),
+            "avg_agent_bytes": round(avg_bytes),
+            "estimated_total_bytes": round(avg_bytes * len(agents))
+        }
@@ -0,0 +1,215 @@
+# backend/app/ai/engines/context_builder.py
+"""
+按token预算构建紧凑的提示词上下文
+"""
+import re
+import json
+import math
+from typing import Dict, Any, List, Tuple
+
+from app.core.config import settings
+
+_CJK = r"\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_PATTERN = re.compile(rf"[{_CJK}]|[A-Za-z]+|\d+|[^\s{_CJK}A-Za-z\d]")
+_GRAM_PATTERN = re.compile(rf"[{_CJK}]+|[A-Za-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """本地估算token数：汉字约1个/字，英文约4字符/个，数字约3位/个，符号1个"""
+    count = 0
+    for piece in _TOKEN_PATTERN.findall(text or ""):
+        if piece[0].isalpha() and piece.isascii():
+            count += math.ceil(len(piece) / 4)
+        elif piece.isdigit():
+            count += math.ceil(len(piece) / 3)
+        else:
+            count += 1
+    return count
+
+
+class _Unit:
+    """可独立取舍的上下文单元：一个标量字段或列表中的一项"""
+
+    __slots__ = ("field", "index", "value", "text", "tokens", "score")
+
+    def __init__(self, field: str, index: int, value: Any, text: str, score: float):
+        self.field = field
+        self.index = index
+        self.value = value
+        self.text = text
+        self.tokens = estimate_tokens(text) + 1  # 换行
+        self.score = score
+
+
+class PromptContextBuilder:
+    """提示词上下文构建器
+
+    列表中的字典按表格输出（表头只写一次），数值保留两位小数并去掉空字段；
+    各条目按与问题的相关度、字段权重和新近程度排序，在token预算内贪心选取。
+    """
+
+    FIELD_WEIGHTS = {
+        "weak_knowledge_points": 1.0,
+        "recent_performance": 0.8,
+        "learning_behaviors": 0.5
+    }
+    DEFAULT_WEIGHT = 0.6
+    PINNED_FIELDS = ("role",)
+    OMITTED_FIELDS = ("user_id",)
+
+    def __init__(
+        self,
+        token_budget: int = settings.AI_CONTEXT_TOKEN_BUDGET,
+        recency_decay: float = 0.85
+    ):
+        self.token_budget = token_budget
+        self.recency_decay = recency_decay
+
+        # 统计指标
+        self.builds = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.items_dropped = 0
+
+    @staticmethod
+    def _format_value(value: Any) -> str:
+        if value is None:
+            return "-"
+        if isinstance(value, bool):
+            return "是" if value else "否"
+        if isinstance(value, float):
+            return f"{round(value, 2):g}"
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+        return str(value)
+
+    @staticmethod
+    def _grams(text: str) -> set:
+        """字符二元组（汉字）与词（字母数字），用于相关度计算"""
+        grams = set()
+        for run in _GRAM_PATTERN.findall((text or "").lower()):
+            if run.isascii():
+                grams.add(run)
+            elif len(run) == 1:
+                grams.add(run)
+            else:
+                grams.update(run[i:i + 2] for i in range(len(run) - 1))
+        return grams
+
+    def _relevance(self, text: str, question_grams: set) -> float:
+        grams = self._grams(text)
+        if not grams or not question_grams:
+            return 0.0
+        return len(grams & question_grams) / len(grams)
+
+    @staticmethod
+    def _is_empty(value: Any) -> bool:
+        return value is None or value == "" or value == [] or value == {}
+
+    def _columns(self, rows: List[Dict[str, Any]]) -> List[str]:
+        columns = []
+        for row in rows:
+            for key, value in row.items():
+                if key not in columns and not self._is_empty(value):
+                    columns.append(key)
+        return columns
+
+    def _collect_units(self, context: Dict[str, Any], question: str) -> Tuple[List[_Unit], Dict[str, List[str]]]:
+        """拆分上下文为可取舍单元，返回单元列表与各表格字段的列名"""
+        question_grams = self._grams(question)
+        units, tables = [], {}
+
+        for field, value in context.items():
+            if field in self.OMITTED_FIELDS or self._is_empty(value):
+                continue
+
+            weight = self.FIELD_WEIGHTS.get(field, self.DEFAULT_WEIGHT)
+
+            if isinstance(value, list):
+                rows = [item for item in value if not self._is_empty(item)]
+                if rows and all(isinstance(item, dict) for item in rows):
+                    tables[field] = self._columns(rows)
+                    for index, row in enumerate(rows):
+                        text = "|".join(self._format_value(row.get(column)) for column in tables[field])
+                        score = weight * (1 + 2 * self._relevance(text, question_grams)) * self.recency_decay ** index
+                        units.append(_Unit(field, index, row, text, score))
+                else:
+                    for index, item in enumerate(rows):
+                        text = self._format_value(item)
+                        score = weight * (1 + 2 * self._relevance(text, question_grams)) * self.recency_decay ** index
+                        units.append(_Unit(field, index, item, text, score))
+            else:
+                text = f"{field}: {self._format_value(value)}"
+                score = math.inf if field in self.PINNED_FIELDS else weight * (1 + 2 * self._relevance(text, question_grams))
+                units.append(_Unit(field, -1, value, text, score))
+
+        return units, tables
+
+    def _header(self, field: str, tables: Dict[str, List[str]]) -> str:
+        if field in tables:
+            return f"{field}[{'|'.join(tables[field])}]:"
+        return f"{field}:"
+
+    def build(self, context: Dict[str, Any], question: str = "") -> Tuple[str, Dict[str, int]]:
+        """构建上下文文本，返回 (文本, token统计)"""
+        context = context or {}
+        baseline = estimate_tokens(json.dumps(context, ensure_ascii=False, indent=2, default=str))
+
+        units, tables = self._collect_units(context, question)
+
+        # 贪心选取：高分优先，放不下则尝试更小的单元
+        selected, opened_fields, used = [], set(), 0
+        for unit in sorted(units, key=lambda u: u.score, reverse=True):
+            cost = unit.tokens
+            if unit.index >= 0 and unit.field not in opened_fields:
+                cost += estimate_tokens(self._header(unit.field, tables)) + 1
+            if used + cost > self.token_budget and unit.score != math.inf:
+                continue
+            selected.append(unit)
+            used += cost
+            if unit.index >= 0:
+                opened_fields.add(unit.field)
+
+        # 按原字段顺序和列表顺序输出
+        field_order = {field: position for position, field in enumerate(context)}
+        selected.sort(key=lambda u: (field_order[u.field], u.index))
+
+        lines, current_field = [], None
+        for unit in selected:
+            if unit.index < 0:
+                lines.append(unit.text)
+                current_field = None
+                continue
+            if unit.field != current_field:
+                lines.append(self._header(unit.field, tables))
+                current_field = unit.field
+            lines.append(unit.text)
+
+        text = "\n".join(lines)
+        stats = {
+            "tokens_before": baseline,
+            "tokens_after": estimate_tokens(text),
+            "items_total": len(units),
+            "items_dropped": len(units) - len(selected)
+        }
+
+        self.builds += 1
+        self.tokens_before += stats["tokens_before"]
+        self.tokens_after += stats["tokens_after"]
+        self.items_dropped += stats["items_dropped"]
+        return text, stats
+
+    def stats(self) -> Dict[str, Any]:
+        """上下文压缩统计"""
+        return {
+            "token_budget": self.token_budget,
+            "builds": self.builds,
+            "avg_tokens_before": round(self.tokens_before / self.builds, 1) if self.builds else 0.0,
+            "avg_tokens_after": round(self.tokens_after / self.builds, 1) if self.builds else 0.0,
+            "reduction_rate": 1 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0,
+            "items_dropped": self.items_dropped
+        }
+
+
+# 全局上下文构建器实例
+context_builder = PromptContextBuilder()
@@ -3,13 +3,20 @@
 AI协调引擎 - 实现流程图中的核心调度功能
 """
 import asyncio
-from typing import Dict, Any, Optional, Type
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Type, AsyncIterator
 from datetime import datetime
 
 from app.ai.agents.base_agent import BaseAgent
 from app.ai.knowledge.knowledge_base import CentralKnowledgeBase
+from app.ai.engines.agent_registry import AgentRegistry
+from app.ai.knowledge.agent_session_store import agent_session_store, CONFLICT
+from app.ai.engines.notification_pipeline import notification_pipeline
+from app.ai.engines.user_actor import ActorSystem
+from app.ai.knowledge.behavior_log_buffer import behavior_log_buffer
 from app.models.user import User
 from app.core.database import get_db
+from app.core.config import settings
 
 
 class AICoordinationEngine:
@@ -17,9 +24,14 @@ class AICoordinationEngine:
     
     def __init__(self):
         self.knowledge_base = CentralKnowledgeBase()
-        self.user_agents: Dict[int, BaseAgent] = {}
-        self.agent_registry: Dict[str, Type[BaseAgent]] = {}
         self.context_manager = ContextManager()
+        # 有界的用户agent缓存，agent被淘汰时一并清理其上下文
+        self.user_agents = AgentRegistry(on_evict=self.context_manager.clear_context)
+        self.agent_registry: Dict[str, Type[BaseAgent]] = {}
+        self.session_store = agent_session_store
+        self.notifications = notification_pipeline
+        # 每个活跃用户一个actor，同一用户的行为按顺序处理
+        self.actors = ActorSystem(self._process_action_batch)
         
     def register_agent_type(self, role: str, agent_class: Type[BaseAgent]):
         """注册AI代理类型"""
@@ -29,14 +41,10 @@ class AICoordinationEngine:
         """根据用户角色初始化对应的AI Agent"""
         try:
             # 检查是否已有活跃的agent
-            if user_id in self.user_agents and self.user_agents[user_id].active:
-                return self.user_agents[user_id]
-            
-            # 获取用户信息
-            with next(get_db()) as db:
-                user = db.query(User).filter(User.id == user_id).first()
-                if not user:
-                    raise ValueError(f"User {user_id} not found")
+            existing = self.user_agents.get(user_id)
+            if existing and existing.active:
+                await self._sync_session(existing)
+                return existing
             
             # 根据角色创建对应的agent
             agent_class = self.agent_registry.get(role)
@@ -45,11 +53,35 @@ class AICoordinationEngine:
             
             agent = agent_class(user_id, self.knowledge_base)
             
+            # 会话已在其他worker上启动时直接恢复，不重复执行启动流程
+            stored = await self.session_store.load(user_id, agent_class.__name__)
+            if stored:
+                agent.restore_state(*stored)
+                self.user_agents.put(user_id, agent)
+                return agent
+            
+            # 获取用户信息
+            with next(get_db()) as db:
+                user = db.query(User).filter(User.id == user_id).first()
+                if not user:
+                    raise ValueError(f"User {user_id} not found")
+            
             # 启动agent
             startup_result = await agent.startup()
             
-            # 缓存agent
-            self.user_agents[user_id] = agent
+            saved = await self.session_store.save(
+                user_id, agent_class.__name__, agent.export_state(), expected_version=0
+            )
+            if saved and saved[0] == CONFLICT:
+                # 其他worker同时完成了启动，统一采用先写入的会话
+                stored = await self.session_store.load(user_id, agent_class.__name__)
+                if stored:
+                    agent.restore_state(*stored)
+            elif saved:
+                agent.session_version, agent.session_digest = saved
+            
+            # 缓存agent，超出容量时淘汰最久未使用的agent
+            self.user_agents.put(user_id, agent)
             
             # 记录启动日志
             await self.knowledge_base.log_agent_activity(
@@ -67,18 +99,30 @@ class AICoordinationEngine:
             return None
     
     async def process_user_action(self, user_id: int, action: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """处理用户行为，触发AI Agent流程"""
+        """处理用户行为，触发AI Agent流程（经由该用户的actor按顺序执行）"""
+        return await self.actors.send(user_id, action)
+    
+    async def _process_action_batch(self, user_id: int, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """actor处理同一用户连续的一批行为：行为日志合并为一组写入，会话状态只写回一次"""
+        try:
+            agent = await self._get_agent(user_id)
+        except Exception as e:
+            print(f"Error processing user action: {e}")
+            return [{"error": str(e)}] * len(actions)
+        if not agent:
+            return [{"error": "Failed to initialize AI agent"}] * len(actions)
+        
+        results = []
+        async with behavior_log_buffer.write_group():
+            for action in actions:
+                results.append(await self._handle_action(agent, user_id, action))
+        
+        # 会话状态有变化时写回共享存储
+        await self._persist_session(agent)
+        return results
+    
+    async def _handle_action(self, agent: BaseAgent, user_id: int, action: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            # 获取或创建agent
-            agent = self.user_agents.get(user_id)
-            if not agent or not agent.active:
-                # 自动推断用户角色
-                role = await self._infer_user_role(user_id)
-                agent = await self.initialize_agent(user_id, role)
-                
-                if not agent:
-                    return {"error": "Failed to initialize AI agent"}
-            
             # 更新用户行为日志
             await self.knowledge_base.update_behavior_log(user_id, action)
             
@@ -98,6 +142,71 @@ class AICoordinationEngine:
             print(f"Error processing user action: {e}")
             return {"error": str(e)}
     
+    async def stream_chat(
+        self,
+        user_id: int,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        history: Optional[list] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式AI对话，逐段转发agent产出的事件"""
+        agent = await self._get_agent(user_id)
+        if not agent:
+            yield {"event": "error", "data": {"error": "Failed to initialize AI agent"}}
+            return
+        
+        if not hasattr(agent, "stream_chat"):
+            yield {"event": "error", "data": {"error": "Streaming chat not supported"}}
+            return
+        
+        async for event in agent.stream_chat(message, context, history):
+            yield event
+    
+    async def _get_agent(self, user_id: int) -> Optional[BaseAgent]:
+        """获取本worker上的agent，不存在时恢复或初始化"""
+        agent = self.user_agents.get(user_id)
+        if agent and agent.active:
+            await self._sync_session(agent)
+            return agent
+        
+        # 自动推断用户角色
+        role = await self._infer_user_role(user_id)
+        return await self.initialize_agent(user_id, role)
+    
+    async def _sync_session(self, agent: BaseAgent):
+        """其他worker更新过会话时，以共享存储中的状态为准"""
+        version = await self.session_store.version(agent.user_id)
+        if version is None or version == agent.session_version:
+            return
+        
+        if version == 0:
+            # 共享会话已过期或被删除，以本地状态重建
+            agent.session_version, agent.session_digest = 0, None
+            await self._persist_session(agent)
+            return
+        
+        stored = await self.session_store.load(agent.user_id, agent.__class__.__name__)
+        if stored:
+            agent.restore_state(*stored)
+    
+    async def _persist_session(self, agent: BaseAgent):
+        """按版本号写回会话状态，冲突时放弃本地修改并重新加载"""
+        state = agent.export_state()
+        if self.session_store.digest(self.session_store.encode(state)) == agent.session_digest:
+            return
+        
+        saved = await self.session_store.save(
+            agent.user_id, agent.__class__.__name__, state, expected_version=agent.session_version
+        )
+        if not saved:
+            return
+        if saved[0] == CONFLICT:
+            stored = await self.session_store.load(agent.user_id, agent.__class__.__name__)
+            if stored:
+                agent.restore_state(*stored)
+            return
+        agent.session_version, agent.session_digest = saved
+    
     async def _infer_user_role(self, user_id: int) -> str:
         """推断用户角色"""
         with next(get_db()) as db:
@@ -141,21 +250,20 @@ class AICoordinationEngine:
             print(f"Cross-role coordination error: {e}")
     
     async def _notify_teachers(self, student_id: int, action: Dict, response: Dict):
-        """通知相关教师"""
-        # 这里会在后续实现
-        pass
+        """通知相关教师（入队后立即返回，由通知管道在后台解析接收人并合并发送）"""
+        self.notifications.submit("teacher", student_id, action)
     
     async def _notify_parents(self, student_id: int, action: Dict, response: Dict):
-        """通知相关家长"""
-        # 这里会在后续实现
-        pass
+        """通知相关家长（入队后立即返回）"""
+        self.notifications.submit("parent", student_id, action)
     
     async def shutdown_agent(self, user_id: int):
         """关闭用户的AI Agent"""
-        if user_id in self.user_agents:
-            agent = self.user_agents[user_id]
+        agent = self.user_agents.pop(user_id)
+        if agent:
             await agent.shutdown()
-            del self.user_agents[user_id]
+        # 用户主动关闭时同时结束共享会话
+        await self.session_store.delete(user_id)
     
     async def get_agent_status(self, user_id: int) -> Dict[str, Any]:
         """获取代理状态"""
@@ -170,16 +278,31 @@ class AICoordinationEngine:
         
         return {"active": False, "agent_type": None}
     
+    async def shutdown(self):
+        """关闭所有AI Agent"""
+        await self.actors.shutdown()
+        await self.user_agents.shutdown()
+        await self.notifications.shutdown()
+    
+    def stats(self) -> Dict[str, Any]:
+        """agent注册表与上下文统计"""
+        return {
+            **self.user_agents.stats(),
+            "contexts": len(self.context_manager.contexts),
+            "session_store": self.session_store.stats(),
+            "notifications": self.notifications.stats(),
+            "actors": self.actors.stats()
+        }
+    
     async def bulk_process_actions(self, actions: list[Dict[str, Any]]) -> list[Dict[str, Any]]:
-        """批量处理用户行为"""
-        tasks = []
+        """批量处理用户行为：按列表顺序投递到各用户的actor，总并发由actor系统限制"""
+        futures = []
         for action in actions:
             user_id = action.get("user_id")
             if user_id:
-                task = self.process_user_action(user_id, action)
-                tasks.append(task)
+                futures.append(await self.actors.enqueue(user_id, action))
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        results = await asyncio.gather(*futures, return_exceptions=True)
         
         return [
             result if not isinstance(result, Exception) else {"error": str(result)}
@@ -188,10 +311,11 @@ class AICoordinationEngine:
 
 
 class ContextManager:
-    """上下文管理器"""
+    """上下文管理器（按最近使用淘汰，容量与agent上限一致）"""
     
-    def __init__(self):
-        self.contexts: Dict[int, Dict[str, Any]] = {}
+    def __init__(self, max_contexts: int = settings.AI_AGENT_MAX_ACTIVE):
+        self.max_contexts = max_contexts
+        self.contexts: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
     
     def get_context(self, user_id: int) -> Dict[str, Any]:
         """获取用户上下文"""
@@ -203,6 +327,10 @@ class ContextManager:
             self.contexts[user_id] = {}
         
         self.contexts[user_id].update(context_updates)
+        self.contexts.move_to_end(user_id)
+        
+        while len(self.contexts) > self.max_contexts:
+            self.contexts.popitem(last=False)
     
     def clear_context(self, user_id: int):
         """清除用户上下文"""
@@ -0,0 +1,101 @@
+# backend/app/ai/engines/llm_cache.py
+"""
+LLM响应精确匹配缓存
+"""
+import re
+import json
+import hashlib
+import unicodedata
+from typing import Dict, Any, Optional
+
+from app.core.config import settings
+from app.utils.cache import TwoTierCache
+
+
+class LLMResponseCache:
+    """LLM响应缓存 - 以规范化后的提示词哈希为键"""
+
+    def __init__(
+        self,
+        ttl: int = settings.AI_LLM_CACHE_TTL,
+        enabled: bool = settings.AI_LLM_CACHE_ENABLED,
+        allow_nondeterministic: bool = settings.AI_LLM_CACHE_ALLOW_NONDETERMINISTIC
+    ):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.allow_nondeterministic = allow_nondeterministic
+        self.backend = TwoTierCache(
+            "llm:resp",
+            local_maxsize=settings.AI_LLM_CACHE_LOCAL_SIZE,
+            local_ttl=settings.AI_LLM_CACHE_LOCAL_TTL
+        )
+
+        # 统计指标
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.latency_saved_ms = 0.0
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """规范化提示词：统一全半角、合并空白"""
+        normalized = unicodedata.normalize("NFKC", prompt or "")
+        return re.sub(r"\s+", " ", normalized).strip()
+
+    def make_key(
+        self,
+        provider: str,
+        model: str,
+        system_prompt: Optional[str],
+        prompt: str,
+        temperature: float
+    ) -> str:
+        """生成缓存键"""
+        raw = json.dumps(
+            [provider, model, system_prompt or "", self.normalize_prompt(prompt), round(temperature, 3)],
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, temperature: float, allow_nondeterministic: bool = False) -> bool:
+        """判断本次调用是否可以使用缓存"""
+        if not self.enabled:
+            return False
+
+        if temperature > 0 and not (allow_nondeterministic or self.allow_nondeterministic):
+            self.skipped += 1
+            return False
+
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存响应"""
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.latency_saved_ms += entry.get("latency_ms", 0.0)
+        return entry.get("response")
+
+    def set(self, key: str, response: str, latency_ms: float):
+        """写入缓存响应，同时记录原始调用耗时"""
+        self.backend.set(key, {"response": response, "latency_ms": latency_ms}, self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 2)
+        }
+
+
+# 全局LLM响应缓存实例
+llm_response_cache = LLMResponseCache()
@@ -4,62 +4,368 @@
 """
 import os
 import json
-import openai
-from typing import Dict, Any, List, Optional
+import time
+import httpx
+from typing import Dict, Any, List, Optional, AsyncIterator, Callable, Tuple
 from app.core.config import settings
+from app.ai.engines.llm_cache import llm_response_cache
+from app.ai.engines.single_flight import llm_single_flight
+from app.ai.engines.llm_scheduler import llm_scheduler, Priority, LLMUnavailableError
+from app.ai.engines.model_router import model_router
+from app.ai.engines.llm_ledger import llm_ledger
+from app.ai.engines.context_builder import estimate_tokens
+
+FALLBACK_RESPONSE = "抱歉，AI服务暂时不可用。"
+
+
+def parse_usage(result: Dict[str, Any]) -> Dict[str, int]:
+    """chat-completions 响应（或流式分片）中的token用量"""
+    usage = result.get("usage") or {}
+    return {
+        key: int(usage[key]) for key in ("prompt_tokens", "completion_tokens")
+        if usage.get(key) is not None
+    }
+
+
+class LLMProvider:
+    """LLM提供方接口，异常由调用方统一处理"""
+    
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: float
+    ) -> str:
+        """一次性生成完整响应"""
+        raise NotImplementedError
+    
+    async def complete_with_usage(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: float
+    ) -> Tuple[str, Dict[str, int]]:
+        """一次性生成完整响应，同时返回上游报告的token用量（prompt_tokens、completion_tokens，未报告时为空）"""
+        return await self.complete(messages, model, max_tokens, temperature), {}
+    
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """流式生成响应，默认退化为一次性返回；传入 usage 时写入上游报告的token用量"""
+        content, reported = await self.complete_with_usage(messages, model, max_tokens, temperature)
+        if usage is not None:
+            usage.update(reported)
+        yield content
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat-completions 协议提供方
+    
+    通过 base_url 可指向任何兼容该协议的服务（包括本地模拟服务）
+    """
+    
+    def __init__(self, api_key: Optional[str], base_url: str, timeout: float = 60.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.client = httpx.AsyncClient(timeout=timeout)
+    
+    def _request(self, messages, model, max_tokens, temperature, stream: bool = False) -> Dict[str, Any]:
+        body = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": stream
+        }
+        if stream:
+            # 流的最后一个分片携带token用量（choices为空）
+            body["stream_options"] = {"include_usage": True}
+        return {
+            "headers": {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            "json": body
+        }
+    
+    async def complete(self, messages, model, max_tokens, temperature) -> str:
+        content, _ = await self.complete_with_usage(messages, model, max_tokens, temperature)
+        return content
+    
+    async def complete_with_usage(self, messages, model, max_tokens, temperature) -> Tuple[str, Dict[str, int]]:
+        response = await self.client.post(
+            f"{self.base_url}/chat/completions",
+            **self._request(messages, model, max_tokens, temperature)
+        )
+        response.raise_for_status()
+        result = response.json()
+        return result["choices"][0]["message"]["content"], parse_usage(result)
+    
+    async def stream(self, messages, model, max_tokens, temperature, usage=None) -> AsyncIterator[str]:
+        async with self.client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            **self._request(messages, model, max_tokens, temperature, stream=True)
+        ) as response:
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                
+                chunk = json.loads(data)
+                if usage is not None:
+                    usage.update(parse_usage(chunk))
+                if not chunk.get("choices"):
+                    continue
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    yield content
+
+
+class AnthropicProvider(LLMProvider):
+    """Anthropic提供方"""
+    
+    def __init__(self, api_key: Optional[str]):
+        self.api_key = api_key
+    
+    async def complete(self, messages, model, max_tokens, temperature) -> str:
+        # 这里可以实现Anthropic API调用
+        return "Anthropic integration coming soon..."
+
+
+# 提供方注册表：名称 -> 工厂函数
+LLM_PROVIDERS: Dict[str, Callable[[], LLMProvider]] = {
+    "openai": lambda: OpenAIProvider(settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL),
+    "anthropic": lambda: AnthropicProvider(settings.ANTHROPIC_API_KEY),
+}
+
+
+def register_provider(name: str, factory: Callable[[], LLMProvider]):
+    """注册自定义LLM提供方"""
+    LLM_PROVIDERS[name] = factory
 
 
 class LLMClient:
     """大语言模型客户端"""
     
     def __init__(self):
-        self.provider = settings.AI_MODEL_PROVIDER  # 'openai' or 'anthropic'
+        self.provider = settings.AI_MODEL_PROVIDER  # LLM_PROVIDERS 中注册的名称
+        self.model = None  # 为空时由模型路由按请求选择
+        self.router = model_router
+        self.ledger = llm_ledger
+        self.temperature = 0.7
+        self.max_tokens = 1000
+        self.response_cache = llm_response_cache
+        self.single_flight = llm_single_flight
+        self.scheduler = llm_scheduler
         self.setup_client()
     
     def setup_client(self):
         """设置客户端"""
-        if self.provider == 'openai':
-            openai.api_key = settings.OPENAI_API_KEY
-        elif self.provider == 'anthropic':
-            # 这里可以添加Anthropic客户端设置
-            pass
-    
-    async def generate(self, prompt: str, context: Optional[Dict] = None) -> str:
-        """生成文本响应"""
-        if self.provider == 'openai':
-            return await self._generate_openai(prompt, context)
-        elif self.provider == 'anthropic':
-            return await self._generate_anthropic(prompt, context)
-        else:
-            raise ValueError(f"Unsupported AI provider: {self.provider}")
+        factory = LLM_PROVIDERS.get(self.provider)
+        self.llm_provider = factory() if factory else None
     
-    async def _generate_openai(self, prompt: str, context: Optional[Dict] = None) -> str:
-        """使用OpenAI生成响应"""
-        try:
-            messages = []
-            
-            if context:
-                system_prompt = self._build_system_prompt(context)
-                messages.append({"role": "system", "content": system_prompt})
+    async def generate(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        temperature: Optional[float] = None,
+        cache_nondeterministic: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None,
+        task: Optional[str] = None,
+        json_mode: bool = False
+    ) -> str:
+        """生成文本响应
+        
+        temperature > 0 时默认不走缓存，除非显式传入 cache_nondeterministic=True；
+        调用经过模型路由和准入调度，被拒绝或失败时返回兜底响应
+        """
+        if self.llm_provider is None:
+            raise ValueError(f"Unsupported AI provider: {self.provider}")
+        
+        temperature = self.temperature if temperature is None else temperature
+        system_prompt = self._build_system_prompt(context) if context else None
+        
+        route = self.router.route(
+            self.provider, prompt, role=(context or {}).get("role"), task=task, json_mode=json_mode
+        )
+        model = self.model or route.model
+        
+        request_key = self.response_cache.make_key(
+            self.provider, model, system_prompt, prompt, temperature
+        )
+        
+        start_time = time.perf_counter()
+        prompt_tokens = estimate_tokens(system_prompt or "") + estimate_tokens(prompt)
+        
+        def record(
+            status: str,
+            response: str = "",
+            cache_hit: bool = False,
+            error: Optional[str] = None,
+            usage: Optional[Dict[str, int]] = None
+        ):
+            # 上游报告了token用量时以其为准，否则按本地估算
+            usage = usage or {}
+            self.ledger.record(
+                task, "llm_client", status, (time.perf_counter() - start_time) * 1000,
+                prompt_tokens=usage.get("prompt_tokens", prompt_tokens),
+                completion_tokens=usage.get("completion_tokens", estimate_tokens(response)),
+                cache_hit=cache_hit,
+                role=(context or {}).get("role"),
+                provider=self.provider,
+                model=model,
+                tier=route.tier,
+                error=error
+            )
+        
+        # 精确匹配缓存
+        cacheable = self.response_cache.is_cacheable(temperature, cache_nondeterministic)
+        if cacheable:
+            cached_response = self.response_cache.get(request_key)
+            if cached_response is not None:
+                record("ok", cached_response, cache_hit=True)
+                return cached_response
+        
+        outcome = {}
+        
+        async def call_provider() -> str:
+            try:
+                response, usage = await self.scheduler.run(
+                    route.lane,
+                    lambda: self.llm_provider.complete_with_usage(
+                        self._build_messages(prompt, system_prompt),
+                        model, self.max_tokens, temperature
+                    ),
+                    priority=priority,
+                    timeout=timeout
+                )
+            except LLMUnavailableError as e:
+                print(f"LLM call rejected: {e}")
+                outcome.update(status="rejected", error=str(e))
+                return FALLBACK_RESPONSE
+            except Exception as e:
+                print(f"LLM API Error: {e}")
+                outcome.update(status="error", error=str(e))
+                return FALLBACK_RESPONSE
             
-            messages.append({"role": "user", "content": prompt})
+            latency_ms = (time.perf_counter() - start_time) * 1000
+            self.router.record(route, latency_ms)
+            if cacheable:
+                self.response_cache.set(request_key, response, latency_ms)
             
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=1000,
-                temperature=0.7
+            outcome.update(status="ok", usage=usage)
+            return response
+        
+        # 并发的相同请求共享同一次上游调用
+        response = await self.single_flight.do(request_key, call_provider)
+        
+        # 未执行上游调用的等待者记为合并请求
+        record(outcome.get("status", "coalesced"), response, error=outcome.get("error"), usage=outcome.get("usage"))
+        return response
+    
+    async def generate_stream(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        temperature: Optional[float] = None,
+        cache_nondeterministic: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None,
+        task: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """流式生成文本响应，逐段产出增量内容
+        
+        完整响应仅在流正常结束后写入缓存
+        """
+        if self.llm_provider is None:
+            raise ValueError(f"Unsupported AI provider: {self.provider}")
+        
+        temperature = self.temperature if temperature is None else temperature
+        system_prompt = self._build_system_prompt(context) if context else None
+        
+        route = self.router.route(self.provider, prompt, role=(context or {}).get("role"), task=task)
+        model = self.model or route.model
+        
+        start_time = time.perf_counter()
+        prompt_tokens = estimate_tokens(system_prompt or "") + estimate_tokens(prompt)
+        usage: Dict[str, int] = {}
+        
+        def record(status: str, response: str = "", cache_hit: bool = False, error: Optional[str] = None):
+            self.ledger.record(
+                task, "llm_client.stream", status, (time.perf_counter() - start_time) * 1000,
+                prompt_tokens=usage.get("prompt_tokens", prompt_tokens),
+                completion_tokens=usage.get("completion_tokens", estimate_tokens(response)),
+                cache_hit=cache_hit,
+                role=(context or {}).get("role"),
+                provider=self.provider,
+                model=model,
+                tier=route.tier,
+                error=error
             )
-            
-            return response.choices[0].message.content
+        
+        cache_key = None
+        if self.response_cache.is_cacheable(temperature, cache_nondeterministic):
+            cache_key = self.response_cache.make_key(
+                self.provider, model, system_prompt, prompt, temperature
+            )
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                record("ok", cached_response, cache_hit=True)
+                yield cached_response
+                return
+        
+        stream = self.llm_provider.stream(
+            self._build_messages(prompt, system_prompt),
+            model, self.max_tokens, temperature, usage=usage
+        )
+        
+        chunks = []
+        try:
+            # timeout仅约束排队等待，流式输出时长不受限
+            async with self.scheduler.slot(route.lane, priority, timeout):
+                async for chunk in stream:
+                    if not chunks:
+                        # 流式调用以首段到达时间衡量延迟
+                        self.router.record(route, (time.perf_counter() - start_time) * 1000)
+                    chunks.append(chunk)
+                    yield chunk
         except Exception as e:
-            print(f"OpenAI API Error: {e}")
-            return "抱歉，AI服务暂时不可用。"
+            print(f"LLM stream error: {e}")
+            status = "rejected" if isinstance(e, LLMUnavailableError) else "error"
+            record(status, "".join(chunks), error=str(e))
+            if not chunks:
+                yield FALLBACK_RESPONSE
+            return
+        
+        response = "".join(chunks)
+        record("ok", response)
+        if cache_key and response and response != FALLBACK_RESPONSE:
+            latency_ms = (time.perf_counter() - start_time) * 1000
+            self.response_cache.set(cache_key, response, latency_ms)
     
-    async def _generate_anthropic(self, prompt: str, context: Optional[Dict] = None) -> str:
-        """使用Anthropic生成响应"""
-        # 这里可以实现Anthropic API调用
-        return "Anthropic integration coming soon..."
+    def _build_messages(self, prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        """构建对话消息"""
+        messages = []
+        
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        messages.append({"role": "user", "content": prompt})
+        return messages
     
     def _build_system_prompt(self, context: Dict) -> str:
         """构建系统提示词"""
@@ -74,7 +380,16 @@ class LLMClient:
         
         return system_prompts.get(role, system_prompts['student'])
     
-    async def analyze_json_response(self, prompt: str, context: Optional[Dict] = None) -> Dict[str, Any]:
+    async def analyze_json_response(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        temperature: Optional[float] = None,
+        cache_nondeterministic: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None,
+        task: Optional[str] = None
+    ) -> Dict[str, Any]:
         """生成结构化JSON响应"""
         json_prompt = f"""
         {prompt}
@@ -82,7 +397,15 @@ class LLMClient:
         请以JSON格式回复，确保返回的内容是有效的JSON格式。
         """
         
-        response = await self.generate(json_prompt, context)
+        response = await self.generate(
+            json_prompt, context,
+            temperature=temperature,
+            cache_nondeterministic=cache_nondeterministic,
+            priority=priority,
+            timeout=timeout,
+            task=task,
+            json_mode=True
+        )
         
         try:
             # 清理可能的markdown格式
@@ -100,3 +423,7 @@ class LLMClient:
                 "raw_response": response,
                 "success": False
             }
+
+
+# 全局LLM客户端实例（各agent共享，连接池随之共享）
+llm_client = LLMClient()
@@ -0,0 +1,235 @@
+# backend/app/ai/engines/llm_ledger.py
+"""
+LLM调用流水：批量异步写入与按模板/日期汇总
+"""
+import asyncio
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.analytics import LLMCallLedger
+
+
+def parse_pricing(spec: str) -> Dict[str, tuple]:
+    """解析 "gpt-4:0.03:0.06,..." 形式的价格配置（每千token的输入/输出价格）"""
+    pricing = {}
+    for item in (spec or "").split(","):
+        parts = item.strip().split(":")
+        if len(parts) == 3:
+            pricing[parts[0]] = (float(parts[1]), float(parts[2]))
+    return pricing
+
+
+class LLMLedger:
+    """LLM调用流水记录器
+
+    请求路径上只把记录追加到内存缓冲区；后台任务按条数或时间间隔批量写库，
+    写库失败的批次放回缓冲区重试，缓冲区满时丢弃最旧的记录并计数。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.AI_LLM_LEDGER_ENABLED,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        max_buffer: int = 20000
+    ):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer: deque = deque(maxlen=max_buffer)
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        # 统计指标
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def record(
+        self,
+        template_id: str,
+        source: str,
+        status: str,
+        latency_ms: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cache_hit: bool = False,
+        user_id: Optional[int] = None,
+        role: Optional[str] = None,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        tier: Optional[str] = None,
+        error: Optional[str] = None
+    ):
+        """追加一条调用记录（不访问数据库）"""
+        if not self.enabled:
+            return
+
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+
+        self.buffer.append({
+            "created_at": datetime.now(),
+            "template_id": (template_id or "generic")[:100],
+            "source": source,
+            "user_id": user_id,
+            "role": role,
+            "provider": provider,
+            "model": model,
+            "tier": tier,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency_ms, 2),
+            "cache_hit": cache_hit,
+            "status": status,
+            "error": error[:255] if error else None
+        })
+        self.recorded += 1
+        self._ensure_flusher()
+
+        if len(self.buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """把缓冲区中的记录批量写入数据库"""
+        while self.buffer:
+            batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+            try:
+                await asyncio.to_thread(self._write, batch)
+                self.written += len(batch)
+            except Exception as e:
+                print(f"LLM ledger write failed: {e}")
+                self.write_errors += 1
+                # 放回缓冲区头部，下个周期重试
+                self.buffer.extendleft(reversed(batch[:self.buffer.maxlen - len(self.buffer)]))
+                return
+
+    @staticmethod
+    def _write(rows: List[Dict[str, Any]]):
+        with next(get_db()) as db:
+            db.bulk_insert_mappings(LLMCallLedger, rows)
+            db.commit()
+
+    async def shutdown(self):
+        """停止后台任务并写出剩余记录"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """流水写入统计"""
+        return {
+            "enabled": self.enabled,
+            "recorded": self.recorded,
+            "written": self.written,
+            "buffered": len(self.buffer),
+            "dropped": self.dropped,
+            "write_errors": self.write_errors
+        }
+
+
+def build_ledger_report(db, days: int = 7, template_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按模板和日期汇总调用量、p95延迟、token用量与估算成本"""
+    pricing = parse_pricing(settings.AI_LLM_PRICING)
+    since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+
+    query = db.query(
+        LLMCallLedger.template_id,
+        LLMCallLedger.created_at,
+        LLMCallLedger.model,
+        LLMCallLedger.latency_ms,
+        LLMCallLedger.prompt_tokens,
+        LLMCallLedger.completion_tokens,
+        LLMCallLedger.cache_hit,
+        LLMCallLedger.status
+    ).filter(LLMCallLedger.created_at >= since)
+    if template_id:
+        query = query.filter(LLMCallLedger.template_id == template_id)
+
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for row in query.yield_per(5000):
+        key = (row.template_id, row.created_at.date().isoformat())
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "template_id": row.template_id,
+                "date": key[1],
+                "calls": 0,
+                "errors": 0,
+                "cache_hits": 0,
+                "coalesced": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "estimated_cost": 0.0,
+                "models": set(),
+                "_latencies": []
+            }
+
+        group["calls"] += 1
+        if row.status in ("error", "rejected"):
+            group["errors"] += 1
+            continue
+        if row.cache_hit:
+            group["cache_hits"] += 1
+            continue
+        if row.status == "coalesced":
+            group["coalesced"] += 1
+            continue
+
+        # 只统计实际发往上游的调用的延迟和token
+        prompt_tokens, completion_tokens = row.prompt_tokens or 0, row.completion_tokens or 0
+        group["prompt_tokens"] += prompt_tokens
+        group["completion_tokens"] += completion_tokens
+        group["models"].add(row.model)
+        group["_latencies"].append(row.latency_ms or 0.0)
+
+        prompt_price, completion_price = pricing.get(row.model, (0.0, 0.0))
+        group["estimated_cost"] += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    report = []
+    for group in groups.values():
+        latencies = group.pop("_latencies")
+        latencies = np.array(latencies) if latencies else None
+        upstream = group["calls"] - group["errors"] - group["cache_hits"] - group["coalesced"]
+        group.update({
+            "models": sorted(model for model in group["models"] if model),
+            "p50_latency_ms": round(float(np.percentile(latencies, 50)), 2) if latencies is not None else None,
+            "p95_latency_ms": round(float(np.percentile(latencies, 95)), 2) if latencies is not None else None,
+            "avg_prompt_tokens": round(group["prompt_tokens"] / upstream, 1) if upstream else 0.0,
+            "avg_completion_tokens": round(group["completion_tokens"] / upstream, 1) if upstream else 0.0,
+            "estimated_cost": round(group["estimated_cost"], 4)
+        })
+        report.append(group)
+
+    report.sort(key=lambda item: (item["date"], item["estimated_cost"]), reverse=True)
+    return report
+
+
+# 全局LLM调用流水实例
+llm_ledger = LLMLedger()
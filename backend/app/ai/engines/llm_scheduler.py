@@ -0,0 +1,301 @@
+# backend/app/ai/engines/llm_scheduler.py
+"""
+LLM调用准入控制：并发上限、优先级队列、调用截止时间与熔断
+"""
+import time
+import heapq
+import asyncio
+import itertools
+from enum import IntEnum
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Callable, Awaitable, Optional, List
+
+from app.core.config import settings
+
+
+class Priority(IntEnum):
+    """调用优先级，数值越小越优先"""
+    INTERACTIVE = 0   # 实时对话、求助
+    STANDARD = 1
+    BACKGROUND = 2    # 后台推荐生成等
+
+
+class LLMUnavailableError(Exception):
+    """LLM调用被拒绝：熔断打开、排队已满或超过截止时间"""
+    pass
+
+
+class CircuitBreaker:
+    """基于滑动窗口错误率的熔断器"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        error_rate_threshold: float = settings.AI_LLM_BREAKER_ERROR_RATE,
+        min_calls: int = settings.AI_LLM_BREAKER_MIN_CALLS,
+        window_seconds: float = 30.0,
+        cooldown_seconds: float = settings.AI_LLM_BREAKER_COOLDOWN
+    ):
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._outcomes: deque = deque()  # (时间, 是否成功)
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def allow(self) -> bool:
+        """是否放行本次调用"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+
+        # 半开状态只放行一个探测请求
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def release_probe(self):
+        """调用没有得到结果（排队失败、被取消或客户端断开）时调用，半开状态下允许下一次调用探测"""
+        self.probe_in_flight = False
+
+    def record_success(self):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._outcomes.clear()
+        self._outcomes.append((now, True))
+        self._trim(now)
+
+    def record_failure(self):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._open(now)
+            return
+
+        self._outcomes.append((now, False))
+        self._trim(now)
+
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate_threshold:
+            self._open(now)
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.probe_in_flight = False
+        self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_error_rate": failures / len(self._outcomes) if self._outcomes else 0.0
+        }
+
+
+class _Lane:
+    """单个提供方的调用通道：并发槽位 + 优先级等待队列"""
+
+    def __init__(self, name: str, capacity: int, max_queue: int):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters: List[list] = []  # [优先级, 序号, future]
+        self.breaker = CircuitBreaker()
+        self._seq = itertools.count()
+
+        # 统计指标
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.breaker_rejections = 0
+        self.wait_times_ms: deque = deque(maxlen=1000)
+
+    async def acquire(self, priority: Priority, timeout: float):
+        """获取并发槽位，超时或队列已满时抛出LLMUnavailableError"""
+        if self.active < self.capacity and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            self.wait_times_ms.append(0.0)
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LLMUnavailableError(f"{self.name} queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [int(priority), next(self._seq), future]
+        heapq.heappush(self.waiters, entry)
+        enqueued_at = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._discard(entry)
+            self.timeouts += 1
+            raise LLMUnavailableError(f"{self.name} queue wait exceeded deadline")
+        except asyncio.CancelledError:
+            self._discard(entry)
+            # 已分配槽位后才被取消，需要归还
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+        self.admitted += 1
+        self.wait_times_ms.append((time.perf_counter() - enqueued_at) * 1000)
+
+    def _discard(self, entry: list):
+        if entry in self.waiters:
+            self.waiters.remove(entry)
+            heapq.heapify(self.waiters)
+
+    def release(self):
+        """归还槽位并唤醒优先级最高的等待者"""
+        self.active -= 1
+        while self.waiters and self.active < self.capacity:
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.wait_times_ms)
+        depth_by_priority = {p.name.lower(): 0 for p in Priority}
+        for priority, _, _ in self.waiters:
+            depth_by_priority[Priority(priority).name.lower()] += 1
+
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "queue_depth": len(self.waiters),
+            "queue_depth_by_priority": depth_by_priority,
+            "avg_wait_ms": round(sum(waits) / len(waits), 2) if waits else 0.0,
+            "p95_wait_ms": round(waits[int(len(waits) * 0.95) - 1], 2) if waits else 0.0,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "breaker_rejections": self.breaker_rejections,
+            "breaker": self.breaker.stats()
+        }
+
+
+class LLMScheduler:
+    """所有LLM调用的统一准入调度器"""
+
+    def __init__(
+        self,
+        default_capacity: int = settings.AI_LLM_MAX_CONCURRENCY,
+        max_queue: int = settings.AI_LLM_MAX_QUEUE,
+        provider_capacity: str = settings.AI_LLM_PROVIDER_CONCURRENCY
+    ):
+        self.default_capacity = default_capacity
+        self.max_queue = max_queue
+        self.provider_capacity = self._parse_capacity(provider_capacity)
+        self.lanes: Dict[str, _Lane] = {}
+
+    @staticmethod
+    def _parse_capacity(spec: str) -> Dict[str, int]:
+        """解析 "openai:16,openai:strong:4,anthropic:8" 形式的并发配置"""
+        capacity = {}
+        for item in (spec or "").split(","):
+            if ":" in item:
+                name, value = item.rsplit(":", 1)
+                capacity[name.strip()] = int(value)
+        return capacity
+
+    def _lane(self, provider: str) -> _Lane:
+        lane = self.lanes.get(provider)
+        if lane is None:
+            # 通道名为 "提供方:档位"，未单独配置时使用提供方的配置
+            capacity = self.provider_capacity.get(
+                provider, self.provider_capacity.get(provider.split(":")[0], self.default_capacity)
+            )
+            lane = _Lane(provider, capacity, self.max_queue)
+            self.lanes[provider] = lane
+        return lane
+
+    @staticmethod
+    def default_timeout(priority: Priority) -> float:
+        if priority == Priority.BACKGROUND:
+            return settings.AI_LLM_BACKGROUND_TIMEOUT
+        return settings.AI_LLM_INTERACTIVE_TIMEOUT
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        provider: str,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None
+    ):
+        """占用一个并发槽位，适用于流式调用"""
+        lane = self._lane(provider)
+        if not lane.breaker.allow():
+            lane.breaker_rejections += 1
+            raise LLMUnavailableError(f"{provider} circuit breaker is open")
+
+        timeout = self.default_timeout(priority) if timeout is None else timeout
+        try:
+            await lane.acquire(priority, timeout)
+        except BaseException:
+            # 包括排队时被取消：探测请求未发出
+            lane.breaker.release_probe()
+            raise
+
+        try:
+            yield
+        except Exception:
+            lane.breaker.record_failure()
+            raise
+        except BaseException:
+            # CancelledError 或流式客户端断开时的 GeneratorExit：结果未知，不计入错误率
+            lane.breaker.release_probe()
+            raise
+        else:
+            lane.breaker.record_success()
+        finally:
+            lane.release()
+
+    async def run(
+        self,
+        provider: str,
+        fn: Callable[[], Awaitable[Any]],
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """在准入控制下执行一次调用，排队与执行共享同一截止时间"""
+        timeout = self.default_timeout(priority) if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        async with self.slot(provider, priority, timeout):
+            remaining = deadline - time.monotonic()
+            try:
+                return await asyncio.wait_for(fn(), max(remaining, 0.001))
+            except asyncio.TimeoutError:
+                raise LLMUnavailableError(f"{provider} call exceeded deadline")
+
+    def stats(self) -> Dict[str, Any]:
+        """各提供方通道统计"""
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+# 全局LLM调度器实例
+llm_scheduler = LLMScheduler()
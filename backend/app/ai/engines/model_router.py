@@ -0,0 +1,175 @@
+# backend/app/ai/engines/model_router.py
+"""
+按请求复杂度和延迟预算选择模型档位
+"""
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.ai.engines.llm_scheduler import llm_scheduler
+from app.ai.engines.context_builder import estimate_tokens
+
+FAST = "fast"
+STRONG = "strong"
+
+
+class Route:
+    """路由结果"""
+
+    __slots__ = ("tier", "model", "lane", "reason", "downgraded")
+
+    def __init__(self, tier: str, model: str, lane: str, reason: str, downgraded: bool = False):
+        self.tier = tier
+        self.model = model
+        self.lane = lane
+        self.reason = reason
+        self.downgraded = downgraded
+
+
+class _TierStats:
+    """单个档位的延迟统计
+
+    只保留最近 window_seconds 内的样本：降级期间强档没有新样本，旧样本过期后自动恢复路由
+    """
+
+    def __init__(self, slo_ms: float, window_seconds: float = 60.0, max_samples: int = 500):
+        self.slo_ms = slo_ms
+        self.window_seconds = window_seconds
+        self.samples: deque = deque(maxlen=max_samples)  # (时间, 耗时ms)
+        self.routed = 0
+        self.slo_breaches = 0
+
+    def record(self, latency_ms: float):
+        self.samples.append((time.monotonic(), latency_ms))
+        if latency_ms > self.slo_ms:
+            self.slo_breaches += 1
+
+    def recent(self) -> list:
+        cutoff = time.monotonic() - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return [latency for _, latency in self.samples]
+
+    def percentile(self, q: float) -> float:
+        values = sorted(self.recent())
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slo_ms": self.slo_ms,
+            "routed": self.routed,
+            "p50_ms": round(self.percentile(0.5), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "slo_breaches": self.slo_breaches
+        }
+
+
+class ModelRouter:
+    """模型分档路由
+
+    简短提示、对话和求助走快速档；结构化输出、学习分析类任务和长提示走强档。
+    强档排队预计等待或近期p95延迟超出其SLO、或熔断打开时降级到快速档。
+    """
+
+    STRONG_TASKS = {"recommendation_generation", "learning_analysis", "learning_plan"}
+    FAST_TASKS = {"ai_chat", "request_help", "conversation_summary"}
+    STRONG_ROLES = {"teacher", "admin"}
+
+    def __init__(
+        self,
+        policy: str = settings.AI_LLM_ROUTING,
+        fast_model: str = settings.AI_LLM_FAST_MODEL,
+        strong_model: str = settings.AI_LLM_STRONG_MODEL,
+        strong_min_tokens: int = settings.AI_LLM_STRONG_MIN_TOKENS,
+        fast_slo_ms: float = settings.AI_LLM_FAST_SLO_MS,
+        strong_slo_ms: float = settings.AI_LLM_STRONG_SLO_MS
+    ):
+        self.policy = policy
+        self.models = {FAST: fast_model, STRONG: strong_model}
+        self.strong_min_tokens = strong_min_tokens
+        self.tiers = {FAST: _TierStats(fast_slo_ms), STRONG: _TierStats(strong_slo_ms)}
+        self.downgrades = 0
+
+    def classify(
+        self,
+        prompt: str,
+        role: Optional[str] = None,
+        task: Optional[str] = None,
+        json_mode: bool = False
+    ) -> Tuple[str, str]:
+        """返回 (档位, 原因)"""
+        if self.policy in (FAST, STRONG):
+            return self.policy, "policy"
+
+        tokens = estimate_tokens(prompt)
+        if task in self.STRONG_TASKS:
+            return STRONG, f"task:{task}"
+        if tokens >= self.strong_min_tokens:
+            return STRONG, "long_prompt"
+        if task in self.FAST_TASKS:
+            return FAST, f"task:{task}"
+        if json_mode:
+            return STRONG, "json_mode"
+        if role in self.STRONG_ROLES:
+            return STRONG, f"role:{role}"
+        return FAST, "default"
+
+    def _strong_over_budget(self, provider: str) -> Optional[str]:
+        """强档是否超出延迟预算，返回降级原因"""
+        tier = self.tiers[STRONG]
+        lane = llm_scheduler.lanes.get(f"{provider}:{STRONG}")
+
+        if lane is not None:
+            if lane.breaker.state == lane.breaker.OPEN:
+                return "breaker_open"
+
+            # 预计排队等待 = 前方排队数 / 并发数 × 近期单次耗时
+            if lane.waiters:
+                expected_wait = len(lane.waiters) / max(lane.capacity, 1) * tier.percentile(0.5)
+                if expected_wait > tier.slo_ms:
+                    return "queue"
+
+        if len(tier.recent()) >= 20 and tier.percentile(0.95) > tier.slo_ms:
+            return "latency"
+        return None
+
+    def route(
+        self,
+        provider: str,
+        prompt: str,
+        role: Optional[str] = None,
+        task: Optional[str] = None,
+        json_mode: bool = False
+    ) -> Route:
+        """为一次调用选择模型档位"""
+        tier, reason = self.classify(prompt, role, task, json_mode)
+
+        downgraded = False
+        if tier == STRONG and self.policy != STRONG:
+            over_budget = self._strong_over_budget(provider)
+            if over_budget:
+                tier, reason, downgraded = FAST, f"{reason}->fallback:{over_budget}", True
+                self.downgrades += 1
+
+        self.tiers[tier].routed += 1
+        return Route(tier, self.models[tier], f"{provider}:{tier}", reason, downgraded)
+
+    def record(self, route: Route, latency_ms: float):
+        """记录调用耗时"""
+        self.tiers[route.tier].record(latency_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        """路由统计"""
+        return {
+            "policy": self.policy,
+            "models": dict(self.models),
+            "downgrades": self.downgrades,
+            "tiers": {name: tier.stats() for name, tier in self.tiers.items()}
+        }
+
+
+# 全局模型路由实例
+model_router = ModelRouter()
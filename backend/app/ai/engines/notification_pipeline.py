@@ -0,0 +1,391 @@
+# backend/app/ai/engines/notification_pipeline.py
+"""
+跨角色通知管道：异步队列 + 批量解析接收人 + 摘要合并 + 可插拔发送渠道
+"""
+import json
+import time
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.utils.cache import redis_client
+
+ACTION_LABELS = {
+    "homework_submit": "提交了作业",
+    "exam_complete": "完成了考试",
+    "learning_difficulty": "遇到学习困难",
+    "low_performance": "近期成绩下滑",
+    "attendance_issue": "出勤异常",
+    "behavioral_concern": "学习行为需要关注"
+}
+
+
+class Notification:
+    """待发送的一条通知（一个接收人的一份摘要）"""
+
+    __slots__ = ("recipient_id", "audience", "title", "body", "items")
+
+    def __init__(self, recipient_id: int, audience: str, title: str, body: str, items: List[Dict[str, Any]]):
+        self.recipient_id = recipient_id
+        self.audience = audience
+        self.title = title
+        self.body = body
+        self.items = items
+
+
+class NotificationChannel:
+    """通知发送渠道基类，按批发送以便渠道内部合并查询"""
+
+    name = "base"
+
+    async def deliver(self, notifications: List[Notification]) -> int:
+        """发送一批通知，返回成功数量"""
+        raise NotImplementedError
+
+
+class LogChannel(NotificationChannel):
+    """输出到日志，用于开发和未配置其他渠道时"""
+
+    name = "log"
+
+    async def deliver(self, notifications: List[Notification]) -> int:
+        for notification in notifications:
+            print(f"[notify:{notification.audience}] user={notification.recipient_id} {notification.title}: "
+                  f"{notification.body}")
+        return len(notifications)
+
+
+class EmailChannel(NotificationChannel):
+    """邮件渠道：一次查询本批接收人的邮箱后逐封发送"""
+
+    name = "email"
+
+    def __init__(self):
+        from app.services.email_service import EmailService
+        self.email_service = EmailService()
+
+    @staticmethod
+    def _load_emails(user_ids: List[int]) -> Dict[int, str]:
+        from app.models.user import User
+
+        with next(get_db()) as db:
+            rows = db.query(User.id, User.email).filter(User.id.in_(user_ids), User.status == 1).all()
+            return {row.id: row.email for row in rows}
+
+    async def deliver(self, notifications: List[Notification]) -> int:
+        emails = await asyncio.to_thread(
+            self._load_emails, list({notification.recipient_id for notification in notifications})
+        )
+        sent = 0
+        for notification in notifications:
+            email = emails.get(notification.recipient_id)
+            if not email:
+                continue
+            # SMTP为阻塞调用，放到线程中执行避免阻塞事件循环
+            if await asyncio.to_thread(
+                self.email_service.send_email_sync, email, notification.title, notification.body
+            ):
+                sent += 1
+        return sent
+
+
+# 发送渠道注册表：名称 -> 渠道工厂
+NOTIFICATION_CHANNELS: Dict[str, Callable[[], NotificationChannel]] = {
+    "log": LogChannel,
+    "email": EmailChannel
+}
+
+
+def register_channel(name: str, factory: Callable[[], NotificationChannel]):
+    """注册新的通知渠道"""
+    NOTIFICATION_CHANNELS[name] = factory
+
+
+class NotificationPipeline:
+    """跨角色通知管道
+
+    请求路径只把事件放入有界队列（满则丢弃并计数）；后台worker按批取出事件，
+    用少量IN查询解析每个学生对应的教师（按班级）和家长。
+    同一接收人同一分组（教师按班级、家长按学生）的事件在 digest_window 秒内合并为一条摘要，
+    摘要状态保存在Redis中，多个worker进程共享，到期后由任一进程认领并通过各渠道发送。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.AI_NOTIFY_ENABLED,
+        workers: int = settings.AI_NOTIFY_WORKERS,
+        queue_size: int = settings.AI_NOTIFY_QUEUE_SIZE,
+        batch_size: int = settings.AI_NOTIFY_BATCH_SIZE,
+        digest_window: int = settings.AI_NOTIFY_DIGEST_WINDOW,
+        channels: str = settings.AI_NOTIFY_CHANNELS,
+        batch_wait: float = 0.1,
+        poll_interval: float = 5.0
+    ):
+        self.enabled = enabled
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.digest_window = digest_window
+        self.channel_names = [name.strip() for name in channels.split(",") if name.strip()]
+        self.batch_wait = batch_wait
+        self.poll_interval = poll_interval
+        self._channels: Optional[List[NotificationChannel]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+        # 统计指标
+        self.submitted = 0
+        self.dropped = 0
+        self.batches = 0
+        self.events_processed = 0
+        self.resolve_time_ms = 0.0
+        self.recipients_resolved = 0
+        self.items_coalesced = 0
+        self.digests_sent = 0
+        self.delivery_errors: Dict[str, int] = defaultdict(int)
+
+    def _due_key(self) -> str:
+        return "notify:due"
+
+    def _items_key(self, digest_key: str) -> str:
+        return f"notify:items:{digest_key}"
+
+    @property
+    def channels(self) -> List[NotificationChannel]:
+        if self._channels is None:
+            self._channels = [
+                NOTIFICATION_CHANNELS[name]() for name in self.channel_names if name in NOTIFICATION_CHANNELS
+            ]
+        return self._channels
+
+    def submit(self, audience: str, student_id: int, action: Dict[str, Any]) -> bool:
+        """提交一个需要通知教师或家长的事件，不等待任何处理"""
+        if not self.enabled:
+            return False
+        self._ensure_workers()
+        if self._queue is None:
+            return False
+
+        event = {
+            "audience": audience,
+            "student_id": student_id,
+            "action_type": action.get("type", "unknown"),
+            "at": datetime.now().isoformat(timespec="seconds")
+        }
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _ensure_workers(self):
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._tasks.append(loop.create_task(self._digest_loop()))
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        """等待第一个事件，再在 batch_wait 内尽量凑满一批"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._process_batch(batch)
+            except Exception as e:
+                print(f"Notification batch failed: {e}")
+
+    async def _process_batch(self, events: List[Dict[str, Any]]):
+        start_time = time.perf_counter()
+        student_ids = list({event["student_id"] for event in events})
+        teachers, parents, names = await asyncio.to_thread(self._resolve_recipients, student_ids)
+        self.resolve_time_ms += (time.perf_counter() - start_time) * 1000
+        self.batches += 1
+        self.events_processed += len(events)
+
+        entries: List[Tuple[str, Dict[str, Any]]] = []
+        for event in events:
+            student_id = event["student_id"]
+            item = {**event, "student_name": names.get(student_id) or f"学生{student_id}"}
+            if event["audience"] == "teacher":
+                for teacher_id, class_id in teachers.get(student_id, []):
+                    entries.append((f"teacher:{teacher_id}:class:{class_id}", item))
+            elif event["audience"] == "parent":
+                for parent_id in parents.get(student_id, []):
+                    entries.append((f"parent:{parent_id}:student:{student_id}", item))
+
+        self.recipients_resolved += len(entries)
+        if entries:
+            await self._add_to_digests(entries)
+
+    @staticmethod
+    def _resolve_recipients(student_ids: List[int]) -> Tuple[Dict[int, list], Dict[int, list], Dict[int, str]]:
+        """批量解析学生对应的任课教师（用户ID, 班级ID）、家长用户ID和学生姓名"""
+        from app.models.user import User, Teacher, ParentStudentRelation
+        from app.models.education import ClassStudent
+        from app.models.class_management import ClassTeacherAssignment
+
+        teachers, parents = defaultdict(list), defaultdict(list)
+        with next(get_db()) as db:
+            rows = db.query(ClassStudent.student_id, ClassStudent.class_id, Teacher.user_id)\
+                .join(ClassTeacherAssignment, ClassTeacherAssignment.class_id == ClassStudent.class_id)\
+                .join(Teacher, Teacher.id == ClassTeacherAssignment.teacher_id)\
+                .filter(
+                    ClassStudent.student_id.in_(student_ids),
+                    ClassStudent.status == 1,
+                    ClassTeacherAssignment.is_active == True
+                ).distinct().all()
+            for student_id, class_id, teacher_user_id in rows:
+                teachers[student_id].append((teacher_user_id, class_id))
+
+            rows = db.query(ParentStudentRelation.student_id, ParentStudentRelation.parent_id)\
+                .filter(
+                    ParentStudentRelation.student_id.in_(student_ids),
+                    ParentStudentRelation.status == 1
+                ).all()
+            for student_id, parent_id in rows:
+                parents[student_id].append(parent_id)
+
+            names = dict(db.query(User.id, User.real_name).filter(User.id.in_(student_ids)).all())
+
+        return teachers, parents, names
+
+    async def _add_to_digests(self, entries: List[Tuple[str, Dict[str, Any]]]):
+        """把事件追加到各接收人的待发摘要，首个事件决定摘要的发送时间"""
+        due_at = time.time() + self.digest_window
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            for digest_key, item in entries:
+                pipe.rpush(self._items_key(digest_key), json.dumps(item, ensure_ascii=False))
+                pipe.expire(self._items_key(digest_key), self.digest_window * 3)
+                # NX：已在等待中的摘要不推迟发送时间
+                pipe.zadd(self._due_key(), {digest_key: due_at}, nx=True)
+            pipe.execute()
+        except Exception as e:
+            # Redis不可用时不合并，直接发送
+            print(f"Notification digest store error: {e}")
+            grouped = defaultdict(list)
+            for digest_key, item in entries:
+                grouped[digest_key].append(item)
+            await self._deliver([self._render(key, items) for key, items in grouped.items()])
+
+    async def _digest_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.send_due_digests()
+            except Exception as e:
+                print(f"Notification digest flush failed: {e}")
+
+    async def send_due_digests(self, now: Optional[float] = None) -> int:
+        """发送已到期的摘要，返回发送数量"""
+        due_keys = redis_client.zrangebyscore(self._due_key(), "-inf", now or time.time(), start=0, num=500)
+        notifications = []
+        for digest_key in due_keys:
+            # 认领与取出在同一事务中完成：ZREM成功的进程负责发送，避免多个worker重复发送，
+            # 也不会删除其他worker在认领后追加的事件
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.zrem(self._due_key(), digest_key)
+            pipe.lrange(self._items_key(digest_key), 0, -1)
+            pipe.delete(self._items_key(digest_key))
+            claimed, raw_items, _ = pipe.execute()
+            if claimed and raw_items:
+                items = [json.loads(item) for item in raw_items]
+                self.items_coalesced += len(items) - 1
+                notifications.append(self._render(digest_key, items))
+
+        await self._deliver(notifications)
+        return len(notifications)
+
+    @staticmethod
+    def _render(digest_key: str, items: List[Dict[str, Any]], max_lines: int = 20) -> Notification:
+        audience, recipient_id = digest_key.split(":")[:2]
+
+        # 同一学生的同类事件合并为一行，保留首次出现的顺序
+        grouped: Dict[tuple, List[str]] = {}
+        for item in items:
+            grouped.setdefault((item["student_name"], item["action_type"]), []).append(item["at"])
+
+        lines = []
+        for (student_name, action_type), times in grouped.items():
+            line = f"{times[-1][5:16].replace('T', ' ')} {student_name}{ACTION_LABELS.get(action_type, action_type)}"
+            lines.append(line if len(times) == 1 else f"{line}（共{len(times)}次）")
+        if len(lines) > max_lines:
+            lines = lines[:max_lines] + [f"……另有{len(lines) - max_lines}项"]
+
+        if audience == "teacher":
+            title = f"班级学生动态（{len(items)}条）"
+        else:
+            title = f"{items[0]['student_name']}的学习动态（{len(items)}条）"
+        return Notification(int(recipient_id), audience, title, "\n".join(lines), items)
+
+    async def _deliver(self, notifications: List[Notification]):
+        if not notifications:
+            return
+        for channel in self.channels:
+            try:
+                sent = await channel.deliver(notifications)
+                if sent < len(notifications):
+                    self.delivery_errors[channel.name] += len(notifications) - sent
+            except Exception as e:
+                self.delivery_errors[channel.name] += len(notifications)
+                print(f"Notification channel {channel.name} failed: {e}")
+        self.digests_sent += len(notifications)
+
+    async def shutdown(self):
+        """处理完队列中的事件后停止后台任务，未到期的摘要留在Redis中由其他进程发送"""
+        if self._queue is not None:
+            while not self._queue.empty():
+                batch = []
+                while not self._queue.empty() and len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+                try:
+                    await self._process_batch(batch)
+                except Exception as e:
+                    print(f"Notification batch failed: {e}")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        """通知管道统计"""
+        return {
+            "enabled": self.enabled,
+            "channels": self.channel_names,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "avg_batch_events": round(self.events_processed / self.batches, 1) if self.batches else 0.0,
+            "avg_resolve_ms": round(self.resolve_time_ms / self.batches, 2) if self.batches else 0.0,
+            "recipients_resolved": self.recipients_resolved,
+            "digests_sent": self.digests_sent,
+            "items_coalesced": self.items_coalesced,
+            "delivery_errors": dict(self.delivery_errors)
+        }
+
+
+# 全局通知管道实例
+notification_pipeline = NotificationPipeline()
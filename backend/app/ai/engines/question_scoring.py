@@ -0,0 +1,57 @@
+# backend/app/ai/engines/question_scoring.py
+"""
+题目推荐评分：对一批候选题按列一次性计算分数并取top-k
+"""
+import numpy as np
+
+# 各项权重：难度匹配、题目质量、使用新鲜度、知识点覆盖
+DIFFICULTY_WEIGHT = 0.4
+QUALITY_WEIGHT = 0.3
+FRESHNESS_WEIGHT = 0.2
+COVERAGE_WEIGHT = 0.1
+
+DEFAULT_QUALITY = 0.7
+USAGE_SATURATION = 10  # 近30天使用达到该次数时新鲜度为0
+COVERAGE_SATURATION = 5  # 关联知识点达到该数量时覆盖度满分
+
+
+def quality_from_saves(save_num: np.ndarray) -> np.ndarray:
+    """题库没有质量分，以收藏数作为质量信号：基准0.7，收藏越多越接近1"""
+    saves = np.maximum(np.nan_to_num(save_num.astype(np.float64)), 0)
+    top = saves.max(initial=0.0)
+    if top <= 0:
+        return np.full(saves.shape, DEFAULT_QUALITY)
+    return DEFAULT_QUALITY + (1 - DEFAULT_QUALITY) * np.log1p(saves) / np.log1p(top)
+
+
+def score_questions(
+    difficulty: np.ndarray,
+    quality: np.ndarray,
+    knowledge_count: np.ndarray,
+    usage_count: np.ndarray,
+    target_difficulty: float
+) -> np.ndarray:
+    """按列计算推荐分数，结果在 [0, 1]"""
+    difficulty_score = np.maximum(0.0, 1 - np.abs(difficulty - target_difficulty) / 5)
+    freshness = np.maximum(0.0, 1 - usage_count / USAGE_SATURATION)
+    coverage = np.minimum(knowledge_count / COVERAGE_SATURATION, 1.0)
+    scores = (
+        difficulty_score * DIFFICULTY_WEIGHT
+        + quality * QUALITY_WEIGHT
+        + freshness * FRESHNESS_WEIGHT
+        + coverage * COVERAGE_WEIGHT
+    )
+    return np.minimum(scores, 1.0)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """分数最高的k个下标（按分数降序）"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates.sort()
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
@@ -7,18 +7,28 @@ from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 import math
 
+import numpy as np
+from sqlalchemy import func
+
 from app.core.database import get_db
-from app.models.question import Question, KnowledgePoint
-from app.models.analytics import StudentKnowledgeMastery, LearningBehaviorLog
+from app.models.question import Question, KnowledgePoint, QuestionKnowledge, DifficultyLevel
+from app.models.analytics import StudentKnowledgeMastery
 from app.models.content import LearningResource
-from app.ai.engines.llm_client import LLMClient
+from app.ai.engines.llm_client import llm_client
+from app.ai.engines.llm_scheduler import Priority
+from app.ai.knowledge.student_feature_store import student_feature_store
+from app.ai.knowledge.behavior_rollup import behavior_rollup
+from app.ai.engines.question_scoring import quality_from_saves, score_questions, top_k
+from app.ai.knowledge.question_usage_store import question_usage_store
+from app.ai.knowledge.question_index import question_index
+from app.ai.knowledge.knowledge_graph import knowledge_graph
 
 
 class IntelligentRecommendationEngine:
     """智能推荐引擎 - 实现个性化推荐"""
     
     def __init__(self):
-        self.llm_client = LLMClient()
+        self.llm_client = llm_client
     
     async def generate_student_recommendations(self, student_id: int) -> List[Dict[str, Any]]:
         """为学生生成个性化推荐"""
@@ -36,13 +46,14 @@ class IntelligentRecommendationEngine:
         
         # 知识点强化推荐
         for weak_point in weak_points[:3]:  # 前3个最薄弱的
-            questions = await self._recommend_questions_for_knowledge_point(
+            questions = await self.recommend_questions_for_knowledge_point(
                 weak_point["id"], profile["difficulty_preference"]
             )
             if questions:
                 recommendations.append({
                     "type": "knowledge_reinforcement",
                     "knowledge_point": weak_point,
+                    "difficulty_level": profile["difficulty_preference"],
                     "questions": questions,
                     "priority": weak_point["urgency_score"],
                     "estimated_time": len(questions) * 2  # 每题2分钟
@@ -88,107 +99,117 @@ class IntelligentRecommendationEngine:
         difficulty_level: int,
         count: int = 5
     ) -> List[Dict[str, Any]]:
-        """为特定知识点推荐题目"""
+        """为特定知识点推荐题目：候选题按列批量取出，一次向量化评分后取top-k"""
+        return await asyncio.to_thread(self._rank_questions, knowledge_point_id, difficulty_level, count)
+    
+    def _rank_questions(self, knowledge_point_id: str, difficulty_level: int, count: int) -> List[Dict[str, Any]]:
         with next(get_db()) as db:
-            # 获取候选题目
-            candidate_questions = db.query(Question).filter(
-                Question.knowledge_point_ids.contains(knowledge_point_id),
-                Question.difficulty_level <= difficulty_level + 1,
-                Question.difficulty_level >= difficulty_level - 1,
-                Question.status == 1
-            ).all()
-            
-            if not candidate_questions:
+            # 获取候选题目（仅评分所需的列），优先取自内存索引
+            columns = question_index.candidate_columns(knowledge_point_id, difficulty_level - 1, difficulty_level + 1)
+            if columns is None:
+                columns = self._query_candidates(db, knowledge_point_id, difficulty_level)
+            ids, levels, saves, knowledge_counts = columns
+            if not len(ids):
                 return []
             
+            usage = question_usage_store.counts(ids.tolist())
+            usage_counts = np.array([usage.get(question_id, 0) for question_id in ids.tolist()], dtype=np.float64)
+            
             # AI评分算法
-            scored_questions = []
-            for question in candidate_questions:
-                score = await self._calculate_question_score(question, difficulty_level)
-                scored_questions.append((question, score))
+            scores = score_questions(levels, quality_from_saves(saves), knowledge_counts, usage_counts, difficulty_level)
+            top = top_k(scores, count)
+            top_ids = ids[top].tolist()
             
-            # 排序并返回top推荐
-            scored_questions.sort(key=lambda x: x[1], reverse=True)
-            top_questions = scored_questions[:count]
+            # 只为入选的题目加载展示字段
+            details = {
+                row.id: row for row in db.query(
+                    Question.id, Question.title, Question.question_text, Question.question_type_id,
+                    Question.difficult_name
+                ).filter(Question.id.in_(top_ids)).all()
+            }
+            knowledge_points: Dict[int, List[str]] = {}
+            for question_id, knowledge_id in db.query(QuestionKnowledge.question_id, QuestionKnowledge.knowledge_id).filter(
+                QuestionKnowledge.question_id.in_(top_ids)
+            ).all():
+                knowledge_points.setdefault(question_id, []).append(knowledge_id)
             
             return [
                 {
-                    "id": q[0].id,
-                    "content": q[0].content,
-                    "type": q[0].type,
-                    "difficulty": q[0].difficulty_level,
-                    "score": q[1],
-                    "estimated_time": q[0].estimated_time or 120,
-                    "knowledge_points": q[0].knowledge_point_ids
+                    "id": question_id,
+                    "content": details[question_id].title or details[question_id].question_text,
+                    "type": details[question_id].question_type_id,
+                    "difficulty": int(level),
+                    "difficulty_name": details[question_id].difficult_name,
+                    "score": float(score),
+                    "estimated_time": 120,
+                    "knowledge_points": knowledge_points.get(question_id, [])
                 }
-                for q in top_questions
+                for question_id, level, score in zip(top_ids, levels[top], scores[top])
+                if question_id in details
             ]
     
-    async def _calculate_question_score(self, question: Question, target_difficulty: int) -> float:
-        """计算题目推荐分数"""
-        score = 0.0
-        
-        # 难度匹配度 (40%)
-        difficulty_diff = abs(question.difficulty_level - target_difficulty)
-        difficulty_score = max(0, 1 - difficulty_diff / 5) * 0.4
-        score += difficulty_score
-        
-        # 题目质量 (30%)
-        quality_score = (question.quality_score or 0.7) * 0.3
-        score += quality_score
-        
-        # 最近使用频率 (20%) - 降低最近常用的题目权重
-        usage_score = await self._calculate_usage_freshness(question.id) * 0.2
-        score += usage_score
-        
-        # 知识点覆盖度 (10%)
-        coverage_score = len(question.knowledge_point_ids or []) / 5 * 0.1
-        score += min(coverage_score, 0.1)
-        
-        return min(score, 1.0)
-    
-    async def _calculate_usage_freshness(self, question_id: int) -> float:
-        """计算题目使用新鲜度"""
-        with next(get_db()) as db:
-            # 查询最近30天内的使用次数
-            recent_usage = db.query(LearningBehaviorLog).filter(
-                LearningBehaviorLog.action_type == "answer_question",
-                LearningBehaviorLog.action_data.contains(str(question_id)),
-                LearningBehaviorLog.timestamp >= datetime.now() - timedelta(days=30)
-            ).count()
-            
-            # 使用次数越多，新鲜度越低
-            return max(0, 1 - recent_usage / 10)
+    @staticmethod
+    def _query_candidates(db, knowledge_point_id: str, difficulty_level: int) -> Tuple[np.ndarray, ...]:
+        """候选题的列数据：id、难度等级、收藏数、关联知识点数"""
+        knowledge_count = db.query(func.count(QuestionKnowledge.id)).filter(
+            QuestionKnowledge.question_id == Question.id
+        ).correlate(Question).scalar_subquery()
+        
+        rows = db.query(
+            Question.id, DifficultyLevel.level, Question.save_num, knowledge_count
+        ).join(
+            QuestionKnowledge, QuestionKnowledge.question_id == Question.id
+        ).join(
+            DifficultyLevel, DifficultyLevel.id == Question.difficulty_id
+        ).filter(
+            QuestionKnowledge.knowledge_id == knowledge_point_id,
+            DifficultyLevel.level <= difficulty_level + 1,
+            DifficultyLevel.level >= difficulty_level - 1,
+            Question.status == 1
+        ).distinct().all()
+        
+        if not rows:
+            return (np.empty(0, dtype=np.int64),) * 4
+        ids, levels, saves, counts = zip(*rows)
+        return (
+            np.array(ids, dtype=np.int64),
+            np.array(levels, dtype=np.float64),
+            np.array([save or 0 for save in saves], dtype=np.float64),
+            np.array(counts, dtype=np.float64)
+        )
     
     async def _get_student_profile(self, student_id: int) -> Dict[str, Any]:
         """获取学生画像"""
         with next(get_db()) as db:
             from app.models.analytics import StudentProfile
             profile = db.query(StudentProfile).filter(StudentProfile.student_id == student_id).first()
-            
-            if profile:
-                return {
-                    "learning_style": profile.learning_style,
-                    "difficulty_preference": self._infer_difficulty_preference(profile),
-                    "attention_span": profile.attention_duration,
-                    "preferred_content": profile.preferred_content_type,
-                    "abilities": {
-                        "visual": profile.ability_visual,
-                        "verbal": profile.ability_verbal,
-                        "logical": profile.ability_logical,
-                        "mathematical": profile.ability_mathematical
-                    }
-                }
-            
-            # 默认画像
+            return self._profile_dict(profile)
+    
+    def _profile_dict(self, profile) -> Dict[str, Any]:
+        """学生画像记录转为推荐使用的画像，没有记录时为默认画像"""
+        if profile:
             return {
-                "learning_style": "mixed",
-                "difficulty_preference": 3,
-                "attention_span": 30,
-                "preferred_content": "mixed",
-                "abilities": {"visual": 0.5, "verbal": 0.5, "logical": 0.5, "mathematical": 0.5}
+                "learning_style": profile.learning_style,
+                "difficulty_preference": self._infer_difficulty_preference(profile),
+                "attention_span": profile.attention_duration,
+                "preferred_content": profile.preferred_content_type,
+                "abilities": {
+                    "visual": profile.ability_visual,
+                    "verbal": profile.ability_verbal,
+                    "logical": profile.ability_logical,
+                    "mathematical": profile.ability_mathematical
+                }
             }
-    
+        
+        # 默认画像
+        return {
+            "learning_style": "mixed",
+            "difficulty_preference": 3,
+            "attention_span": 30,
+            "preferred_content": "mixed",
+            "abilities": {"visual": 0.5, "verbal": 0.5, "logical": 0.5, "mathematical": 0.5}
+        }
+
     def _infer_difficulty_preference(self, profile) -> int:
         """推断难度偏好"""
         # 基于能力水平推断适合的难度
@@ -206,36 +227,31 @@ class IntelligentRecommendationEngine:
     
     async def _analyze_learning_behavior(self, student_id: int) -> Dict[str, Any]:
         """分析学习行为"""
+        # 最近30天：已完成的时段读日/小时汇总，当前时段读原始日志
+        since = datetime.combine(datetime.now().date() - timedelta(days=29), datetime.min.time())
         with next(get_db()) as db:
-            # 获取最近30天的学习行为
-            recent_behaviors = db.query(LearningBehaviorLog).filter(
-                LearningBehaviorLog.student_id == student_id,
-                LearningBehaviorLog.timestamp >= datetime.now() - timedelta(days=30)
-            ).order_by(LearningBehaviorLog.timestamp.desc()).all()
-            
-            if not recent_behaviors:
-                return {"activity_level": "low", "patterns": []}
-            
-            # 分析活动水平
-            daily_activities = {}
-            for behavior in recent_behaviors:
-                day = behavior.timestamp.date()
-                daily_activities[day] = daily_activities.get(day, 0) + 1
-            
-            avg_daily_activities = sum(daily_activities.values()) / len(daily_activities)
-            
-            activity_level = "high" if avg_daily_activities > 10 else "medium" if avg_daily_activities > 5 else "low"
-            
-            # 分析学习模式
-            patterns = await self._identify_learning_patterns(recent_behaviors)
-            
-            return {
-                "activity_level": activity_level,
-                "avg_daily_activities": avg_daily_activities,
-                "patterns": patterns,
-                "total_sessions": len(recent_behaviors),
-                "consistency_score": self._calculate_consistency_score(daily_activities)
-            }
+            behavior = behavior_rollup.behavior_profile(db, student_id, since)
+        
+        if not behavior["total"]:
+            return {"activity_level": "low", "patterns": []}
+        
+        # 分析活动水平
+        daily_activities = {day: count for day, count in behavior["daily"].items() if count}
+        
+        avg_daily_activities = behavior["total"] / len(daily_activities)
+        
+        activity_level = "high" if avg_daily_activities > 10 else "medium" if avg_daily_activities > 5 else "low"
+        
+        # 分析学习模式
+        patterns = await self._identify_learning_patterns(behavior["hours"], behavior["actions"])
+        
+        return {
+            "activity_level": activity_level,
+            "avg_daily_activities": avg_daily_activities,
+            "patterns": patterns,
+            "total_sessions": behavior["total"],
+            "consistency_score": self._calculate_consistency_score(daily_activities)
+        }
     
     def _calculate_consistency_score(self, daily_activities: Dict) -> float:
         """计算学习一致性分数"""
@@ -256,103 +272,94 @@ class IntelligentRecommendationEngine:
         # 变异系数越小，一致性越高
         return max(0, 1 - cv)
     
-    async def _identify_learning_patterns(self, behaviors: List) -> List[str]:
-        """识别学习模式"""
+    async def _identify_learning_patterns(self, hour_counts: Dict[int, int], type_counts: Dict[str, int]) -> List[str]:
+        """识别学习模式（按小时、按行为类型的次数）"""
         patterns = []
+        total = sum(type_counts.values())
         
-        if len(behaviors) < 10:
+        if total < 10:
             return patterns
         
         # 分析时间模式
-        hours = [b.timestamp.hour for b in behaviors]
-        hour_counts = {}
-        for hour in hours:
-            hour_counts[hour] = hour_counts.get(hour, 0) + 1
-        
         most_active_hour = max(hour_counts, key=hour_counts.get)
-        if hour_counts[most_active_hour] > len(behaviors) * 0.3:
+        if hour_counts[most_active_hour] > total * 0.3:
             patterns.append(f"prefer_time_{most_active_hour}")
         
         # 分析活动类型模式
-        action_types = [b.action_type for b in behaviors]
-        type_counts = {}
-        for action_type in action_types:
-            type_counts[action_type] = type_counts.get(action_type, 0) + 1
-        
         most_common_action = max(type_counts, key=type_counts.get)
-        if type_counts[most_common_action] > len(behaviors) * 0.4:
+        if type_counts[most_common_action] > total * 0.4:
             patterns.append(f"prefer_activity_{most_common_action}")
         
         return patterns
     
     async def _identify_weak_points(self, student_id: int) -> List[Dict[str, Any]]:
-        """识别薄弱知识点"""
-        with next(get_db()) as db:
-            weak_masteries = db.query(StudentKnowledgeMastery).filter(
-                StudentKnowledgeMastery.student_id == student_id,
-                StudentKnowledgeMastery.mastery_level < 0.7
-            ).order_by(StudentKnowledgeMastery.mastery_level).limit(10).all()
-            
-            weak_points = []
-            for mastery in weak_masteries:
+        """识别薄弱知识点（掌握度低于0.7的前10个，来自预计算的学生特征）"""
+        weak_points = []
+        features = await asyncio.to_thread(student_feature_store.get, student_id)
+        for point in features["mastery"]["weak_points"]:
+            last_practice = datetime.fromisoformat(point["last_practice"]) if point["last_practice"] else None
+            weak_points.append({
+                "id": point["id"],
+                "name": point["name"],
+                "mastery_level": point["mastery_level"],
                 # 计算紧急度分数
-                urgency = await self._calculate_urgency_score(mastery)
-                
-                weak_points.append({
-                    "id": mastery.knowledge_point_id,
-                    "name": mastery.knowledge_point.name if mastery.knowledge_point else mastery.knowledge_point_id,
-                    "mastery_level": mastery.mastery_level,
-                    "urgency_score": urgency,
-                    "last_practice": mastery.last_practice_time
-                })
-            
-            return weak_points
+                "urgency_score": await self._calculate_urgency_score(
+                    point["id"], point["mastery_level"], last_practice
+                ),
+                "last_practice": last_practice
+            })
+        
+        return weak_points
     
-    async def _calculate_urgency_score(self, mastery) -> float:
+    async def _calculate_urgency_score(
+        self,
+        knowledge_point_id: str,
+        mastery_level: float,
+        last_practice_time: Optional[datetime]
+    ) -> float:
         """计算知识点学习紧急度"""
         urgency = 0.0
         
         # 基于掌握水平 (40%)
-        mastery_urgency = (1 - mastery.mastery_level) * 0.4
+        mastery_urgency = (1 - mastery_level) * 0.4
         urgency += mastery_urgency
         
         # 基于时间间隔 (30%)
-        if mastery.last_practice_time:
-            days_since_practice = (datetime.now() - mastery.last_practice_time).days
+        if last_practice_time:
+            days_since_practice = (datetime.now() - last_practice_time).days
             time_urgency = min(days_since_practice / 30, 1.0) * 0.3
             urgency += time_urgency
         else:
             urgency += 0.3  # 从未练习过，高紧急度
         
         # 基于依赖关系 (30%) - 如果是基础知识点，紧急度更高
-        dependency_urgency = await self._calculate_dependency_urgency(mastery.knowledge_point_id)
+        dependency_urgency = await self._calculate_dependency_urgency(knowledge_point_id)
         urgency += dependency_urgency * 0.3
         
         return min(urgency, 1.0)
     
     async def _calculate_dependency_urgency(self, knowledge_point_id: str) -> float:
-        """计算知识点依赖紧急度"""
-        # 这里可以实现更复杂的知识图谱依赖分析
-        # 简化版本：假设某些知识点是基础知识点
-        basic_concepts = ["basic_arithmetic", "algebra_fundamentals", "geometry_basics"]
-        
-        if knowledge_point_id in basic_concepts:
-            return 1.0  # 基础概念优先级最高
+        """计算知识点依赖紧急度：作为其他知识点前置的基础知识点紧急度更高"""
+        weight = knowledge_graph.dependency_weight(knowledge_point_id)
         
-        return 0.5  # 默认中等优先级
+        return weight if weight is not None else 0.5  # 不在图谱中时为默认中等优先级
     
     async def _generate_learning_path(self, student_id: int, weak_points: List[Dict]) -> Optional[Dict[str, Any]]:
         """生成学习路径"""
         if not weak_points:
             return None
         
-        # 按紧急度和依赖关系排序
-        sorted_points = sorted(weak_points, key=lambda x: x["urgency_score"], reverse=True)
+        # 取最紧急的知识点（最多5个步骤），再按依赖关系排序：前置知识点在前，其余按教材顺序
+        selected = {
+            point["id"]: point
+            for point in sorted(weak_points, key=lambda x: x["urgency_score"], reverse=True)[:5]
+        }
+        sorted_points = [selected[point_id] for point_id in knowledge_graph.topological_sort(list(selected))]
         
         path_steps = []
         total_time = 0
         
-        for i, point in enumerate(sorted_points[:5]):  # 最多5个步骤
+        for i, point in enumerate(sorted_points):
             step_time = await self._estimate_learning_time(point)
             
             path_steps.append({
@@ -362,6 +369,10 @@ class IntelligentRecommendationEngine:
                 "current_mastery": point["mastery_level"],
                 "target_mastery": 0.8,
                 "estimated_time": step_time,
+                "prerequisites": [
+                    earlier["id"] for earlier in sorted_points[:i]
+                    if knowledge_graph.is_prerequisite(earlier["id"], point["id"])
+                ],
                 "recommended_actions": await self._get_recommended_actions(point)
             })
             
@@ -453,7 +464,8 @@ class IntelligentRecommendationEngine:
                     "url": resource.url,
                     "duration": resource.duration,
                     "difficulty": resource.difficulty_level,
-                    "rating": resource.rating
+                    "rating": resource.rating,
+                    "knowledge_point_id": knowledge_point_id
                 }
                 for resource in resources
             ]
@@ -468,25 +480,29 @@ class IntelligentRecommendationEngine:
                 StudentKnowledgeMastery.last_practice_time < datetime.now() - timedelta(days=7)
             ).order_by(StudentKnowledgeMastery.last_practice_time).limit(5).all()
             
-            review_items = []
-            for candidate in review_candidates:
-                # 计算遗忘风险
-                forgetting_risk = await self._calculate_forgetting_risk(candidate)
-                
-                if forgetting_risk > 0.3:  # 遗忘风险超过30%才推荐复习
-                    review_items.append({
-                        "knowledge_point_id": candidate.knowledge_point_id,
-                        "knowledge_point_name": candidate.knowledge_point.name if candidate.knowledge_point else candidate.knowledge_point_id,
-                        "current_mastery": candidate.mastery_level,
-                        "forgetting_risk": forgetting_risk,
-                        "days_since_practice": (datetime.now() - candidate.last_practice_time).days,
-                        "review_priority": forgetting_risk * (1 - candidate.mastery_level)
-                    })
-            
-            # 按复习优先级排序
-            review_items.sort(key=lambda x: x["review_priority"], reverse=True)
+            return await self._review_items(review_candidates)
+    
+    async def _review_items(self, review_candidates: List[StudentKnowledgeMastery]) -> List[Dict[str, Any]]:
+        """由复习候选计算复习项目"""
+        review_items = []
+        for candidate in review_candidates:
+            # 计算遗忘风险
+            forgetting_risk = await self._calculate_forgetting_risk(candidate)
             
-            return review_items
+            if forgetting_risk > 0.3:  # 遗忘风险超过30%才推荐复习
+                review_items.append({
+                    "knowledge_point_id": candidate.knowledge_point_id,
+                    "knowledge_point_name": candidate.knowledge_point.title if candidate.knowledge_point else candidate.knowledge_point_id,
+                    "current_mastery": candidate.mastery_level,
+                    "forgetting_risk": forgetting_risk,
+                    "days_since_practice": (datetime.now() - candidate.last_practice_time).days,
+                    "review_priority": forgetting_risk * (1 - candidate.mastery_level)
+                })
+        
+        # 按复习优先级排序
+        review_items.sort(key=lambda x: x["review_priority"], reverse=True)
+        
+        return review_items
     
     async def _calculate_forgetting_risk(self, mastery_record) -> float:
         """计算遗忘风险"""
@@ -541,7 +557,7 @@ class IntelligentRecommendationEngine:
             ai_response = await self.llm_client.analyze_json_response(prompt, {
                 "role": "student",
                 "context": "recommendation_generation"
-            })
+            }, cache_nondeterministic=True, priority=Priority.BACKGROUND, task="recommendation_generation")
             
             if ai_response.get("success", True) and isinstance(ai_response, dict):
                 return ai_response.get("recommendations", [])
@@ -0,0 +1,396 @@
+# backend/app/ai/engines/recommendation_precompute.py
+"""
+推荐预计算：按班级、年级或全校批量生成学生推荐并保存，接口优先读取未过期的结果
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional
+
+from sqlalchemy.orm import joinedload
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.analytics import LearningRecommendation, StudentProfile, StudentKnowledgeMastery
+from app.models.class_management import LearningResourceRecommendation
+from app.models.education import Class, ClassStudent
+from app.models.question import KnowledgePoint
+from app.ai.engines.recommendation_engine import IntelligentRecommendationEngine
+
+REVIEW_LIMIT = 5  # 与 _recommend_review_items 的候选数一致
+MAX_PRIORITY = 5
+EMPTY_RESOURCE_TYPE = "none"  # 没有推荐的学生写入一行占位，避免每次请求都重新生成
+
+
+def _difficulty_name(level: Optional[int]) -> Optional[str]:
+    if level is None:
+        return None
+    return "easy" if level <= 2 else "medium" if level == 3 else "hard"
+
+
+def _jsonable(recommendation: Dict[str, Any]) -> Dict[str, Any]:
+    """推荐中含有 datetime 等对象，转为可写入JSON列的结构"""
+    return json.loads(json.dumps(recommendation, default=str, ensure_ascii=False))
+
+
+def _display_rows(
+    student_id: int,
+    recommendation: Dict[str, Any],
+    difficulty_level: Optional[int],
+    subjects: Dict[str, int],
+    expires_at: datetime
+) -> List[Dict[str, Any]]:
+    """一条推荐展开为学习资源推荐表的展示行（学习资源推荐每个资源一行）"""
+    kind = recommendation.get("type")
+    score = min(float(recommendation.get("priority", 0)) / MAX_PRIORITY, 1.0)
+    base = {"student_id": student_id, "recommendation_score": score, "expires_at": expires_at}
+
+    if kind == "knowledge_reinforcement":
+        point = recommendation["knowledge_point"]
+        return [{
+            **base,
+            "resource_type": "exercise",
+            "resource_title": f"巩固练习：{point['name']}",
+            "subject_id": subjects.get(point["id"]),
+            "knowledge_point_ids": [point["id"]],
+            "difficulty_level": _difficulty_name(difficulty_level),
+            "estimated_time": recommendation.get("estimated_time"),
+            "recommendation_reason": f"当前掌握度 {point['mastery_level']:.0%}，建议针对性练习"
+        }]
+    if kind == "learning_path":
+        path = recommendation["path"]
+        return [{
+            **base,
+            "resource_type": "learning_path",
+            "resource_title": f"学习路径：{path['total_steps']} 个步骤",
+            "knowledge_point_ids": [step["knowledge_point_id"] for step in path["path_steps"]],
+            "estimated_time": path["total_time"],
+            "recommendation_reason": path.get("completion_target")
+        }]
+    if kind == "learning_resources":
+        return [
+            {
+                **base,
+                "resource_type": resource.get("type") or "resource",
+                "resource_id": resource.get("id"),
+                "resource_title": resource.get("title") or "学习资源",
+                "resource_url": resource.get("url"),
+                "subject_id": subjects.get(resource.get("knowledge_point_id")),
+                "knowledge_point_ids": [resource["knowledge_point_id"]] if resource.get("knowledge_point_id") else None,
+                "difficulty_level": str(resource["difficulty"]) if resource.get("difficulty") is not None else None,
+                "estimated_time": resource.get("duration"),
+                "recommendation_reason": "适合你的学习风格的薄弱知识点资源"
+            }
+            for resource in recommendation["resources"]
+        ]
+    if kind == "review_session":
+        items = recommendation["items"]
+        return [{
+            **base,
+            "resource_type": "review",
+            "resource_title": f"复习：{len(items)} 个知识点",
+            "knowledge_point_ids": [item["knowledge_point_id"] for item in items],
+            "estimated_time": recommendation.get("estimated_time"),
+            "recommendation_reason": "这些知识点较久没有练习，遗忘风险较高"
+        }]
+    return []
+
+
+def save_recommendations(db, results: Dict[int, List[Dict[str, Any]]], ttl_hours: int) -> int:
+    """替换学生的预计算推荐，返回写入的推荐数
+
+    只替换预计算写入的行（带 expires_at），教师等其他来源的推荐不受影响。
+    旧推荐的进度和点击状态按内容对应到新推荐上；已完成的展示行保留（含评分与反馈），不再重复推荐。
+    """
+    if not results:
+        return 0
+    student_ids = list(results)
+    expires_at = datetime.now() + timedelta(hours=ttl_hours)
+
+    knowledge_ids = set()
+    for recommendations in results.values():
+        for recommendation in recommendations:
+            if recommendation.get("type") == "knowledge_reinforcement":
+                knowledge_ids.add(recommendation["knowledge_point"]["id"])
+            for resource in recommendation.get("resources", []):
+                if resource.get("knowledge_point_id"):
+                    knowledge_ids.add(resource["knowledge_point_id"])
+    subjects = dict(
+        db.query(KnowledgePoint.id, KnowledgePoint.chid).filter(KnowledgePoint.id.in_(knowledge_ids)).all()
+    ) if knowledge_ids else {}
+
+    statuses = {
+        (student_id, resource_type, knowledge_point): status
+        for student_id, resource_type, knowledge_point, status in db.query(
+            LearningRecommendation.student_id,
+            LearningRecommendation.resource_type,
+            LearningRecommendation.knowledge_point,
+            LearningRecommendation.status
+        ).filter(
+            LearningRecommendation.student_id.in_(student_ids),
+            LearningRecommendation.expires_at.isnot(None),
+            LearningRecommendation.status != 1
+        ).all()
+    }
+    clicked, completed = set(), set()
+    for student_id, resource_type, resource_id, resource_title, was_clicked, was_completed in db.query(
+        LearningResourceRecommendation.student_id,
+        LearningResourceRecommendation.resource_type,
+        LearningResourceRecommendation.resource_id,
+        LearningResourceRecommendation.resource_title,
+        LearningResourceRecommendation.clicked,
+        LearningResourceRecommendation.completed
+    ).filter(
+        LearningResourceRecommendation.student_id.in_(student_ids),
+        LearningResourceRecommendation.expires_at.isnot(None),
+        (LearningResourceRecommendation.clicked.is_(True)) | (LearningResourceRecommendation.completed.is_(True))
+    ).all():
+        key = (student_id, resource_type, resource_id, resource_title)
+        (completed if was_completed else clicked).add(key)
+
+    db.query(LearningRecommendation).filter(
+        LearningRecommendation.student_id.in_(student_ids),
+        LearningRecommendation.expires_at.isnot(None)
+    ).delete(synchronize_session=False)
+    db.query(LearningResourceRecommendation).filter(
+        LearningResourceRecommendation.student_id.in_(student_ids),
+        LearningResourceRecommendation.expires_at.isnot(None),
+        LearningResourceRecommendation.completed.is_(False)
+    ).delete(synchronize_session=False)
+
+    recommendation_rows, display_rows = [], []
+    for student_id, recommendations in results.items():
+        if not recommendations:
+            recommendation_rows.append({
+                "student_id": student_id,
+                "resource_type": EMPTY_RESOURCE_TYPE,
+                "priority": 0,
+                "status": 1,
+                "payload": {},
+                "expires_at": expires_at
+            })
+            continue
+        for recommendation in recommendations:
+            point = recommendation.get("knowledge_point") or {}
+            difficulty_level = recommendation.get("difficulty_level")
+            rows = _display_rows(student_id, recommendation, difficulty_level, subjects, expires_at)
+            for row in rows:
+                key = (student_id, row["resource_type"], row.get("resource_id"), row["resource_title"])
+                if key not in completed:
+                    display_rows.append({**row, "clicked": key in clicked})
+            recommendation_rows.append({
+                "student_id": student_id,
+                "subject_id": subjects.get(point.get("id")),
+                "knowledge_point": point.get("id"),
+                "difficulty_level": difficulty_level,
+                "resource_type": recommendation.get("type"),
+                "reason": rows[0]["recommendation_reason"] if rows else None,
+                "priority": int(round(float(recommendation.get("priority", 0)))),
+                "status": statuses.get((student_id, recommendation.get("type"), point.get("id")), 1),
+                "payload": _jsonable(recommendation),
+                "expires_at": expires_at
+            })
+
+    db.bulk_insert_mappings(LearningRecommendation, recommendation_rows)
+    db.bulk_insert_mappings(LearningResourceRecommendation, display_rows)
+    db.commit()
+    return len([row for row in recommendation_rows if row["resource_type"] != EMPTY_RESOURCE_TYPE])
+
+
+def load_recommendations(db, student_id: int) -> Optional[List[Dict[str, Any]]]:
+    """学生未过期的预计算推荐（按生成时的顺序），没有预计算过时为None"""
+    rows = db.query(LearningRecommendation.resource_type, LearningRecommendation.payload).filter(
+        LearningRecommendation.student_id == student_id,
+        LearningRecommendation.expires_at > datetime.now(),
+        LearningRecommendation.payload.isnot(None)
+    ).order_by(LearningRecommendation.id).all()
+    if not rows:
+        return None
+    return [row.payload for row in rows if row.resource_type != EMPTY_RESOURCE_TYPE]
+
+
+class _ShardRecommendationEngine(IntelligentRecommendationEngine):
+    """批量生成用的推荐引擎：一个分片的学生画像和复习候选各用一次查询取出"""
+
+    def preload(self, student_ids: List[int]):
+        with next(get_db()) as db:
+            self._profiles = {
+                profile.student_id: profile for profile in db.query(StudentProfile).filter(
+                    StudentProfile.student_id.in_(student_ids)
+                ).all()
+            }
+            self._review_candidates: Dict[int, List[StudentKnowledgeMastery]] = {}
+            for candidate in db.query(StudentKnowledgeMastery).options(
+                joinedload(StudentKnowledgeMastery.knowledge_point)
+            ).filter(
+                StudentKnowledgeMastery.student_id.in_(student_ids),
+                StudentKnowledgeMastery.mastery_level.between(0.6, 0.85),
+                StudentKnowledgeMastery.last_practice_time < datetime.now() - timedelta(days=7)
+            ).order_by(StudentKnowledgeMastery.student_id, StudentKnowledgeMastery.last_practice_time).all():
+                candidates = self._review_candidates.setdefault(candidate.student_id, [])
+                if len(candidates) < REVIEW_LIMIT:
+                    candidates.append(candidate)
+
+    async def _get_student_profile(self, student_id: int) -> Dict[str, Any]:
+        return self._profile_dict(self._profiles.get(student_id))
+
+    async def _recommend_review_items(self, student_id: int, profile: Dict) -> List[Dict[str, Any]]:
+        return await self._review_items(self._review_candidates.get(student_id, []))
+
+
+def _init_worker():
+    """进程池工作进程启动时构建题目索引，候选题生成不查询数据库"""
+    from app.ai.knowledge.question_index import question_index
+    if question_index.enabled:
+        try:
+            question_index.build()
+        except Exception as e:
+            print(f"Question index build failed in worker: {e}")
+
+
+def _run_shard(student_ids: List[int], ttl_hours: int) -> Dict[str, int]:
+    """在工作进程中为一个分片的学生生成并保存推荐"""
+    engine = _ShardRecommendationEngine()
+    engine.preload(student_ids)
+
+    async def generate() -> Dict[int, List[Dict[str, Any]]]:
+        results = {}
+        for student_id in student_ids:
+            try:
+                results[student_id] = await engine.generate_student_recommendations(student_id)
+            except Exception as e:
+                print(f"Recommendation precompute failed for student {student_id}: {e}")
+        return results
+
+    results = asyncio.run(generate())
+    with next(get_db()) as db:
+        saved = save_recommendations(db, results, ttl_hours)
+    return {"students": len(results), "failed": len(student_ids) - len(results), "recommendations": saved}
+
+
+class RecommendationPrecomputer:
+    """推荐预计算
+
+    批量任务把学生按 shard_size 分片交给进程池（spawn方式，每个进程独立连接数据库），
+    每个分片批量取出画像和复习候选后逐个学生生成推荐，再整片写入：
+    learning_recommendations 保存完整推荐供 /ai/recommendations 使用，
+    learning_resource_recommendations 保存展示行供 /my-recommendations 使用，均带 expires_at。
+    接口读到未过期的结果即直接返回，没有时才按需生成并写回。
+    """
+
+    def __init__(
+        self,
+        ttl_hours: int = settings.AI_RECOMMENDATION_TTL_HOURS,
+        workers: int = settings.AI_RECOMMENDATION_BATCH_WORKERS,
+        shard_size: int = settings.AI_RECOMMENDATION_SHARD_SIZE
+    ):
+        self.ttl_hours = ttl_hours
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+
+        # 统计指标
+        self.served = 0
+        self.generated_on_demand = 0
+        self.batch_students = 0
+        self.batch_failed = 0
+        self.last_batch_seconds = 0.0
+
+    def resolve_students(
+        self,
+        class_ids: Optional[List[int]] = None,
+        grade_name: Optional[str] = None,
+        whole_school: bool = False
+    ) -> List[int]:
+        """班级、年级或全校（所有启用的班级）的在读学生"""
+        with next(get_db()) as db:
+            query = db.query(ClassStudent.student_id).join(
+                Class, Class.id == ClassStudent.class_id
+            ).filter(ClassStudent.status == 1, Class.status == 1)
+            if class_ids:
+                query = query.filter(Class.id.in_(class_ids))
+            elif grade_name:
+                query = query.filter(Class.grade_name == grade_name)
+            elif not whole_school:
+                return []
+            return sorted({row.student_id for row in query.distinct().all()})
+
+    def run(
+        self,
+        student_ids: List[int],
+        workers: Optional[int] = None,
+        on_shard: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> Dict[str, int]:
+        """为学生批量预计算推荐，每完成一个分片以该分片的结果调用 on_shard"""
+        start = time.perf_counter()
+        workers = workers or self.workers
+        shards = [student_ids[i:i + self.shard_size] for i in range(0, len(student_ids), self.shard_size)]
+        totals = {"students": 0, "failed": 0, "recommendations": 0, "shards": len(shards)}
+
+        if workers <= 1 or len(shards) <= 1:
+            _init_worker()
+            results = (_run_shard(shard, self.ttl_hours) for shard in shards)
+            self._accumulate(totals, results, on_shard)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(shards)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            ) as pool:
+                self._accumulate(totals, pool.map(_run_shard, shards, [self.ttl_hours] * len(shards)), on_shard)
+
+        self.batch_students += totals["students"]
+        self.batch_failed += totals["failed"]
+        self.last_batch_seconds = round(time.perf_counter() - start, 1)
+        return totals
+
+    @staticmethod
+    def _accumulate(totals: Dict[str, int], results, on_shard: Optional[Callable[[Dict[str, int]], None]]):
+        for result in results:
+            for key, value in result.items():
+                totals[key] += value
+            if on_shard is not None:
+                on_shard(result)
+
+    def _load(self, student_id: int) -> Optional[List[Dict[str, Any]]]:
+        with next(get_db()) as db:
+            return load_recommendations(db, student_id)
+
+    def _save(self, student_id: int, recommendations: List[Dict[str, Any]]):
+        with next(get_db()) as db:
+            save_recommendations(db, {student_id: recommendations}, self.ttl_hours)
+
+    async def get_or_generate(self, student_id: int) -> List[Dict[str, Any]]:
+        """读取未过期的预计算推荐，没有时按需生成并写回"""
+        recommendations = await asyncio.to_thread(self._load, student_id)
+        if recommendations is not None:
+            self.served += 1
+            return recommendations
+
+        self.generated_on_demand += 1
+        recommendations = await IntelligentRecommendationEngine().generate_student_recommendations(student_id)
+        try:
+            await asyncio.to_thread(self._save, student_id, recommendations)
+        except Exception as e:
+            print(f"Recommendation save failed: {e}")
+        return recommendations
+
+    def stats(self) -> Dict[str, Any]:
+        """推荐预计算统计（批量任务在独立进程中运行时只反映本进程）"""
+        requests = self.served + self.generated_on_demand
+        return {
+            "ttl_hours": self.ttl_hours,
+            "served": self.served,
+            "generated_on_demand": self.generated_on_demand,
+            "precomputed_hit_rate": round(self.served / requests, 3) if requests else 0.0,
+            "batch_students": self.batch_students,
+            "batch_failed": self.batch_failed,
+            "last_batch_seconds": self.last_batch_seconds
+        }
+
+
+# 全局推荐预计算实例
+recommendation_precomputer = RecommendationPrecomputer()
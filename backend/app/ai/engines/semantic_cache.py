@@ -0,0 +1,307 @@
+# backend/app/ai/engines/semantic_cache.py
+"""
+基于字符n-gram TF-IDF相似度的本地语义缓存
+"""
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from app.core.config import settings
+
+
+class _Segment:
+    """不可变的向量段（CSC存储，按列切片即倒排查找）"""
+
+    __slots__ = ("matrix", "answers")
+
+    def __init__(self, matrix: sparse.csc_matrix, answers: List[Dict[str, Any]]):
+        self.matrix = matrix
+        self.answers = answers
+
+    @property
+    def size(self) -> int:
+        return self.matrix.shape[0]
+
+
+class _SemanticBucket:
+    """单个(用户, 角色, 学科)分区的增量索引
+
+    新条目先进入待写缓冲区，查询前封装为段；相邻同量级的段按二进制计数方式合并，
+    超出容量时整段淘汰最旧的数据，从而保证插入摊销开销和内存上限。
+    """
+
+    def __init__(self, n_features: int, capacity: int, max_segment_rows: int):
+        self.n_features = n_features
+        self.capacity = capacity
+        self.max_segment_rows = max_segment_rows
+        self.segments: List[_Segment] = []
+        self.pending_rows: List[sparse.csr_matrix] = []
+        self.pending_answers: List[Dict[str, Any]] = []
+
+    @property
+    def size(self) -> int:
+        return sum(seg.size for seg in self.segments) + len(self.pending_answers)
+
+    def add(self, rows: sparse.csr_matrix, answers: List[Dict[str, Any]]):
+        """追加向量（已加权并归一化）"""
+        self.pending_rows.append(rows)
+        self.pending_answers.extend(answers)
+
+        if len(self.pending_answers) >= min(self.max_segment_rows, self.capacity):
+            self._seal()
+
+    def _seal(self):
+        """将待写缓冲区封装为新段并合并"""
+        if not self.pending_answers:
+            return
+
+        matrix = sparse.vstack(self.pending_rows, format="csc")
+        matrix.sort_indices()
+        self.segments.append(_Segment(matrix, self.pending_answers))
+        self.pending_rows = []
+        self.pending_answers = []
+
+        # 二进制计数式合并：前一段不大于后一段时合并
+        while len(self.segments) >= 2:
+            previous, last = self.segments[-2], self.segments[-1]
+            if previous.size > last.size or previous.size + last.size > self.max_segment_rows:
+                break
+            merged = sparse.vstack([previous.matrix, last.matrix], format="csc")
+            merged.sort_indices()
+            self.segments[-2:] = [_Segment(merged, previous.answers + last.answers)]
+
+        self._evict()
+
+    def _evict(self):
+        """超出容量时淘汰最旧的段"""
+        while self.segments and self.size > self.capacity:
+            self.segments.pop(0)
+
+    def search(
+        self,
+        probe_indices: np.ndarray,
+        probe_values: np.ndarray,
+        rest_indices: np.ndarray,
+        rest_values: np.ndarray,
+        top_candidates: int = 32
+    ) -> Tuple[Optional[Dict[str, Any]], float]:
+        """返回余弦相似度最高的条目及其分数
+
+        先用低频（高IDF）的探测项在倒排表上召回候选，再对候选补齐其余查询项得到精确分数，
+        避免高频n-gram的超长倒排链拖慢查询。
+        """
+        self._seal()
+
+        best_answer, best_score = None, 0.0
+        for segment in self.segments:
+            matrix = segment.matrix
+            probe = matrix[:, probe_indices]
+            if probe.nnz == 0:
+                continue
+
+            # 探测项的部分得分
+            weights = np.repeat(probe_values, np.diff(probe.indptr)) * probe.data
+            rows, inverse = np.unique(probe.indices, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+
+            if len(rows) > top_candidates:
+                keep = np.argpartition(-scores, top_candidates - 1)[:top_candidates]
+                rows, scores = rows[keep], scores[keep]
+
+            # 对候选行补齐剩余查询项（列内行号有序，二分查找）
+            for column, value in zip(rest_indices, rest_values):
+                start, end = matrix.indptr[column], matrix.indptr[column + 1]
+                if start == end:
+                    continue
+                postings = matrix.indices[start:end]
+                positions = np.searchsorted(postings, rows)
+                found = positions < len(postings)
+                found[found] = postings[positions[found]] == rows[found]
+                scores[found] += matrix.data[start + positions[found]] * value
+
+            idx = int(np.argmax(scores))
+            if scores[idx] > best_score:
+                best_answer, best_score = segment.answers[rows[idx]], float(scores[idx])
+
+        return best_answer, best_score
+
+
+class SemanticCache:
+    """语义缓存 - 相似问题复用已有回答，避免重复调用LLM
+
+    回答来自含用户姓名、薄弱点等个人上下文的提示词，因此按用户分区，只在同一用户的问题之间复用；
+    分区数超过 max_buckets 时淘汰最久未使用的分区。
+    每个进程最多缓存 capacity_per_bucket * max_buckets 条，每条约3KB（向量不到1KB，其余为回答），
+    默认配置（200 * 1000）最坏约600MB。
+    """
+
+    def __init__(
+        self,
+        threshold: float = settings.AI_SEMANTIC_CACHE_THRESHOLD,
+        capacity_per_bucket: int = settings.AI_SEMANTIC_CACHE_CAPACITY,
+        enabled: bool = settings.AI_SEMANTIC_CACHE_ENABLED,
+        max_buckets: int = settings.AI_SEMANTIC_CACHE_MAX_BUCKETS,
+        n_features: int = 2 ** 18,
+        ngram_range: Tuple[int, int] = (1, 3),
+        max_segment_rows: int = 65536,
+        probe_terms: int = 16
+    ):
+        self.threshold = threshold
+        self.capacity_per_bucket = capacity_per_bucket
+        self.enabled = enabled
+        self.max_buckets = max_buckets
+        self.n_features = n_features
+        self.max_segment_rows = max_segment_rows
+        self.probe_terms = probe_terms
+
+        # 无状态的哈希向量化，天然支持增量写入
+        self.vectorizer = HashingVectorizer(
+            analyzer="char_wb",
+            ngram_range=ngram_range,
+            n_features=n_features,
+            alternate_sign=False,
+            norm=None
+        )
+
+        # 增量维护的文档频率，用于IDF加权
+        self.doc_freq = np.zeros(n_features, dtype=np.int32)
+        self.doc_count = 0
+        self.buckets: "OrderedDict[Tuple[str, str, str], _SemanticBucket]" = OrderedDict()
+
+        # 统计指标
+        self.hits = 0
+        self.misses = 0
+        self.evicted_buckets = 0
+        self.lookup_time_ms = 0.0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """规范化问题文本：统一全半角、去标点、合并空白"""
+        normalized = unicodedata.normalize("NFKC", text or "").lower()
+        normalized = re.sub(r"[^\w]+", " ", normalized)
+        return re.sub(r"\s+", " ", normalized).strip()
+
+    def _bucket_key(self, role: str, subject: Optional[Any], user_id: Optional[Any]) -> Tuple[str, str, str]:
+        return (
+            str(user_id) if user_id is not None else "",
+            role or "student",
+            str(subject) if subject is not None else ""
+        )
+
+    def _idf(self, indices: np.ndarray) -> np.ndarray:
+        return np.log((1 + self.doc_count) / (1 + self.doc_freq[indices])) + 1.0
+
+    def _weight(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        """对词频矩阵做TF-IDF加权并按行L2归一化"""
+        weighted = counts.tocsr(copy=True)
+        weighted.data = np.log1p(weighted.data) * self._idf(weighted.indices)
+
+        row_norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        row_norms[row_norms == 0] = 1.0
+        return (sparse.diags(1.0 / row_norms) @ weighted).astype(np.float32)
+
+    def add_many(
+        self,
+        questions: List[str],
+        role: str,
+        subject: Optional[Any],
+        answers: List[Dict[str, Any]],
+        user_id: Optional[Any] = None
+    ):
+        """批量写入问题与回答（个性化的回答须传入 user_id）"""
+        if not self.enabled or not questions:
+            return
+
+        counts = self.vectorizer.transform([self.normalize_text(q) for q in questions]).tocsr()
+
+        # 先更新文档频率，再按当前IDF加权写入
+        present = counts.copy()
+        present.data[:] = 1
+        self.doc_freq += np.asarray(present.sum(axis=0), dtype=np.int32).ravel()
+        self.doc_count += len(questions)
+
+        key = self._bucket_key(role, subject, user_id)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = _SemanticBucket(self.n_features, self.capacity_per_bucket, self.max_segment_rows)
+            self.buckets[key] = bucket
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+                self.evicted_buckets += 1
+        else:
+            self.buckets.move_to_end(key)
+
+        bucket.add(self._weight(counts), list(answers))
+
+    def add(
+        self,
+        question: str,
+        role: str,
+        subject: Optional[Any],
+        answer: Dict[str, Any],
+        user_id: Optional[Any] = None
+    ):
+        """写入单条问题与回答"""
+        self.add_many([question], role, subject, [answer], user_id)
+
+    def lookup(
+        self,
+        question: str,
+        role: str,
+        subject: Optional[Any],
+        user_id: Optional[Any] = None
+    ) -> Optional[Dict[str, Any]]:
+        """在同一分区内查找相似度超过阈值的已缓存回答"""
+        if not self.enabled:
+            return None
+
+        start_time = time.perf_counter()
+        answer = None
+
+        key = self._bucket_key(role, subject, user_id)
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            self.buckets.move_to_end(key)
+            query = self._weight(self.vectorizer.transform([self.normalize_text(question)]))
+            if query.nnz:
+                # 按文档频率升序，最稀有的若干项作为探测项
+                order = np.argsort(self.doc_freq[query.indices], kind="stable")
+                indices, values = query.indices[order], query.data[order]
+                candidate, score = bucket.search(
+                    indices[:self.probe_terms], values[:self.probe_terms],
+                    indices[self.probe_terms:], values[self.probe_terms:]
+                )
+                if candidate is not None and score >= self.threshold:
+                    answer = candidate
+
+        self.lookup_time_ms += (time.perf_counter() - start_time) * 1000
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "buckets": len(self.buckets),
+            "evicted_buckets": self.evicted_buckets,
+            "entries": sum(bucket.size for bucket in self.buckets.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_lookup_ms": round(self.lookup_time_ms / lookups, 3) if lookups else 0.0
+        }
+
+
+# 全局语义缓存实例（进程内）
+semantic_cache = SemanticCache()
@@ -0,0 +1,164 @@
+# backend/app/ai/engines/single_flight.py
+"""
+并发相同请求合并（single-flight）
+"""
+import json
+import uuid
+import asyncio
+from typing import Dict, Any, Callable, Awaitable
+
+from app.core.config import settings
+from app.utils.cache import redis_client
+
+
+class _Flight:
+    """进行中的一次上游调用及其等待者数"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """同一键的并发请求只发起一次上游调用
+
+    进程内的上游调用在独立的任务中执行，所有调用方（包括发起者）都只是等待者：
+    某个调用方被取消不影响其他调用方，最后一个等待者离开时才取消上游调用。
+    跨worker通过Redis锁选出唯一执行者，其余worker轮询执行者发布的结果。
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        enabled: bool = settings.AI_LLM_SINGLE_FLIGHT_ENABLED,
+        lock_ttl: int = 60,
+        result_ttl: int = 30,
+        poll_interval: float = 0.05
+    ):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, _Flight] = {}
+
+        # 统计指标
+        self.requests = 0
+        self.upstream_calls = 0
+        self.local_coalesced = 0
+        self.remote_coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行或加入同键的进行中请求"""
+        self.requests += 1
+
+        if not self.enabled:
+            self.upstream_calls += 1
+            return await fn()
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.local_coalesced += 1
+        else:
+            flight = _Flight(asyncio.get_running_loop().create_task(self._run_distributed(key, fn)))
+            flight.task.add_done_callback(lambda task, key=key, flight=flight: self._finish(key, flight))
+            self._inflight[key] = flight
+
+        flight.waiters += 1
+        try:
+            # shield：等待者被取消时上游任务继续为其他等待者运行
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 所有等待者都已取消，上游结果不再需要；之后的同键请求重新发起
+                self.abandoned += 1
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def _finish(self, key: str, flight: _Flight):
+        self._forget(key, flight)
+        # 无等待者时也标记异常已读取，避免告警
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    async def _run_distributed(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """跨worker合并：抢到锁的worker执行并发布结果"""
+        lock_key = f"{self.namespace}:lock:{key}"
+        flight_id = uuid.uuid4().hex
+
+        try:
+            acquired = redis_client.set(lock_key, flight_id, nx=True, ex=self.lock_ttl)
+            leader_flight = None if acquired else redis_client.get(lock_key)
+        except Exception as e:
+            print(f"Single-flight lock error: {e}")
+            acquired, leader_flight = True, None
+
+        if acquired or not leader_flight:
+            return await self._lead(lock_key, flight_id, fn)
+
+        # 等待其他worker发布结果
+        result_key = f"{self.namespace}:result:{leader_flight}"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                published = redis_client.get(result_key)
+                if published is not None:
+                    self.remote_coalesced += 1
+                    return json.loads(published)
+                if redis_client.get(lock_key) != leader_flight:
+                    break
+            except Exception as e:
+                print(f"Single-flight poll error: {e}")
+                break
+
+        # 执行者异常退出或超时，自行调用
+        self.upstream_calls += 1
+        return await fn()
+
+    async def _lead(self, lock_key: str, flight_id: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """作为执行者调用上游并发布结果"""
+        self.upstream_calls += 1
+        try:
+            result = await fn()
+            try:
+                redis_client.setex(
+                    f"{self.namespace}:result:{flight_id}",
+                    self.result_ttl,
+                    json.dumps(result, ensure_ascii=False, default=str)
+                )
+            except Exception as e:
+                print(f"Single-flight publish error: {e}")
+            return result
+        finally:
+            try:
+                if redis_client.get(lock_key) == flight_id:
+                    redis_client.delete(lock_key)
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """合并统计"""
+        coalesced = self.local_coalesced + self.remote_coalesced
+        return {
+            "enabled": self.enabled,
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "local_coalesced": self.local_coalesced,
+            "remote_coalesced": self.remote_coalesced,
+            "abandoned": self.abandoned,
+            "coalescing_rate": coalesced / self.requests if self.requests else 0.0
+        }
+
+
+# 全局LLM请求合并实例
+llm_single_flight = SingleFlight("llm:sf")
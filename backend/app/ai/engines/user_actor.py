@@ -0,0 +1,153 @@
+# backend/app/ai/engines/user_actor.py
+"""
+按用户划分的actor：每个活跃用户一个邮箱和处理任务，保证同一用户的行为按顺序处理
+"""
+import asyncio
+from typing import Dict, Any, List, Callable, Awaitable, Optional
+
+from app.core.config import settings
+
+# 处理函数：接收同一用户连续的一批行为，按顺序返回各自的结果
+BatchHandler = Callable[[int, List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+
+class UserActor:
+    """单个用户的actor：邮箱 + 处理任务"""
+
+    __slots__ = ("user_id", "mailbox", "task", "processed", "batches")
+
+    def __init__(self, user_id: int, mailbox_size: int):
+        self.user_id = user_id
+        self.mailbox: asyncio.Queue = asyncio.Queue(maxsize=mailbox_size)
+        self.task: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.batches = 0
+
+
+class ActorSystem:
+    """用户actor管理
+
+    同一用户的行为进入该用户的邮箱，由其专属任务依次处理，互不竞争同一个agent；
+    处理时一次取出邮箱中已排队的连续行为作为一批交给处理函数，以便合并写入。
+    全局信号量限制同时处理的用户数，邮箱满时发送方等待；空闲超过 idle_timeout 的actor自动退出。
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        max_concurrency: int = settings.AI_ACTOR_MAX_CONCURRENCY,
+        mailbox_size: int = settings.AI_ACTOR_MAILBOX_SIZE,
+        max_batch: int = settings.AI_ACTOR_MAX_BATCH,
+        idle_timeout: float = settings.AI_ACTOR_IDLE_TIMEOUT
+    ):
+        self.handler = handler
+        self.max_concurrency = max_concurrency
+        self.mailbox_size = mailbox_size
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+        self.actors: Dict[int, UserActor] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # 统计指标
+        self.processed = 0
+        self.batches = 0
+        self.running = 0
+        self.waiting = 0
+        self.peak_mailbox_depth = 0
+        self.mailbox_full_waits = 0
+        self.actors_started = 0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def enqueue(self, user_id: int, action: Dict[str, Any]) -> asyncio.Future:
+        """把行为放入用户邮箱，返回处理结果的future；按调用顺序处理"""
+        actor = self.actors.get(user_id)
+        if actor is None:
+            actor = self.actors[user_id] = UserActor(user_id, self.mailbox_size)
+            actor.task = asyncio.get_running_loop().create_task(self._run(actor))
+            self.actors_started += 1
+
+        future = asyncio.get_running_loop().create_future()
+        if actor.mailbox.full():
+            self.mailbox_full_waits += 1
+        await actor.mailbox.put((action, future))
+        self.peak_mailbox_depth = max(self.peak_mailbox_depth, actor.mailbox.qsize())
+        return future
+
+    async def send(self, user_id: int, action: Dict[str, Any]) -> Dict[str, Any]:
+        """发送行为并等待处理结果"""
+        return await (await self.enqueue(user_id, action))
+
+    async def _run(self, actor: UserActor):
+        while True:
+            try:
+                first = await asyncio.wait_for(actor.mailbox.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                # 检查与移除之间没有await，不会漏掉新投递的消息
+                if actor.mailbox.empty():
+                    self.actors.pop(actor.user_id, None)
+                    return
+                continue
+
+            batch = [first]
+            while len(batch) < self.max_batch and not actor.mailbox.empty():
+                batch.append(actor.mailbox.get_nowait())
+
+            self.waiting += 1
+            async with self.semaphore:
+                self.waiting -= 1
+                self.running += 1
+                try:
+                    results = await self.handler(actor.user_id, [action for action, _ in batch])
+                except Exception as e:
+                    print(f"Actor batch failed for user {actor.user_id}: {e}")
+                    results = [{"error": str(e)}] * len(batch)
+                finally:
+                    self.running -= 1
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            for _ in batch:
+                actor.mailbox.task_done()
+
+            actor.processed += len(batch)
+            actor.batches += 1
+            self.processed += len(batch)
+            self.batches += 1
+
+    async def shutdown(self, timeout: float = 10.0):
+        """等待邮箱中已有的行为处理完成后停止所有actor"""
+        actors = list(self.actors.values())
+        if actors:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(actor.mailbox.join() for actor in actors)), timeout
+                )
+            except asyncio.TimeoutError:
+                print("Actor shutdown timed out with pending actions")
+        for actor in actors:
+            if actor.task is not None:
+                actor.task.cancel()
+        self.actors.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """actor统计"""
+        depths = [actor.mailbox.qsize() for actor in self.actors.values()]
+        return {
+            "active_actors": len(self.actors),
+            "actors_started": self.actors_started,
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "waiting_for_slot": self.waiting,
+            "queued_actions": sum(depths),
+            "max_mailbox_depth": max(depths, default=0),
+            "peak_mailbox_depth": self.peak_mailbox_depth,
+            "mailbox_full_waits": self.mailbox_full_waits,
+            "processed": self.processed,
+            "avg_batch_size": round(self.processed / self.batches, 2) if self.batches else 0.0
+        }
@@ -0,0 +1,197 @@
+# backend/app/ai/knowledge/agent_session_store.py
+"""
+AI Agent会话状态存储：多worker间共享，带版本号的乐观并发控制
+"""
+import json
+import zlib
+import base64
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.cache import redis_client
+
+# 版本号一致时才写入，返回新版本号；版本冲突返回 -1
+_SAVE_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'v') or '0')
+if current ~= tonumber(ARGV[1]) then
+    return -1
+end
+redis.call('HSET', KEYS[1], 'v', current + 1, 't', ARGV[2], 'd', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return current + 1
+"""
+
+CONFLICT = -1
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return str(value)
+
+
+def _json_object_hook(value: Dict[str, Any]):
+    if len(value) == 1 and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+class AgentSessionStore:
+    """Agent会话状态存储（Redis哈希：v=版本号，t=agent类型，d=编码后的状态）
+
+    状态使用紧凑JSON编码，超过阈值时zlib压缩；每次读写刷新TTL，
+    会话在任一worker上启动一次后，其他worker直接恢复而不重复执行启动流程。
+    """
+
+    def __init__(
+        self,
+        ttl: int = settings.AI_AGENT_SESSION_TTL,
+        compress_min_bytes: int = 512,
+        enabled: bool = settings.AI_AGENT_SESSION_STORE_ENABLED
+    ):
+        self.ttl = ttl
+        self.compress_min_bytes = compress_min_bytes
+        self.enabled = enabled
+        self._save_script = redis_client.register_script(_SAVE_SCRIPT)
+
+        # 统计指标
+        self.hits = 0
+        self.misses = 0
+        self.saves = 0
+        self.conflicts = 0
+        self.errors = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def _key(self, user_id: int) -> str:
+        return f"agent:session:{user_id}"
+
+    def encode(self, state: Dict[str, Any]) -> str:
+        """编码会话状态"""
+        return self._pack(json.dumps(state, ensure_ascii=False, separators=(",", ":"), default=_json_default))
+
+    def _pack(self, raw: str) -> str:
+        if len(raw) >= self.compress_min_bytes:
+            return "z:" + base64.b85encode(zlib.compress(raw.encode("utf-8"), 6)).decode("ascii")
+        return "j:" + raw
+
+    @staticmethod
+    def decode(data: str) -> Dict[str, Any]:
+        """解码会话状态"""
+        if data.startswith("z:"):
+            raw = zlib.decompress(base64.b85decode(data[2:])).decode("utf-8")
+        else:
+            raw = data[2:]
+        return json.loads(raw, object_hook=_json_object_hook)
+
+    @staticmethod
+    def digest(data: str) -> str:
+        """编码结果的摘要，用于跳过未变化的写入"""
+        return hashlib.md5(data.encode("utf-8")).hexdigest()
+
+    async def load(self, user_id: int, agent_type: str) -> Optional[Tuple[Dict[str, Any], int, str]]:
+        """读取会话状态，返回 (状态, 版本号, 摘要)；不存在或类型不符时返回None"""
+        if not self.enabled:
+            return None
+
+        key = self._key(user_id)
+        try:
+            pipe = redis_client.pipeline()
+            pipe.hgetall(key)
+            pipe.expire(key, self.ttl)
+            record = pipe.execute()[0]
+        except Exception as e:
+            self.errors += 1
+            print(f"Agent session load error: {e}")
+            return None
+
+        if not record or record.get("t") != agent_type or "d" not in record:
+            self.misses += 1
+            return None
+
+        try:
+            state = self.decode(record["d"])
+        except Exception as e:
+            self.errors += 1
+            print(f"Agent session decode error: {e}")
+            return None
+
+        self.hits += 1
+        return state, int(record["v"]), self.digest(record["d"])
+
+    async def version(self, user_id: int) -> Optional[int]:
+        """读取当前版本号，会话不存在返回0，存储不可用返回None"""
+        if not self.enabled:
+            return None
+        try:
+            return int(redis_client.hget(self._key(user_id), "v") or 0)
+        except Exception as e:
+            self.errors += 1
+            print(f"Agent session version error: {e}")
+            return None
+
+    async def save(
+        self,
+        user_id: int,
+        agent_type: str,
+        state: Dict[str, Any],
+        expected_version: int
+    ) -> Optional[Tuple[int, str]]:
+        """基于版本号写入会话状态
+
+        返回 (新版本号, 摘要)；版本冲突时版本号为 CONFLICT；存储不可用返回None
+        """
+        if not self.enabled:
+            return None
+
+        raw = json.dumps(state, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+        data = self._pack(raw)
+        try:
+            version = int(self._save_script(
+                keys=[self._key(user_id)],
+                args=[expected_version, agent_type, data, self.ttl]
+            ))
+        except Exception as e:
+            self.errors += 1
+            print(f"Agent session save error: {e}")
+            return None
+
+        if version == CONFLICT:
+            self.conflicts += 1
+        else:
+            self.saves += 1
+            self.raw_bytes += len(raw.encode("utf-8"))
+            self.stored_bytes += len(data)
+        return version, self.digest(data)
+
+    async def delete(self, user_id: int):
+        """删除会话状态"""
+        if not self.enabled:
+            return
+        try:
+            redis_client.delete(self._key(user_id))
+        except Exception as e:
+            self.errors += 1
+            print(f"Agent session delete error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """会话存储统计"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "rehydrated": self.hits,
+            "misses": self.misses,
+            "rehydrate_rate": self.hits / lookups if lookups else 0.0,
+            "saves": self.saves,
+            "conflicts": self.conflicts,
+            "errors": self.errors,
+            "avg_stored_bytes": round(self.stored_bytes / self.saves) if self.saves else 0,
+            "compression_ratio": self.stored_bytes / self.raw_bytes if self.raw_bytes else 0.0
+        }
+
+
+# 全局Agent会话存储实例
+agent_session_store = AgentSessionStore()
@@ -0,0 +1,354 @@
+# backend/app/ai/knowledge/behavior_log_archive.py
+"""
+学习行为日志归档：按月分区维护、过期月份导出为压缩文件，以及透明回落到归档的历史查询
+"""
+import os
+import gzip
+import json
+import shutil
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import select, func, text
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.analytics import LearningBehaviorLog, RollupWatermark
+from app.ai.knowledge.behavior_rollup import ROLLUP_NAME, ARCHIVE_NAME, read_watermark
+
+TABLE = LearningBehaviorLog.__tablename__
+ARCHIVE_BUCKETS = 32  # 每月按 student_id 分桶，按学生读取时只需解压一个文件
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "student_id": row.student_id,
+        "action_type": row.action_type,
+        "action_data": row.action_data,
+        "session_duration": row.session_duration,
+        "timestamp": row.timestamp
+    }
+
+
+class BehaviorLogArchive:
+    """行为日志归档
+
+    learning_behavior_logs 在MySQL上按月分区（迁移007）。归档任务（scripts/archive_behavior_logs.py）
+    把早于保留期且已完成汇总的整月导出到 {archive_dir}/{YYYYMM}/part-NN.jsonl.gz（按学生分桶）和
+    manifest.json，核对行数后推进归档高水位并删除该月分区（未分区时按时间范围删除）。
+    query() 把时间范围拆为归档高水位之前（读归档文件）和之后（查数据库）两部分，对调用方透明。
+    """
+
+    def __init__(
+        self,
+        archive_dir: str = settings.AI_BEHAVIOR_LOG_ARCHIVE_DIR,
+        retention_months: int = settings.AI_BEHAVIOR_LOG_RETENTION_MONTHS
+    ):
+        self.archive_dir = archive_dir
+        self.retention_months = retention_months
+
+        # 统计指标
+        self.months_archived = 0
+        self.rows_archived = 0
+        self.partitions_added = 0
+        self.archive_reads = 0
+        self.archive_rows_read = 0
+        self.missing_archives = 0
+
+    # ---- 分区 ----
+
+    @staticmethod
+    def list_partitions(db) -> List[Tuple[str, Optional[datetime]]]:
+        """按上界排列的 (分区名, 上界)，pmax 的上界为None；未分区时为空"""
+        if db.get_bind().dialect.name != "mysql":
+            return []
+        rows = db.execute(text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ), {"table": TABLE}).all()
+        partitions = []
+        for name, description in rows:
+            bound = None if description == "MAXVALUE" else datetime.fromisoformat(description.strip("'"))
+            partitions.append((name, bound))
+        return partitions
+
+    def ensure_partitions(self, months_ahead: int = 3, now: Optional[datetime] = None) -> List[str]:
+        """把 pmax 拆分出未来 months_ahead 个月的分区（pmax 为空时只改元数据）"""
+        with next(get_db()) as db:
+            partitions = self.list_partitions(db)
+            bounds = [bound for _, bound in partitions if bound is not None]
+            if not partitions or not bounds:
+                return []
+
+            target = add_months(month_start(now or datetime.now()), months_ahead + 1)
+            month, added = max(bounds), []
+            while month < target:
+                added.append(month)
+                month = add_months(month, 1)
+            if not added:
+                return []
+
+            definitions = [
+                f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')" for month in added
+            ]
+            db.execute(text(
+                f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO ("
+                + ", ".join(definitions) + ", PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+            ))
+        self.partitions_added += len(added)
+        return [f"p{month:%Y%m}" for month in added]
+
+    # ---- 归档 ----
+
+    def archived_until(self, db) -> Optional[datetime]:
+        """早于该时间的行为日志只在归档文件中"""
+        return read_watermark(db, ARCHIVE_NAME)
+
+    def _month_dir(self, month: datetime) -> str:
+        return os.path.join(self.archive_dir, f"{month:%Y%m}")
+
+    def archive_expired(self, now: Optional[datetime] = None, dry_run: bool = False) -> List[Dict[str, Any]]:
+        """依次归档早于保留期的整月，返回每月的归档结果"""
+        cutoff = add_months(month_start(now or datetime.now()), -self.retention_months)
+        results = []
+        while True:
+            with next(get_db()) as db:
+                oldest = db.query(func.min(LearningBehaviorLog.timestamp)).scalar()
+                rolled_until = read_watermark(db, ROLLUP_NAME)
+            if oldest is None or month_start(oldest) >= cutoff:
+                break
+
+            month = month_start(oldest)
+            end = add_months(month, 1)
+            if rolled_until is None or rolled_until < end:
+                # 归档后原始日志不再可用于汇总，必须先完成该月的汇总
+                print(f"Behavior log archive skipped {month:%Y-%m}: rollup has not reached {end}")
+                break
+
+            result = self.archive_month(month, dry_run=dry_run)
+            results.append(result)
+            if dry_run:
+                break
+        return results
+
+    def archive_month(self, month: datetime, dry_run: bool = False) -> Dict[str, Any]:
+        """导出 month 所在月（及更早遗留）的行为日志，核对后推进归档高水位并删除"""
+        month = month_start(month)
+        end = add_months(month, 1)
+        in_range = LearningBehaviorLog.timestamp < end
+
+        with next(get_db()) as db:
+            expected = db.query(func.count(LearningBehaviorLog.id)).filter(in_range).scalar()
+        if dry_run:
+            return {"month": f"{month:%Y-%m}", "rows": expected, "dry_run": True}
+
+        exported = self._export(month, end)
+        with next(get_db()) as db:
+            # 导出期间有新写入（迟到事件）时不删除，下次重新导出
+            current = db.query(func.count(LearningBehaviorLog.id)).filter(in_range).scalar()
+            if exported != expected or current != expected:
+                raise RuntimeError(
+                    f"Behavior log archive count mismatch for {month:%Y-%m}: "
+                    f"expected {expected}, exported {exported}, now {current}"
+                )
+
+            mark = db.query(RollupWatermark).filter(RollupWatermark.name == ARCHIVE_NAME).with_for_update().first()
+            if mark is None:
+                db.add(RollupWatermark(name=ARCHIVE_NAME, watermark=end))
+            elif mark.watermark < end:
+                mark.watermark = end
+            db.commit()
+
+        dropped = self._drop(month, end)
+        self.months_archived += 1
+        self.rows_archived += exported
+        return {"month": f"{month:%Y-%m}", "rows": exported, "dropped": dropped, "path": self._month_dir(month)}
+
+    def _export(self, month: datetime, end: datetime) -> int:
+        """流式导出到临时目录，写完 manifest 后改名为正式目录"""
+        final_dir = self._month_dir(month)
+        temp_dir = final_dir + ".tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+
+        files: Dict[int, Any] = {}
+        counts = [0] * ARCHIVE_BUCKETS
+        first = last = None
+        try:
+            with next(get_db()) as db:
+                result = db.execute(
+                    select(LearningBehaviorLog.__table__).where(
+                        LearningBehaviorLog.timestamp < end
+                    ).order_by(LearningBehaviorLog.timestamp, LearningBehaviorLog.id).execution_options(yield_per=5000)
+                )
+                for row in result:
+                    bucket = row.student_id % ARCHIVE_BUCKETS
+                    if bucket not in files:
+                        files[bucket] = gzip.open(os.path.join(temp_dir, f"part-{bucket:02d}.jsonl.gz"), "wt", encoding="utf-8")
+                    record = _row_to_dict(row)
+                    record["timestamp"] = row.timestamp.isoformat()
+                    files[bucket].write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                    counts[bucket] += 1
+                    first = first or row.timestamp
+                    last = row.timestamp
+        finally:
+            for archive_file in files.values():
+                archive_file.close()
+
+        manifest = {
+            "table": TABLE,
+            "month": f"{month:%Y-%m}",
+            "end": end.isoformat(),
+            "buckets": ARCHIVE_BUCKETS,
+            "rows": sum(counts),
+            "bucket_rows": counts,
+            "first_timestamp": first.isoformat() if first else None,
+            "last_timestamp": last.isoformat() if last else None,
+            "created_at": datetime.now().isoformat()
+        }
+        with open(os.path.join(temp_dir, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+
+        # 上次中断留下的同月目录（数据库中仍有该月数据）以本次导出为准
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.rename(temp_dir, final_dir)
+        return manifest["rows"]
+
+    def _drop(self, month: datetime, end: datetime) -> str:
+        """删除已归档的数据：上界恰为 end 的分区直接删除，否则按时间范围分批删除"""
+        with next(get_db()) as db:
+            partition = next((name for name, bound in self.list_partitions(db) if bound == end), None)
+            if partition:
+                db.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {partition}"))
+                return f"partition {partition}"
+
+            deleted = 0
+            while True:
+                ids = [row.id for row in db.query(LearningBehaviorLog.id).filter(
+                    LearningBehaviorLog.timestamp < end
+                ).limit(10000).all()]
+                if not ids:
+                    break
+                db.query(LearningBehaviorLog).filter(
+                    LearningBehaviorLog.id.in_(ids)
+                ).delete(synchronize_session=False)
+                db.commit()
+                deleted += len(ids)
+            return f"deleted {deleted} rows"
+
+    # ---- 查询 ----
+
+    def query(
+        self,
+        student_id: int,
+        since: datetime,
+        until: Optional[datetime] = None,
+        action_types: Optional[List[str]] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """学生在 [since, until) 内的行为日志（按时间升序），早于归档高水位的部分读归档文件
+
+        指定 limit 时只返回最近的 limit 条：数据库部分倒序取 limit 条，仍不足时才从最近的月份起逐月读归档。
+        """
+        until = until or datetime.now()
+        with next(get_db()) as db:
+            boundary = self.archived_until(db)
+            db_since = max(since, boundary) if boundary else since
+
+            query = db.query(LearningBehaviorLog).filter(
+                LearningBehaviorLog.student_id == student_id,
+                LearningBehaviorLog.timestamp >= db_since,
+                LearningBehaviorLog.timestamp < until
+            )
+            if action_types:
+                query = query.filter(LearningBehaviorLog.action_type.in_(action_types))
+            if limit:
+                query = query.order_by(LearningBehaviorLog.timestamp.desc(), LearningBehaviorLog.id.desc()).limit(limit)
+                recent = [_row_to_dict(row) for row in reversed(query.all())]
+            else:
+                recent = [_row_to_dict(row) for row in query.order_by(LearningBehaviorLog.timestamp).all()]
+
+        archived = []
+        if boundary and since < boundary:
+            archive_until = min(until, boundary)
+            # 从最近的月份往前读，已够 limit 条时停止
+            month = month_start(archive_until - timedelta(microseconds=1))
+            while month >= month_start(since):
+                if limit and len(archived) + len(recent) >= limit:
+                    break
+                records = self._read_month(month, student_id, since, archive_until, action_types)
+                records.sort(key=lambda record: record["timestamp"])
+                archived = records + archived
+                month = add_months(month, -1)
+        records = archived + recent
+        return records[-limit:] if limit else records
+
+    def _read_month(
+        self,
+        month: datetime,
+        student_id: int,
+        since: datetime,
+        until: datetime,
+        action_types: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        month_dir = self._month_dir(month)
+        try:
+            with open(os.path.join(month_dir, "manifest.json"), encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            # 没有数据的月份不会生成归档目录
+            return []
+        except Exception as e:
+            print(f"Behavior log archive manifest unreadable for {month:%Y-%m}: {e}")
+            self.missing_archives += 1
+            return []
+
+        bucket = student_id % manifest["buckets"]
+        if not manifest["bucket_rows"][bucket]:
+            return []
+
+        self.archive_reads += 1
+        records = []
+        try:
+            with gzip.open(os.path.join(month_dir, f"part-{bucket:02d}.jsonl.gz"), "rt", encoding="utf-8") as archive_file:
+                for line in archive_file:
+                    record = json.loads(line)
+                    if record["student_id"] != student_id:
+                        continue
+                    if action_types and record["action_type"] not in action_types:
+                        continue
+                    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+                    if since <= record["timestamp"] < until:
+                        records.append(record)
+        except Exception as e:
+            print(f"Behavior log archive read failed for {month:%Y-%m}: {e}")
+            self.missing_archives += 1
+        self.archive_rows_read += len(records)
+        return records
+
+    def stats(self) -> Dict[str, Any]:
+        """归档统计"""
+        return {
+            "retention_months": self.retention_months,
+            "months_archived": self.months_archived,
+            "rows_archived": self.rows_archived,
+            "partitions_added": self.partitions_added,
+            "archive_reads": self.archive_reads,
+            "archive_rows_read": self.archive_rows_read,
+            "missing_archives": self.missing_archives
+        }
+
+
+# 全局行为日志归档实例
+behavior_log_archive = BehaviorLogArchive()
@@ -0,0 +1,382 @@
+# backend/app/ai/knowledge/behavior_log_buffer.py
+"""
+学习行为日志的异步批量写入（write-behind）缓冲区
+"""
+import os
+import glob
+import json
+import time
+import asyncio
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.analytics import LearningBehaviorLog
+from app.ai.knowledge.behavior_rollup import behavior_rollup
+
+# 当前任务所在写入组已提交的事件数（见 write_group）
+_write_group: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "behavior_log_write_group", default=None
+)
+
+
+class BehaviorLogBuffer:
+    """行为日志写入缓冲区
+
+    请求路径只把事件追加到内存队列；后台任务每 flush_interval_ms 毫秒或累计 batch_size 条时
+    以多行INSERT批量写库。队列达到 max_pending 时写入方最多等待 block_timeout 秒，仍无空间则丢弃。
+
+    配置 spool_dir 后每条事件先追加到本进程的spool文件，成功写库后删除对应文件；
+    进程崩溃后由下一个启动的进程接管遗留文件并重新写入（至少一次语义）。
+
+    一批写入失败时先检查数据库是否可用：不可用时整批放回队列头部，下个周期重试；
+    可用则说明批内有无法写入的事件（数据错误、违反约束），二分定位后移入死信文件
+    （spool_dir 下的 dead-letter.jsonl，未配置时只打印），不阻塞后续事件。
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.AI_BEHAVIOR_LOG_BATCH_SIZE,
+        flush_interval_ms: int = settings.AI_BEHAVIOR_LOG_FLUSH_MS,
+        max_pending: int = settings.AI_BEHAVIOR_LOG_MAX_PENDING,
+        block_timeout: float = settings.AI_BEHAVIOR_LOG_BLOCK_TIMEOUT,
+        spool_dir: str = settings.AI_BEHAVIOR_LOG_SPOOL_DIR
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.block_timeout = block_timeout
+        self.spool_dir = spool_dir
+        self.pending: deque = deque()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._spool_file = None
+        self._spool_seq = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        # 统计指标
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+        self.groups = 0
+        self.flush_latencies: deque = deque(maxlen=500)  # 每批写库耗时ms
+        self.event_delays: deque = deque(maxlen=500)  # 事件从入队到落库的延迟ms
+
+    @staticmethod
+    def _build_row(user_id: int, action: Dict[str, Any]) -> Dict[str, Any]:
+        # 行为数据中可能含有datetime等对象，统一转为可JSON序列化的形式
+        action_data = json.loads(json.dumps(action, ensure_ascii=False, default=str))
+        return {
+            "student_id": user_id,
+            "action_type": str(action.get("type", "unknown"))[:50],
+            "action_data": action_data,
+            "session_duration": action.get("duration", 0) or 0,
+            "timestamp": datetime.now()
+        }
+
+    async def put(self, user_id: int, action: Dict[str, Any]) -> bool:
+        """提交一条行为事件，正常情况下不等待；队列满时施加背压，超时后丢弃并返回False"""
+        row = self._build_row(user_id, action)
+        group = _write_group.get()
+        if group is not None:
+            group[0] += 1
+        return await self._enqueue([row], wake=group is None)
+
+    @asynccontextmanager
+    async def write_group(self):
+        """上下文内提交的事件照常立即写入spool并入队，只是累计满 batch_size 时不提前唤醒写入任务，
+        退出时再检查，使同一组事件尽量在同一次多行INSERT中写入"""
+        group = [0]
+        token = _write_group.set(group)
+        try:
+            yield
+        finally:
+            _write_group.reset(token)
+            if group[0]:
+                self.groups += 1
+                if self._wakeup is not None and len(self.pending) >= self.batch_size:
+                    self._wakeup.set()
+
+    async def _enqueue(self, rows: List[Dict[str, Any]], wake: bool = True) -> bool:
+        self._ensure_flusher()
+
+        if len(self.pending) >= self.max_pending:
+            self.backpressure_waits += 1
+            self._wakeup.set()
+            deadline = time.monotonic() + self.block_timeout
+            while len(self.pending) >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.dropped += len(rows)
+                    return False
+                self._space.clear()
+                try:
+                    await asyncio.wait_for(self._space.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+        enqueued_at = time.monotonic()
+        for row in rows:
+            self._spool(row)
+            self.pending.append((enqueued_at, row))
+        self.enqueued += len(rows)
+
+        if wake and len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _ensure_flusher(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wakeup = self._wakeup or asyncio.Event()
+        self._space = self._space or asyncio.Event()
+        self._flush_lock = self._flush_lock or asyncio.Lock()
+        self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """写出当前队列中的全部事件"""
+        if not self.pending:
+            return
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            # 切换spool文件：此刻之前的事件都在已关闭的文件中，全部写库成功后即可删除
+            closed_segments = self._rotate_spool()
+            count = len(self.pending)
+
+            while count > 0:
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, count))]
+                count -= len(batch)
+                start_time = time.perf_counter()
+                written, retry = await self._write_batch(batch)
+
+                if written:
+                    now = time.monotonic()
+                    self.flush_latencies.append((time.perf_counter() - start_time) * 1000)
+                    self.event_delays.extend((now - enqueued_at) * 1000 for enqueued_at, _ in written)
+                    self.written += len(written)
+                    self.batches += 1
+                if len(retry) < len(batch) and self._space is not None:
+                    self._space.set()
+                if retry:
+                    # 放回队列头部，保留spool文件，下个周期重试
+                    self.pending.extendleft(reversed(retry))
+                    return
+
+            for path in closed_segments:
+                self._remove(path)
+
+    async def _write_batch(self, batch: List[tuple]) -> Tuple[List[tuple], List[tuple]]:
+        """写入一批 (入队时间, 行)，返回 (已写入, 需重试)；数据库可用时无法写入的行移入死信文件"""
+        written, parts = [], [batch]
+        while parts:
+            part = parts.pop()
+            try:
+                await asyncio.to_thread(self._write, [row for _, row in part])
+                written.extend(part)
+                continue
+            except Exception as e:
+                error = e
+            self.write_errors += 1
+
+            if not await asyncio.to_thread(self._ping):
+                print(f"Behavior log flush failed: {error}")
+                # 尚未写入的部分按原顺序返回
+                return written, [item for rest in [part] + parts[::-1] for item in rest]
+
+            if len(part) == 1:
+                self._dead_letter(part[0][1], error)
+            else:
+                middle = len(part) // 2
+                parts.extend([part[middle:], part[:middle]])
+        return written, []
+
+    @staticmethod
+    def _write(rows: List[Dict[str, Any]]):
+        with next(get_db()) as db:
+            # Core executemany，由驱动合并为多行INSERT
+            db.execute(LearningBehaviorLog.__table__.insert(), rows)
+            # 迟到的事件（如spool重放）落在已汇总的时段时，回拨汇总高水位
+            behavior_rollup.rewind(db, min(row["timestamp"] for row in rows))
+            db.commit()
+
+    @staticmethod
+    def _ping() -> bool:
+        """数据库是否可用，用于区分连接故障和批内的坏数据"""
+        try:
+            with next(get_db()) as db:
+                db.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    def _dead_letter(self, row: Dict[str, Any], error: Exception):
+        self.dead_lettered += 1
+        print(f"Behavior log row moved to dead letter: {error}")
+        record = json.dumps({"error": str(error)[:500], "row": row}, ensure_ascii=False, default=str)
+        if not self.spool_dir:
+            print(record)
+            return
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            # 文件名不匹配 behavior-*.jsonl，recover() 不会重放
+            with open(os.path.join(self.spool_dir, "dead-letter.jsonl"), "a", encoding="utf-8") as dead_letter:
+                dead_letter.write(record + "\n")
+        except OSError as e:
+            print(f"Behavior log dead letter write failed: {e}")
+            print(record)
+
+    # ---- spool 文件 ----
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.spool_dir, f"behavior-{os.getpid()}-{seq:06d}.jsonl")
+
+    def _spool(self, row: Dict[str, Any]):
+        if not self.spool_dir:
+            return
+        try:
+            if self._spool_file is None:
+                os.makedirs(self.spool_dir, exist_ok=True)
+                self._spool_file = open(self._segment_path(self._spool_seq), "a", encoding="utf-8")
+            self._spool_file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            # 写入操作系统缓冲即可保证进程崩溃后不丢失
+            self._spool_file.flush()
+        except OSError as e:
+            print(f"Behavior log spool write failed: {e}")
+
+    def _rotate_spool(self) -> List[str]:
+        """关闭当前spool文件，返回本进程所有已关闭的文件"""
+        if not self.spool_dir:
+            return []
+        if self._spool_file is not None:
+            self._spool_file.close()
+            self._spool_file = None
+            self._spool_seq += 1
+        return sorted(
+            path for path in glob.glob(os.path.join(self.spool_dir, f"behavior-{os.getpid()}-*.jsonl"))
+            if path != self._segment_path(self._spool_seq)
+        )
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Behavior log spool cleanup failed: {e}")
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def recover(self) -> int:
+        """接管已退出进程遗留的spool文件，重新放入写入队列"""
+        if not self.spool_dir or not os.path.isdir(self.spool_dir):
+            return 0
+
+        recovered = 0
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "behavior-*.jsonl"))):
+            try:
+                pid = int(os.path.basename(path).split("-")[1])
+            except (IndexError, ValueError):
+                continue
+            if pid != os.getpid() and self._pid_alive(pid):
+                continue
+
+            # 改名为本进程的文件，多个进程同时启动时只有一个能接管成功；
+            # 重启后的PID可能与崩溃的进程相同，跳过已存在的文件名，避免 os.rename 覆盖未处理的文件
+            claimed = self._segment_path(self._spool_seq)
+            while os.path.exists(claimed):
+                self._spool_seq += 1
+                claimed = self._segment_path(self._spool_seq)
+            self._spool_seq += 1
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+
+            with open(claimed, encoding="utf-8") as spool_file:
+                for line in spool_file:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时写了一半的行
+                    row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+                    self.pending.append((time.monotonic(), row))
+                    recovered += 1
+
+        self.replayed += recovered
+        if recovered:
+            self._ensure_flusher()
+        return recovered
+
+    async def shutdown(self):
+        """停止后台任务并写出剩余事件"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if self._spool_file is not None:
+            self._spool_file.close()
+            self._spool_file = None
+
+    @staticmethod
+    def _percentile(values: deque, q: float) -> float:
+        ordered = sorted(values)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def stats(self) -> Dict[str, Any]:
+        """写入统计"""
+        return {
+            "pending": len(self.pending),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 1) if self.batches else 0.0,
+            "write_errors": self.write_errors,
+            "replayed": self.replayed,
+            "dead_lettered": self.dead_lettered,
+            "groups": self.groups,
+            "spool_enabled": bool(self.spool_dir),
+            "flush_p50_ms": round(self._percentile(self.flush_latencies, 0.5), 2),
+            "flush_p95_ms": round(self._percentile(self.flush_latencies, 0.95), 2),
+            "event_delay_p95_ms": round(self._percentile(self.event_delays, 0.95), 2)
+        }
+
+
+# 全局行为日志缓冲区实例
+behavior_log_buffer = BehaviorLogBuffer()
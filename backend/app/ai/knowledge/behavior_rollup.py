@@ -0,0 +1,384 @@
+# backend/app/ai/knowledge/behavior_rollup.py
+"""
+学习行为日志的小时/日汇总（rollup）与汇总感知的查询
+"""
+import time
+from collections import Counter
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Optional
+
+from sqlalchemy import func, case, and_, extract
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.analytics import (
+    LearningBehaviorLog, LearningBehaviorHourly, LearningBehavior, RollupWatermark
+)
+
+ROLLUP_NAME = "learning_behavior_logs"
+# 归档高水位（见 behavior_log_archive）：之前的行为日志已不在数据库中
+ARCHIVE_NAME = "learning_behavior_logs.archive"
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _day_start(value: datetime) -> datetime:
+    return datetime.combine(value.date(), datetime.min.time())
+
+
+def _as_date(value: Any) -> date:
+    # MySQL返回date，SQLite返回字符串
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def read_watermark(db, name: str) -> Optional[datetime]:
+    return db.query(RollupWatermark.watermark).filter(RollupWatermark.name == name).scalar()
+
+
+def _answer_columns():
+    """答题数与答对数的聚合表达式（只统计带判题结果的 answer_question）
+
+    判题结果与题目id一样有两种位置：agent内部的行为在顶层，接口提交的行为在 data 中。
+    """
+    action_data = LearningBehaviorLog.action_data
+    is_correct = func.coalesce(
+        action_data["is_correct"].as_boolean(), action_data[("data", "is_correct")].as_boolean()
+    )
+    is_answer = and_(LearningBehaviorLog.action_type == "answer_question", is_correct.isnot(None))
+    return (
+        func.sum(case((is_answer, 1), else_=0)),
+        func.sum(case((and_(is_answer, is_correct == True), 1), else_=0))  # noqa: E712
+    )
+
+
+def query_raw_counts(db, student_id: int, since: datetime, until: Optional[datetime] = None) -> Counter:
+    """在原始表中按日、小时分组聚合行为日志（走 student_id+timestamp 索引），返回与特征哈希相同格式的计数"""
+    timestamp = LearningBehaviorLog.timestamp
+    day, hour = func.date(timestamp), extract("hour", timestamp)
+    answered, correct = _answer_columns()
+
+    query = db.query(
+        day, hour,
+        func.count(),
+        func.coalesce(func.sum(LearningBehaviorLog.session_duration), 0),
+        answered, correct
+    ).filter(
+        LearningBehaviorLog.student_id == student_id,
+        timestamp >= since
+    )
+    if until is not None:
+        query = query.filter(timestamp < until)
+
+    counts: Counter = Counter()
+    for bucket_day, bucket_hour, count, duration, answered_count, correct_count in query.group_by(day, hour).all():
+        _add_counts(counts, _as_date(bucket_day), int(bucket_hour), count, duration, answered_count, correct_count)
+    return counts
+
+
+def _add_counts(counts: Counter, day: date, hour: int, count, duration, answered, correct):
+    day_key = day.strftime("%Y%m%d")
+    counts[f"a:{day_key}:n"] += int(count)
+    counts[f"a:{day_key}:t"] += int(duration or 0)
+    counts[f"h:{day_key}:{hour:02d}"] += int(count)
+    if answered:
+        counts[f"a:{day_key}:q"] += int(answered)
+        counts[f"a:{day_key}:c"] += int(correct or 0)
+
+
+class BehaviorRollup:
+    """行为日志汇总
+
+    汇总任务（scripts/rollup_behavior_logs.py，由cron定期执行）从高水位开始，把已结束的整小时按
+    学生×小时×行为类型聚合到 learning_behavior_hourly，重算涉及日期的 learning_behaviors 日汇总，
+    然后推进高水位；每 chunk_hours 小时一个事务，重复执行结果相同。
+    高水位只推进到 now - lateness 之前的整点；写入更早时间戳的迟到事件（如spool重放）会回拨高水位，
+    由下一次汇总重算。读取时高水位之前查汇总表，之后（当前未完成的时段）查原始表。
+    """
+
+    def __init__(
+        self,
+        lateness: int = settings.AI_ROLLUP_LATENESS,
+        chunk_hours: int = settings.AI_ROLLUP_CHUNK_HOURS
+    ):
+        self.lateness = lateness
+        self.chunk_hours = chunk_hours
+
+        # 统计指标
+        self.runs = 0
+        self.hours_rolled = 0
+        self.hourly_rows_written = 0
+        self.daily_rows_written = 0
+        self.rewinds = 0
+        self.rollup_reads = 0
+        self.raw_reads = 0
+        self.last_run_ms = 0.0
+        self.last_watermark: Optional[datetime] = None
+
+    # ---- 高水位 ----
+
+    def get_watermark(self, db) -> Optional[datetime]:
+        """已汇总到的时间点，未汇总过时为None"""
+        watermark = read_watermark(db, ROLLUP_NAME)
+        if watermark is not None:
+            self.last_watermark = watermark
+        return watermark
+
+    def _lock_watermark(self, db) -> Optional[RollupWatermark]:
+        """锁定高水位行，首次执行时从最早的行为日志开始"""
+        mark = db.query(RollupWatermark).filter(RollupWatermark.name == ROLLUP_NAME).with_for_update().first()
+        if mark is None:
+            earliest = db.query(func.min(LearningBehaviorLog.timestamp)).scalar()
+            if earliest is None:
+                return None
+            mark = RollupWatermark(name=ROLLUP_NAME, watermark=_floor_hour(earliest))
+            db.add(mark)
+            db.flush()
+        return mark
+
+    def rewind(self, db, timestamp: datetime) -> bool:
+        """写入时间戳早于允许延迟的事件时，把高水位回拨到该事件所在整点（在写入事务中调用）"""
+        if timestamp >= datetime.now() - timedelta(seconds=self.lateness):
+            return False
+        updated = db.query(RollupWatermark).filter(
+            RollupWatermark.name == ROLLUP_NAME,
+            RollupWatermark.watermark > timestamp
+        ).update({"watermark": _floor_hour(timestamp)}, synchronize_session=False)
+        if updated:
+            self.rewinds += 1
+        return bool(updated)
+
+    # ---- 汇总任务 ----
+
+    def run(self, now: Optional[datetime] = None, max_chunks: int = 0) -> int:
+        """汇总到 now - lateness 之前的整点，返回汇总的小时数"""
+        target = _floor_hour((now or datetime.now()) - timedelta(seconds=self.lateness))
+        start_time = time.perf_counter()
+        rolled = chunks = 0
+
+        while not max_chunks or chunks < max_chunks:
+            with next(get_db()) as db:
+                mark = self._lock_watermark(db)
+                # 已归档时段的原始日志已删除，保留其汇总，不再重算
+                archived_until = read_watermark(db, ARCHIVE_NAME)
+                if mark is not None and archived_until is not None and mark.watermark < archived_until:
+                    mark.watermark = archived_until
+                if mark is None or mark.watermark >= target:
+                    self.last_watermark = mark.watermark if mark else None
+                    db.commit()
+                    break
+                start = mark.watermark
+                end = min(start + timedelta(hours=self.chunk_hours), target)
+
+                self._roll_hours(db, start, end)
+                self._rebuild_daily(db, _day_start(start), _day_start(end - timedelta(hours=1)) + timedelta(days=1))
+                mark.watermark = end
+                db.commit()
+                self.last_watermark = end
+
+            rolled += int((end - start).total_seconds() // 3600)
+            chunks += 1
+
+        self.runs += 1
+        self.hours_rolled += rolled
+        self.last_run_ms = (time.perf_counter() - start_time) * 1000
+        return rolled
+
+    def _roll_hours(self, db, start: datetime, end: datetime):
+        """重算 [start, end) 内各小时的汇总"""
+        timestamp = LearningBehaviorLog.timestamp
+        day, hour = func.date(timestamp), extract("hour", timestamp)
+        answered, correct = _answer_columns()
+
+        rows = db.query(
+            LearningBehaviorLog.student_id, LearningBehaviorLog.action_type, day, hour,
+            func.count(),
+            func.coalesce(func.sum(LearningBehaviorLog.session_duration), 0),
+            func.coalesce(func.max(LearningBehaviorLog.session_duration), 0),
+            answered, correct
+        ).filter(
+            timestamp >= start,
+            timestamp < end
+        ).group_by(LearningBehaviorLog.student_id, LearningBehaviorLog.action_type, day, hour).all()
+
+        db.query(LearningBehaviorHourly).filter(
+            LearningBehaviorHourly.hour >= start,
+            LearningBehaviorHourly.hour < end
+        ).delete(synchronize_session=False)
+        if rows:
+            db.execute(LearningBehaviorHourly.__table__.insert(), [
+                {
+                    "student_id": student_id,
+                    "action_type": action_type,
+                    "hour": datetime.combine(_as_date(bucket_day), datetime.min.time()) + timedelta(hours=int(bucket_hour)),
+                    "event_count": count,
+                    "duration_seconds": int(duration),
+                    "max_duration": int(max_duration),
+                    "answered_count": int(answered_count or 0),
+                    "correct_count": int(correct_count or 0)
+                }
+                for student_id, action_type, bucket_day, bucket_hour, count, duration, max_duration,
+                answered_count, correct_count in rows
+            ])
+        self.hourly_rows_written += len(rows)
+
+    def _rebuild_daily(self, db, start: datetime, end: datetime):
+        """由小时汇总重算 [start, end) 内各天的日汇总"""
+        hourly = LearningBehaviorHourly
+        day = func.date(hourly.hour)
+        rows = db.query(
+            hourly.student_id, day, hourly.action_type,
+            func.sum(hourly.event_count),
+            func.sum(hourly.duration_seconds),
+            func.max(hourly.max_duration),
+            func.sum(hourly.answered_count),
+            func.sum(hourly.correct_count)
+        ).filter(
+            hourly.hour >= start,
+            hourly.hour < end
+        ).group_by(hourly.student_id, day, hourly.action_type).all()
+
+        days: Dict[tuple, Dict[str, Any]] = {}
+        for student_id, bucket_day, action_type, count, duration, max_duration, answered, correct in rows:
+            totals = days.setdefault((student_id, _as_date(bucket_day)), {
+                "count": 0, "duration": 0, "max_duration": 0, "answered": 0, "correct": 0, "actions": Counter()
+            })
+            totals["count"] += int(count)
+            totals["duration"] += int(duration or 0)
+            totals["max_duration"] = max(totals["max_duration"], int(max_duration or 0))
+            totals["answered"] += int(answered or 0)
+            totals["correct"] += int(correct or 0)
+            totals["actions"][action_type] += int(count)
+
+        db.query(LearningBehavior).filter(
+            LearningBehavior.date >= start,
+            LearningBehavior.date < end
+        ).delete(synchronize_session=False)
+        if days:
+            db.execute(LearningBehavior.__table__.insert(), [
+                {
+                    "student_id": student_id,
+                    "date": datetime.combine(day_value, datetime.min.time()),
+                    "study_duration": round(totals["duration"] / 60),
+                    "resource_views": totals["actions"]["view_content"],
+                    "question_attempts": totals["actions"]["answer_question"],
+                    "correct_rate": totals["correct"] / totals["answered"] if totals["answered"] else None,
+                    "focus_duration": round(totals["max_duration"] / 60),  # 当天最长的一次学习
+                    "activity_type": totals["actions"].most_common(1)[0][0],
+                    "activity_count": totals["count"]
+                }
+                for (student_id, day_value), totals in days.items()
+            ])
+        self.daily_rows_written += len(days)
+
+    # ---- 汇总感知的查询 ----
+
+    def activity_counts(self, db, student_id: int, since: datetime) -> Counter:
+        """since（整点）之后的按日、小时计数：高水位之前读小时汇总，之后读原始表"""
+        watermark = self.get_watermark(db)
+        if watermark is None or watermark <= since:
+            self.raw_reads += 1
+            return query_raw_counts(db, student_id, since)
+
+        self.rollup_reads += 1
+        hourly = LearningBehaviorHourly
+        rows = db.query(
+            hourly.hour,
+            func.sum(hourly.event_count),
+            func.sum(hourly.duration_seconds),
+            func.sum(hourly.answered_count),
+            func.sum(hourly.correct_count)
+        ).filter(
+            hourly.student_id == student_id,
+            hourly.hour >= since,
+            hourly.hour < watermark
+        ).group_by(hourly.hour).all()
+
+        counts = query_raw_counts(db, student_id, watermark)
+        for bucket, count, duration, answered, correct in rows:
+            _add_counts(counts, bucket.date(), bucket.hour, count, duration, answered, correct)
+        return counts
+
+    def behavior_profile(self, db, student_id: int, since: datetime) -> Dict[str, Any]:
+        """since（零点）之后的每日行为数、各小时行为数和各行为类型次数
+
+        已完整汇总的日期读日汇总，高水位所在日期读小时汇总，高水位之后读原始表。
+        """
+        daily: Counter = Counter()
+        hours: Counter = Counter()
+        actions: Counter = Counter()
+
+        watermark = self.get_watermark(db)
+        raw_since = since
+        if watermark is not None and watermark > since:
+            self.rollup_reads += 1
+            raw_since = watermark
+            complete_until = max(since, _day_start(watermark))
+
+            for day_value, count in db.query(LearningBehavior.date, LearningBehavior.activity_count).filter(
+                LearningBehavior.student_id == student_id,
+                LearningBehavior.date >= since,
+                LearningBehavior.date < complete_until
+            ).all():
+                daily[day_value.date()] += count or 0
+
+            hourly = LearningBehaviorHourly
+            hour_of_day = extract("hour", hourly.hour)
+            for bucket, count in db.query(hourly.hour, func.sum(hourly.event_count)).filter(
+                hourly.student_id == student_id,
+                hourly.hour >= complete_until,
+                hourly.hour < watermark
+            ).group_by(hourly.hour).all():
+                daily[bucket.date()] += int(count)
+
+            for bucket_hour, action_type, count in db.query(
+                hour_of_day, hourly.action_type, func.sum(hourly.event_count)
+            ).filter(
+                hourly.student_id == student_id,
+                hourly.hour >= since,
+                hourly.hour < watermark
+            ).group_by(hour_of_day, hourly.action_type).all():
+                hours[int(bucket_hour)] += int(count)
+                actions[action_type] += int(count)
+        else:
+            self.raw_reads += 1
+
+        timestamp = LearningBehaviorLog.timestamp
+        day, hour = func.date(timestamp), extract("hour", timestamp)
+        for bucket_day, bucket_hour, action_type, count in db.query(
+            day, hour, LearningBehaviorLog.action_type, func.count()
+        ).filter(
+            LearningBehaviorLog.student_id == student_id,
+            timestamp >= raw_since
+        ).group_by(day, hour, LearningBehaviorLog.action_type).all():
+            daily[_as_date(bucket_day)] += count
+            hours[int(bucket_hour)] += count
+            actions[action_type] += count
+
+        return {
+            "daily": dict(daily),
+            "hours": hours,
+            "actions": actions,
+            "total": sum(actions.values())
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """汇总统计"""
+        lag = (datetime.now() - self.last_watermark).total_seconds() if self.last_watermark else None
+        return {
+            "last_watermark": self.last_watermark.isoformat() if self.last_watermark else None,
+            "watermark_lag_seconds": round(lag) if lag is not None else None,
+            "runs": self.runs,
+            "hours_rolled": self.hours_rolled,
+            "hourly_rows_written": self.hourly_rows_written,
+            "daily_rows_written": self.daily_rows_written,
+            "rewinds": self.rewinds,
+            "rollup_reads": self.rollup_reads,
+            "raw_reads": self.raw_reads,
+            "last_run_ms": round(self.last_run_ms, 2)
+        }
+
+
+# 全局行为日志汇总实例
+behavior_rollup = BehaviorRollup()
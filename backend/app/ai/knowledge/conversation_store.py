@@ -0,0 +1,280 @@
+# backend/app/ai/knowledge/conversation_store.py
+"""
+对话记忆存储：保留最近若干轮原文，更早的对话压缩为滚动摘要
+"""
+import re
+import json
+import time
+import uuid
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from app.core.config import settings
+from app.utils.cache import redis_client
+
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]+[。！？!?；;]?")
+_GRAM_PATTERN = re.compile(r"[\u4e00-\u9fff]+|[A-Za-z0-9]+")
+
+# 列表头部仍是已摘要的消息时才写入摘要并移除这些消息，返回1；否则（已被其他worker处理）返回0
+_COMMIT_SCRIPT = """
+local count = #ARGV - 2
+local head = redis.call('LRANGE', KEYS[1], 0, count - 1)
+if #head ~= count then
+    return 0
+end
+for i = 1, count do
+    if head[i] ~= ARGV[i + 2] then
+        return 0
+    end
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[1])
+redis.call('LTRIM', KEYS[1], count, -1)
+return 1
+"""
+
+
+class ExtractiveSummarizer:
+    """本地抽取式摘要：按与整体内容的中心相似度挑选句子，保持原有顺序"""
+
+    def __init__(self, max_chars: int = settings.AI_CONVERSATION_SUMMARY_MAX_CHARS):
+        self.max_chars = max_chars
+
+    @staticmethod
+    def _grams(text: str) -> Counter:
+        grams = Counter()
+        for run in _GRAM_PATTERN.findall(text.lower()):
+            if run.isascii() or len(run) == 1:
+                grams[run] += 1
+            else:
+                grams.update(run[i:i + 2] for i in range(len(run) - 1))
+        return grams
+
+    def summarize(self, previous_summary: str, turns: List[Dict[str, Any]]) -> str:
+        """合并已有摘要与新移出的对话，输出不超过 max_chars 的摘要"""
+        sentences, seen = [], set()
+        for sentence in _SENTENCE_PATTERN.findall(previous_summary or ""):
+            if sentence.strip() and sentence.strip() not in seen:
+                seen.add(sentence.strip())
+                sentences.append(sentence.strip())
+        for turn in turns:
+            speaker = "学生" if turn.get("role") == "user" else "AI"
+            for sentence in _SENTENCE_PATTERN.findall(turn.get("content", "")):
+                sentence = f"{speaker}: {sentence.strip()}"
+                # 重复的套话只保留一次
+                if len(sentence) >= 8 and sentence not in seen:
+                    seen.add(sentence)
+                    sentences.append(sentence)
+
+        if not sentences:
+            return previous_summary or ""
+
+        grams = [self._grams(sentence) for sentence in sentences]
+        centroid = Counter()
+        for sentence_grams in grams:
+            centroid.update(sentence_grams.keys())
+
+        scored = []
+        for index, sentence_grams in enumerate(grams):
+            total = sum(sentence_grams.values()) or 1
+            score = sum(centroid[gram] * count for gram, count in sentence_grams.items()) / total
+            # 学生的提问和越新的内容略微优先
+            if sentences[index].startswith("学生"):
+                score *= 1.3
+            scored.append((score * (1 + 0.5 * index / len(sentences)), index))
+
+        chosen, used = [], 0
+        for _, index in sorted(scored, reverse=True):
+            length = len(sentences[index])
+            if used + length > self.max_chars:
+                continue
+            chosen.append(index)
+            used += length
+
+        return "".join(
+            sentences[i] if sentences[i][-1] in "。！？!?；;" else sentences[i] + "。"
+            for i in sorted(chosen)
+        )
+
+
+class ConversationStore:
+    """按用户存储的对话记忆（Redis）
+
+    新消息追加到列表尾部；超过保留轮数后由后台任务把最旧的若干轮并入摘要并从列表移除，
+    因此每次构建提示词的对话部分大小有上限。多worker下同一用户同时只有一个摘要任务（Redis锁），
+    写回时再由脚本确认列表头部仍是本次摘要的消息，锁过期后重复的任务不会多删未摘要的消息。
+    """
+
+    def __init__(
+        self,
+        keep_turns: int = settings.AI_CONVERSATION_KEEP_TURNS,
+        summarize_batch: int = 4,
+        turn_max_chars: int = settings.AI_CONVERSATION_TURN_MAX_CHARS,
+        ttl: int = settings.AI_CONVERSATION_TTL,
+        summarizer: str = settings.AI_CONVERSATION_SUMMARIZER,
+        enabled: bool = settings.AI_CONVERSATION_STORE_ENABLED,
+        lock_ttl: int = 120
+    ):
+        self.keep_turns = keep_turns
+        self.summarize_batch = summarize_batch
+        self.turn_max_chars = turn_max_chars
+        self.ttl = ttl
+        self.summarizer = summarizer
+        self.enabled = enabled
+        self.lock_ttl = lock_ttl
+        self.extractive = ExtractiveSummarizer()
+        self._llm_client = None
+        self._summarizing: Dict[int, asyncio.Task] = {}
+        self._commit_script = redis_client.register_script(_COMMIT_SCRIPT)
+
+        # 统计指标
+        self.summaries = 0
+        self.turns_summarized = 0
+        self.summary_time_ms = 0.0
+        self.llm_fallbacks = 0
+        self.lock_contended = 0
+        self.stale_commits = 0
+
+    def _turns_key(self, user_id: int) -> str:
+        return f"conv:{user_id}:turns"
+
+    def _summary_key(self, user_id: int) -> str:
+        return f"conv:{user_id}:summary"
+
+    def _lock_key(self, user_id: int) -> str:
+        return f"conv:{user_id}:summarizing"
+
+    async def get_memory(self, user_id: int) -> Dict[str, Any]:
+        """获取用于构建提示词的记忆：滚动摘要 + 最近若干轮原文"""
+        try:
+            raw_turns = redis_client.lrange(self._turns_key(user_id), -self.keep_turns, -1)
+            summary = redis_client.get(self._summary_key(user_id)) or ""
+        except Exception as e:
+            print(f"Conversation store read error: {e}")
+            return {"summary": "", "turns": []}
+
+        return {"summary": summary, "turns": [json.loads(turn) for turn in raw_turns]}
+
+    async def append_exchange(self, user_id: int, message: str, response: str):
+        """追加一轮问答，必要时在后台触发摘要"""
+        now = datetime.now().isoformat()
+        turns = [
+            {"role": "user", "content": message[:self.turn_max_chars], "timestamp": now},
+            {"role": "assistant", "content": response[:self.turn_max_chars], "timestamp": now}
+        ]
+
+        key = self._turns_key(user_id)
+        try:
+            pipe = redis_client.pipeline()
+            pipe.rpush(key, *[json.dumps(turn, ensure_ascii=False) for turn in turns])
+            pipe.expire(key, self.ttl)
+            pipe.expire(self._summary_key(user_id), self.ttl)
+            length = pipe.execute()[0]
+        except Exception as e:
+            print(f"Conversation store write error: {e}")
+            return
+
+        if length > self.keep_turns + self.summarize_batch and user_id not in self._summarizing:
+            task = asyncio.create_task(self._summarize(user_id))
+            self._summarizing[user_id] = task
+            task.add_done_callback(lambda _: self._summarizing.pop(user_id, None))
+
+    async def _summarize(self, user_id: int):
+        """把超出保留范围的旧对话并入摘要"""
+        start_time = time.perf_counter()
+        key = self._turns_key(user_id)
+        lock_key = self._lock_key(user_id)
+        token = uuid.uuid4().hex
+        try:
+            if not redis_client.set(lock_key, token, nx=True, ex=self.lock_ttl):
+                # 其他worker正在摘要该用户的对话
+                self.lock_contended += 1
+                return
+
+            raw_turns = redis_client.lrange(key, 0, -(self.keep_turns + 1))
+            if not raw_turns:
+                return
+            previous = redis_client.get(self._summary_key(user_id)) or ""
+            older = [json.loads(turn) for turn in raw_turns]
+
+            summary = await self._make_summary(previous, older)
+
+            # 只移除已摘要的部分，期间新追加的消息在尾部不受影响
+            committed = self._commit_script(
+                keys=[key, self._summary_key(user_id)],
+                args=[self.ttl, summary, *raw_turns]
+            )
+            if not committed:
+                self.stale_commits += 1
+                return
+        except Exception as e:
+            print(f"Conversation summarization failed: {e}")
+            return
+        finally:
+            try:
+                if redis_client.get(lock_key) == token:
+                    redis_client.delete(lock_key)
+            except Exception:
+                pass
+
+        self.summaries += 1
+        self.turns_summarized += len(raw_turns)
+        self.summary_time_ms += (time.perf_counter() - start_time) * 1000
+
+    async def _make_summary(self, previous: str, turns: List[Dict[str, Any]]) -> str:
+        if self.summarizer != "llm":
+            return self.extractive.summarize(previous, turns)
+
+        from app.ai.engines.llm_client import LLMClient, FALLBACK_RESPONSE
+        from app.ai.engines.llm_scheduler import Priority
+
+        if self._llm_client is None:
+            self._llm_client = LLMClient()
+            self._llm_client.model = settings.AI_CONVERSATION_SUMMARY_MODEL
+            self._llm_client.max_tokens = self.extractive.max_chars
+
+        dialogue = "\n".join(
+            f"{'学生' if turn['role'] == 'user' else 'AI'}: {turn['content']}" for turn in turns
+        )
+        prompt = f"""
+        已有摘要：{previous or '无'}
+
+        新增对话：
+        {dialogue}
+
+        请把已有摘要和新增对话合并为一段不超过{self.extractive.max_chars}字的摘要，
+        保留学生的问题、已讲解的知识点和尚未解决的疑问，只输出摘要本身。
+        """
+        summary = await self._llm_client.generate(
+            prompt, temperature=0, priority=Priority.BACKGROUND, task="conversation_summary"
+        )
+        if summary == FALLBACK_RESPONSE:
+            self.llm_fallbacks += 1
+            return self.extractive.summarize(previous, turns)
+        return summary.strip()[:self.extractive.max_chars]
+
+    async def clear(self, user_id: int):
+        """清除用户的对话记忆"""
+        try:
+            redis_client.delete(self._turns_key(user_id), self._summary_key(user_id))
+        except Exception as e:
+            print(f"Conversation store clear error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """对话记忆统计"""
+        return {
+            "enabled": self.enabled,
+            "summarizer": self.summarizer,
+            "summaries": self.summaries,
+            "turns_summarized": self.turns_summarized,
+            "avg_summary_ms": round(self.summary_time_ms / self.summaries, 2) if self.summaries else 0.0,
+            "llm_fallbacks": self.llm_fallbacks,
+            "lock_contended": self.lock_contended,
+            "stale_commits": self.stale_commits,
+            "summarizing": len(self._summarizing)
+        }
+
+
+# 全局对话记忆实例
+conversation_store = ConversationStore()
@@ -2,6 +2,7 @@
 """
 中央知识库
 """
+import asyncio
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
@@ -10,6 +11,10 @@ from app.core.database import get_db
 from app.models.analytics import LearningBehaviorLog, StudentProfile
 from app.models.user import User
 from app.models.education import Class
+from app.ai.knowledge.behavior_log_buffer import behavior_log_buffer
+from app.ai.knowledge.student_feature_store import student_feature_store
+from app.ai.knowledge.behavior_log_archive import behavior_log_archive
+from app.ai.knowledge.question_usage_store import question_usage_store
 
 
 class CentralKnowledgeBase:
@@ -61,18 +66,10 @@ class CentralKnowledgeBase:
             return await self.get_user_profile(user_id)
     
     async def update_behavior_log(self, user_id: int, action: Dict[str, Any]):
-        """更新用户行为日志"""
-        with next(get_db()) as db:
-            behavior_log = LearningBehaviorLog(
-                student_id=user_id,
-                action_type=action.get('type', 'unknown'),
-                action_data=action,
-                session_duration=action.get('duration', 0),
-                timestamp=datetime.now()
-            )
-            
-            db.add(behavior_log)
-            db.commit()
+        """更新用户行为日志（写入缓冲区，由后台批量落库），同时累加学生特征和题目使用次数"""
+        if await behavior_log_buffer.put(user_id, action):
+            student_feature_store.record_activity(user_id, action)
+            question_usage_store.record_action(action)
     
     async def get_recent_activities(self, user_id: int, hours: int = 24) -> List[Dict[str, Any]]:
         """获取最近活动记录"""
@@ -95,6 +92,17 @@ class CentralKnowledgeBase:
                 for activity in activities
             ]
     
+    async def get_activity_history(
+        self,
+        user_id: int,
+        start: datetime,
+        end: datetime,
+        action_types: Optional[List[str]] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """获取任意时间段的活动记录（按时间升序，指定 limit 时为最近的 limit 条），已归档的月份从归档文件读取"""
+        return await asyncio.to_thread(behavior_log_archive.query, user_id, start, end, action_types, limit)
+    
     async def log_agent_activity(
         self, 
         user_id: int, 
@@ -111,53 +119,26 @@ class CentralKnowledgeBase:
             "timestamp": timestamp.isoformat()
         })
     
-    async def get_learning_stats(self, user_id: int) -> Dict[str, Any]:
-        """获取学习统计数据"""
-        activities = await self.get_recent_activities(user_id, hours=24*7)  # 最近一周
+    async def get_learning_stats(self, user_id: int, days: int = 7) -> Dict[str, Any]:
+        """获取学习统计数据（最近 days 天，7天内读预计算特征，更长窗口读行为日志的小时汇总）"""
+        activity = await asyncio.to_thread(student_feature_store.activity_summary, user_id, days)
         
-        if not activities:
+        if not activity["count"]:
             return {
                 "total_time": 0,
                 "session_count": 0,
                 "avg_session_duration": 0,
                 "most_active_hour": None,
-                "learning_consistency": 0
+                "learning_consistency": 0,
+                "daily_activity": activity["daily"]
             }
         
-        total_time = sum(activity.get('session_duration', 0) for activity in activities)
-        session_count = len(activities)
-        avg_duration = total_time / session_count if session_count > 0 else 0
-        
         return {
-            "total_time": total_time,
-            "session_count": session_count,
-            "avg_session_duration": avg_duration,
-            "most_active_hour": self._calculate_most_active_hour(activities),
-            "learning_consistency": self._calculate_consistency_score(activities)
-        }
-    
-    def _calculate_most_active_hour(self, activities: List[Dict]) -> int:
-        """计算最活跃的小时"""
-        hour_counts = {}
-        for activity in activities:
-            if 'timestamp' in activity:
-                hour = datetime.fromisoformat(activity['timestamp']).hour
-                hour_counts[hour] = hour_counts.get(hour, 0) + 1
-        
-        return max(hour_counts, key=hour_counts.get) if hour_counts else None
-    
-    def _calculate_consistency_score(self, activities: List[Dict]) -> float:
-        """计算学习一致性分数"""
-        if len(activities) < 2:
-            return 0.0
-        
-        # 简单的一致性计算：基于活动分布的均匀程度
-        days = set()
-        for activity in activities:
-            if 'timestamp' in activity:
-                day = datetime.fromisoformat(activity['timestamp']).date()
-                days.add(day)
-        
-        # 一周内的天数比例
-        consistency = len(days) / 7.0
-        return min(consistency, 1.0)
\ No newline at end of file
+            "total_time": activity["total_time"],
+            "session_count": activity["count"],
+            "avg_session_duration": activity["avg_session_duration"],
+            "most_active_hour": activity["most_active_hour"],
+            # 窗口内有学习的天数比例
+            "learning_consistency": activity["active_days"] / days if activity["count"] >= 2 else 0.0,
+            "daily_activity": activity["daily"]
+        }
\ No newline at end of file
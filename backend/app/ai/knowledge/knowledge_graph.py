@@ -0,0 +1,316 @@
+# backend/app/ai/knowledge/knowledge_graph.py
+"""
+知识点图谱：章节树与知识点树合并为一片森林，按教材顺序编号，支持前置关系判断和子树查询
+"""
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.utils.cache import redis_client
+from app.models.question import Chapter, KnowledgePoint
+
+VERSION_KEY = "knowledge:graph:version"
+PREREQUISITE_SATURATION = 20  # 以其为前置的知识点达到该数量时依赖紧急度为1
+
+
+class _Graph:
+    """一次构建的结果
+
+    节点编号：章节在前、知识点在后。parent 为父节点（-1 为根），
+    pre 为按教材顺序（displayorder）先序遍历的位置，order 为其逆映射，size 为子树大小：
+    a 是 b 的祖先 <=> pre[a] < pre[b] < pre[a] + size[a]，子树即 order 中的一段连续区间。
+    """
+
+    def __init__(self, chapter_ids: List[str], knowledge_ids: List[str], parent: np.ndarray, displayorder: np.ndarray):
+        self.chapter_count = len(chapter_ids)
+        self.knowledge_ids = knowledge_ids
+        self.chapter_index = {chapter_id: i for i, chapter_id in enumerate(chapter_ids)}
+        self.knowledge_index = {knowledge_id: self.chapter_count + i for i, knowledge_id in enumerate(knowledge_ids)}
+
+        count = len(parent)
+        # 子节点邻接数组（CSR），同一父节点下按 displayorder 排序
+        by_parent = np.lexsort((np.arange(count), displayorder, parent))
+        child_parents = parent[by_parent]
+        first_child = np.searchsorted(child_parents, np.arange(-1, count + 1))
+        self.child_offsets = first_child.astype(np.int32)  # child_offsets[p+1]..child_offsets[p+2] 为 p 的子节点
+        self.children = by_parent.astype(np.int32)
+
+        self.parent = parent.astype(np.int32)
+        self.pre = np.full(count, -1, dtype=np.int32)
+        self.size = np.ones(count, dtype=np.int32)
+        self.depth = np.zeros(count, dtype=np.int16)
+        self.order = np.empty(count, dtype=np.int32)
+        self._number()
+
+        # 子树中的知识点数：按先序位置的前缀和
+        is_knowledge = (self.order >= self.chapter_count).astype(np.int32)
+        self.knowledge_prefix = np.concatenate([[0], np.cumsum(is_knowledge)]).astype(np.int32)
+
+    def _children_of(self, node: int) -> np.ndarray:
+        return self.children[self.child_offsets[node + 1]:self.child_offsets[node + 2]]
+
+    def _number(self):
+        position = 0
+        roots = list(self._children_of(-1))
+        visited = np.zeros(len(self.parent), dtype=bool)
+        while True:
+            for root in roots:
+                if visited[root]:
+                    continue
+                # 迭代先序遍历，出栈时得到子树大小
+                stack = [(int(root), False)]
+                while stack:
+                    node, done = stack.pop()
+                    if done:
+                        self.size[node] = position - self.pre[node]
+                        continue
+                    if visited[node]:
+                        continue
+                    visited[node] = True
+                    self.pre[node] = position
+                    self.order[position] = node
+                    position += 1
+                    stack.append((node, True))
+                    for child in reversed(self._children_of(node)):
+                        if not visited[child]:
+                            self.depth[child] = self.depth[node] + 1
+                            stack.append((int(child), False))
+            # 成环的节点从根不可达：断开其父节点后作为根继续编号
+            remaining = np.flatnonzero(~visited)
+            if not len(remaining):
+                break
+            self.parent[remaining[0]] = -1
+            self.depth[remaining[0]] = 0
+            roots = [remaining[0]]
+
+    def is_ancestor(self, ancestor: int, node: int) -> bool:
+        return self.pre[ancestor] < self.pre[node] < self.pre[ancestor] + self.size[ancestor]
+
+    def knowledge_in_subtree(self, node: int, include_self: bool = True) -> List[str]:
+        start = int(self.pre[node]) + (0 if include_self else 1)
+        nodes = self.order[start:self.pre[node] + self.size[node]]
+        return [self.knowledge_ids[i - self.chapter_count] for i in nodes[nodes >= self.chapter_count]]
+
+    def knowledge_descendants(self, node: int) -> int:
+        start = self.pre[node]
+        return int(self.knowledge_prefix[start + self.size[node]] - self.knowledge_prefix[start + 1])
+
+
+class KnowledgeGraph:
+    """知识点图谱
+
+    知识点按 upid 挂在上级知识点下，顶层知识点挂在所属章节（chapter_id）下，章节按 upid 组成树。
+    上级知识点视为下级知识点的前置知识点；教材顺序即先序遍历顺序，作为学习路径的拓扑序。
+    重新加载在后台线程进行：比对加载到的树结构，没有变化时保留现有图谱；
+    导入知识点或章节后调用 invalidate()，各进程在 check_interval 秒内重新加载。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.AI_KNOWLEDGE_GRAPH_ENABLED,
+        check_interval: int = settings.AI_KNOWLEDGE_GRAPH_CHECK_INTERVAL,
+        refresh_interval: int = settings.AI_KNOWLEDGE_GRAPH_REFRESH_INTERVAL
+    ):
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self.refresh_interval = refresh_interval
+
+        self._graph: Optional[_Graph] = None
+        self._fingerprint: Optional[int] = None
+        self._version: Optional[str] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reloading = False
+
+        # 统计指标
+        self.builds = 0
+        self.unchanged_reloads = 0
+        self.last_build_ms = 0.0
+        self.lookups = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _read_version(self) -> Optional[str]:
+        try:
+            return redis_client.get(VERSION_KEY)
+        except Exception as e:
+            print(f"Knowledge graph version check failed: {e}")
+            self.errors += 1
+            return self._version
+
+    def load(self) -> int:
+        """加载章节和知识点树，结构有变化时重建图谱，返回知识点数"""
+        start = time.perf_counter()
+        version = self._read_version()
+        with next(get_db()) as db:
+            chapters = db.query(Chapter.id, Chapter.upid, Chapter.displayorder).order_by(Chapter.id).all()
+            knowledge_points = db.query(
+                KnowledgePoint.id, KnowledgePoint.upid, KnowledgePoint.chapter_id, KnowledgePoint.displayorder
+            ).order_by(KnowledgePoint.id).all()
+
+        fingerprint = hash((tuple(map(tuple, chapters)), tuple(map(tuple, knowledge_points))))
+        if fingerprint == self._fingerprint:
+            self.unchanged_reloads += 1
+        else:
+            graph = self._build(chapters, knowledge_points)
+            with self._lock:
+                self._graph = graph
+                self._fingerprint = fingerprint
+            self.builds += 1
+            self.last_build_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        self._version = version
+        self._loaded_at = time.monotonic()
+        self._checked_at = self._loaded_at
+        return len(self._graph.knowledge_ids)
+
+    @staticmethod
+    def _build(chapters, knowledge_points) -> _Graph:
+        chapter_ids = [row.id for row in chapters]
+        knowledge_ids = [row.id for row in knowledge_points]
+        chapter_index = {chapter_id: i for i, chapter_id in enumerate(chapter_ids)}
+        knowledge_index = {knowledge_id: len(chapter_ids) + i for i, knowledge_id in enumerate(knowledge_ids)}
+
+        parent = np.full(len(chapter_ids) + len(knowledge_ids), -1, dtype=np.int64)
+        displayorder = np.zeros(len(parent), dtype=np.int64)
+        for i, row in enumerate(chapters):
+            parent[i] = chapter_index.get(row.upid, -1)
+            displayorder[i] = row.displayorder or 0
+        for i, row in enumerate(knowledge_points, start=len(chapter_ids)):
+            parent[i] = knowledge_index.get(row.upid, chapter_index.get(row.chapter_id, -1))
+            displayorder[i] = row.displayorder or 0
+        parent[parent == np.arange(len(parent))] = -1
+        return _Graph(chapter_ids, knowledge_ids, parent, displayorder)
+
+    def _reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"Knowledge graph reload failed: {e}")
+            self.errors += 1
+        finally:
+            self._reloading = False
+
+    def reload_async(self):
+        """在后台线程重新加载（已有加载在进行时忽略）"""
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, name="knowledge-graph-reload", daemon=True).start()
+
+    def invalidate(self):
+        """知识点或章节变化后调用：递增全局版本号，各进程随后重新加载"""
+        try:
+            redis_client.incr(VERSION_KEY)
+        except Exception as e:
+            print(f"Knowledge graph version bump failed: {e}")
+            self.errors += 1
+        if self._graph is not None and self.enabled:
+            self.reload_async()
+
+    def _current(self) -> Optional[_Graph]:
+        if not self.enabled:
+            return None
+        self.lookups += 1
+        if self._graph is None:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if self._read_version() != self._version or now - self._loaded_at > self.refresh_interval:
+                self.reload_async()
+        return self._graph
+
+    # ---- 查询 ----
+
+    def is_prerequisite(self, prerequisite_id: str, knowledge_point_id: str) -> bool:
+        """prerequisite_id 是否为 knowledge_point_id 的前置（上级）知识点"""
+        graph = self._current()
+        if graph is None:
+            return False
+        ancestor = graph.knowledge_index.get(prerequisite_id)
+        node = graph.knowledge_index.get(knowledge_point_id)
+        return ancestor is not None and node is not None and graph.is_ancestor(ancestor, node)
+
+    def prerequisites(self, knowledge_point_id: str) -> List[str]:
+        """所有前置知识点，由近及远"""
+        graph = self._current()
+        node = graph.knowledge_index.get(knowledge_point_id) if graph else None
+        if node is None:
+            return []
+        result = []
+        node = graph.parent[node]
+        while node >= graph.chapter_count:
+            result.append(graph.knowledge_ids[node - graph.chapter_count])
+            node = graph.parent[node]
+        return result
+
+    def subtree(self, knowledge_point_id: str, include_self: bool = True) -> List[str]:
+        """知识点及其所有下级知识点（教材顺序）"""
+        graph = self._current()
+        node = graph.knowledge_index.get(knowledge_point_id) if graph else None
+        return graph.knowledge_in_subtree(node, include_self) if node is not None else []
+
+    def chapter_knowledge_points(self, chapter_id: str) -> List[str]:
+        """章节（含下级章节）下的所有知识点（教材顺序）"""
+        graph = self._current()
+        node = graph.chapter_index.get(chapter_id) if graph else None
+        return graph.knowledge_in_subtree(node) if node is not None else []
+
+    def depth(self, knowledge_point_id: str) -> Optional[int]:
+        """知识点在章节树与知识点树中的深度"""
+        graph = self._current()
+        node = graph.knowledge_index.get(knowledge_point_id) if graph else None
+        return int(graph.depth[node]) if node is not None else None
+
+    def dependent_count(self, knowledge_point_id: str) -> int:
+        """以该知识点为前置的知识点数"""
+        graph = self._current()
+        node = graph.knowledge_index.get(knowledge_point_id) if graph else None
+        return graph.knowledge_descendants(node) if node is not None else 0
+
+    def dependency_weight(self, knowledge_point_id: str) -> Optional[float]:
+        """依赖紧急度：没有下级的知识点0.5，作为前置的知识点越多越接近1；不在图谱中为 None"""
+        graph = self._current()
+        node = graph.knowledge_index.get(knowledge_point_id) if graph else None
+        if node is None:
+            return None
+        dependents = graph.knowledge_descendants(node)
+        return 0.5 + 0.5 * min(np.log1p(dependents) / np.log1p(PREREQUISITE_SATURATION), 1.0)
+
+    def topological_sort(self, knowledge_point_ids: List[str]) -> List[str]:
+        """按教材顺序排序（前置知识点在前），不在图谱中的保持原顺序排在最后"""
+        graph = self._current()
+        if graph is None:
+            return list(knowledge_point_ids)
+        known = [i for i in knowledge_point_ids if i in graph.knowledge_index]
+        unknown = [i for i in knowledge_point_ids if i not in graph.knowledge_index]
+        return sorted(known, key=lambda i: graph.pre[graph.knowledge_index[i]]) + unknown
+
+    def stats(self) -> Dict[str, Any]:
+        """知识点图谱统计"""
+        graph = self._graph
+        return {
+            "enabled": self.enabled,
+            "ready": graph is not None,
+            "knowledge_points": len(graph.knowledge_ids) if graph else 0,
+            "chapters": graph.chapter_count if graph else 0,
+            "max_depth": int(graph.depth.max()) if graph and len(graph.depth) else 0,
+            "builds": self.builds,
+            "unchanged_reloads": self.unchanged_reloads,
+            "last_build_ms": self.last_build_ms,
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "errors": self.errors
+        }
+
+
+# 全局知识点图谱实例
+knowledge_graph = KnowledgeGraph()
@@ -0,0 +1,284 @@
+# backend/app/ai/knowledge/question_index.py
+"""
+题目倒排索引：知识点 -> 各难度等级下有序的题目id数组，每个工作进程在内存中持有一份
+"""
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.utils.cache import redis_client
+from app.models.question import Question, QuestionKnowledge, DifficultyLevel
+
+VERSION_KEY = "question:index:version"
+
+
+class _Snapshot:
+    """一次构建的结果；题目属性按题目id下标存放（0 表示不在索引中）"""
+
+    def __init__(self, by_knowledge, level, subject, save_num, knowledge_count, difficulty_levels):
+        self.by_knowledge: Dict[str, Dict[int, np.ndarray]] = by_knowledge
+        self.level: np.ndarray = level
+        self.subject: np.ndarray = subject
+        self.save_num: np.ndarray = save_num
+        self.knowledge_count: np.ndarray = knowledge_count
+        self.difficulty_levels: Dict[int, int] = difficulty_levels
+
+
+def _grow(values: np.ndarray, size: int) -> np.ndarray:
+    grown = np.zeros(max(size, len(values) * 3 // 2), dtype=values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+
+class QuestionIndex:
+    """题目倒排索引
+
+    启动时从 question_knowledge 全量构建（仅启用的题目），候选题生成不再查询数据库。
+    本进程创建题目时增量加入；题目被修改或删除时递增Redis中的全局版本号，
+    各进程每 check_interval 秒比对一次版本，不一致或超过 refresh_interval 时在后台线程重建，
+    重建完成前继续使用旧索引。索引未就绪时返回 None，由调用方回落到数据库查询。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.AI_QUESTION_INDEX_ENABLED,
+        check_interval: int = settings.AI_QUESTION_INDEX_CHECK_INTERVAL,
+        refresh_interval: int = settings.AI_QUESTION_INDEX_REFRESH_INTERVAL
+    ):
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self.refresh_interval = refresh_interval
+
+        self._snapshot: Optional[_Snapshot] = None
+        self._version: Optional[str] = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+        # 统计指标
+        self.builds = 0
+        self.last_build_ms = 0.0
+        self.lookups = 0
+        self.misses = 0
+        self.added = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def _read_version(self) -> Optional[str]:
+        try:
+            return redis_client.get(VERSION_KEY)
+        except Exception as e:
+            print(f"Question index version check failed: {e}")
+            self.errors += 1
+            return self._version
+
+    def build(self) -> int:
+        """全量构建并替换当前索引，返回题目数"""
+        start = time.perf_counter()
+        # 先读版本号：构建期间发生的修改会在下次检查时再触发一次重建
+        version = self._read_version()
+        with next(get_db()) as db:
+            difficulty_levels = {row.id: row.level for row in db.query(DifficultyLevel.id, DifficultyLevel.level).all()}
+            rows = db.query(
+                QuestionKnowledge.knowledge_id, Question.id, DifficultyLevel.level, Question.subject_id, Question.save_num
+            ).join(
+                Question, Question.id == QuestionKnowledge.question_id
+            ).join(
+                DifficultyLevel, DifficultyLevel.id == Question.difficulty_id
+            ).filter(Question.status == 1).all()
+
+        snapshot = self._build_snapshot(rows, difficulty_levels)
+        with self._lock:
+            self._snapshot = snapshot
+            self._version = version
+            self._built_at = time.monotonic()
+            self._checked_at = self._built_at
+        self.builds += 1
+        self.last_build_ms = round((time.perf_counter() - start) * 1000, 1)
+        return int(np.count_nonzero(snapshot.level))
+
+    @staticmethod
+    def _build_snapshot(rows, difficulty_levels: Dict[int, int]) -> _Snapshot:
+        if not rows:
+            empty = np.zeros(1, dtype=np.int8)
+            return _Snapshot({}, empty, empty.astype(np.int32), empty.astype(np.int32), empty.astype(np.int16), difficulty_levels)
+
+        knowledge_ids, question_ids, levels, subjects, saves = zip(*rows)
+        question_ids = np.array(question_ids, dtype=np.int64)
+        levels = np.array(levels, dtype=np.int8)
+        knowledges, knowledge_codes = np.unique(np.array(knowledge_ids, dtype=object), return_inverse=True)
+
+        # 去掉重复的关联后按 (知识点, 难度, 题目id) 排序，再按 (知识点, 难度) 切分
+        edges = np.unique(np.stack([knowledge_codes, levels.astype(np.int64), question_ids], axis=1), axis=0)
+        groups = np.flatnonzero(np.any(np.diff(edges[:, :2], axis=0) != 0, axis=1)) + 1
+        by_knowledge: Dict[str, Dict[int, np.ndarray]] = {}
+        for start, end in zip(np.r_[0, groups], np.r_[groups, len(edges)]):
+            code, level = edges[start, 0], edges[start, 1]
+            by_knowledge.setdefault(knowledges[code], {})[int(level)] = edges[start:end, 2].copy()
+
+        size = int(question_ids.max()) + 1
+        level = np.zeros(size, dtype=np.int8)
+        subject = np.zeros(size, dtype=np.int32)
+        save_num = np.zeros(size, dtype=np.int32)
+        level[question_ids] = levels
+        subject[question_ids] = np.array(subjects, dtype=np.int32)
+        save_num[question_ids] = np.array([save or 0 for save in saves], dtype=np.int32)
+        knowledge_count = np.bincount(edges[:, 2], minlength=size).astype(np.int16)
+        return _Snapshot(by_knowledge, level, subject, save_num, knowledge_count, difficulty_levels)
+
+    def _rebuild(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"Question index rebuild failed: {e}")
+            self.errors += 1
+        finally:
+            self._rebuilding = False
+
+    def rebuild_async(self):
+        """在后台线程重建（已有重建在进行时忽略）"""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name="question-index-rebuild", daemon=True).start()
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if self._read_version() != self._version or now - self._built_at > self.refresh_interval:
+            self.rebuild_async()
+
+    def _current(self) -> Optional[_Snapshot]:
+        if not self.enabled:
+            return None
+        self.lookups += 1
+        if self._snapshot is None:
+            self.misses += 1
+            return None
+        self._maybe_refresh()
+        return self._snapshot
+
+    @staticmethod
+    def _ids_at_levels(snapshot: _Snapshot, knowledge_id: str, min_level: int, max_level: int) -> List[np.ndarray]:
+        buckets = snapshot.by_knowledge.get(knowledge_id, {})
+        return [buckets[level] for level in range(min_level, max_level + 1) if level in buckets]
+
+    def candidate_columns(
+        self, knowledge_point_id: str, min_level: int, max_level: int
+    ) -> Optional[Tuple[np.ndarray, ...]]:
+        """知识点在难度区间内的候选题：id、难度等级、收藏数、关联知识点数；索引未就绪时为 None"""
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        arrays = self._ids_at_levels(snapshot, knowledge_point_id, min_level, max_level)
+        ids = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+        return (
+            ids,
+            snapshot.level[ids].astype(np.float64),
+            snapshot.save_num[ids].astype(np.float64),
+            snapshot.knowledge_count[ids].astype(np.float64)
+        )
+
+    def similar_ids(self, question_id: int, knowledge_ids: List[str], count: int) -> Optional[List[int]]:
+        """与题目同学科、难度相差不超过1且至少共享一个知识点的题目id；题目不在索引中时为 None
+
+        按共享知识点数、收藏数、题目id依次降序取前 count 个
+        """
+        snapshot = self._current()
+        if snapshot is None or question_id >= len(snapshot.level) or not snapshot.level[question_id]:
+            return None
+        level = int(snapshot.level[question_id])
+        arrays = [
+            ids for knowledge_id in set(knowledge_ids)
+            for ids in self._ids_at_levels(snapshot, knowledge_id, level - 1, level + 1)
+        ]
+        if not arrays:
+            return []
+        # 每个知识点下题目只出现一次，出现次数即共享知识点数
+        ids, shared = np.unique(np.concatenate(arrays), return_counts=True)
+        keep = (ids != question_id) & (snapshot.subject[ids] == snapshot.subject[question_id])
+        ids, shared = ids[keep], shared[keep]
+        order = np.lexsort((-ids, -snapshot.save_num[ids].astype(np.int64), -shared))
+        return ids[order[:count]].tolist()
+
+    def add_question(self, question: Question, knowledge_ids: List[str]):
+        """本进程新建题目后加入索引，并通知其他进程重建"""
+        snapshot = self._snapshot
+        if snapshot is None or not self.enabled:
+            return
+        level = snapshot.difficulty_levels.get(question.difficulty_id)
+        if level is None or question.status != 1:
+            self.invalidate()
+            return
+
+        with self._lock:
+            size = question.id + 1
+            if size > len(snapshot.level):
+                # 先换好按题目id下标的属性数组，再把id放进倒排表，读取方不会越界
+                snapshot.level = _grow(snapshot.level, size)
+                snapshot.subject = _grow(snapshot.subject, size)
+                snapshot.save_num = _grow(snapshot.save_num, size)
+                snapshot.knowledge_count = _grow(snapshot.knowledge_count, size)
+            snapshot.level[question.id] = level
+            snapshot.subject[question.id] = question.subject_id
+            snapshot.save_num[question.id] = question.save_num or 0
+            snapshot.knowledge_count[question.id] = len(set(knowledge_ids))
+            for knowledge_id in set(knowledge_ids):
+                buckets = snapshot.by_knowledge.setdefault(knowledge_id, {})
+                ids = buckets.get(level, np.empty(0, dtype=np.int64))
+                buckets[level] = np.insert(ids, np.searchsorted(ids, question.id), question.id)
+            self.added += 1
+
+        # 版本号只前进了这一次时说明其他进程没有改动，本进程的索引仍是最新的
+        expected = int(self._version or 0) + 1
+        try:
+            version = redis_client.incr(VERSION_KEY)
+            if version == expected:
+                self._version = str(version)
+        except Exception as e:
+            print(f"Question index version bump failed: {e}")
+            self.errors += 1
+
+    def invalidate(self):
+        """题目被修改或删除后调用：递增全局版本号，各进程（包括本进程）在后台重建"""
+        self.invalidations += 1
+        try:
+            redis_client.incr(VERSION_KEY)
+        except Exception as e:
+            print(f"Question index version bump failed: {e}")
+            self.errors += 1
+        if self._snapshot is not None and self.enabled:
+            self.rebuild_async()
+
+    def stats(self) -> Dict[str, Any]:
+        """题目索引统计"""
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "ready": snapshot is not None,
+            "questions": int(np.count_nonzero(snapshot.level)) if snapshot else 0,
+            "knowledge_points": len(snapshot.by_knowledge) if snapshot else 0,
+            "builds": self.builds,
+            "last_build_ms": self.last_build_ms,
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "added": self.added,
+            "invalidations": self.invalidations,
+            "errors": self.errors
+        }
+
+
+# 全局题目索引实例
+question_index = QuestionIndex()
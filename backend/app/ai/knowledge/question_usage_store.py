@@ -0,0 +1,197 @@
+# backend/app/ai/knowledge/question_usage_store.py
+"""
+题目使用计数：按天的Redis有序集合，作答时累加，推荐评分时按题目id直接查询
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import Integer, cast, func
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.utils.cache import redis_client
+from app.models.analytics import LearningBehaviorLog
+
+DAY_KEY = "question:usage:{day}"
+WINDOW_KEY = "question:usage:window:{days}:{day}"
+# 窗口集合中的占位成员：前几天都没有计数时 ZUNIONSTORE 不会留下键，靠它记录当天已生成
+WINDOW_BUILT_MEMBER = "_built"
+
+
+def question_id_of(action: Dict[str, Any]) -> Optional[int]:
+    """行为中的题目id：agent内部的行为在顶层，接口提交的行为在 data 中"""
+    question_id = action.get("question_id")
+    if question_id is None and isinstance(action.get("data"), dict):
+        question_id = action["data"].get("question_id")
+    try:
+        return int(question_id) if question_id is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _question_id_column():
+    """日志中的题目id列（两种位置，数字或字符串均按整数取出）"""
+    action_data = LearningBehaviorLog.action_data
+    return cast(
+        func.coalesce(action_data["question_id"].as_string(), action_data[("data", "question_id")].as_string()),
+        Integer
+    )
+
+
+class QuestionUsageStore:
+    """题目使用计数
+
+    每次 answer_question 对当天的有序集合 ZINCRBY（保留 window_days+1 天）。查询最近 window_days 天时，
+    今天之前的 window_days-1 天由 ZUNIONSTORE 合并成窗口集合（每天首次查询时生成，次日过期），
+    再加上今天的实时计数：无论候选题多少，都只需一次往返的两条 ZMSCORE。
+    Redis不可用或计数丢失时回落到行为日志上的分组查询，backfill() 从行为日志重建。
+    """
+
+    def __init__(
+        self,
+        window_days: int = settings.AI_QUESTION_USAGE_WINDOW_DAYS,
+        enabled: bool = settings.AI_QUESTION_USAGE_STORE_ENABLED
+    ):
+        self.window_days = window_days
+        self.enabled = enabled
+        self.ttl = (window_days + 1) * 86400
+
+        # 统计指标
+        self.recorded = 0
+        self.lookups = 0
+        self.questions_looked_up = 0
+        self.windows_built = 0
+        self.fallbacks = 0
+        self.errors = 0
+
+    @staticmethod
+    def _day(value: datetime) -> str:
+        return value.strftime("%Y%m%d")
+
+    def record(self, question_id: int, now: Optional[datetime] = None, count: int = 1):
+        """记录题目被作答"""
+        if not self.enabled:
+            return
+        key = DAY_KEY.format(day=self._day(now or datetime.now()))
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.zincrby(key, count, question_id)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+            self.recorded += count
+        except Exception as e:
+            print(f"Question usage record failed: {e}")
+            self.errors += 1
+
+    def record_action(self, action: Dict[str, Any]):
+        """行为为作答时记录使用"""
+        if action.get("type") != "answer_question":
+            return
+        question_id = question_id_of(action)
+        if question_id is not None:
+            self.record(question_id)
+
+    def _window_key(self, today: datetime) -> str:
+        """今天之前 window_days-1 天的合计集合，不存在时生成"""
+        key = WINDOW_KEY.format(days=self.window_days, day=self._day(today))
+        if not redis_client.exists(key):
+            day_keys = [
+                DAY_KEY.format(day=self._day(today - timedelta(days=offset)))
+                for offset in range(1, self.window_days)
+            ]
+            pipe = redis_client.pipeline()
+            if day_keys:
+                pipe.zunionstore(key, day_keys)
+            pipe.zadd(key, {WINDOW_BUILT_MEMBER: 0})
+            pipe.expire(key, 86400 + 3600)
+            pipe.execute()
+            self.windows_built += 1
+        return key
+
+    def counts(self, question_ids: List[int], now: Optional[datetime] = None) -> Dict[int, int]:
+        """最近 window_days 天（含今天）各题的作答次数"""
+        if not question_ids:
+            return {}
+        self.lookups += 1
+        self.questions_looked_up += len(question_ids)
+        now = now or datetime.now()
+
+        if self.enabled:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.zmscore(self._window_key(now), question_ids)
+                pipe.zmscore(DAY_KEY.format(day=self._day(now)), question_ids)
+                window, today = pipe.execute()
+                return {
+                    question_id: int((earlier or 0) + (current or 0))
+                    for question_id, earlier, current in zip(question_ids, window, today)
+                    if earlier or current
+                }
+            except Exception as e:
+                print(f"Question usage lookup failed: {e}")
+                self.errors += 1
+
+        self.fallbacks += 1
+        since = datetime.combine(now.date() - timedelta(days=self.window_days - 1), datetime.min.time())
+        with next(get_db()) as db:
+            return self._query_counts(db, since, question_ids)
+
+    @staticmethod
+    def _query_counts(db, since: datetime, question_ids: List[int]) -> Dict[int, int]:
+        question_id = _question_id_column()
+        rows = db.query(question_id, func.count()).filter(
+            LearningBehaviorLog.action_type == "answer_question",
+            LearningBehaviorLog.timestamp >= since,
+            question_id.in_(question_ids)
+        ).group_by(question_id).all()
+        return {int(row[0]): row[1] for row in rows}
+
+    def backfill(self, days: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """从行为日志重建最近 days 天的按天计数（覆盖已有计数），返回每天的作答数"""
+        now = now or datetime.now()
+        days = days or self.window_days
+        question_id = _question_id_column()
+        day = func.date(LearningBehaviorLog.timestamp)
+        since = datetime.combine(now.date() - timedelta(days=days - 1), datetime.min.time())
+
+        per_day: Dict[str, Counter] = {}
+        with next(get_db()) as db:
+            rows = db.query(day, question_id, func.count()).filter(
+                LearningBehaviorLog.action_type == "answer_question",
+                LearningBehaviorLog.timestamp >= since,
+                question_id.isnot(None)
+            ).group_by(day, question_id).all()
+        for bucket_day, bucket_question, count in rows:
+            per_day.setdefault(str(bucket_day).replace("-", ""), Counter())[int(bucket_question)] += count
+
+        pipe = redis_client.pipeline()
+        for offset in range(days):
+            day_key = self._day(now - timedelta(days=offset))
+            key = DAY_KEY.format(day=day_key)
+            pipe.delete(key)
+            usage = per_day.get(day_key)
+            if usage:
+                pipe.zadd(key, dict(usage))
+                pipe.expire(key, self.ttl)
+        # 窗口集合按新的按天计数重新生成
+        pipe.delete(WINDOW_KEY.format(days=self.window_days, day=self._day(now)))
+        pipe.execute()
+        return {day_key: sum(usage.values()) for day_key, usage in sorted(per_day.items())}
+
+    def stats(self) -> Dict[str, Any]:
+        """题目使用计数统计"""
+        return {
+            "enabled": self.enabled,
+            "window_days": self.window_days,
+            "recorded": self.recorded,
+            "lookups": self.lookups,
+            "avg_questions_per_lookup": round(self.questions_looked_up / self.lookups, 1) if self.lookups else 0.0,
+            "windows_built": self.windows_built,
+            "fallbacks": self.fallbacks,
+            "errors": self.errors
+        }
+
+
+# 全局题目使用计数实例
+question_usage_store = QuestionUsageStore()
@@ -0,0 +1,508 @@
+# backend/app/ai/knowledge/student_feature_store.py
+"""
+学生特征存储：按事件增量维护的学生聚合特征（Redis哈希 + 数据库表）
+"""
+import json
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.utils.cache import redis_client
+from app.ai.knowledge.behavior_rollup import behavior_rollup
+from app.models.question import KnowledgePoint
+from app.models.analytics import StudentKnowledgeMastery, StudentFeature
+from app.models.exam import ExamRecord, ExamAnswerRecord
+from app.models.homework import HomeworkSubmission
+
+# 特征已构建时才累加，避免在不完整的哈希上计数；
+# 未构建时记入待重建集合，下次读取跳过数据库表（表中缺少这次累加）直接从原始数据重建
+_INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SADD', KEYS[2], ARGV[2])
+    return 0
+end
+for i = 3, #ARGV, 2 do
+    redis.call('HINCRBYFLOAT', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# 仅在哈希不存在时写入完整特征，不覆盖并发累加的结果
+_SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+DIRTY_KEY = "student:features:dirty"
+STALE_KEY = "student:features:stale"
+
+
+def is_correct_of(action: Dict[str, Any]) -> Optional[bool]:
+    """行为中的答题结果：agent内部的行为在顶层，接口提交的行为在 data 中"""
+    is_correct = action.get("is_correct")
+    if is_correct is None and isinstance(action.get("data"), dict):
+        is_correct = action["data"].get("is_correct")
+    return bool(is_correct) if is_correct is not None else None
+
+
+def _num(value: Any) -> float:
+    return float(value) if value else 0.0
+
+
+def summarize_activity(raw: Dict[str, Any], days: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """按最近 days 个自然日汇总活动计数"""
+    today = (now or datetime.now()).date()
+    day_keys = [(today - timedelta(days=offset)).strftime("%Y%m%d") for offset in range(days)]
+
+    daily = {day: int(_num(raw.get(f"a:{day}:n"))) for day in day_keys}
+    count = sum(daily.values())
+    total_time = sum(_num(raw.get(f"a:{day}:t")) for day in day_keys)
+
+    hour_counts: Counter = Counter()
+    for field_name, value in raw.items():
+        parts = field_name.split(":")
+        if parts[0] == "h" and parts[1] in daily:
+            hour_counts[int(parts[2])] += int(_num(value))
+
+    return {
+        "count": count,
+        "total_time": total_time,
+        "avg_session_duration": total_time / count if count else 0,
+        "active_days": len([day for day in day_keys if daily[day]]),
+        "most_active_hour": max(hour_counts, key=hour_counts.get) if hour_counts else None,
+        "daily": daily
+    }
+
+
+class StudentFeatureStore:
+    """学生特征存储
+
+    哈希字段：a:{日期}:n/t/q/c 为当日活动数、学习时长、答题数、答对数，h:{日期}:{小时} 为分时活动数，
+    hw:n/hw:s 为已批改作业数与总分，m 为掌握度汇总（JSON），built 为构建时间。
+    行为日志、考试批改、作业批改时原子累加；读取时按最近 window_days 个自然日汇总，开销与历史数据量无关。
+    有变化的学生记入脏集合，后台定期写回 student_features 表；缓存缺失时从表或原始数据重建，
+    缓存缺失期间有过累加的学生（待重建集合）跳过表，直接从原始数据重建。
+    """
+
+    window_days = 7
+
+    def __init__(
+        self,
+        ttl: int = settings.AI_FEATURE_TTL,
+        flush_interval: float = settings.AI_FEATURE_FLUSH_INTERVAL,
+        enabled: bool = settings.AI_FEATURE_STORE_ENABLED
+    ):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._incr_script = redis_client.register_script(_INCR_SCRIPT)
+        self._seed_script = redis_client.register_script(_SEED_SCRIPT)
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # 统计指标
+        self.hits = 0
+        self.table_loads = 0
+        self.rebuilds = 0
+        self.updates = 0
+        self.missed_updates = 0
+        self.flushed = 0
+        self.errors = 0
+
+    def _key(self, student_id: int) -> str:
+        return f"student:features:{student_id}"
+
+    # ---- 增量更新 ----
+
+    def _increment(self, student_id: int, increments: Dict[str, float]):
+        if not self.enabled:
+            return
+        args = [self.ttl, student_id]
+        for field_name, amount in increments.items():
+            args.extend([field_name, amount])
+        try:
+            pipe = redis_client.pipeline()
+            self._incr_script(keys=[self._key(student_id), STALE_KEY], args=args, client=pipe)
+            pipe.sadd(DIRTY_KEY, student_id)
+            applied = pipe.execute()[0]
+            if applied:
+                self.updates += 1
+            else:
+                self.missed_updates += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"Student feature update error: {e}")
+        self._ensure_flusher()
+
+    def record_activity(self, student_id: int, action: Dict[str, Any], now: Optional[datetime] = None):
+        """记录一条行为日志（与 BehaviorLogBuffer 写入的行一一对应）"""
+        now = now or datetime.now()
+        day = now.strftime("%Y%m%d")
+        increments = {
+            f"a:{day}:n": 1,
+            f"a:{day}:t": action.get("duration", 0) or 0,
+            f"h:{day}:{now.hour:02d}": 1
+        }
+        is_correct = is_correct_of(action)
+        if action.get("type") == "answer_question" and is_correct is not None:
+            increments[f"a:{day}:q"] = 1
+            increments[f"a:{day}:c"] = 1 if is_correct else 0
+        self._increment(student_id, increments)
+
+    def record_answers(self, student_id: int, answered: int, correct: int, now: Optional[datetime] = None):
+        """记录批改后的答题结果（考试）"""
+        if answered <= 0:
+            return
+        day = (now or datetime.now()).strftime("%Y%m%d")
+        self._increment(student_id, {f"a:{day}:q": answered, f"a:{day}:c": correct})
+
+    def record_homework(self, student_id: int, score: float, previous_score: Optional[float] = None):
+        """记录作业批改；重复批改时只累加分数差"""
+        if previous_score is None:
+            self._increment(student_id, {"hw:n": 1, "hw:s": score or 0})
+        else:
+            self._increment(student_id, {"hw:s": (score or 0) - previous_score})
+
+    def refresh_mastery(self, student_id: int):
+        """重新汇总掌握度（一次查询），在批改等可能改变掌握度的事件后调用"""
+        if not self.enabled:
+            return
+        try:
+            key = self._key(student_id)
+            if not redis_client.exists(key):
+                return
+            mastery = self._summarize_mastery(self._query_masteries(student_id))
+            pipe = redis_client.pipeline()
+            pipe.hset(key, "m", json.dumps(mastery, ensure_ascii=False, default=str))
+            pipe.sadd(DIRTY_KEY, student_id)
+            pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            print(f"Student feature mastery refresh error: {e}")
+
+    # ---- 读取 ----
+
+    def get(self, student_id: int) -> Dict[str, Any]:
+        """读取学生特征"""
+        return self.derive(self.get_raw(student_id))
+
+    def get_raw(self, student_id: int) -> Dict[str, str]:
+        stale = False
+        if self.enabled:
+            try:
+                raw = redis_client.hgetall(self._key(student_id))
+                if raw.get("built"):
+                    self.hits += 1
+                    return raw
+                # 先移除标记再重建：重建期间的累加会重新标记
+                stale = bool(redis_client.srem(STALE_KEY, student_id))
+            except Exception as e:
+                self.errors += 1
+                print(f"Student feature read error: {e}")
+
+        raw = None if stale else self._load_table(student_id)
+        if raw is not None:
+            self.table_loads += 1
+        else:
+            raw = self.rebuild_raw(student_id)
+            self.rebuilds += 1
+            self._save_table({student_id: raw})
+        self._seed(student_id, raw)
+        return raw
+
+    def _seed(self, student_id: int, raw: Dict[str, Any]):
+        if not self.enabled:
+            return
+        args = [self.ttl]
+        for field_name, value in raw.items():
+            args.extend([field_name, value])
+        try:
+            self._seed_script(keys=[self._key(student_id)], args=args)
+        except Exception as e:
+            self.errors += 1
+            print(f"Student feature seed error: {e}")
+
+    def derive(self, raw: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+        """由原始计数汇总出特征"""
+        activity = summarize_activity(raw, self.window_days, now)
+        answered = sum(_num(raw.get(f"a:{day}:q")) for day in activity["daily"])
+        correct = sum(_num(raw.get(f"a:{day}:c")) for day in activity["daily"])
+
+        mastery = raw.get("m") or {}
+        if isinstance(mastery, str):
+            mastery = json.loads(mastery)
+        homework_count = _num(raw.get("hw:n"))
+
+        return {
+            "mastery": {
+                "count": mastery.get("count", 0),
+                "mastered": mastery.get("mastered", 0),
+                "weak": mastery.get("weak", 0),
+                "avg": mastery["sum"] / mastery["count"] if mastery.get("count") else 0.0,
+                "histogram": mastery.get("hist", [0] * 5),
+                "weak_points": mastery.get("weak_points", [])
+            },
+            "activity_7d": activity,
+            "accuracy_7d": {
+                "answered": int(answered),
+                "correct": int(correct),
+                "rate": correct / answered if answered else None
+            },
+            # 与 StudentAIAgent._calculate_focus_level 一致：平均时长30分钟为满分
+            "focus_7d": min(activity["avg_session_duration"] / 1800, 1.0) if activity["total_time"] else 0.5,
+            "homework": {
+                "graded": int(homework_count),
+                "avg_score": _num(raw.get("hw:s")) / homework_count if homework_count else None
+            }
+        }
+
+    def activity_summary(self, student_id: int, days: int = 7) -> Dict[str, Any]:
+        """最近 days 个自然日的活动汇总：不超过特征窗口时读特征，否则读行为日志的小时汇总"""
+        if days <= self.window_days:
+            return summarize_activity(self.get_raw(student_id), days)
+        since = datetime.combine(datetime.now().date() - timedelta(days=days - 1), datetime.min.time())
+        with next(get_db()) as db:
+            return summarize_activity(behavior_rollup.activity_counts(db, student_id, since), days)
+
+    # ---- 从原始数据重建 ----
+
+    @staticmethod
+    def _query_masteries(student_id: int) -> List[tuple]:
+        with next(get_db()) as db:
+            return [tuple(row) for row in db.query(
+                StudentKnowledgeMastery.knowledge_point_id,
+                KnowledgePoint.title,
+                StudentKnowledgeMastery.mastery_level,
+                StudentKnowledgeMastery.last_practice_time
+            ).outerjoin(
+                KnowledgePoint, KnowledgePoint.id == StudentKnowledgeMastery.knowledge_point_id
+            ).filter(StudentKnowledgeMastery.student_id == student_id).all()]
+
+    @staticmethod
+    def _summarize_mastery(rows: List[tuple]) -> Dict[str, Any]:
+        hist = [0] * 5
+        for _, _, level, _ in rows:
+            hist[min(int(level * 5), 4)] += 1
+        weak = sorted((row for row in rows if row[2] < 0.7), key=lambda row: row[2])[:10]
+        return {
+            "count": len(rows),
+            "mastered": len([row for row in rows if row[2] >= 0.8]),
+            "weak": len([row for row in rows if row[2] < 0.6]),
+            "sum": sum(row[2] for row in rows),
+            "hist": hist,
+            "weak_points": [
+                {
+                    "id": knowledge_point_id,
+                    "name": name or knowledge_point_id,
+                    "mastery_level": level,
+                    "last_practice": last_practice.isoformat() if last_practice else None
+                }
+                for knowledge_point_id, name, level, last_practice in weak
+            ]
+        }
+
+    def rebuild_raw(self, student_id: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """从原始表重建全部计数"""
+        now = now or datetime.now()
+        since = datetime.combine(now.date() - timedelta(days=self.window_days - 1), datetime.min.time())
+        counts: Counter = Counter()
+
+        with next(get_db()) as db:
+            counts.update(behavior_rollup.activity_counts(db, student_id, since))
+
+            exam_answers = db.query(ExamRecord.submit_time, ExamAnswerRecord.is_correct).join(
+                ExamAnswerRecord, ExamAnswerRecord.exam_record_id == ExamRecord.id
+            ).filter(
+                ExamRecord.student_id == student_id,
+                ExamRecord.status == 3,  # 已批改
+                ExamRecord.submit_time >= since,
+                ExamAnswerRecord.is_correct.isnot(None)
+            ).all()
+            for submit_time, is_correct in exam_answers:
+                day = submit_time.strftime("%Y%m%d")
+                counts[f"a:{day}:q"] += 1
+                counts[f"a:{day}:c"] += 1 if is_correct else 0
+
+            graded = db.query(HomeworkSubmission.score).filter(
+                HomeworkSubmission.student_id == student_id,
+                HomeworkSubmission.status == 3  # 已批改
+            ).all()
+            if graded:
+                counts["hw:n"] = len(graded)
+                counts["hw:s"] = sum(score or 0 for score, in graded)
+
+        raw: Dict[str, Any] = dict(counts)
+        raw["m"] = json.dumps(self._summarize_mastery(self._query_masteries(student_id)), ensure_ascii=False)
+        raw["built"] = now.isoformat()
+        return raw
+
+    # ---- 数据库表 ----
+
+    @staticmethod
+    def _load_table(student_id: int) -> Optional[Dict[str, Any]]:
+        with next(get_db()) as db:
+            row = db.query(StudentFeature.raw).filter(StudentFeature.student_id == student_id).first()
+            return dict(row.raw) if row and row.raw else None
+
+    def _save_table(self, raws: Dict[int, Dict[str, Any]]):
+        now = datetime.now()
+        with next(get_db()) as db:
+            for student_id, raw in raws.items():
+                features = self.derive(raw, now)
+                db.merge(StudentFeature(
+                    student_id=student_id,
+                    mastery_avg=features["mastery"]["avg"],
+                    weak_count=features["mastery"]["weak"],
+                    activity_count_7d=features["activity_7d"]["count"],
+                    study_seconds_7d=int(features["activity_7d"]["total_time"]),
+                    accuracy_7d=features["accuracy_7d"]["rate"],
+                    raw=raw,
+                    updated_at=now
+                ))
+            db.commit()
+
+    def _prune(self, raw: Dict[str, Any]) -> List[str]:
+        """窗口之外的按日字段"""
+        oldest = (datetime.now().date() - timedelta(days=self.window_days)).strftime("%Y%m%d")
+        return [
+            field_name for field_name in raw
+            if field_name[:2] in ("a:", "h:") and field_name.split(":")[1] < oldest
+        ]
+
+    # ---- 后台写回 ----
+
+    def _ensure_flusher(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self, batch_size: int = 500) -> int:
+        """把有变化的学生特征写回数据库表"""
+        if not self.enabled:
+            return 0
+        written = 0
+        while True:
+            student_ids = []
+            try:
+                student_ids = redis_client.spop(DIRTY_KEY, batch_size)
+                if not student_ids:
+                    break
+                pipe = redis_client.pipeline()
+                for student_id in student_ids:
+                    pipe.hgetall(self._key(student_id))
+                raws = {
+                    int(student_id): raw
+                    for student_id, raw in zip(student_ids, pipe.execute())
+                    if raw.get("built")
+                }
+                pipe = redis_client.pipeline()
+                for student_id, raw in raws.items():
+                    stale = self._prune(raw)
+                    if stale:
+                        pipe.hdel(self._key(student_id), *stale)
+                        for field_name in stale:
+                            raw.pop(field_name)
+                pipe.execute()
+                await asyncio.to_thread(self._save_table, raws)
+            except Exception as e:
+                self.errors += 1
+                print(f"Student feature flush error: {e}")
+                # 放回脏集合，下个周期重试
+                try:
+                    if student_ids:
+                        redis_client.sadd(DIRTY_KEY, *student_ids)
+                except Exception:
+                    pass
+                break
+            written += len(raws)
+            if len(student_ids) < batch_size:
+                break
+        self.flushed += written
+        return written
+
+    async def shutdown(self):
+        """停止后台任务并写回剩余变化"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    # ---- 对账 ----
+
+    def reconcile(self, student_id: int, fix: bool = False, tolerance: float = 1e-6) -> Dict[str, Any]:
+        """比较存储的特征与原始表重建结果，返回不一致的项；fix 时以重建结果覆盖"""
+        now = datetime.now()
+        expected_raw = self.rebuild_raw(student_id, now)
+        expected = _flatten(self.derive(expected_raw, now))
+        actual = _flatten(self.derive(self.get_raw(student_id), now))
+
+        diffs = {}
+        for name in set(expected) | set(actual):
+            left, right = expected.get(name), actual.get(name)
+            if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+                if abs(left - right) <= tolerance:
+                    continue
+            elif left == right:
+                continue
+            diffs[name] = {"expected": left, "actual": right}
+
+        if diffs and fix:
+            if self.enabled:
+                redis_client.delete(self._key(student_id))
+            self._seed(student_id, expected_raw)
+            self._save_table({student_id: expected_raw})
+        return diffs
+
+    def stats(self) -> Dict[str, Any]:
+        """特征存储统计"""
+        reads = self.hits + self.table_loads + self.rebuilds
+        try:
+            dirty = redis_client.scard(DIRTY_KEY) if self.enabled else 0
+            stale = redis_client.scard(STALE_KEY) if self.enabled else 0
+        except Exception:
+            dirty = stale = None
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "table_loads": self.table_loads,
+            "rebuilds": self.rebuilds,
+            "hit_rate": self.hits / reads if reads else 0.0,
+            "updates": self.updates,
+            "missed_updates": self.missed_updates,
+            "dirty": dirty,
+            "stale": stale,
+            "flushed": self.flushed,
+            "errors": self.errors
+        }
+
+
+def _flatten(features: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat = {}
+    for name, value in features.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{name}."))
+        else:
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+
+# 全局学生特征存储实例
+student_feature_store = StudentFeatureStore()
@@ -1,5 +1,6 @@
 from typing import Any
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.api.deps import get_db, get_current_user
 from app.models.user import User
@@ -9,6 +10,7 @@ from app.schemas.ai import (
 )
 from app.schemas.common import APIResponse
 from app.services.ai_service import AIService
+from app.utils.helpers import format_sse
 
 router = APIRouter()
 
@@ -36,6 +38,38 @@ async def ai_chat(
     )
 
 
+@router.post("/chat/stream")
+async def ai_chat_stream(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """AI聊天对话（SSE流式）"""
+    ai_service = AIService(db)
+    role = current_user.roles[0].name if current_user.roles else "student"
+    user_id = current_user.id
+    
+    async def event_stream():
+        try:
+            async for event in ai_service.chat_stream(
+                message=request.message,
+                role=role,
+                user_id=user_id,
+                context=request.context
+            ):
+                yield format_sse(event["event"], event["data"])
+        except Exception as e:
+            yield format_sse("error", {"error": str(e)})
+        
+        yield format_sse("done", {})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/recommendations", response_model=APIResponse[RecommendationResponse])
 async def get_recommendations(
     request: RecommendationRequest,
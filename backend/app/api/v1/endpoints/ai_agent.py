@@ -3,18 +3,23 @@
 AI Agent API端点 - 更新版本
 """
 from typing import Any, Dict, List, Optional
+from datetime import date, datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_db, get_current_user, require_roles
 from app.models.user import User
 from app.schemas.ai import (
     AIAgentInitRequest, AIAgentResponse, ActionRequest, ActionResponse,
     RecommendationResponse, ChatRequest, ChatResponse
 )
 from app.schemas.common import APIResponse
-from app.ai import get_ai_coordinator
+from app.ai import get_ai_coordinator, get_ai_metrics
+from app.ai.engines.llm_ledger import build_ledger_report
 from app.ai.engines.recommendation_engine import IntelligentRecommendationEngine
+from app.ai.engines.recommendation_precompute import recommendation_precomputer
+from app.utils.helpers import format_sse
 
 router = APIRouter()
 
@@ -37,12 +42,12 @@ async def initialize_ai_agent(
         if not agent:
             raise HTTPException(status_code=500, detail="AI Agent初始化失败")
         
-        # 获取启动结果
-        startup_result = agent.session_context
+        # 获取启动结果（从其他worker恢复的会话返回原始启动结果）
+        startup_result = agent.startup_result
         
         return APIResponse(
             data=AIAgentResponse(
-                agent_id=startup_result.get("session_id"),
+                agent_id=agent.session_context.get("session_id"),
                 status="active",
                 agent_type=agent.__class__.__name__,
                 recommendations=startup_result.get("recommendations", []),
@@ -112,17 +117,13 @@ async def get_personalized_recommendations(
 ) -> Any:
     """获取个性化推荐"""
     try:
-        recommendation_engine = IntelligentRecommendationEngine()
-        
-        # 生成推荐
+        # 生成推荐：带上下文时实时生成，否则优先使用预计算的推荐
         if context:
-            recommendations = await recommendation_engine.generate_ai_powered_recommendations(
+            recommendations = await IntelligentRecommendationEngine().generate_ai_powered_recommendations(
                 current_user.id, context
             )
         else:
-            recommendations = await recommendation_engine.generate_student_recommendations(
-                current_user.id
-            )
+            recommendations = await recommendation_precomputer.get_or_generate(current_user.id)
         
         # 转换为响应格式
         recommendation_responses = [
@@ -187,6 +188,33 @@ async def ai_chat(
         raise HTTPException(status_code=500, detail=f"AI对话失败: {str(e)}")
 
 
+@router.post("/chat/stream")
+async def ai_chat_stream(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """AI对话接口（SSE流式）"""
+    ai_coordinator = get_ai_coordinator()
+    user_id = current_user.id
+    
+    async def event_stream():
+        try:
+            async for event in ai_coordinator.stream_chat(
+                user_id, request.message, request.context, request.history
+            ):
+                yield format_sse(event["event"], event["data"])
+        except Exception as e:
+            yield format_sse("error", {"error": f"AI对话失败: {str(e)}"})
+        
+        yield format_sse("done", {})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/agent/status", response_model=APIResponse[Dict[str, Any]])
 async def get_agent_status(
     current_user: User = Depends(get_current_user)
@@ -230,16 +258,16 @@ async def get_learning_analysis(
     db: Session = Depends(get_db)
 ) -> Any:
     """获取学习分析报告"""
+    if days < 1 or days > 365:
+        raise HTTPException(status_code=400, detail="days取值范围为1-365")
+    
     try:
         from app.ai.knowledge.knowledge_base import CentralKnowledgeBase
         
         knowledge_base = CentralKnowledgeBase()
         
-        # 获取学习统计
-        stats = await knowledge_base.get_learning_stats(current_user.id)
-        
-        # 获取最近活动
-        activities = await knowledge_base.get_recent_activities(current_user.id, hours=days*24)
+        # 获取学习统计（数据库端聚合，覆盖整个窗口）
+        stats = await knowledge_base.get_learning_stats(current_user.id, days)
         
         # 生成分析报告
         analysis = {
@@ -249,8 +277,8 @@ async def get_learning_analysis(
             "average_session_duration": stats["avg_session_duration"],
             "most_active_hour": stats["most_active_hour"],
             "consistency_score": stats["learning_consistency"],
-            "recent_activities": len(activities),
-            "activity_trend": await _calculate_activity_trend(activities, days)
+            "recent_activities": stats["session_count"],
+            "activity_trend": await _calculate_activity_trend(stats["daily_activity"], days)
         }
         
         return APIResponse(
@@ -262,6 +290,72 @@ async def get_learning_analysis(
         raise HTTPException(status_code=500, detail=f"分析生成失败: {str(e)}")
 
 
+@router.get("/activity-history", response_model=APIResponse[List[Dict[str, Any]]])
+async def get_activity_history(
+    start: date,
+    end: date,
+    action_type: Optional[str] = None,
+    limit: int = 1000,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """获取指定日期范围内的学习行为记录（含已归档的历史数据）"""
+    if end < start or (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="日期范围无效，最长366天")
+    if limit < 1 or limit > 5000:
+        raise HTTPException(status_code=400, detail="limit取值范围为1-5000")
+    
+    from app.ai.knowledge.knowledge_base import CentralKnowledgeBase
+    
+    records = await CentralKnowledgeBase().get_activity_history(
+        current_user.id,
+        datetime.combine(start, datetime.min.time()),
+        datetime.combine(end + timedelta(days=1), datetime.min.time()),
+        [action_type] if action_type else None,
+        limit
+    )
+    
+    return APIResponse(
+        data=[
+            {
+                "action_type": record["action_type"],
+                "action_data": record["action_data"],
+                "session_duration": record["session_duration"],
+                "timestamp": record["timestamp"].isoformat()
+            }
+            for record in records
+        ],
+        message="活动记录获取成功"
+    )
+
+
+@router.get("/admin/metrics", response_model=APIResponse[Dict[str, Any]])
+async def get_ai_system_metrics(
+    current_user: User = Depends(require_roles("admin"))
+) -> Any:
+    """获取AI系统运行指标（缓存命中率等）"""
+    return APIResponse(
+        data=get_ai_metrics(),
+        message="指标获取成功"
+    )
+
+
+@router.get("/admin/llm-ledger/report", response_model=APIResponse[List[Dict[str, Any]]])
+async def get_llm_ledger_report(
+    days: int = 7,
+    template_id: Optional[str] = None,
+    current_user: User = Depends(require_roles("admin")),
+    db: Session = Depends(get_db)
+) -> Any:
+    """按提示模板和日期汇总LLM调用的p95延迟、token用量与估算成本"""
+    if days < 1 or days > 90:
+        raise HTTPException(status_code=400, detail="days取值范围为1-90")
+    
+    return APIResponse(
+        data=build_ledger_report(db, days, template_id),
+        message="调用报表获取成功"
+    )
+
+
 # 辅助函数
 async def _update_user_profile_async(user_id: int, action_data: Dict, response: Dict):
     """异步更新用户画像"""
@@ -273,18 +367,15 @@ async def _update_user_profile_async(user_id: int, action_data: Dict, response:
         print(f"Profile update failed for user {user_id}: {e}")
 
 
-async def _calculate_activity_trend(activities: List[Dict], days: int) -> str:
-    """计算活动趋势"""
-    if len(activities) < 2:
+async def _calculate_activity_trend(daily_activity: Dict[str, int], days: int) -> str:
+    """计算活动趋势：比较窗口后半段与前半段的日均活动数"""
+    counts = list(daily_activity.values())  # 从今天往前排列
+    if days < 2 or sum(counts) < 2:
         return "insufficient_data"
     
-    # 简单的趋势计算
-    mid_point = len(activities) // 2
-    recent_half = activities[:mid_point]
-    earlier_half = activities[mid_point:]
-    
-    recent_avg = len(recent_half) / (days / 2) if days > 1 else len(recent_half)
-    earlier_avg = len(earlier_half) / (days / 2) if days > 1 else len(earlier_half)
+    mid_point = len(counts) // 2
+    recent_avg = sum(counts[:mid_point]) / mid_point
+    earlier_avg = sum(counts[mid_point:]) / (len(counts) - mid_point)
     
     if recent_avg > earlier_avg * 1.2:
         return "increasing"
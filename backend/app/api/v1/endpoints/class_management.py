@@ -13,6 +13,7 @@ from app.schemas.class_management import (
 )
 from app.schemas.common import APIResponse, PaginationParams, PaginationResponse
 from app.services.class_management_service import ClassManagementService
+from app.ai.engines.recommendation_precompute import recommendation_precomputer
 
 router = APIRouter()
 
@@ -572,6 +573,10 @@ async def get_my_recommendations(
     """获取我的学习推荐"""
     service = ClassManagementService(db)
     recommendations = service.get_student_recommendations(current_user.id)
+    if not recommendations:
+        # 没有预计算的推荐时按需生成
+        await recommendation_precomputer.get_or_generate(current_user.id)
+        recommendations = service.get_student_recommendations(current_user.id)
     
     return APIResponse(
         data=[LearningRecommendationResponse(**rec) for rec in recommendations]
@@ -1,3 +1,4 @@
+import os
 from typing import Any, Dict, Optional, List
 from pydantic import BaseSettings, validator
 from pydantic_settings import BaseSettings
@@ -77,11 +78,119 @@ class Settings(BaseSettings):
     AI_MODEL_PROVIDER: str = os.getenv("AI_MODEL_PROVIDER", "openai")
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     ANTHROPIC_API_KEY: Optional[str] = os.getenv("ANTHROPIC_API_KEY")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")  # 可指向兼容服务或本地模拟服务
     
     # AI Agent配置
-    AI_AGENT_TIMEOUT: int = int(os.getenv("AI_AGENT_TIMEOUT", "300"))  # 5分钟
+    AI_AGENT_TIMEOUT: int = int(os.getenv("AI_AGENT_TIMEOUT", "300"))  # 5分钟，空闲超时后回收agent
+    AI_AGENT_MAX_ACTIVE: int = int(os.getenv("AI_AGENT_MAX_ACTIVE", "2000"))  # 每个worker常驻agent上限
+    AI_AGENT_SESSION_STORE_ENABLED: bool = os.getenv("AI_AGENT_SESSION_STORE_ENABLED", "true").lower() == "true"
+    AI_AGENT_SESSION_TTL: int = int(os.getenv("AI_AGENT_SESSION_TTL", "1800"))  # 30分钟，多worker共享的会话状态
+    
+    # 行为日志批量写入配置
+    AI_BEHAVIOR_LOG_BATCH_SIZE: int = int(os.getenv("AI_BEHAVIOR_LOG_BATCH_SIZE", "500"))
+    AI_BEHAVIOR_LOG_FLUSH_MS: int = int(os.getenv("AI_BEHAVIOR_LOG_FLUSH_MS", "200"))
+    AI_BEHAVIOR_LOG_MAX_PENDING: int = int(os.getenv("AI_BEHAVIOR_LOG_MAX_PENDING", "50000"))
+    AI_BEHAVIOR_LOG_BLOCK_TIMEOUT: float = float(os.getenv("AI_BEHAVIOR_LOG_BLOCK_TIMEOUT", "0.5"))  # 秒，队列满时写入方最长等待
+    AI_BEHAVIOR_LOG_SPOOL_DIR: str = os.getenv("AI_BEHAVIOR_LOG_SPOOL_DIR", "")  # 为空时不落盘
+    
+    # 跨角色通知配置
+    AI_NOTIFY_ENABLED: bool = os.getenv("AI_NOTIFY_ENABLED", "true").lower() == "true"
+    AI_NOTIFY_WORKERS: int = int(os.getenv("AI_NOTIFY_WORKERS", "2"))
+    AI_NOTIFY_QUEUE_SIZE: int = int(os.getenv("AI_NOTIFY_QUEUE_SIZE", "10000"))
+    AI_NOTIFY_BATCH_SIZE: int = int(os.getenv("AI_NOTIFY_BATCH_SIZE", "200"))
+    AI_NOTIFY_DIGEST_WINDOW: int = int(os.getenv("AI_NOTIFY_DIGEST_WINDOW", "600"))  # 秒，同一接收人同一分组合并发送的窗口
+    AI_NOTIFY_CHANNELS: str = os.getenv("AI_NOTIFY_CHANNELS", "log")  # 逗号分隔，如 "log,email"
+    
+    # 用户行为actor配置
+    AI_ACTOR_MAX_CONCURRENCY: int = int(os.getenv("AI_ACTOR_MAX_CONCURRENCY", "64"))  # 同时处理行为的用户数上限
+    AI_ACTOR_MAILBOX_SIZE: int = int(os.getenv("AI_ACTOR_MAILBOX_SIZE", "100"))
+    AI_ACTOR_MAX_BATCH: int = int(os.getenv("AI_ACTOR_MAX_BATCH", "20"))
+    AI_ACTOR_IDLE_TIMEOUT: float = float(os.getenv("AI_ACTOR_IDLE_TIMEOUT", "30"))  # 秒
+    
+    # 学生特征存储配置
+    AI_FEATURE_STORE_ENABLED: bool = os.getenv("AI_FEATURE_STORE_ENABLED", "true").lower() == "true"
+    AI_FEATURE_TTL: int = int(os.getenv("AI_FEATURE_TTL", "691200"))  # 秒，不活跃学生的特征缓存保留8天
+    AI_FEATURE_FLUSH_INTERVAL: float = float(os.getenv("AI_FEATURE_FLUSH_INTERVAL", "60"))  # 秒，写回特征表的周期
+    
+    # 行为日志汇总配置
+    AI_ROLLUP_LATENESS: int = int(os.getenv("AI_ROLLUP_LATENESS", "900"))  # 秒，汇总只推进到该时长之前的整点
+    AI_ROLLUP_CHUNK_HOURS: int = int(os.getenv("AI_ROLLUP_CHUNK_HOURS", "24"))  # 每个事务汇总的小时数
+    
+    # 行为日志归档配置
+    AI_BEHAVIOR_LOG_RETENTION_MONTHS: int = int(os.getenv("AI_BEHAVIOR_LOG_RETENTION_MONTHS", "12"))  # 数据库中保留的整月数
+    AI_BEHAVIOR_LOG_ARCHIVE_DIR: str = os.getenv("AI_BEHAVIOR_LOG_ARCHIVE_DIR", "./archive/behavior_logs")  # 多实例部署时应为共享存储
+    
+    # 题目使用统计配置
+    AI_QUESTION_USAGE_STORE_ENABLED: bool = os.getenv("AI_QUESTION_USAGE_STORE_ENABLED", "true").lower() == "true"
+    AI_QUESTION_USAGE_WINDOW_DAYS: int = int(os.getenv("AI_QUESTION_USAGE_WINDOW_DAYS", "30"))  # 题目新鲜度统计的天数
+    
+    # 题目索引配置
+    AI_QUESTION_INDEX_ENABLED: bool = os.getenv("AI_QUESTION_INDEX_ENABLED", "true").lower() == "true"
+    AI_QUESTION_INDEX_CHECK_INTERVAL: int = int(os.getenv("AI_QUESTION_INDEX_CHECK_INTERVAL", "5"))  # 秒，比对题目修改版本号的间隔
+    AI_QUESTION_INDEX_REFRESH_INTERVAL: int = int(os.getenv("AI_QUESTION_INDEX_REFRESH_INTERVAL", "3600"))  # 秒，定期全量重建
+    
+    # 推荐配置
+    AI_RECOMMENDATION_TTL_HOURS: int = int(os.getenv("AI_RECOMMENDATION_TTL_HOURS", "24"))  # 预计算推荐的有效期
+    AI_RECOMMENDATION_BATCH_WORKERS: int = int(os.getenv("AI_RECOMMENDATION_BATCH_WORKERS", "0"))  # 批量预计算的进程数，0为CPU核数
+    AI_RECOMMENDATION_SHARD_SIZE: int = int(os.getenv("AI_RECOMMENDATION_SHARD_SIZE", "200"))  # 每个分片的学生数
     AI_RECOMMENDATION_CACHE_TTL: int = int(os.getenv("AI_RECOMMENDATION_CACHE_TTL", "1800"))  # 30分钟
     
+    # 知识点图谱配置
+    AI_KNOWLEDGE_GRAPH_ENABLED: bool = os.getenv("AI_KNOWLEDGE_GRAPH_ENABLED", "true").lower() == "true"
+    AI_KNOWLEDGE_GRAPH_CHECK_INTERVAL: int = int(os.getenv("AI_KNOWLEDGE_GRAPH_CHECK_INTERVAL", "30"))  # 秒，比对知识点变更版本号的间隔
+    AI_KNOWLEDGE_GRAPH_REFRESH_INTERVAL: int = int(os.getenv("AI_KNOWLEDGE_GRAPH_REFRESH_INTERVAL", "3600"))  # 秒，定期重新加载
+    
+    # LLM响应缓存配置
+    AI_LLM_CACHE_ENABLED: bool = os.getenv("AI_LLM_CACHE_ENABLED", "true").lower() == "true"
+    AI_LLM_CACHE_TTL: int = int(os.getenv("AI_LLM_CACHE_TTL", "86400"))  # 24小时
+    AI_LLM_CACHE_LOCAL_SIZE: int = int(os.getenv("AI_LLM_CACHE_LOCAL_SIZE", "2048"))
+    AI_LLM_CACHE_LOCAL_TTL: int = int(os.getenv("AI_LLM_CACHE_LOCAL_TTL", "300"))  # 5分钟
+    AI_LLM_CACHE_ALLOW_NONDETERMINISTIC: bool = os.getenv("AI_LLM_CACHE_ALLOW_NONDETERMINISTIC", "false").lower() == "true"
+    
+    AI_LLM_SINGLE_FLIGHT_ENABLED: bool = os.getenv("AI_LLM_SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    
+    # LLM准入控制配置
+    AI_LLM_MAX_CONCURRENCY: int = int(os.getenv("AI_LLM_MAX_CONCURRENCY", "16"))  # 每个提供方默认并发上限
+    AI_LLM_PROVIDER_CONCURRENCY: str = os.getenv("AI_LLM_PROVIDER_CONCURRENCY", "")  # 例如 "openai:16,openai:strong:4,anthropic:8"
+    AI_LLM_MAX_QUEUE: int = int(os.getenv("AI_LLM_MAX_QUEUE", "200"))
+    AI_LLM_INTERACTIVE_TIMEOUT: float = float(os.getenv("AI_LLM_INTERACTIVE_TIMEOUT", "30"))  # 秒
+    AI_LLM_BACKGROUND_TIMEOUT: float = float(os.getenv("AI_LLM_BACKGROUND_TIMEOUT", "120"))  # 秒
+    AI_LLM_BREAKER_ERROR_RATE: float = float(os.getenv("AI_LLM_BREAKER_ERROR_RATE", "0.5"))
+    AI_LLM_BREAKER_MIN_CALLS: int = int(os.getenv("AI_LLM_BREAKER_MIN_CALLS", "20"))
+    AI_LLM_BREAKER_COOLDOWN: float = float(os.getenv("AI_LLM_BREAKER_COOLDOWN", "15"))  # 秒
+    
+    # LLM调用流水配置
+    AI_LLM_LEDGER_ENABLED: bool = os.getenv("AI_LLM_LEDGER_ENABLED", "true").lower() == "true"
+    AI_LLM_PRICING: str = os.getenv(
+        "AI_LLM_PRICING", "gpt-3.5-turbo:0.0005:0.0015,gpt-4:0.03:0.06"
+    )  # 模型:每千输入token价格:每千输出token价格
+    
+    # 模型分档路由配置
+    AI_LLM_ROUTING: str = os.getenv("AI_LLM_ROUTING", "auto")  # auto、fast 或 strong
+    AI_LLM_FAST_MODEL: str = os.getenv("AI_LLM_FAST_MODEL", "gpt-3.5-turbo")
+    AI_LLM_STRONG_MODEL: str = os.getenv("AI_LLM_STRONG_MODEL", "gpt-4")
+    AI_LLM_STRONG_MIN_TOKENS: int = int(os.getenv("AI_LLM_STRONG_MIN_TOKENS", "1200"))  # 超过该长度的提示走强档
+    AI_LLM_FAST_SLO_MS: float = float(os.getenv("AI_LLM_FAST_SLO_MS", "3000"))
+    AI_LLM_STRONG_SLO_MS: float = float(os.getenv("AI_LLM_STRONG_SLO_MS", "15000"))
+    
+    # 提示词上下文配置
+    AI_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", "400"))  # 用户上下文的token上限
+    
+    # 对话记忆配置
+    AI_CONVERSATION_STORE_ENABLED: bool = os.getenv("AI_CONVERSATION_STORE_ENABLED", "true").lower() == "true"
+    AI_CONVERSATION_KEEP_TURNS: int = int(os.getenv("AI_CONVERSATION_KEEP_TURNS", "6"))  # 原文保留的消息条数
+    AI_CONVERSATION_TURN_MAX_CHARS: int = int(os.getenv("AI_CONVERSATION_TURN_MAX_CHARS", "800"))
+    AI_CONVERSATION_SUMMARY_MAX_CHARS: int = int(os.getenv("AI_CONVERSATION_SUMMARY_MAX_CHARS", "600"))
+    AI_CONVERSATION_SUMMARIZER: str = os.getenv("AI_CONVERSATION_SUMMARIZER", "extractive")  # extractive 或 llm
+    AI_CONVERSATION_SUMMARY_MODEL: str = os.getenv("AI_CONVERSATION_SUMMARY_MODEL", "gpt-3.5-turbo")
+    AI_CONVERSATION_TTL: int = int(os.getenv("AI_CONVERSATION_TTL", "86400"))  # 24小时
+    
+    # 语义缓存配置
+    AI_SEMANTIC_CACHE_ENABLED: bool = os.getenv("AI_SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    AI_SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("AI_SEMANTIC_CACHE_THRESHOLD", "0.8"))
+    AI_SEMANTIC_CACHE_CAPACITY: int = int(os.getenv("AI_SEMANTIC_CACHE_CAPACITY", "200"))  # 每个用户/角色/学科分区的条数
+    AI_SEMANTIC_CACHE_MAX_BUCKETS: int = int(os.getenv("AI_SEMANTIC_CACHE_MAX_BUCKETS", "1000"))  # 分区数上限，超出时淘汰最久未使用的；每进程最多 条数*分区数 条，每条约3KB
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
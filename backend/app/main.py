@@ -15,7 +15,7 @@ from app.middleware.auth import AuthMiddleware
 from app.middleware.logging import LoggingMiddleware
 
 # 导入AI系统
-from app.ai import init_ai_system
+from app.ai import init_ai_system, shutdown_ai_system
 
 
 @asynccontextmanager
@@ -36,6 +36,7 @@ async def lifespan(app: FastAPI):
     
     # 关闭时执行
     print(f"👋 {settings.PROJECT_NAME} is shutting down...")
+    await shutdown_ai_system()
 
 
 # 创建FastAPI应用
@@ -14,7 +14,8 @@ from app.models.exam import (
 )
 from app.models.analytics import (
     StudentProfile, StudentKnowledgeMastery, LearningBehavior,
-    LearningRecommendation
+    LearningBehaviorLog, LearningRecommendation, LLMCallLedger, StudentFeature,
+    LearningBehaviorHourly, RollupWatermark
 )
 
 # 确保所有模型都被导入，这样alembic才能检测到它们
@@ -28,5 +29,6 @@ __all__ = [
     "Exam", "ExamQuestion", "ExamRecord", "ExamAnswer",
     "Homework", "HomeworkSubmission",
     "StudentProfile", "StudentKnowledgeMastery", "LearningBehavior",
-    "LearningRecommendation"
+    "LearningBehaviorLog", "LearningRecommendation", "LLMCallLedger", "StudentFeature",
+    "LearningBehaviorHourly", "RollupWatermark"
 ]
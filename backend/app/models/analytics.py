@@ -1,5 +1,5 @@
 # backend/app/models/analytics.py
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float, Boolean, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.base import Base
@@ -143,8 +143,12 @@ class StudentPerformance(Base):
 
 
 class LearningBehavior(Base):
-    """学习行为分析表"""
+    """学习行为分析表（每个学生每天一行，由行为日志汇总生成）"""
     __tablename__ = "learning_behaviors"
+    __table_args__ = (
+        Index("uq_learning_behaviors_student_date", "student_id", "date", unique=True),
+        Index("ix_learning_behaviors_date", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -155,12 +159,80 @@ class LearningBehavior(Base):
     correct_rate = Column(Float)  # 正确率
     focus_duration = Column(Integer)  # 专注时长（分钟）
     activity_type = Column(String(50))  # 活动类型
+    activity_count = Column(Integer)  # 行为次数
     created_at = Column(DateTime, default=func.now())
 
     # 关联关系
     student = relationship("User")
 
 
+class LearningBehaviorLog(Base):
+    """学习行为日志表（只追加，批量写入）
+
+    MySQL上按 timestamp 每月一个分区，主键为 (id, timestamp)、不建外键（见迁移007）；
+    超过保留期的分区归档到文件后删除，见 app/ai/knowledge/behavior_log_archive.py。
+    """
+    __tablename__ = "learning_behavior_logs"
+    __table_args__ = (
+        # 按学生和时间窗口的查询与分组聚合
+        Index("ix_learning_behavior_logs_student_time", "student_id", "timestamp"),
+        # 汇总任务按时间范围扫描
+        Index("ix_learning_behavior_logs_timestamp", "timestamp"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    student_id = Column(Integer, nullable=False)  # 分区表不支持外键
+    action_type = Column(String(50), nullable=False)  # 行为类型
+    action_data = Column(JSON)  # 行为详情
+    session_duration = Column(Integer, default=0)  # 持续时长（秒）
+    timestamp = Column(DateTime, nullable=False)  # 行为发生时间（非写库时间）
+
+    # 关联关系
+    student = relationship("User", primaryjoin="foreign(LearningBehaviorLog.student_id) == User.id")
+
+
+class LearningBehaviorHourly(Base):
+    """学习行为小时汇总表（按学生、整点、行为类型汇总行为日志）"""
+    __tablename__ = "learning_behavior_hourly"
+    __table_args__ = (
+        Index("uq_learning_behavior_hourly_student_hour_action", "student_id", "hour", "action_type", unique=True),
+        Index("ix_learning_behavior_hourly_hour", "hour"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    hour = Column(DateTime, nullable=False)  # 整点
+    action_type = Column(String(50), nullable=False)
+    event_count = Column(Integer, nullable=False, default=0)
+    duration_seconds = Column(Integer, nullable=False, default=0)
+    max_duration = Column(Integer, nullable=False, default=0)  # 单次最长时长（秒）
+    answered_count = Column(Integer, nullable=False, default=0)  # 有判题结果的答题数
+    correct_count = Column(Integer, nullable=False, default=0)
+
+
+class RollupWatermark(Base):
+    """处理高水位表：name 对应的处理（汇总、归档）已完成到 watermark"""
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class StudentFeature(Base):
+    """学生特征表（增量维护的聚合特征，raw 为计数原始值）"""
+    __tablename__ = "student_features"
+
+    student_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    mastery_avg = Column(Float)
+    weak_count = Column(Integer, default=0)
+    activity_count_7d = Column(Integer, default=0)
+    study_seconds_7d = Column(Integer, default=0)
+    accuracy_7d = Column(Float)
+    raw = Column(JSON)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
 class LearningPathAnalysis(Base):
     """学习路径分析表"""
     __tablename__ = "learning_path_analyses"
@@ -215,10 +287,13 @@ class TeachingAnalysis(Base):
 class LearningRecommendation(Base):
     """学习推荐表"""
     __tablename__ = "learning_recommendations"
+    __table_args__ = (
+        Index("ix_learning_recommendations_student_expires", "student_id", "expires_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
+    subject_id = Column(Integer, ForeignKey("subjects.id"))  # 学习路径、复习等跨学科推荐为空
     knowledge_point = Column(String(100))
     difficulty_level = Column(Integer)
     resource_type = Column(String(50))
@@ -226,9 +301,35 @@ class LearningRecommendation(Base):
     reason = Column(Text)
     priority = Column(Integer)
     status = Column(Integer, default=1)  # 1-未开始, 2-进行中, 3-已完成
+    payload = Column(JSON)  # 推荐引擎生成的完整推荐（预计算的推荐才有）
+    expires_at = Column(DateTime)  # 推荐过期时间
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
     # 关联关系
     student = relationship("User")
-    subject = relationship("Subject")
\ No newline at end of file
+    subject = relationship("Subject")
+
+
+class LLMCallLedger(Base):
+    """LLM调用流水表（只追加）"""
+    __tablename__ = "llm_call_ledger"
+    __table_args__ = (
+        Index("ix_llm_call_ledger_template_created", "template_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+    template_id = Column(String(100), nullable=False)  # 提示词模板/任务标识
+    source = Column(String(20), nullable=False)  # llm_client 或 ai_service
+    user_id = Column(Integer)  # 不建外键，避免写入路径上的额外检查
+    role = Column(String(20))
+    provider = Column(String(20))
+    model = Column(String(50))
+    tier = Column(String(20))
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    latency_ms = Column(Float)
+    cache_hit = Column(Boolean, default=False)
+    status = Column(String(20), nullable=False)  # ok, error, rejected, coalesced
+    error = Column(String(255))
@@ -1,5 +1,5 @@
 # backend/app/models/class_management.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, Date, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, Date, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.base import Base
@@ -232,6 +232,9 @@ class StudentLearningProfile(Base):
 class LearningResourceRecommendation(Base):
     """学习资源推荐表"""
     __tablename__ = "learning_resource_recommendations"
+    __table_args__ = (
+        Index("ix_learning_resource_recommendations_student_expires", "student_id", "expires_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
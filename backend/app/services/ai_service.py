@@ -1,13 +1,22 @@
 # backend/app/services/ai_service.py
 import json
+import time
 import httpx
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncIterator
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.models.user import User
 from app.models.analytics import StudentPerformance, LearningBehavior
 from app.models.question import Question, KnowledgePoint
 from app.services.analytics_service import AnalyticsService
+from app.ai.engines.semantic_cache import semantic_cache
+from app.ai.engines.context_builder import context_builder
+from app.ai.engines.model_router import model_router
+from app.ai.engines.llm_scheduler import llm_scheduler, Priority, LLMUnavailableError
+from app.ai.engines.llm_ledger import llm_ledger
+from app.ai.engines.context_builder import estimate_tokens
+
+FALLBACK_RESPONSE = "抱歉，AI服务暂时不可用，请稍后再试。"
 
 
 class AIService:
@@ -32,6 +41,17 @@ class AIService:
         if not user:
             raise ValueError("用户不存在")
         
+        # 语义缓存：同一用户的相似问题直接复用已有回答（回答含该用户的个人上下文，不跨用户复用）
+        subject = (context or {}).get("subject_id") or (context or {}).get("subject")
+        cached_response = semantic_cache.lookup(message, role, subject, user_id)
+        if cached_response is not None:
+            llm_ledger.record(
+                f"ai_service.chat.{role}", "ai_service", "ok", 0.0,
+                completion_tokens=estimate_tokens(cached_response.get("content", "")),
+                cache_hit=True, user_id=user_id, role=role
+            )
+            return cached_response
+        
         # 根据角色构建不同的系统提示词
         system_prompt = self._build_system_prompt(role, user, context)
         
@@ -50,8 +70,67 @@ class AIService:
             response, role, user_id, message
         )
         
+        if response != FALLBACK_RESPONSE:
+            semantic_cache.add(message, role, subject, processed_response, user_id)
+        
         return processed_response
     
+    async def chat_stream(
+        self, 
+        message: str, 
+        role: str, 
+        user_id: int,
+        context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """AI对话流式入口
+        
+        依次产出 {"event": "token", "data": {...}} 增量事件，
+        流结束后产出携带建议和资源的 {"event": "final", "data": {...}} 事件
+        """
+        
+        user = self.db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise ValueError("用户不存在")
+        
+        subject = (context or {}).get("subject_id") or (context or {}).get("subject")
+        cached_response = semantic_cache.lookup(message, role, subject, user_id)
+        if cached_response is not None:
+            llm_ledger.record(
+                f"ai_service.chat_stream.{role}", "ai_service", "ok", 0.0,
+                completion_tokens=estimate_tokens(cached_response.get("content", "")),
+                cache_hit=True, user_id=user_id, role=role
+            )
+            yield {"event": "token", "data": {"content": cached_response["content"]}}
+            yield {"event": "final", "data": {
+                key: value for key, value in cached_response.items() if key != "content"
+            }}
+            return
+        
+        system_prompt = self._build_system_prompt(role, user, context)
+        user_context = await self._build_user_context(user_id, role)
+        
+        chunks = []
+        async for chunk in self._call_llm_stream(
+            system_prompt=system_prompt,
+            user_message=message,
+            context=user_context
+        ):
+            chunks.append(chunk)
+            yield {"event": "token", "data": {"content": chunk}}
+        
+        # 流结束后再生成建议与资源，并写入缓存
+        response = "".join(chunks)
+        processed_response = await self._process_ai_response(
+            response, role, user_id, message
+        )
+        
+        if response != FALLBACK_RESPONSE:
+            semantic_cache.add(message, role, subject, processed_response, user_id)
+        
+        yield {"event": "final", "data": {
+            key: value for key, value in processed_response.items() if key != "content"
+        }}
+    
     def _build_system_prompt(self, role: str, user: User, context: Dict[str, Any]) -> str:
         """构建角色专属的系统提示词"""
         
@@ -188,47 +267,177 @@ class AIService:
     ) -> str:
         """调用LLM API"""
         
-        try:
-            # 构建消息
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"""
-用户问题: {user_message}
-
-用户上下文: {json.dumps(context, ensure_ascii=False, indent=2)}
-
-请基于以上信息回答用户问题。
-"""}
-            ]
-            
-            # 调用OpenAI API (或其他LLM API)
-            headers = {
-                "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": "gpt-4",
-                "messages": messages,
-                "max_tokens": 1000,
-                "temperature": 0.7
-            }
-            
+        # 调用OpenAI API (或其他LLM API)
+        headers, payload, route = self._build_llm_request(system_prompt, user_message, context)
+        
+        async def request_completion() -> str:
             response = await self.client.post(
-                "https://api.openai.com/v1/chat/completions",
+                f"{settings.OPENAI_BASE_URL}/chat/completions",
                 headers=headers,
                 json=payload
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-            else:
-                return "抱歉，AI服务暂时不可用，请稍后再试。"
-                
+            # 非200计入熔断器的错误率
+            response.raise_for_status()
+            result = response.json()
+            usage.update(result.get("usage") or {})
+            return result["choices"][0]["message"]["content"]
+        
+        usage = {}
+        start_time = time.perf_counter()
+        try:
+            content = await llm_scheduler.run(route.lane, request_completion, priority=Priority.INTERACTIVE)
+            model_router.record(route, (time.perf_counter() - start_time) * 1000)
+        except LLMUnavailableError as e:
+            print(f"LLM调用被拒绝: {e}")
+            self._record_call("chat", payload, route, context, start_time, "rejected", error=str(e))
+            return FALLBACK_RESPONSE
         except Exception as e:
             print(f"LLM API调用失败: {e}")
-            return "抱歉，AI服务暂时不可用，请稍后再试。"
+            self._record_call("chat", payload, route, context, start_time, "error", error=str(e))
+            return FALLBACK_RESPONSE
+        
+        self._record_call("chat", payload, route, context, start_time, "ok", content, usage)
+        return content
+    
+    async def _call_llm_stream(
+        self, 
+        system_prompt: str, 
+        user_message: str, 
+        context: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """流式调用LLM API，逐段产出增量内容"""
+        
+        headers, payload, route = self._build_llm_request(system_prompt, user_message, context)
+        payload["stream"] = True
+        # 流的最后一个分片携带token用量（choices为空）
+        payload["stream_options"] = {"include_usage": True}
+        
+        start_time = time.perf_counter()
+        received = False
+        chunks = []
+        usage = {}
+        try:
+            async with llm_scheduler.slot(route.lane, Priority.INTERACTIVE), self.client.stream(
+                "POST",
+                f"{settings.OPENAI_BASE_URL}/chat/completions",
+                headers=headers,
+                json=payload
+            ) as response:
+                response.raise_for_status()
+                
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    
+                    chunk = json.loads(data)
+                    usage.update(chunk.get("usage") or {})
+                    if not chunk.get("choices"):
+                        continue
+                    content = chunk["choices"][0].get("delta", {}).get("content")
+                    if content:
+                        if not received:
+                            model_router.record(route, (time.perf_counter() - start_time) * 1000)
+                        received = True
+                        chunks.append(content)
+                        yield content
+                        
+        except Exception as e:
+            print(f"LLM流式调用失败: {e}")
+            status = "rejected" if isinstance(e, LLMUnavailableError) else "error"
+            self._record_call(
+                "chat_stream", payload, route, context, start_time, status, "".join(chunks), usage, error=str(e)
+            )
+            # 已输出部分内容时向上抛出，避免残缺回答被写入缓存
+            if received:
+                raise
+            yield FALLBACK_RESPONSE
+            return
+        
+        self._record_call("chat_stream", payload, route, context, start_time, "ok", "".join(chunks), usage)
+    
+    def _record_call(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        route,
+        context: Dict[str, Any],
+        start_time: float,
+        status: str,
+        content: str = "",
+        usage: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ):
+        """写入LLM调用流水，上游未返回usage时按本地估算计token"""
+        usage = usage or {}
+        role = context.get("role")
+        prompt_tokens = usage.get("prompt_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = sum(estimate_tokens(message["content"]) for message in payload["messages"])
+        completion_tokens = usage.get("completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(content)
+        
+        llm_ledger.record(
+            f"ai_service.{kind}.{role}", "ai_service", status,
+            (time.perf_counter() - start_time) * 1000,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            user_id=context.get("user_id"),
+            role=role,
+            provider="openai",
+            model=route.model,
+            tier=route.tier,
+            error=error
+        )
+    
+    def _build_llm_request(
+        self, 
+        system_prompt: str, 
+        user_message: str, 
+        context: Dict[str, Any]
+    ) -> tuple:
+        """构建LLM请求头、请求体及模型路由"""
+        
+        # 按token预算压缩用户上下文，优先保留与问题相关的条目
+        context_text, _ = context_builder.build(context, user_message)
+        
+        # 构建消息
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"""
+用户问题: {user_message}
+
+用户上下文:
+{context_text}
+
+请基于以上信息回答用户问题。
+"""}
+        ]
+        
+        headers = {
+            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        
+        # 按角色和提示长度选择模型档位
+        route = model_router.route(
+            "openai",
+            system_prompt + messages[1]["content"],
+            role=context.get("role")
+        )
+        
+        payload = {
+            "model": route.model,
+            "messages": messages,
+            "max_tokens": 1000,
+            "temperature": 0.7
+        }
+        
+        return headers, payload, route
     
     async def _process_ai_response(
         self, 
@@ -12,14 +12,15 @@ from app.models.user import User, Teacher, Student, Role
 from app.models.class_management import (
     ClassInfo, ClassTeacherAssignment, StudentClassHistory, 
     StudentImportTask, HomeworkAssignment, ExamAssignment,
-    TeachingSchedule, HomeworkSubmissionDetail, ExamSubmissionDetail
+    TeachingSchedule, HomeworkSubmissionDetail, ExamSubmissionDetail, LearningResourceRecommendation
 )
 from app.models.homework import Homework, HomeworkSubmission
 from app.models.exam import Exam, ExamRecord
-from app.models.analytics import StudentProfile, LearningRecommendation
+from app.models.analytics import StudentProfile
 from app.core.security import get_password_hash
 from app.utils.excel_parser import parse_student_excel
 from app.services.ai_service import AIService
+from app.ai.knowledge.student_feature_store import student_feature_store
 
 
 class ClassManagementService:
@@ -609,6 +610,9 @@ class ClassManagementService:
         if not submission:
             raise HTTPException(status_code=404, detail="作业提交不存在")
         
+        # 重复批改时只计入分数变化
+        previous_score = (submission.score or 0) if submission.status == 3 else None
+        
         # 更新作业成绩和评语
         submission.score = grade_data.get("score")
         submission.comment = grade_data.get("comment")
@@ -627,6 +631,10 @@ class ClassManagementService:
             assignment.final_score = grade_data.get("score")
         
         self.db.commit()
+        
+        # 增量更新学生特征
+        student_feature_store.record_homework(submission.student_id, submission.score, previous_score)
+        student_feature_store.refresh_mastery(submission.student_id)
         return True
 
     # ==================== 学生功能 ====================
@@ -729,25 +737,36 @@ class ClassManagementService:
         return profile
 
     def get_student_recommendations(self, student_id: int) -> List[Dict[str, Any]]:
-        """获取学生学习推荐"""
-        recommendations = self.db.query(LearningRecommendation).filter(
+        """获取学生学习推荐（未过期的推荐，通常由批量任务预计算）"""
+        recommendations = self.db.query(LearningResourceRecommendation, Subject.name).outerjoin(
+            Subject, Subject.id == LearningResourceRecommendation.subject_id
+        ).filter(
             and_(
-                LearningRecommendation.student_id == student_id,
-                LearningRecommendation.status == 1
+                LearningResourceRecommendation.student_id == student_id,
+                LearningResourceRecommendation.completed.is_(False),
+                or_(
+                    LearningResourceRecommendation.expires_at.is_(None),
+                    LearningResourceRecommendation.expires_at > datetime.now()
+                )
             )
-        ).order_by(LearningRecommendation.priority.desc()).limit(10).all()
+        ).order_by(
+            LearningResourceRecommendation.recommendation_score.desc(), LearningResourceRecommendation.id
+        ).limit(10).all()
         
         result = []
-        for rec in recommendations:
+        for rec, subject_name in recommendations:
             result.append({
                 "id": rec.id,
-                "knowledge_point": rec.knowledge_point,
-                "difficulty_level": rec.difficulty_level,
                 "resource_type": rec.resource_type,
-                "resource_id": rec.resource_id,
-                "reason": rec.reason,
-                "priority": rec.priority,
-                "created_at": rec.created_at
+                "resource_title": rec.resource_title,
+                "resource_url": rec.resource_url,
+                "subject_name": subject_name,
+                "difficulty_level": rec.difficulty_level,
+                "estimated_time": rec.estimated_time,
+                "recommendation_reason": rec.recommendation_reason,
+                "recommendation_score": rec.recommendation_score,
+                "clicked": bool(rec.clicked),
+                "completed": bool(rec.completed)
             })
         
         return result
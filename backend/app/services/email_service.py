@@ -24,6 +24,16 @@ class EmailService:
         is_html: bool = False
     ) -> bool:
         """发送邮件"""
+        return self.send_email_sync(to_email, subject, body, is_html)
+    
+    def send_email_sync(
+        self, 
+        to_email: str, 
+        subject: str, 
+        body: str, 
+        is_html: bool = False
+    ) -> bool:
+        """同步发送邮件（阻塞的SMTP调用），后台任务中应放到线程执行"""
         if not all([self.smtp_host, self.smtp_port, self.smtp_user, self.smtp_password]):
             print("邮件服务未配置，跳过发送")
             return False
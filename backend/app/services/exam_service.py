@@ -7,6 +7,7 @@ from app.models.exam import Exam, ExamQuestion, ExamRecord, ExamAnswer
 from app.models.content import Question
 from app.schemas.exam import ExamCreate, ExamUpdate, ExamSubmission
 from app.services.base_service import BaseService
+from app.ai.knowledge.student_feature_store import student_feature_store
 
 
 class ExamService(BaseService[Exam]):
@@ -182,6 +183,7 @@ class ExamService(BaseService[Exam]):
             return
         
         total_score = 0.0
+        answered = correct = 0
         
         # 获取所有答案
         answers = self.db.query(ExamAnswer).filter(
@@ -216,6 +218,8 @@ class ExamService(BaseService[Exam]):
                 answer.is_correct = is_correct
                 answer.score = exam_question.score if is_correct else 0.0
                 total_score += answer.score
+                answered += 1
+                correct += 1 if is_correct else 0
             else:
                 # 主观题需要人工批改
                 answer.score = 0.0
@@ -226,6 +230,10 @@ class ExamService(BaseService[Exam]):
         exam_record.status = 3  # 已批改
         
         self.db.commit()
+        
+        # 增量更新学生特征：与 rebuild_raw 一致，按交卷时间计入当天
+        student_feature_store.record_answers(exam_record.student_id, answered, correct, now=exam_record.submit_time)
+        student_feature_store.refresh_mastery(exam_record.student_id)
     
     def check_answer_correctness(self, student_answer: str, correct_answer: str) -> bool:
         """检查答案正确性"""
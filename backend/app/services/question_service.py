@@ -4,6 +4,7 @@ from sqlalchemy import and_, or_, func
 from app.models.content import Question, QuestionKnowledge, KnowledgePoint, QuestionType, DifficultyLevel
 from app.schemas.exam import QuestionCreate, QuestionResponse
 from app.services.base_service import BaseService
+from app.ai.knowledge.question_index import question_index
 
 
 class QuestionService(BaseService[Question]):
@@ -100,24 +101,45 @@ class QuestionService(BaseService[Question]):
         if not question:
             return []
         
-        # 基于相同知识点和相近难度查找相似题目
-        similar_questions = self.db.query(Question).join(QuestionKnowledge).filter(
+        # 候选题优先取自内存索引（同学科、难度等级相差不超过1、共享知识点）
+        knowledge_ids = [link.knowledge_id for link in question.knowledge_points]
+        similar_ids = question_index.similar_ids(question.id, knowledge_ids, count)
+        if similar_ids is not None:
+            if not similar_ids:
+                return []
+            questions = {
+                item.id: item for item in self.db.query(Question).filter(
+                    Question.id.in_(similar_ids), Question.status == 1
+                ).all()
+            }
+            return [questions[item_id] for item_id in similar_ids if item_id in questions]
+        
+        # 基于相同知识点和相近难度等级查找相似题目，排序与索引一致
+        shared = self.db.query(
+            QuestionKnowledge.question_id, func.count().label("shared")
+        ).filter(
+            QuestionKnowledge.knowledge_id.in_(knowledge_ids)
+        ).group_by(QuestionKnowledge.question_id).subquery()
+        level = self.db.query(DifficultyLevel.level).filter(
+            DifficultyLevel.id == question.difficulty_id
+        ).scalar()
+        
+        query = self.db.query(Question).join(
+            shared, shared.c.question_id == Question.id
+        ).join(
+            DifficultyLevel, DifficultyLevel.id == Question.difficulty_id
+        ).filter(
             and_(
                 Question.id != question_id,
                 Question.subject_id == question.subject_id,
-                Question.difficulty_id.in_([
-                    question.difficulty_id - 1,
-                    question.difficulty_id,
-                    question.difficulty_id + 1
-                ]),
-                Question.status == 1,
-                QuestionKnowledge.knowledge_id.in_(
-                    self.db.query(QuestionKnowledge.knowledge_id).filter(
-                        QuestionKnowledge.question_id == question_id
-                    )
-                )
+                Question.status == 1
             )
-        ).distinct().limit(count).all()
+        )
+        if level is not None:
+            query = query.filter(DifficultyLevel.level.between(level - 1, level + 1))
+        similar_questions = query.order_by(
+            shared.c.shared.desc(), Question.save_num.desc(), Question.id.desc()
+        ).limit(count).all()
         
         return similar_questions
     
@@ -141,8 +163,22 @@ class QuestionService(BaseService[Question]):
             self.db.add(question_knowledge)
         
         self.db.commit()
+        question_index.add_question(question, question_create.knowledge_point_ids)
         return question
     
+    def update(self, db_obj: Question, obj_in: Dict[str, Any]) -> Question:
+        """更新题目，各进程的题目索引随后重建"""
+        question = super().update(db_obj, obj_in)
+        question_index.invalidate()
+        return question
+    
+    def delete(self, id: Any) -> bool:
+        """删除题目，各进程的题目索引随后重建"""
+        deleted = super().delete(id)
+        if deleted:
+            question_index.invalidate()
+        return deleted
+    
     def get_question_statistics(self, subject_id: Optional[int] = None) -> Dict[str, Any]:
         """获取题库统计信息"""
         query = self.db.query(Question).filter(Question.status == 1)
@@ -1,7 +1,10 @@
 import json
+import time
 import redis
-from typing import Any, Optional, Union
+from collections import OrderedDict
+from typing import Any, Optional, Tuple, Union
 from functools import wraps
+from loguru import logger
 from app.core.config import settings
 
 # Redis客户端
@@ -117,3 +120,62 @@ class CacheManager:
         except Exception as e:
             logger.error(f"Cache exists error: {e}")
             return False
+
+
+class TwoTierCache:
+    """两级缓存：进程内LRU（一级） + Redis（二级）"""
+    
+    def __init__(self, prefix: str, local_maxsize: int = 1024, local_ttl: int = 60):
+        self.prefix = prefix
+        self.local_maxsize = local_maxsize
+        self.local_ttl = local_ttl
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+    
+    def _full_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+    
+    def _get_local(self, key: str) -> Optional[Any]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        
+        self._local.move_to_end(key)
+        return value
+    
+    def _set_local(self, key: str, value: Any, expire: int):
+        ttl = min(expire, self.local_ttl)
+        self._local[key] = (time.monotonic() + ttl, value)
+        self._local.move_to_end(key)
+        
+        while len(self._local) > self.local_maxsize:
+            self._local.popitem(last=False)
+    
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存，一级未命中时回源Redis并回填"""
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        
+        value = CacheManager.get(self._full_key(key))
+        if value is not None:
+            self._set_local(key, value, self.local_ttl)
+        return value
+    
+    def set(self, key: str, value: Any, expire: int = 300) -> bool:
+        """同时写入两级缓存"""
+        self._set_local(key, value, expire)
+        return CacheManager.set(self._full_key(key), value, expire)
+    
+    def delete(self, key: str) -> bool:
+        """同时删除两级缓存"""
+        self._local.pop(key, None)
+        return CacheManager.delete(self._full_key(key))
+    
+    def clear_local(self):
+        """清空进程内缓存"""
+        self._local.clear()
@@ -1,3 +1,4 @@
+import json
 import hashlib
 import secrets
 import string
@@ -142,3 +143,9 @@ def mask_sensitive_string(value: str, mask_char: str = "*", keep_prefix: int = 3
     mask_length = len(value) - keep_prefix - keep_suffix
     
     return prefix + mask_char * mask_length + suffix
+
+
+def format_sse(event: str, data: Any) -> str:
+    """格式化Server-Sent Events消息"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+学习行为日志归档：补充未来月份分区，把早于保留期的整月导出为压缩文件后删除
+
+建议每天执行一次（在汇总任务之后），例如 crontab:
+    15 3 * * * cd /path/to/backend && python scripts/archive_behavior_logs.py
+
+只归档已完成汇总的月份；导出文件位于 AI_BEHAVIOR_LOG_ARCHIVE_DIR/{YYYYMM}/，
+历史查询（/ai/activity-history）会自动从归档文件读取这些月份。
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ai.knowledge.behavior_log_archive import behavior_log_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学习行为日志归档")
+    parser.add_argument("--retention-months", type=int, help="数据库中保留的整月数，默认取配置")
+    parser.add_argument("--months-ahead", type=int, default=3, help="预先创建的未来月份分区数")
+    parser.add_argument("--partitions-only", action="store_true", help="只补充分区，不归档")
+    parser.add_argument("--dry-run", action="store_true", help="只打印最早一个待归档月份的行数")
+    args = parser.parse_args()
+
+    if args.retention_months:
+        behavior_log_archive.retention_months = args.retention_months
+
+    added = behavior_log_archive.ensure_partitions(args.months_ahead)
+    if added:
+        print(f"新增分区: {', '.join(added)}")
+    if args.partitions_only:
+        return
+
+    try:
+        results = behavior_log_archive.archive_expired(dry_run=args.dry_run)
+    except Exception as e:
+        print(f"归档失败: {e}")
+        sys.exit(1)
+
+    for result in results:
+        if result.get("dry_run"):
+            print(f"{result['month']}: 待归档 {result['rows']} 行")
+        else:
+            print(f"{result['month']}: 归档 {result['rows']} 行 -> {result['path']}（{result['dropped']}）")
+    if not results:
+        print(f"没有超过保留期（{behavior_log_archive.retention_months} 个月）且已汇总的月份")
+
+
+if __name__ == "__main__":
+    main()
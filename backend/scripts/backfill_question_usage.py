@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+题目使用计数回填：从学习行为日志重建最近N天的按天作答计数
+
+上线题目使用计数、Redis数据丢失或调整 AI_QUESTION_USAGE_WINDOW_DAYS 后执行一次:
+    python scripts/backfill_question_usage.py --days 30
+
+覆盖这些天的已有计数；执行期间新产生的作答可能被覆盖，建议在低峰期执行。
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ai.knowledge.question_usage_store import question_usage_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="题目使用计数回填")
+    parser.add_argument("--days", type=int, help="回填的天数，默认取配置的统计窗口")
+    args = parser.parse_args()
+
+    try:
+        per_day = question_usage_store.backfill(args.days)
+    except Exception as e:
+        print(f"回填失败: {e}")
+        sys.exit(1)
+
+    for day, answers in per_day.items():
+        print(f"{day}: {answers} 次作答")
+    print(f"完成：{len(per_day)} 天有作答记录，共 {sum(per_day.values())} 次")
+
+
+if __name__ == "__main__":
+    main()
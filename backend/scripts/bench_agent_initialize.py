@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+学生Agent启动（/ai/agent/initialize）延迟基准测试
+
+先为指定学生写入一批贴近真实的学习历史（行为日志、知识点掌握度、错题），再测量冷启动延迟:
+    python scripts/bench_agent_initialize.py seed --user-id 12
+    python scripts/bench_agent_initialize.py inprocess --user-id 12 --iterations 50
+    python scripts/bench_agent_initialize.py http --user student1:password --iterations 50
+
+inprocess 直接调用 StudentAIAgent 的启动流程，同时统计每次启动执行的SQL条数；
+http 模式每轮先调用 /ai/agent/shutdown 清除会话，保证每次 initialize 都执行完整启动流程。
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ACTION_TYPES = [
+    "answer_question", "answer_question", "answer_question", "view_content",
+    "start_learning", "request_help", "ai_chat", "complete_homework"
+]
+
+
+def print_latencies(label: str, samples: List[float]):
+    values = np.array(samples) if samples else np.zeros(1)
+    print(
+        f"{label:<12}{len(samples):>6}{np.percentile(values, 50):>10.1f}{np.percentile(values, 95):>10.1f}"
+        f"{np.percentile(values, 99):>10.1f}{values.max():>10.1f}  (ms)"
+    )
+
+
+def seed(args: argparse.Namespace):
+    """为学生写入学习历史：行为日志分布在最近24小时（含最近1小时），掌握度与错题引用已有知识点和试题"""
+    from app.core.database import get_db
+    from app.models.question import KnowledgePoint, Question
+    from app.models.analytics import LearningBehaviorLog, StudentKnowledgeMastery, MistakeCollection
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    with next(get_db()) as db:
+        logs = []
+        for _ in range(args.activities):
+            action_type = rng.choice(ACTION_TYPES)
+            logs.append({
+                "student_id": args.user_id,
+                "action_type": action_type,
+                "action_data": {"type": action_type, "data": {"is_correct": rng.random() < 0.7}},
+                "session_duration": rng.randint(30, 1800),
+                "timestamp": now - timedelta(seconds=rng.randint(0, 24 * 3600))
+            })
+        db.execute(LearningBehaviorLog.__table__.insert(), logs)
+
+        knowledge_ids = [row.id for row in db.query(KnowledgePoint.id).limit(args.masteries).all()]
+        if knowledge_ids:
+            db.query(StudentKnowledgeMastery).filter(
+                StudentKnowledgeMastery.student_id == args.user_id
+            ).delete(synchronize_session=False)
+            db.execute(StudentKnowledgeMastery.__table__.insert(), [
+                {
+                    "student_id": args.user_id,
+                    "knowledge_point_id": knowledge_id,
+                    "mastery_level": round(rng.random(), 2),
+                    "last_practice_time": now - timedelta(days=rng.randint(0, 30))
+                }
+                for knowledge_id in knowledge_ids
+            ])
+
+        question_ids = [row.id for row in db.query(Question.id).limit(args.mistakes).all()]
+        if question_ids:
+            db.execute(MistakeCollection.__table__.insert(), [
+                {
+                    "student_id": args.user_id,
+                    "question_id": question_id,
+                    "wrong_answer": "B",
+                    "mistake_type": rng.choice(["concept", "calculation", "careless"]),
+                    "review_count": rng.randint(0, 3),
+                    "status": 1 if rng.random() < 0.6 else 2
+                }
+                for question_id in question_ids
+            ])
+        db.commit()
+
+    print(
+        f"学生 {args.user_id}: 行为日志 {len(logs)} 条，掌握度 {len(knowledge_ids)} 条，错题 {len(question_ids)} 条"
+    )
+    if not knowledge_ids or not question_ids:
+        print("提示: 知识点或试题表为空，请先导入题库数据")
+
+
+async def bench_inprocess(args: argparse.Namespace):
+    from sqlalchemy import event
+    from app.core.database import engine
+    from app.ai.agents.student_agent import StudentAIAgent
+    from app.ai.knowledge.knowledge_base import CentralKnowledgeBase
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    knowledge_base = CentralKnowledgeBase()
+    latencies, per_startup = [], []
+
+    for i in range(args.warmup + args.iterations):
+        agent = StudentAIAgent(args.user_id, knowledge_base)
+        statements = 0
+        start = time.perf_counter()
+        await agent.on_startup()
+        if i >= args.warmup:
+            latencies.append((time.perf_counter() - start) * 1000)
+            per_startup.append(statements)
+
+    print(f"\n{'':<12}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    print_latencies("on_startup", latencies)
+    print(f"每次启动SQL条数: {np.mean(per_startup):.1f}")
+
+
+async def bench_http(args: argparse.Namespace):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        username, _, password = args.user.partition(":")
+        response = await client.post("/auth/login", json={"username": username, "password": password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+        latencies, errors = [], 0
+        for i in range(args.warmup + args.iterations):
+            await client.post("/ai/agent/shutdown", headers=headers)
+            start = time.perf_counter()
+            response = await client.post("/ai/agent/initialize", headers=headers)
+            if response.status_code >= 400:
+                errors += 1
+            elif i >= args.warmup:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    print(f"\n{'':<12}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    print_latencies("initialize", latencies)
+    print(f"失败: {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学生Agent启动延迟基准测试")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    seed_parser = sub.add_parser("seed", help="写入学习历史")
+    seed_parser.add_argument("--user-id", type=int, required=True)
+    seed_parser.add_argument("--activities", type=int, default=300, help="最近24小时的行为日志条数")
+    seed_parser.add_argument("--masteries", type=int, default=80, help="知识点掌握度条数")
+    seed_parser.add_argument("--mistakes", type=int, default=30, help="错题条数")
+    seed_parser.add_argument("--seed", type=int, default=42)
+
+    inprocess_parser = sub.add_parser("inprocess", help="进程内直接测量启动流程")
+    inprocess_parser.add_argument("--user-id", type=int, required=True)
+
+    http_parser = sub.add_parser("http", help="通过接口测量")
+    http_parser.add_argument("--base-url", default="http://127.0.0.1:8000/api/v1")
+    http_parser.add_argument("--user", required=True, help="学生账号 username:password")
+    http_parser.add_argument("--timeout", type=float, default=60.0)
+
+    for bench_parser in (inprocess_parser, http_parser):
+        bench_parser.add_argument("--iterations", type=int, default=50)
+        bench_parser.add_argument("--warmup", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.mode == "seed":
+        seed(args)
+    elif args.mode == "inprocess":
+        asyncio.run(bench_inprocess(args))
+    else:
+        asyncio.run(bench_http(args))
+
+
+if __name__ == "__main__":
+    main()
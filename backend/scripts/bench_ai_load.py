@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+AI接口负载基准测试：按目标RPS驱动 /ai/chat、/ai/agent/initialize、/ai/agent/action
+
+配合 scripts/mock_llm_server.py 使用，避免消耗真实token:
+    python scripts/mock_llm_server.py --port 8900 &
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 uvicorn app.main:app --port 8000 &
+    python scripts/bench_ai_load.py --user student1:password --rps 20 --duration 60
+
+采用开环调度：请求按固定间隔发出而不等待前一个完成，延迟从计划发送时刻算起，
+避免服务变慢时压测端同步降速而低估尾延迟。
+"""
+import time
+import random
+import asyncio
+import argparse
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+QUESTIONS = [
+    "什么是勾股定理？", "一元二次方程怎么解", "二次函数的顶点怎么求", "光合作用的过程是什么",
+    "牛顿第二定律怎么理解", "化学方程式如何配平", "文言文翻译有什么技巧", "英语现在完成时怎么用",
+    "分数除法怎么算", "等差数列求和公式是什么", "圆的面积公式怎么推导", "电路串联和并联有什么区别"
+]
+
+ENDPOINTS = {
+    "chat": ("POST", "/ai/chat"),
+    "initialize": ("POST", "/ai/agent/initialize"),
+    "action": ("POST", "/ai/agent/action"),
+}
+
+
+def build_payload(endpoint: str, rng: random.Random, unique: bool) -> Optional[Dict[str, Any]]:
+    question = rng.choice(QUESTIONS)
+    if unique:
+        # 追加随机后缀绕过缓存，测量未命中路径
+        question = f"{question}（{rng.randint(0, 10 ** 9)}）"
+
+    if endpoint == "chat":
+        return {"message": question, "context": {"subject": "math"}, "history": []}
+    if endpoint == "action":
+        return {
+            "action_type": "request_help",
+            "data": {"question": question},
+            "context": {"help_type": "concept"}
+        }
+    return None
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """解析 "chat=6,action=3,initialize=1" 形式的请求配比"""
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"未知接口: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+async def login(client: httpx.AsyncClient, credential: str) -> str:
+    username, _, password = credential.partition(":")
+    response = await client.post("/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["data"]["access_token"]
+
+
+async def main_async(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    names, weights = [name for name, _ in mix], [weight for _, weight in mix]
+
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        tokens = list(args.token or [])
+        for credential in args.user or []:
+            tokens.append(await login(client, credential))
+        if not tokens:
+            raise SystemExit("需要至少一个 --user 或 --token")
+
+        latencies: Dict[str, List[float]] = {name: [] for name in names}
+        errors: Dict[str, int] = {name: 0 for name in names}
+        status_counts: Dict[str, int] = {}
+        dropped = 0
+        in_flight = 0
+
+        async def fire(endpoint: str, token: str, scheduled_at: float, record: bool):
+            nonlocal in_flight
+            method, path = ENDPOINTS[endpoint]
+            payload = build_payload(endpoint, rng, args.unique)
+            try:
+                response = await client.request(
+                    method, path, json=payload, headers={"Authorization": f"Bearer {token}"}
+                )
+                status = str(response.status_code)
+                ok = response.status_code < 400
+            except Exception as e:
+                status = type(e).__name__
+                ok = False
+            finally:
+                in_flight -= 1
+
+            if not record:
+                return
+            status_counts[status] = status_counts.get(status, 0) + 1
+            if ok:
+                latencies[endpoint].append((time.perf_counter() - scheduled_at) * 1000)
+            else:
+                errors[endpoint] += 1
+
+        total = int(args.rps * (args.warmup + args.duration))
+        warmup_requests = int(args.rps * args.warmup)
+        interval = 1.0 / args.rps
+        tasks = []
+
+        print(f"目标 {args.rps} RPS，预热 {args.warmup}s，测量 {args.duration}s，配比 {args.mix}")
+        start = time.perf_counter()
+        for i in range(total):
+            scheduled_at = start + i * interval
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if in_flight >= args.max_in_flight:
+                # 客户端并发已满，计为丢弃而不是悄悄排队
+                if i >= warmup_requests:
+                    dropped += 1
+                continue
+
+            in_flight += 1
+            endpoint = rng.choices(names, weights)[0]
+            token = tokens[i % len(tokens)]
+            tasks.append(asyncio.create_task(fire(endpoint, token, scheduled_at, i >= warmup_requests)))
+
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start - args.warmup
+
+        print(f"\n{'接口':<12}{'成功':>8}{'失败':>8}{'RPS':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+        for name in names:
+            samples = np.array(latencies[name]) if latencies[name] else np.zeros(1)
+            print(
+                f"{name:<12}{len(latencies[name]):>8}{errors[name]:>8}"
+                f"{(len(latencies[name]) + errors[name]) / elapsed:>8.1f}"
+                f"{np.percentile(samples, 50):>10.1f}{np.percentile(samples, 95):>10.1f}"
+                f"{np.percentile(samples, 99):>10.1f}{samples.max():>10.1f}"
+            )
+        print(f"\n状态分布: {status_counts}  客户端丢弃: {dropped}")
+
+        if args.metrics:
+            response = await client.get("/ai/admin/metrics", headers={"Authorization": f"Bearer {tokens[0]}"})
+            print(f"\n服务端AI指标: {response.json().get('data') if response.status_code == 200 else response.status_code}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI接口负载基准测试")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000/api/v1")
+    parser.add_argument("--user", action="append", help="username:password，可重复指定以模拟多个用户")
+    parser.add_argument("--token", action="append", help="直接使用的访问令牌，可重复指定")
+    parser.add_argument("--rps", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=5.0, help="预热时长（秒），不计入统计")
+    parser.add_argument("--mix", default="chat=6,action=3,initialize=1", help="接口配比")
+    parser.add_argument("--unique", action="store_true", help="为每个问题追加随机后缀以绕过缓存")
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--metrics", action="store_true", help="结束后拉取 /ai/admin/metrics（需管理员令牌）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+学习统计（/ai/learning-analysis）基准测试
+
+为学生写入大量行为日志后，比较三种统计方式的耗时:
+    python scripts/bench_learning_analysis.py seed --user-id 12 --events 10000 --days 30
+    python scripts/bench_learning_analysis.py inprocess --user-id 12 --days 7 --explain
+    python scripts/bench_learning_analysis.py http --user student1:password --days 30
+
+inprocess 中 python_rows 为把窗口内全部行读入Python再汇总（改造前的做法，且未截断），
+sql_group_by 为在原始表上按日、小时分组聚合，rollup 为读小时汇总加高水位之后的原始行
+（需先执行 scripts/rollup_behavior_logs.py），features 为读取预计算的学生特征（仅7天以内窗口）。
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ACTION_TYPES = ["answer_question", "answer_question", "view_content", "start_learning", "request_help", "ai_chat"]
+
+
+def print_latencies(label: str, samples: List[float]):
+    values = np.array(samples) if samples else np.zeros(1)
+    print(
+        f"{label:<14}{len(samples):>6}{np.percentile(values, 50):>10.2f}{np.percentile(values, 95):>10.2f}"
+        f"{np.percentile(values, 99):>10.2f}{values.max():>10.2f}  (ms)"
+    )
+
+
+def timed(fn: Callable, iterations: int, warmup: int) -> List[float]:
+    samples = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        fn()
+        if i >= warmup:
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def seed(args: argparse.Namespace):
+    """写入分布在最近 days 天内的行为日志，白天时段更密集"""
+    from app.core.database import get_db
+    from app.models.analytics import LearningBehaviorLog
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    rows = []
+    for _ in range(args.events):
+        hour = min(23, max(0, int(rng.gauss(16, 4))))
+        timestamp = (now - timedelta(days=rng.randint(0, args.days - 1))).replace(
+            hour=hour, minute=rng.randint(0, 59), second=rng.randint(0, 59)
+        )
+        action_type = rng.choice(ACTION_TYPES)
+        action_data = {"type": action_type}
+        if action_type == "answer_question":
+            action_data["is_correct"] = rng.random() < 0.7
+        rows.append({
+            "student_id": args.user_id,
+            "action_type": action_type,
+            "action_data": action_data,
+            "session_duration": rng.randint(10, 900),
+            "timestamp": min(timestamp, now)
+        })
+
+    with next(get_db()) as db:
+        for start in range(0, len(rows), 1000):
+            db.execute(LearningBehaviorLog.__table__.insert(), rows[start:start + 1000])
+        db.commit()
+    print(f"学生 {args.user_id}: 写入行为日志 {len(rows)} 条，分布在最近 {args.days} 天")
+
+
+def bench_inprocess(args: argparse.Namespace):
+    from app.core.database import get_db, engine
+    from app.models.analytics import LearningBehaviorLog
+    from app.ai.knowledge.student_feature_store import student_feature_store, summarize_activity
+    from app.ai.knowledge.behavior_rollup import behavior_rollup, query_raw_counts
+
+    since = datetime.combine(datetime.now().date() - timedelta(days=args.days - 1), datetime.min.time())
+
+    def python_rows():
+        with next(get_db()) as db:
+            rows = db.query(LearningBehaviorLog).filter(
+                LearningBehaviorLog.student_id == args.user_id,
+                LearningBehaviorLog.timestamp >= since
+            ).all()
+            counts: Counter = Counter()
+            for row in rows:
+                day = row.timestamp.strftime("%Y%m%d")
+                counts[f"a:{day}:n"] += 1
+                counts[f"a:{day}:t"] += row.session_duration or 0
+                counts[f"h:{day}:{row.timestamp.hour:02d}"] += 1
+            return summarize_activity(counts, args.days)
+
+    def sql_group_by():
+        with next(get_db()) as db:
+            return summarize_activity(query_raw_counts(db, args.user_id, since), args.days)
+
+    def rollup():
+        with next(get_db()) as db:
+            return summarize_activity(behavior_rollup.activity_counts(db, args.user_id, since), args.days)
+
+    baseline = python_rows()
+    for label, pushed in (("sql_group_by", sql_group_by()), ("rollup", rollup())):
+        if (baseline["count"], baseline["total_time"]) != (pushed["count"], pushed["total_time"]):
+            print(f"警告: {label} 结果与逐行汇总不一致 {pushed['count']}/{baseline['count']}")
+    print(f"窗口 {args.days} 天内事件 {baseline['count']} 条，最活跃时段 {baseline['most_active_hour']}:00")
+
+    print(f"\n{'':<14}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    print_latencies("python_rows", timed(python_rows, args.iterations, args.warmup))
+    print_latencies("sql_group_by", timed(sql_group_by, args.iterations, args.warmup))
+    print_latencies("rollup", timed(rollup, args.iterations, args.warmup))
+    if args.days <= student_feature_store.window_days:
+        print_latencies("features", timed(
+            lambda: student_feature_store.activity_summary(args.user_id, args.days), args.iterations, args.warmup
+        ))
+
+    if args.explain and engine.dialect.name == "mysql":
+        from sqlalchemy import text
+        with engine.connect() as connection:
+            plan = connection.execute(text(
+                "EXPLAIN SELECT DATE(timestamp), HOUR(timestamp), COUNT(*), SUM(session_duration) "
+                "FROM learning_behavior_logs WHERE student_id = :student_id AND timestamp >= :since "
+                "GROUP BY DATE(timestamp), HOUR(timestamp)"
+            ), {"student_id": args.user_id, "since": since}).mappings().all()
+        print("\nEXPLAIN:")
+        for row in plan:
+            print(f"    key={row.get('key')} rows={row.get('rows')} extra={row.get('Extra')}")
+
+
+def bench_http(args: argparse.Namespace):
+    with httpx.Client(base_url=args.base_url, timeout=args.timeout) as client:
+        username, _, password = args.user.partition(":")
+        response = client.post("/auth/login", json={"username": username, "password": password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+        def request():
+            client.get("/ai/learning-analysis", params={"days": args.days}, headers=headers).raise_for_status()
+
+        print(f"\n{'':<14}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        print_latencies("analysis", timed(request, args.iterations, args.warmup))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学习统计基准测试")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    seed_parser = sub.add_parser("seed", help="写入行为日志")
+    seed_parser.add_argument("--user-id", type=int, required=True)
+    seed_parser.add_argument("--events", type=int, default=10000)
+    seed_parser.add_argument("--days", type=int, default=30, help="事件分布的天数")
+    seed_parser.add_argument("--seed", type=int, default=42)
+
+    inprocess_parser = sub.add_parser("inprocess", help="进程内比较统计方式")
+    inprocess_parser.add_argument("--user-id", type=int, required=True)
+    inprocess_parser.add_argument("--explain", action="store_true", help="打印分组聚合的执行计划（MySQL）")
+
+    http_parser = sub.add_parser("http", help="通过接口测量")
+    http_parser.add_argument("--base-url", default="http://127.0.0.1:8000/api/v1")
+    http_parser.add_argument("--user", required=True, help="学生账号 username:password")
+    http_parser.add_argument("--timeout", type=float, default=30.0)
+
+    for bench_parser in (inprocess_parser, http_parser):
+        bench_parser.add_argument("--days", type=int, default=7, help="统计窗口（天）")
+        bench_parser.add_argument("--iterations", type=int, default=50)
+        bench_parser.add_argument("--warmup", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.mode == "seed":
+        seed(args)
+    elif args.mode == "inprocess":
+        bench_inprocess(args)
+    else:
+        bench_http(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+题目推荐评分微基准：逐题评分 + 全排序 与 按列向量化评分 + argpartition 的对比
+
+    python scripts/bench_question_scoring.py --candidates 10000 --k 5
+
+只测评分与取top-k本身（不含数据库）；改造前每个候选题还各自执行一次使用次数查询，
+改造后候选题的列数据与使用次数各一次查询。
+"""
+import os
+import sys
+import time
+import argparse
+from typing import Callable, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ai.engines.question_scoring import quality_from_saves, score_questions, top_k
+
+
+def print_latencies(label: str, samples: List[float]):
+    values = np.array(samples) if samples else np.zeros(1)
+    print(
+        f"{label:<12}{len(samples):>6}{np.percentile(values, 50):>10.3f}{np.percentile(values, 95):>10.3f}"
+        f"{np.percentile(values, 99):>10.3f}{values.max():>10.3f}  (ms)"
+    )
+
+
+def timed(fn: Callable, iterations: int, warmup: int) -> List[float]:
+    samples = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        fn()
+        if i >= warmup:
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def legacy_score(candidate: dict, quality: float, target: int) -> float:
+    """改造前 _calculate_question_score 的逐题计算（使用次数已取出）"""
+    score = max(0, 1 - abs(candidate["level"] - target) / 5) * 0.4
+    score += quality * 0.3
+    score += max(0, 1 - candidate["usage"] / 10) * 0.2
+    score += min(candidate["knowledge_count"] / 5 * 0.1, 0.1)
+    return min(score, 1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="题目推荐评分微基准")
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--target", type=int, default=3, help="目标难度")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    ids = np.arange(1, args.candidates + 1, dtype=np.int64)
+    levels = rng.integers(args.target - 1, args.target + 2, args.candidates).astype(np.float64)
+    saves = rng.zipf(2.0, args.candidates).astype(np.float64)
+    knowledge_counts = rng.integers(1, 8, args.candidates).astype(np.float64)
+    usage_counts = rng.poisson(3, args.candidates).astype(np.float64)
+
+    rows = [
+        {"id": int(i), "level": float(l), "save_num": float(s), "knowledge_count": float(c), "usage": float(u)}
+        for i, l, s, c, u in zip(ids, levels, saves, knowledge_counts, usage_counts)
+    ]
+    qualities = quality_from_saves(saves).tolist()
+
+    def legacy():
+        scored = [(row, legacy_score(row, quality, args.target)) for row, quality in zip(rows, qualities)]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return [row["id"] for row, _ in scored[:args.k]]
+
+    def vectorized():
+        scores = score_questions(levels, quality_from_saves(saves), knowledge_counts, usage_counts, args.target)
+        return ids[top_k(scores, args.k)].tolist()
+
+    scores = score_questions(levels, quality_from_saves(saves), knowledge_counts, usage_counts, args.target)
+    legacy_scores = sorted((legacy_score(row, q, args.target) for row, q in zip(rows, qualities)), reverse=True)
+    if not np.allclose(np.sort(scores)[::-1][:args.k], legacy_scores[:args.k]):
+        print("警告: 两种实现的top-k分数不一致")
+
+    print(f"候选题 {args.candidates}，取top {args.k}")
+    print(f"\n{'':<12}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    legacy_samples = timed(legacy, args.iterations, args.warmup)
+    vectorized_samples = timed(vectorized, args.iterations, args.warmup)
+    print_latencies("per_question", legacy_samples)
+    print_latencies("vectorized", vectorized_samples)
+    print(f"\np50加速比: {np.percentile(legacy_samples, 50) / np.percentile(vectorized_samples, 50):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
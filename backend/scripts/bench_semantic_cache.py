@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+语义缓存查询延迟基准测试
+
+用法: python scripts/bench_semantic_cache.py --entries 1000000 --queries 1000
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.ai.engines.semantic_cache import SemanticCache
+
+SEED_TERMS = [
+    "勾股定理", "一元二次方程", "二次函数", "三角函数", "平行四边形", "相似三角形",
+    "光合作用", "牛顿第二定律", "化学方程式", "文言文翻译", "议论文写作", "英语时态",
+    "分数除法", "概率统计", "等差数列", "圆的面积", "电路串并联", "细胞分裂"
+]
+QUESTION_TEMPLATES = [
+    "什么是{}？", "{}怎么理解", "如何掌握{}的解题方法", "{}有哪些常见错误",
+    "请讲解一下{}", "{}的例题第{}题怎么做", "{}和{}有什么区别", "老师说的{}我没听懂"
+]
+
+
+def build_vocabulary(rng: random.Random, size: int) -> list:
+    """生成知识点术语表（真实题库的术语规模为数千级）"""
+    terms = list(SEED_TERMS)
+    while len(terms) < size:
+        length = rng.randint(2, 6)
+        terms.append("".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(length)))
+    return terms
+
+
+def make_question(rng: random.Random, terms: list) -> str:
+    template = rng.choice(QUESTION_TEMPLATES)
+    slots = template.count("{}")
+    values = [rng.choice(terms) for _ in range(slots)]
+    if "第{}题" in template:
+        values[-1] = str(rng.randint(1, 500))
+    return template.format(*values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语义缓存查询延迟基准测试")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    terms = build_vocabulary(rng, args.vocabulary)
+    cache = SemanticCache(threshold=0.8, capacity_per_bucket=args.entries, enabled=True)
+
+    print(f"写入 {args.entries} 条缓存...")
+    start = time.perf_counter()
+    written = 0
+    while written < args.entries:
+        size = min(args.batch, args.entries - written)
+        questions = [make_question(rng, terms) for _ in range(size)]
+        cache.add_many(questions, "student", "math", [{"content": q} for q in questions])
+        written += size
+    build_seconds = time.perf_counter() - start
+    print(f"写入耗时 {build_seconds:.1f}s ({args.entries / build_seconds:.0f} 条/秒)")
+
+    # 首次查询会封装待写缓冲区，不计入统计
+    cache.lookup(make_question(rng, terms), "student", "math")
+
+    latencies = []
+    for _ in range(args.queries):
+        question = make_question(rng, terms)
+        start = time.perf_counter()
+        cache.lookup(question, "student", "math")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies = np.array(latencies)
+    bucket = cache.buckets[("student", "math")]
+    print(f"段数量: {len(bucket.segments)}, 条目数: {bucket.size}")
+    print(
+        f"查询延迟(ms): p50={np.percentile(latencies, 50):.2f} "
+        f"p95={np.percentile(latencies, 95):.2f} p99={np.percentile(latencies, 99):.2f} "
+        f"max={latencies.max():.2f}"
+    )
+    print(f"命中率: {cache.stats()['hit_rate']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
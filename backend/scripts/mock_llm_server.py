@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+本地模拟LLM服务，兼容 OpenAI chat-completions 协议（含流式输出）
+
+用法:
+    python scripts/mock_llm_server.py --port 8900 --latency lognormal --latency-ms 800 \
+        --error-rate 0.02 --tokens-per-sec 40
+
+然后设置 OPENAI_BASE_URL=http://127.0.0.1:8900/v1 启动后端即可在不消耗真实token的情况下压测。
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Dict, Any, List, AsyncIterator
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SENTENCES = [
+    "这个知识点的关键在于理解概念之间的联系。",
+    "建议先回顾课本上的例题，再尝试独立完成练习。",
+    "可以把题目中的已知条件逐条列出来，找到突破口。",
+    "错题要及时整理，分析错误原因比重复练习更重要。",
+    "每天安排二十分钟复习，效果比考前突击更好。",
+    "遇到困难时可以先画图，把抽象的问题具体化。",
+    "这道题考查的是公式的灵活运用，注意单位换算。",
+    "学习时保持专注，适当休息可以提高效率。"
+]
+
+
+class MockLLM:
+    """模拟LLM的延迟、错误率与吞吐"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.latency = args.latency
+        self.latency_ms = args.latency_ms
+        self.jitter_ms = args.jitter_ms
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.tokens_per_sec = args.tokens_per_sec
+        self.completion_tokens = args.completion_tokens
+        self.rng = random.Random(args.seed)
+
+        # 统计指标
+        self.requests = 0
+        self.stream_requests = 0
+        self.errors = 0
+        self.tokens_sent = 0
+
+    def first_token_delay(self) -> float:
+        """按配置的分布采样首token延迟（秒）"""
+        mean, jitter = self.latency_ms, self.jitter_ms
+        if self.latency == "uniform":
+            delay = self.rng.uniform(mean - jitter, mean + jitter)
+        elif self.latency == "normal":
+            delay = self.rng.gauss(mean, jitter)
+        elif self.latency == "lognormal":
+            # latency_ms 为中位数，jitter_ms / latency_ms 作为对数标准差
+            sigma = jitter / mean if mean > 0 else 0.0
+            delay = mean * self.rng.lognormvariate(0.0, sigma)
+        else:
+            delay = mean
+        return max(delay, 0.0) / 1000
+
+    def should_fail(self) -> bool:
+        return self.rng.random() < self.error_rate
+
+    def build_tokens(self, messages: List[Dict[str, str]], max_tokens: int) -> List[str]:
+        """生成响应token（按字符计），提示要求JSON时返回合法JSON"""
+        limit = min(self.completion_tokens, max_tokens or self.completion_tokens)
+        prompt = " ".join(str(m.get("content", "")) for m in messages)
+
+        if "JSON" in prompt or "json" in prompt:
+            text = json.dumps({
+                "success": True,
+                "analysis": self.rng.choice(SENTENCES),
+                "recommendations": [
+                    {
+                        "title": f"练习{i + 1}",
+                        "description": self.rng.choice(SENTENCES),
+                        "difficulty": self.rng.randint(1, 5),
+                        "estimated_time": self.rng.choice([10, 15, 20, 30]),
+                        "reasoning": self.rng.choice(SENTENCES)
+                    }
+                    for i in range(3)
+                ]
+            }, ensure_ascii=False)
+            return list(text)
+
+        text = ""
+        while len(text) < limit:
+            text += self.rng.choice(SENTENCES)
+        return list(text[:limit])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "stream_requests": self.stream_requests,
+            "errors": self.errors,
+            "tokens_sent": self.tokens_sent
+        }
+
+
+def create_app(mock: MockLLM) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+
+    def error_response() -> JSONResponse:
+        mock.errors += 1
+        return JSONResponse(
+            status_code=mock.error_status,
+            content={"error": {
+                "message": "mock upstream error",
+                "type": "server_error" if mock.error_status >= 500 else "rate_limit_error",
+                "code": None
+            }}
+        )
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return mock.stats()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        mock.requests += 1
+
+        if mock.should_fail():
+            await asyncio.sleep(mock.first_token_delay())
+            return error_response()
+
+        model = body.get("model", "mock-model")
+        messages = body.get("messages", [])
+        tokens = mock.build_tokens(messages, body.get("max_tokens"))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": sum(len(str(m.get("content", ""))) for m in messages),
+            "completion_tokens": len(tokens)
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            delay = mock.first_token_delay()
+            if mock.tokens_per_sec > 0:
+                delay += len(tokens) / mock.tokens_per_sec
+            await asyncio.sleep(delay)
+            mock.tokens_sent += len(tokens)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+
+        mock.stream_requests += 1
+
+        def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def event_stream() -> AsyncIterator[str]:
+            await asyncio.sleep(mock.first_token_delay())
+            yield chunk({"role": "assistant"})
+
+            # 每个分片约20ms，避免高吞吐配置下过多的小包
+            per_chunk = max(1, int(mock.tokens_per_sec * 0.02)) if mock.tokens_per_sec > 0 else len(tokens)
+            for start in range(0, len(tokens), per_chunk):
+                piece = tokens[start:start + per_chunk]
+                if mock.tokens_per_sec > 0:
+                    await asyncio.sleep(len(piece) / mock.tokens_per_sec)
+                mock.tokens_sent += len(piece)
+                yield chunk({"content": "".join(piece)})
+
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                # 与OpenAI一致：用量在choices为空的最后一个分片中
+                final = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟LLM服务（OpenAI协议）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "normal", "lognormal"], default="lognormal",
+                        help="首token延迟分布")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="首token延迟均值（lognormal为中位数）")
+    parser.add_argument("--jitter-ms", type=float, default=300.0, help="延迟离散程度")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求失败比例 0~1")
+    parser.add_argument("--error-status", type=int, default=500, help="失败时返回的状态码，如 429/500/503")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="输出吞吐，0表示不限速")
+    parser.add_argument("--completion-tokens", type=int, default=200, help="每次响应的token数上限")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    mock = MockLLM(args)
+    print(
+        f"Mock LLM 服务: http://{args.host}:{args.port}/v1 "
+        f"(latency={args.latency} {args.latency_ms}±{args.jitter_ms}ms, "
+        f"error_rate={args.error_rate}, tokens/s={args.tokens_per_sec})"
+    )
+    uvicorn.run(create_app(mock), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
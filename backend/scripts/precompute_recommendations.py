@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+推荐批量预计算：为班级、年级或全校的学生生成推荐并保存（带过期时间）
+
+建议每天在低峰期执行一次，例如 crontab:
+    30 4 * * * cd /path/to/backend && python scripts/precompute_recommendations.py --all
+
+    python scripts/precompute_recommendations.py --class-id 12 --class-id 13
+    python scripts/precompute_recommendations.py --grade 七年级 --workers 4
+
+学生按分片分配到多个进程；/ai/recommendations 和 /my-recommendations 优先返回这些结果。
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ai.engines.recommendation_precompute import recommendation_precomputer
+
+
+def print_shard(result):
+    print(f"分片完成: {result['students']} 名学生，{result['recommendations']} 条推荐，失败 {result['failed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推荐批量预计算")
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--class-id", type=int, action="append", help="班级id，可重复")
+    scope.add_argument("--grade", help="年级名称（班级的 grade_name）")
+    scope.add_argument("--all", action="store_true", help="全校所有启用的班级")
+    parser.add_argument("--workers", type=int, help="进程数，默认取配置")
+    parser.add_argument("--shard-size", type=int, help="每个分片的学生数，默认取配置")
+    parser.add_argument("--ttl-hours", type=int, help="推荐有效期（小时），默认取配置")
+    args = parser.parse_args()
+
+    if args.shard_size:
+        recommendation_precomputer.shard_size = args.shard_size
+    if args.ttl_hours:
+        recommendation_precomputer.ttl_hours = args.ttl_hours
+
+    student_ids = recommendation_precomputer.resolve_students(args.class_id, args.grade, args.all)
+    if not student_ids:
+        print("没有找到学生")
+        return
+    print(f"学生 {len(student_ids)} 名，每片 {recommendation_precomputer.shard_size} 名")
+
+    totals = recommendation_precomputer.run(student_ids, args.workers, on_shard=print_shard)
+    print(
+        f"完成：{totals['students']} 名学生，{totals['recommendations']} 条推荐，失败 {totals['failed']}，"
+        f"耗时 {recommendation_precomputer.last_batch_seconds}s"
+    )
+    if totals["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
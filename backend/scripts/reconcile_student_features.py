@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+学生特征对账：用原始表重建每个学生的特征，与增量维护的结果比较
+
+建议每晚执行一次，例如 crontab:
+    30 2 * * * cd /path/to/backend && python scripts/reconcile_student_features.py --fix
+
+检查对象为特征表中已有的学生以及最近7天有行为日志的学生；--fix 时以重建结果覆盖Redis与特征表。
+退出码：全部一致为0，存在不一致为1。
+"""
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import get_db
+from app.models.analytics import LearningBehaviorLog, StudentFeature
+from app.ai.knowledge.student_feature_store import student_feature_store
+
+
+def candidate_students(limit: int = 0) -> list:
+    since = datetime.now() - timedelta(days=student_feature_store.window_days)
+    with next(get_db()) as db:
+        stored = {row.student_id for row in db.query(StudentFeature.student_id).all()}
+        active = {
+            row.student_id for row in db.query(LearningBehaviorLog.student_id).filter(
+                LearningBehaviorLog.timestamp >= since
+            ).distinct().all()
+        }
+    students = sorted(stored | active)
+    return students[:limit] if limit else students
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学生特征对账")
+    parser.add_argument("--fix", action="store_true", help="以原始表重建结果覆盖不一致的特征")
+    parser.add_argument("--student-id", type=int, action="append", help="只检查指定学生，可重复指定")
+    parser.add_argument("--limit", type=int, default=0, help="最多检查的学生数，0为不限")
+    parser.add_argument("--verbose", action="store_true", help="打印每个不一致字段")
+    args = parser.parse_args()
+
+    students = args.student_id or candidate_students(args.limit)
+    mismatched = 0
+    for student_id in students:
+        diffs = student_feature_store.reconcile(student_id, fix=args.fix)
+        if not diffs:
+            continue
+        mismatched += 1
+        print(f"学生 {student_id}: {len(diffs)} 项不一致{'（已修复）' if args.fix else ''}")
+        if args.verbose:
+            for name, values in sorted(diffs.items()):
+                print(f"    {name}: 期望 {values['expected']}，实际 {values['actual']}")
+
+    print(f"\n检查 {len(students)} 名学生，不一致 {mismatched} 名")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
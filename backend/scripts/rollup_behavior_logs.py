@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+学习行为日志汇总：把高水位之后已结束的整小时汇总到小时表和日表
+
+建议每5分钟执行一次，例如 crontab:
+    */5 * * * * cd /path/to/backend && python scripts/rollup_behavior_logs.py
+
+首次执行从最早的行为日志开始，按 AI_ROLLUP_CHUNK_HOURS 分事务推进；中断后再次执行会从高水位继续。
+--rebuild-from 把高水位回拨到指定日期，用于修正后重算该日期之后的汇总。
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import get_db
+from app.ai.knowledge.behavior_rollup import behavior_rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学习行为日志汇总")
+    parser.add_argument("--rebuild-from", help="从该日期（YYYY-MM-DD）起重新汇总")
+    parser.add_argument("--max-chunks", type=int, default=0, help="本次最多处理的事务数，0为不限")
+    args = parser.parse_args()
+
+    if args.rebuild_from:
+        with next(get_db()) as db:
+            behavior_rollup.rewind(db, datetime.fromisoformat(args.rebuild_from))
+            db.commit()
+
+    hours = behavior_rollup.run(max_chunks=args.max_chunks)
+    stats = behavior_rollup.stats()
+    print(
+        f"汇总 {hours} 小时，写入小时汇总 {stats['hourly_rows_written']} 行、日汇总 {stats['daily_rows_written']} 行，"
+        f"高水位 {stats['last_watermark']}，耗时 {stats['last_run_ms']:.0f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# backend/test/test_agent_registry.py
+import asyncio
+
+from app.ai.engines.agent_registry import AgentRegistry
+
+
+class FakeAgent:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.active = True
+        self.shutdown_calls = 0
+
+    async def shutdown(self):
+        self.shutdown_calls += 1
+        self.active = False
+
+
+class TestAgentRegistry:
+    """Agent注册表测试"""
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的agent并关闭"""
+        async def scenario():
+            evicted = []
+            registry = AgentRegistry(max_agents=2, idle_ttl=60, on_evict=evicted.append)
+            agents = [FakeAgent(user_id) for user_id in range(3)]
+            registry.put(0, agents[0])
+            registry.put(1, agents[1])
+            registry.get(0)
+            registry.put(2, agents[2])
+            await registry.shutdown()
+            return registry, agents, evicted
+
+        registry, agents, evicted = asyncio.run(scenario())
+
+        assert evicted[0] == 1
+        assert agents[1].shutdown_calls == 1
+        assert registry.stats()["lru_evictions"] == 1
+
+    def test_sweep_removes_idle_agents(self):
+        """测试回收空闲超时的agent，保留最近使用的agent"""
+        async def scenario():
+            registry = AgentRegistry(max_agents=10, idle_ttl=60)
+            idle, recent = FakeAgent(1), FakeAgent(2)
+            registry.put(1, idle)
+            registry.put(2, recent)
+            registry._last_used[1] -= 120
+            removed = registry.sweep()
+            await asyncio.sleep(0)
+            return registry, removed, idle, recent
+
+        registry, removed, idle, recent = asyncio.run(scenario())
+
+        assert removed == 1
+        assert 1 not in registry and 2 in registry
+        assert idle.shutdown_calls == 1
+        assert recent.shutdown_calls == 0
+
+    def test_replaced_agent_shut_down(self):
+        """测试同一用户登记新实例时关闭旧实例"""
+        async def scenario():
+            registry = AgentRegistry(max_agents=10, idle_ttl=60)
+            first, second = FakeAgent(1), FakeAgent(1)
+            registry.put(1, first)
+            registry.put(1, second)
+            await asyncio.sleep(0)
+            return registry, first, second
+
+        registry, first, second = asyncio.run(scenario())
+
+        assert registry.get(1) is second
+        assert first.shutdown_calls == 1
+        assert second.shutdown_calls == 0
+        assert len(registry) == 1
+
+    def test_pop_does_not_shut_down(self):
+        """测试移除agent时不关闭，由调用方负责"""
+        registry = AgentRegistry(max_agents=10, idle_ttl=60)
+        agent = FakeAgent(1)
+        registry.put(1, agent)
+
+        assert registry.pop(1) is agent
+        assert agent.shutdown_calls == 0
+        assert 1 not in registry
@@ -0,0 +1,87 @@
+# backend/test/test_agent_session_store.py
+import asyncio
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from app.ai.knowledge import agent_session_store as agent_session_store_module
+from app.ai.knowledge.agent_session_store import AgentSessionStore, CONFLICT
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(agent_session_store_module, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def store(fake_redis):
+    return AgentSessionStore(ttl=100, compress_min_bytes=64, enabled=True)
+
+
+class TestAgentSessionStore:
+    """Agent会话存储测试"""
+
+    def test_save_and_load(self, store):
+        """测试写入后读取到相同状态和版本号"""
+        state = {"learning_goals": ["数学"], "started_at": datetime(2024, 1, 1, 8, 30)}
+
+        version, digest = asyncio.run(store.save(1, "StudentAgent", state, expected_version=0))
+        loaded, loaded_version, loaded_digest = asyncio.run(store.load(1, "StudentAgent"))
+
+        assert version == 1
+        assert loaded == state
+        assert loaded_version == 1
+        assert loaded_digest == digest
+
+    def test_stale_version_conflicts(self, store):
+        """测试基于旧版本号的写入返回冲突且不覆盖"""
+        asyncio.run(store.save(1, "StudentAgent", {"step": 1}, expected_version=0))
+
+        conflict, _ = asyncio.run(store.save(1, "StudentAgent", {"step": "other"}, expected_version=0))
+        version, _ = asyncio.run(store.save(1, "StudentAgent", {"step": 2}, expected_version=1))
+
+        assert conflict == CONFLICT
+        assert version == 2
+        assert asyncio.run(store.load(1, "StudentAgent"))[0] == {"step": 2}
+        assert store.stats()["conflicts"] == 1
+
+    def test_concurrent_first_saves_one_wins(self, store):
+        """测试两个worker同时启动会话时只有一个写入成功"""
+        async def scenario():
+            return await asyncio.gather(
+                store.save(1, "StudentAgent", {"worker": "a"}, expected_version=0),
+                store.save(1, "StudentAgent", {"worker": "b"}, expected_version=0)
+            )
+
+        results = asyncio.run(scenario())
+
+        assert sorted(version for version, _ in results) == [CONFLICT, 1]
+        assert asyncio.run(store.version(1)) == 1
+
+    def test_load_other_agent_type_misses(self, store):
+        """测试agent类型不符时视为不存在"""
+        asyncio.run(store.save(1, "StudentAgent", {"step": 1}, expected_version=0))
+
+        assert asyncio.run(store.load(1, "TeacherAgent")) is None
+        assert store.stats()["misses"] == 1
+
+    def test_large_state_compressed(self, store, fake_redis):
+        """测试超过阈值的状态压缩存储"""
+        state = {"history": ["二次函数"] * 50}
+
+        asyncio.run(store.save(1, "StudentAgent", state, expected_version=0))
+
+        assert fake_redis.hget("agent:session:1", "d").startswith("z:")
+        assert asyncio.run(store.load(1, "StudentAgent"))[0] == state
+        assert store.stats()["compression_ratio"] < 1
+
+    def test_version_of_missing_session(self, store, fake_redis):
+        """测试会话不存在时版本号为0，写入设置TTL"""
+        assert asyncio.run(store.version(1)) == 0
+
+        asyncio.run(store.save(1, "StudentAgent", {"step": 1}, expected_version=0))
+
+        assert 0 < fake_redis.ttl("agent:session:1") <= 100
@@ -0,0 +1,80 @@
+# backend/test/test_behavior_log_archive.py
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.ai.knowledge import behavior_log_archive as behavior_log_archive_module
+from app.ai.knowledge.behavior_log_archive import BehaviorLogArchive
+from app.models.analytics import LearningBehaviorLog
+from app.models.base import Base
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+
+    def get_test_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(behavior_log_archive_module, "get_db", get_test_db)
+    return factory
+
+
+@pytest.fixture
+def archive(session_factory, tmp_path):
+    """1月、2月已归档，3月仍在数据库中，每月3条"""
+    with session_factory() as db:
+        for month in (1, 2, 3):
+            for day in (1, 2, 3):
+                db.add(LearningBehaviorLog(
+                    student_id=1, action_type="view_content", action_data={"month": month, "day": day},
+                    session_duration=60, timestamp=datetime(2024, month, day, 8)
+                ))
+        db.commit()
+    archive = BehaviorLogArchive(archive_dir=str(tmp_path / "archive"), retention_months=1)
+    archive.archive_month(datetime(2024, 1, 1))
+    archive.archive_month(datetime(2024, 2, 1))
+    return archive
+
+
+def days_of(records):
+    return [(record["action_data"]["month"], record["action_data"]["day"]) for record in records]
+
+
+class TestBehaviorLogArchiveQuery:
+    """归档透明查询测试"""
+
+    def test_query_spans_archive_and_database(self, archive):
+        """测试查询范围跨越归档高水位时按时间升序合并"""
+        records = archive.query(1, datetime(2024, 1, 1), datetime(2024, 4, 1))
+
+        assert days_of(records) == [(month, day) for month in (1, 2, 3) for day in (1, 2, 3)]
+        assert archive.stats()["archive_reads"] == 2
+
+    def test_limit_served_from_database(self, archive):
+        """测试数据库中的记录已够 limit 条时不读归档"""
+        records = archive.query(1, datetime(2024, 1, 1), datetime(2024, 4, 1), limit=2)
+
+        assert days_of(records) == [(3, 2), (3, 3)]
+        assert archive.stats()["archive_reads"] == 0
+
+    def test_limit_reads_only_recent_months(self, archive):
+        """测试不足 limit 条时从最近的月份往前读归档，够数即停"""
+        records = archive.query(1, datetime(2024, 1, 1), datetime(2024, 4, 1), limit=5)
+
+        assert days_of(records) == [(2, 2), (2, 3), (3, 1), (3, 2), (3, 3)]
+        assert archive.stats()["archive_reads"] == 1
+
+    def test_limit_within_archive(self, archive):
+        """测试查询范围全部在归档中时同样取最近的记录"""
+        records = archive.query(1, datetime(2024, 1, 1), datetime(2024, 2, 1) + timedelta(days=2), limit=4)
+
+        assert days_of(records) == [(1, 2), (1, 3), (2, 1), (2, 2)]
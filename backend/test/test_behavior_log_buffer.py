@@ -0,0 +1,220 @@
+# backend/test/test_behavior_log_buffer.py
+import asyncio
+import json
+import os
+
+import pytest
+
+from app.ai.knowledge.behavior_log_buffer import BehaviorLogBuffer
+
+
+class FakeDatabase:
+    """代替 _write/_ping：记录写入的行，action_type 为 bad 的行违反约束"""
+
+    def __init__(self):
+        self.rows = []
+        self.available = True
+        self.attempts = 0
+
+    def write(self, rows):
+        self.attempts += 1
+        if not self.available:
+            raise ConnectionError("database unavailable")
+        if any(row["action_type"] == "bad" for row in rows):
+            raise ValueError("constraint violation")
+        self.rows.extend(rows)
+
+    def ping(self) -> bool:
+        return self.available
+
+
+def make_buffer(database: FakeDatabase, spool_dir: str = "", **kwargs) -> BehaviorLogBuffer:
+    options = {"batch_size": 8, "flush_interval_ms": 10000, "max_pending": 100, "block_timeout": 0.01}
+    options.update(kwargs)
+    buffer = BehaviorLogBuffer(spool_dir=spool_dir, **options)
+    buffer._write = database.write
+    buffer._ping = database.ping
+    return buffer
+
+
+def spool_segments(spool_dir) -> list:
+    return sorted(name for name in os.listdir(spool_dir) if name.startswith("behavior-"))
+
+
+@pytest.fixture
+def database():
+    return FakeDatabase()
+
+
+class TestBehaviorLogBuffer:
+    """行为日志缓冲区测试"""
+
+    def test_flush_writes_in_batches(self, database):
+        """测试按批次写出全部事件"""
+        async def scenario():
+            buffer = make_buffer(database)
+            for i in range(20):
+                await buffer.put(1, {"type": "answer_question", "question_id": i})
+            await buffer.shutdown()
+            return buffer
+
+        buffer = asyncio.run(scenario())
+
+        assert [row["action_data"]["question_id"] for row in database.rows] == list(range(20))
+        assert buffer.stats()["batches"] == 3
+        assert buffer.stats()["pending"] == 0
+
+    def test_outage_keeps_events_for_retry(self, database):
+        """测试数据库不可用时事件保留在队列中，恢复后写入"""
+        async def scenario():
+            buffer = make_buffer(database)
+            for i in range(5):
+                await buffer.put(1, {"type": "view", "index": i})
+            database.available = False
+            await buffer.flush()
+            pending = buffer.stats()["pending"]
+
+            database.available = True
+            await buffer.shutdown()
+            return buffer, pending
+
+        buffer, pending = asyncio.run(scenario())
+
+        assert pending == 5
+        assert [row["action_data"]["index"] for row in database.rows] == list(range(5))
+        assert buffer.stats()["dead_lettered"] == 0
+
+    def test_bad_row_moved_to_dead_letter(self, database, tmp_path):
+        """测试批内无法写入的行移入死信文件，其余行照常写入"""
+        async def scenario():
+            buffer = make_buffer(database, spool_dir=str(tmp_path))
+            for i in range(8):
+                await buffer.put(1, {"type": "bad" if i == 5 else "view", "index": i})
+            await buffer.put(1, {"type": "view", "index": 8})
+            await buffer.shutdown()
+            return buffer
+
+        buffer = asyncio.run(scenario())
+
+        assert sorted(row["action_data"]["index"] for row in database.rows) == [0, 1, 2, 3, 4, 6, 7, 8]
+        dead_letters = (tmp_path / "dead-letter.jsonl").read_text(encoding="utf-8").splitlines()
+        assert len(dead_letters) == 1
+        assert json.loads(dead_letters[0])["row"]["action_data"]["index"] == 5
+        assert buffer.stats()["dead_lettered"] == 1
+        assert buffer.stats()["pending"] == 0
+        assert spool_segments(tmp_path) == []
+
+    def test_spool_replayed_after_crash(self, database, tmp_path):
+        """测试进程崩溃后遗留的spool文件被接管并重新写入"""
+        async def crash():
+            buffer = make_buffer(database, spool_dir=str(tmp_path))
+            for i in range(3):
+                await buffer.put(1, {"type": "view", "index": i})
+            # 未写库即退出：只关闭spool文件
+            buffer._flush_task.cancel()
+            buffer._spool_file.close()
+
+        asyncio.run(crash())
+        assert database.rows == []
+        assert len(spool_segments(tmp_path)) == 1
+
+        async def restart():
+            buffer = make_buffer(database, spool_dir=str(tmp_path))
+            recovered = buffer.recover()
+            await buffer.shutdown()
+            return buffer, recovered
+
+        buffer, recovered = asyncio.run(restart())
+
+        assert recovered == 3
+        assert [row["action_data"]["index"] for row in database.rows] == [0, 1, 2]
+        assert buffer.stats()["replayed"] == 3
+        assert spool_segments(tmp_path) == []
+
+    def test_recover_does_not_overwrite_files_of_same_pid(self, database, tmp_path, monkeypatch):
+        """测试重启后PID与崩溃进程相同时，接管其他文件不会覆盖同名的遗留文件"""
+        def write_segment(name, indexes):
+            rows = [
+                json.dumps({**BehaviorLogBuffer._build_row(1, {"type": "view", "index": i}), "timestamp": "2024-03-05T08:00:00"})
+                for i in indexes
+            ]
+            (tmp_path / name).write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+        # 已退出进程的文件按名称排在前面
+        write_segment("behavior-0-000000.jsonl", [0, 1])
+        write_segment(f"behavior-{os.getpid()}-000000.jsonl", [2, 3, 4])
+        monkeypatch.setattr(BehaviorLogBuffer, "_pid_alive", staticmethod(lambda pid: False))
+
+        async def restart():
+            buffer = make_buffer(database, spool_dir=str(tmp_path))
+            recovered = buffer.recover()
+            await buffer.shutdown()
+            return recovered
+
+        recovered = asyncio.run(restart())
+
+        assert recovered == 5
+        assert sorted(row["action_data"]["index"] for row in database.rows) == [0, 1, 2, 3, 4]
+        assert spool_segments(tmp_path) == []
+
+    def test_spool_kept_until_written(self, database, tmp_path):
+        """测试写库失败时保留spool文件"""
+        async def scenario():
+            buffer = make_buffer(database, spool_dir=str(tmp_path))
+            await buffer.put(1, {"type": "view"})
+            database.available = False
+            await buffer.flush()
+            segments = spool_segments(tmp_path)
+            database.available = True
+            await buffer.shutdown()
+            return segments
+
+        segments = asyncio.run(scenario())
+
+        assert len(segments) == 1
+        assert spool_segments(tmp_path) == []
+        assert len(database.rows) == 1
+
+    def test_group_rows_spooled_and_written_together(self, database, tmp_path):
+        """测试写入组内的事件提交时即写入spool，退出后在同一批中写入"""
+        async def scenario():
+            buffer = make_buffer(database, spool_dir=str(tmp_path), batch_size=4)
+            async with buffer.write_group():
+                for i in range(3):
+                    await buffer.put(1, {"type": "view", "index": i})
+                spooled = (tmp_path / spool_segments(tmp_path)[0]).read_text(encoding="utf-8").count("\n")
+            await buffer.shutdown()
+            return buffer, spooled
+
+        buffer, spooled = asyncio.run(scenario())
+
+        assert spooled == 3
+        assert [row["action_data"]["index"] for row in database.rows] == [0, 1, 2]
+        assert buffer.stats()["batches"] == 1
+        assert buffer.stats()["groups"] == 1
+
+    def test_group_reports_dropped_rows(self, database):
+        """测试写入组内队列已满时同样返回False"""
+        async def scenario():
+            buffer = make_buffer(database, max_pending=2)
+            database.available = False
+            async with buffer.write_group():
+                return buffer, [await buffer.put(1, {"type": "view", "index": i}) for i in range(3)]
+
+        buffer, results = asyncio.run(scenario())
+
+        assert results == [True, True, False]
+        assert buffer.stats()["dropped"] == 1
+
+    def test_full_queue_drops_after_timeout(self, database):
+        """测试队列已满且超时后丢弃事件"""
+        async def scenario():
+            buffer = make_buffer(database, max_pending=2)
+            database.available = False
+            results = [await buffer.put(1, {"type": "view", "index": i}) for i in range(3)]
+            return buffer, results
+
+        buffer, results = asyncio.run(scenario())
+
+        assert results == [True, True, False]
+        assert buffer.stats()["dropped"] == 1
@@ -0,0 +1,148 @@
+# backend/test/test_behavior_rollup.py
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.ai.knowledge import behavior_rollup as behavior_rollup_module
+from app.ai.knowledge.behavior_rollup import BehaviorRollup, ROLLUP_NAME, read_watermark
+from app.models.analytics import LearningBehaviorLog, LearningBehaviorHourly, LearningBehavior
+from app.models.base import Base
+
+START = datetime(2024, 3, 5, 8, 0)
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollup.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+
+    def get_test_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(behavior_rollup_module, "get_db", get_test_db)
+    return factory
+
+
+def add_logs(factory, *logs):
+    with factory() as db:
+        for student_id, action_type, action_data, timestamp in logs:
+            db.add(LearningBehaviorLog(
+                student_id=student_id, action_type=action_type, action_data=action_data,
+                session_duration=60, timestamp=timestamp
+            ))
+        db.commit()
+
+
+def watermark(factory):
+    with factory() as db:
+        return read_watermark(db, ROLLUP_NAME)
+
+
+class TestBehaviorRollup:
+    """行为日志汇总测试"""
+
+    def test_run_rolls_completed_hours(self, session_factory):
+        """测试汇总到 now - lateness 之前的整点并推进高水位"""
+        add_logs(
+            session_factory,
+            (1, "view_content", {}, START + timedelta(minutes=5)),
+            (1, "view_content", {}, START + timedelta(hours=1, minutes=10)),
+            (1, "view_content", {}, START + timedelta(hours=2, minutes=50))
+        )
+        rollup = BehaviorRollup(lateness=600, chunk_hours=1)
+
+        rolled = rollup.run(now=START + timedelta(hours=2, minutes=55))
+
+        assert rolled == 2
+        assert watermark(session_factory) == START + timedelta(hours=2)
+        with session_factory() as db:
+            assert [row.event_count for row in db.query(LearningBehaviorHourly).order_by(LearningBehaviorHourly.hour)] == [1, 1]
+            assert db.query(LearningBehavior).one().activity_count == 2
+
+    def test_run_is_idempotent(self, session_factory):
+        """测试高水位已到达目标时不再重复汇总"""
+        add_logs(session_factory, (1, "view_content", {}, START))
+        rollup = BehaviorRollup(lateness=0, chunk_hours=24)
+        now = START + timedelta(hours=3)
+
+        rollup.run(now=now)
+        assert rollup.run(now=now) == 0
+
+        with session_factory() as db:
+            assert db.query(LearningBehaviorHourly).count() == 1
+
+    def test_answers_counted_from_both_locations(self, session_factory):
+        """测试判题结果在顶层或 data 中都计入答题数与答对数"""
+        add_logs(
+            session_factory,
+            (1, "answer_question", {"question_id": 1, "is_correct": True}, START),
+            (1, "answer_question", {"data": {"question_id": 2, "is_correct": True}}, START),
+            (1, "answer_question", {"data": {"question_id": 3, "is_correct": False}}, START),
+            (1, "answer_question", {"data": {"question_id": 4}}, START)
+        )
+        rollup = BehaviorRollup(lateness=0, chunk_hours=24)
+
+        rollup.run(now=START + timedelta(hours=1))
+
+        with session_factory() as db:
+            hourly = db.query(LearningBehaviorHourly).one()
+            assert (hourly.answered_count, hourly.correct_count) == (3, 2)
+            assert db.query(LearningBehavior).one().correct_rate == pytest.approx(2 / 3)
+
+    def test_late_event_rewinds_and_is_rolled(self, session_factory):
+        """测试迟到事件回拨高水位，下一次汇总重算该时段"""
+        add_logs(session_factory, (1, "view_content", {}, START + timedelta(minutes=5)))
+        rollup = BehaviorRollup(lateness=0, chunk_hours=24)
+        now = START + timedelta(hours=4)
+        rollup.run(now=now)
+
+        late = START + timedelta(minutes=40)
+        add_logs(session_factory, (1, "view_content", {}, late))
+        with session_factory() as db:
+            assert rollup.rewind(db, late)
+            db.commit()
+
+        assert watermark(session_factory) == START
+        rollup.run(now=now)
+
+        assert watermark(session_factory) == now
+        assert rollup.stats()["rewinds"] == 1
+        with session_factory() as db:
+            assert db.query(LearningBehaviorHourly).one().event_count == 2
+
+    def test_recent_event_does_not_rewind(self, session_factory):
+        """测试允许延迟内的事件不回拨高水位"""
+        add_logs(session_factory, (1, "view_content", {}, START))
+        rollup = BehaviorRollup(lateness=3600, chunk_hours=24)
+        rollup.run(now=START + timedelta(hours=3))
+
+        with session_factory() as db:
+            assert not rollup.rewind(db, datetime.now())
+
+        assert watermark(session_factory) == START + timedelta(hours=2)
+
+    def test_activity_counts_merge_rollup_and_raw(self, session_factory):
+        """测试高水位之前读小时汇总、之后读原始表"""
+        add_logs(
+            session_factory,
+            (1, "answer_question", {"data": {"is_correct": True}}, START),
+            (1, "view_content", {}, START + timedelta(hours=3))
+        )
+        rollup = BehaviorRollup(lateness=0, chunk_hours=24)
+        rollup.run(now=START + timedelta(hours=2))
+
+        with session_factory() as db:
+            counts = rollup.activity_counts(db, 1, START)
+
+        day = START.strftime("%Y%m%d")
+        assert counts[f"a:{day}:n"] == 2
+        assert counts[f"a:{day}:q"] == 1 and counts[f"a:{day}:c"] == 1
+        assert counts[f"h:{day}:08"] == 1 and counts[f"h:{day}:11"] == 1
+        assert rollup.stats()["rollup_reads"] == 1
@@ -0,0 +1,89 @@
+# backend/test/test_conversation_store.py
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from app.ai.knowledge import conversation_store as conversation_store_module
+from app.ai.knowledge.conversation_store import ConversationStore
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(conversation_store_module, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def store(fake_redis):
+    return ConversationStore(keep_turns=2, summarize_batch=2, ttl=100, summarizer="extractive", enabled=True)
+
+
+def push_turns(client, user_id: int, count: int):
+    client.rpush(f"conv:{user_id}:turns", *[
+        json.dumps({"role": "user", "content": f"第{i}个问题：二次函数的图像怎么画？"}, ensure_ascii=False)
+        for i in range(count)
+    ])
+
+
+class TestConversationStore:
+    """对话记忆测试"""
+
+    def test_summarize_moves_old_turns_into_summary(self, store, fake_redis):
+        """测试旧消息并入摘要，只保留最近的消息"""
+        push_turns(fake_redis, 1, 6)
+
+        asyncio.run(store._summarize(1))
+
+        assert fake_redis.llen("conv:1:turns") == 2
+        assert fake_redis.get("conv:1:summary")
+        assert not fake_redis.exists("conv:1:summarizing")
+        assert store.stats()["turns_summarized"] == 4
+
+    def test_skips_when_other_worker_holds_lock(self, store, fake_redis):
+        """测试其他worker正在摘要时跳过"""
+        push_turns(fake_redis, 1, 6)
+        fake_redis.set("conv:1:summarizing", "other-worker")
+
+        asyncio.run(store._summarize(1))
+
+        assert fake_redis.llen("conv:1:turns") == 6
+        assert fake_redis.get("conv:1:summarizing") == "other-worker"
+        assert store.stats()["lock_contended"] == 1
+
+    def test_stale_summary_not_committed(self, store, fake_redis, monkeypatch):
+        """测试列表头部已被其他worker移除时不再重复裁剪"""
+        push_turns(fake_redis, 1, 6)
+        original = store._make_summary
+
+        async def summarize_while_other_worker_trims(previous, turns):
+            # 摘要期间另一个worker已处理并移除了这些消息，随后又追加了新消息
+            fake_redis.ltrim("conv:1:turns", 4, -1)
+            push_turns(fake_redis, 1, 3)
+            return await original(previous, turns)
+
+        monkeypatch.setattr(store, "_make_summary", summarize_while_other_worker_trims)
+
+        asyncio.run(store._summarize(1))
+
+        assert fake_redis.llen("conv:1:turns") == 5
+        assert fake_redis.get("conv:1:summary") is None
+        assert store.stats()["stale_commits"] == 1
+
+    def test_messages_appended_during_summary_kept(self, store, fake_redis, monkeypatch):
+        """测试摘要期间追加的消息不会被移除"""
+        push_turns(fake_redis, 1, 6)
+        original = store._make_summary
+
+        async def summarize_while_appending(previous, turns):
+            push_turns(fake_redis, 1, 2)
+            return await original(previous, turns)
+
+        monkeypatch.setattr(store, "_make_summary", summarize_while_appending)
+
+        asyncio.run(store._summarize(1))
+
+        assert fake_redis.llen("conv:1:turns") == 4
+        assert fake_redis.get("conv:1:summary")
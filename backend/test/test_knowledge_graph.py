@@ -0,0 +1,95 @@
+# backend/test/test_knowledge_graph.py
+from collections import namedtuple
+
+import numpy as np
+
+from app.ai.knowledge.knowledge_graph import KnowledgeGraph
+
+ChapterRow = namedtuple("ChapterRow", "id upid displayorder")
+KnowledgeRow = namedtuple("KnowledgeRow", "id upid chapter_id displayorder")
+
+
+def build(chapters, knowledge_points):
+    graph = KnowledgeGraph._build(
+        [ChapterRow(*row) for row in chapters],
+        [KnowledgeRow(*row) for row in knowledge_points]
+    )
+    return graph, {**graph.chapter_index, **graph.knowledge_index}
+
+
+def preorder(graph, nodes):
+    """按先序位置排列的节点id"""
+    names = {index: name for name, index in nodes.items()}
+    return [names[int(node)] for node in graph.order]
+
+
+class TestKnowledgeGraphNumbering:
+    """知识点图谱区间编号测试"""
+
+    chapters = [("c1", None, 2), ("c2", None, 1), ("c1-1", "c1", 1)]
+    knowledge_points = [
+        ("k1", None, "c1-1", 2),
+        ("k2", "k1", "c1-1", 1),
+        ("k3", None, "c1-1", 1),
+        ("k4", None, "c2", 1)
+    ]
+
+    def test_preorder_follows_displayorder(self):
+        """测试同一父节点下按 displayorder 先序编号"""
+        graph, nodes = build(self.chapters, self.knowledge_points)
+
+        assert preorder(graph, nodes) == ["c2", "k4", "c1", "c1-1", "k3", "k1", "k2"]
+        assert sorted(graph.pre.tolist()) == list(range(7))
+
+    def test_is_ancestor(self):
+        """测试祖先判断：包含跨章节与知识点的层级，不包含自身和兄弟节点"""
+        graph, nodes = build(self.chapters, self.knowledge_points)
+
+        assert graph.is_ancestor(nodes["c1"], nodes["k2"])
+        assert graph.is_ancestor(nodes["k1"], nodes["k2"])
+        assert not graph.is_ancestor(nodes["k2"], nodes["k1"])
+        assert not graph.is_ancestor(nodes["k1"], nodes["k1"])
+        assert not graph.is_ancestor(nodes["k3"], nodes["k2"])
+        assert not graph.is_ancestor(nodes["c2"], nodes["k2"])
+
+    def test_knowledge_in_subtree(self):
+        """测试子树中的知识点按教材顺序返回，只含知识点"""
+        graph, nodes = build(self.chapters, self.knowledge_points)
+
+        assert graph.knowledge_in_subtree(nodes["c1"]) == ["k3", "k1", "k2"]
+        assert graph.knowledge_in_subtree(nodes["k1"]) == ["k1", "k2"]
+        assert graph.knowledge_in_subtree(nodes["k1"], include_self=False) == ["k2"]
+        assert graph.knowledge_in_subtree(nodes["k2"], include_self=False) == []
+
+    def test_knowledge_descendants(self):
+        """测试子树中知识点数（不含自身）"""
+        graph, nodes = build(self.chapters, self.knowledge_points)
+
+        assert graph.knowledge_descendants(nodes["c1"]) == 3
+        assert graph.knowledge_descendants(nodes["c1-1"]) == 3
+        assert graph.knowledge_descendants(nodes["k1"]) == 1
+        assert graph.knowledge_descendants(nodes["k4"]) == 0
+
+    def test_cycle_broken_into_root(self):
+        """测试成环的知识点断开一处后作为根编号，每个节点只编号一次"""
+        graph, nodes = build(
+            [("c1", None, 1)],
+            [("k1", None, "c1", 1), ("ka", "kc", None, 1), ("kb", "ka", None, 1), ("kc", "kb", None, 1)]
+        )
+
+        assert sorted(graph.pre.tolist()) == list(range(5))
+        cycle = [nodes["ka"], nodes["kb"], nodes["kc"]]
+        roots = [node for node in cycle if graph.parent[node] == -1]
+        assert len(roots) == 1
+        assert all(graph.is_ancestor(roots[0], node) for node in cycle if node != roots[0])
+        assert graph.knowledge_descendants(roots[0]) == 2
+        assert not any(graph.is_ancestor(nodes["c1"], node) for node in cycle)
+
+    def test_self_parent_becomes_root(self):
+        """测试以自身为上级的节点作为根"""
+        graph, nodes = build([("c1", "c1", 1)], [("k1", "k1", "c1", 1)])
+
+        assert graph.parent[nodes["c1"]] == -1
+        assert graph.parent[nodes["k1"]] == -1
+        assert graph.depth.tolist() == [0, 0]
+        assert np.all(graph.size == 1)
@@ -0,0 +1,261 @@
+# backend/test/test_llm_scheduler.py
+import asyncio
+
+import pytest
+
+from app.ai.engines.llm_scheduler import CircuitBreaker, LLMScheduler, LLMUnavailableError, Priority
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    options = {"error_rate_threshold": 0.5, "min_calls": 4, "window_seconds": 30.0, "cooldown_seconds": 10.0}
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def cool_down(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.cooldown_seconds
+
+
+def make_scheduler(capacity: int = 1, max_queue: int = 10) -> LLMScheduler:
+    return LLMScheduler(default_capacity=capacity, max_queue=max_queue, provider_capacity="")
+
+
+class TestCircuitBreaker:
+    """熔断器状态测试"""
+
+    def test_opens_on_error_rate(self):
+        """测试错误率达到阈值且调用数足够时打开"""
+        breaker = make_breaker()
+        breaker.record_success()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_stays_closed_below_min_calls(self):
+        """测试调用数不足时不打开"""
+        breaker = make_breaker()
+        for _ in range(3):
+            breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+    def test_half_open_allows_single_probe(self):
+        """测试冷却后半开状态只放行一个探测请求"""
+        breaker = make_breaker()
+        open_breaker(breaker)
+        cool_down(breaker)
+
+        assert breaker.allow()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow()
+
+    def test_probe_success_closes(self):
+        """测试探测成功后关闭"""
+        breaker = make_breaker()
+        open_breaker(breaker)
+        cool_down(breaker)
+        breaker.allow()
+
+        breaker.record_success()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+    def test_probe_failure_reopens(self):
+        """测试探测失败后重新打开"""
+        breaker = make_breaker()
+        open_breaker(breaker)
+        cool_down(breaker)
+        breaker.allow()
+
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_released_probe_allows_next_probe(self):
+        """测试探测请求没有结果时允许下一次探测"""
+        breaker = make_breaker()
+        open_breaker(breaker)
+        cool_down(breaker)
+        breaker.allow()
+
+        breaker.release_probe()
+
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+
+
+class TestLLMScheduler:
+    """LLM准入调度测试"""
+
+    def test_run_returns_result(self):
+        """测试准入后执行调用"""
+        async def call():
+            return "ok"
+
+        scheduler = make_scheduler()
+        assert asyncio.run(scheduler.run("openai", call, timeout=1)) == "ok"
+        assert scheduler.stats()["openai"]["admitted"] == 1
+        assert scheduler.stats()["openai"]["active"] == 0
+
+    def test_waiters_admitted_by_priority(self):
+        """测试槽位释放后按优先级唤醒等待者"""
+        async def scenario():
+            scheduler = make_scheduler(capacity=1)
+            order = []
+            release = asyncio.Event()
+
+            async def hold():
+                await release.wait()
+
+            def record(name):
+                async def call():
+                    order.append(name)
+                return call
+
+            holder = asyncio.create_task(scheduler.run("openai", hold, timeout=1))
+            await asyncio.sleep(0.01)
+            background = asyncio.create_task(scheduler.run("openai", record("background"), Priority.BACKGROUND, 1))
+            await asyncio.sleep(0.01)
+            interactive = asyncio.create_task(scheduler.run("openai", record("interactive"), Priority.INTERACTIVE, 1))
+            await asyncio.sleep(0.01)
+            release.set()
+            await asyncio.gather(holder, background, interactive)
+            return order
+
+        assert asyncio.run(scenario()) == ["interactive", "background"]
+
+    def test_queue_full_rejected(self):
+        """测试等待队列已满时拒绝"""
+        async def scenario():
+            scheduler = make_scheduler(capacity=1, max_queue=1)
+            release = asyncio.Event()
+            holder = asyncio.create_task(scheduler.run("openai", release.wait, timeout=1))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(scheduler.run("openai", release.wait, timeout=1))
+            await asyncio.sleep(0.01)
+            with pytest.raises(LLMUnavailableError):
+                await scheduler.run("openai", release.wait, timeout=1)
+            release.set()
+            await asyncio.gather(holder, waiter)
+            return scheduler.stats()["openai"]
+
+        stats = asyncio.run(scenario())
+        assert stats["rejected"] == 1
+        assert stats["active"] == 0
+
+    def test_queue_wait_timeout(self):
+        """测试排队超过截止时间时拒绝并归还队列位置"""
+        async def scenario():
+            scheduler = make_scheduler(capacity=1)
+            release = asyncio.Event()
+            holder = asyncio.create_task(scheduler.run("openai", release.wait, timeout=1))
+            await asyncio.sleep(0.01)
+            with pytest.raises(LLMUnavailableError):
+                await scheduler.run("openai", release.wait, timeout=0.02)
+            release.set()
+            await holder
+            return scheduler.stats()["openai"]
+
+        stats = asyncio.run(scenario())
+        assert stats["timeouts"] == 1
+        assert stats["queue_depth"] == 0
+
+    def test_open_breaker_rejects(self):
+        """测试熔断打开时直接拒绝"""
+        async def failing():
+            raise RuntimeError("provider error")
+
+        async def scenario():
+            scheduler = make_scheduler(capacity=4)
+            breaker = scheduler._lane("openai").breaker
+            breaker.min_calls = 2
+            for _ in range(2):
+                with pytest.raises(RuntimeError):
+                    await scheduler.run("openai", failing, timeout=1)
+            with pytest.raises(LLMUnavailableError):
+                await scheduler.run("openai", failing, timeout=1)
+            return scheduler.stats()["openai"]
+
+        stats = asyncio.run(scenario())
+        assert stats["breaker"]["state"] == CircuitBreaker.OPEN
+        assert stats["breaker_rejections"] == 1
+
+    def test_cancelled_probe_does_not_wedge_breaker(self):
+        """测试半开探测被取消后仍可再次探测"""
+        async def scenario():
+            scheduler = make_scheduler()
+            breaker = scheduler._lane("openai").breaker
+            open_breaker(breaker)
+            cool_down(breaker)
+
+            probe = asyncio.create_task(scheduler.run("openai", asyncio.Event().wait, timeout=1))
+            await asyncio.sleep(0.01)
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+
+            async def call():
+                return "ok"
+            return await scheduler.run("openai", call, timeout=1), breaker.state
+
+        result, state = asyncio.run(scenario())
+        assert result == "ok"
+        assert state == CircuitBreaker.CLOSED
+
+    def test_cancelled_while_queued_releases_probe(self):
+        """测试探测请求排队时被取消也释放探测"""
+        async def scenario():
+            scheduler = make_scheduler(capacity=1)
+            lane = scheduler._lane("openai")
+            lane.active = 1  # 槽位已被占满
+            open_breaker(lane.breaker)
+            cool_down(lane.breaker)
+
+            probe = asyncio.create_task(scheduler.run("openai", asyncio.Event().wait, timeout=1))
+            await asyncio.sleep(0.01)
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+            return lane
+
+        lane = asyncio.run(scenario())
+        assert not lane.breaker.probe_in_flight
+        assert lane.breaker.allow()
+        assert lane.stats()["queue_depth"] == 0
+
+    def test_stream_disconnect_does_not_wedge_breaker(self):
+        """测试流式客户端断开（GeneratorExit）时释放探测"""
+        async def scenario():
+            scheduler = make_scheduler()
+            breaker = scheduler._lane("openai").breaker
+            open_breaker(breaker)
+            cool_down(breaker)
+
+            async def stream():
+                async with scheduler.slot("openai", timeout=1):
+                    for chunk in ["a", "b", "c"]:
+                        yield chunk
+
+            chunks = stream()
+            assert await chunks.__anext__() == "a"
+            await chunks.aclose()
+            return breaker, scheduler.stats()["openai"]
+
+        breaker, stats = asyncio.run(scenario())
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+        assert stats["active"] == 0
@@ -0,0 +1,36 @@
+# backend/test/test_question_index.py
+import time
+
+from app.ai.knowledge.question_index import QuestionIndex
+
+
+def _index(rows):
+    index = QuestionIndex(enabled=True, check_interval=3600, refresh_interval=3600)
+    index._snapshot = QuestionIndex._build_snapshot(rows, {1: 1, 2: 2, 3: 3})
+    index._checked_at = time.monotonic()
+    return index
+
+
+class TestSimilarIds:
+    """相似题候选测试"""
+
+    def test_ranks_by_shared_knowledge_then_saves(self):
+        """测试按共享知识点数、收藏数排序，而不是取最小的id"""
+        rows = [
+            ("k1", 1, 2, 10, 0), ("k2", 1, 2, 10, 0),
+            ("k1", 2, 2, 10, 50),
+            ("k1", 3, 3, 10, 5), ("k2", 3, 3, 10, 5),
+            ("k1", 4, 1, 10, 9), ("k2", 4, 1, 10, 9),
+            ("k1", 5, 2, 20, 99),
+            ("k1", 6, 2, 10, 80),
+        ]
+        index = _index(rows)
+        assert index.similar_ids(1, ["k1", "k2"], 3) == [4, 3, 6]
+        assert index.similar_ids(1, ["k1", "k2", "k1"], 10) == [4, 3, 6, 2]
+
+    def test_filters_by_level_distance(self):
+        """测试难度等级相差超过1的题目不作为候选"""
+        rows = [("k1", 1, 1, 10, 0), ("k1", 2, 3, 10, 100), ("k1", 3, 2, 10, 0)]
+        index = _index(rows)
+        assert index.similar_ids(1, ["k1"], 5) == [3]
+        assert index.similar_ids(99, ["k1"], 5) is None
@@ -0,0 +1,63 @@
+# backend/test/test_question_scoring.py
+import numpy as np
+
+from app.ai.engines.question_scoring import quality_from_saves, score_questions, top_k, DEFAULT_QUALITY
+
+
+class TestTopK:
+    """top-k选取测试"""
+
+    def test_returns_highest_scores_descending(self):
+        """测试返回分数最高的k个下标，按分数降序"""
+        scores = np.array([0.2, 0.9, 0.5, 0.7, 0.1])
+
+        assert top_k(scores, 3).tolist() == [1, 3, 2]
+
+    def test_matches_full_sort(self):
+        """测试与完整排序的结果一致"""
+        scores = np.random.default_rng(0).random(1000)
+
+        assert top_k(scores, 20).tolist() == np.argsort(-scores, kind="stable")[:20].tolist()
+
+    def test_ties_keep_candidate_order(self):
+        """测试同分时按原顺序排列"""
+        scores = np.array([0.5, 0.8, 0.5, 0.8, 0.1])
+
+        assert top_k(scores, 4).tolist() == [1, 3, 0, 2]
+
+    def test_k_larger_than_candidates(self):
+        """测试k超过候选数时返回全部"""
+        scores = np.array([0.3, 0.6])
+
+        assert top_k(scores, 10).tolist() == [1, 0]
+
+    def test_empty_result(self):
+        """测试k为0或没有候选时返回空"""
+        assert top_k(np.array([0.3, 0.6]), 0).size == 0
+        assert top_k(np.array([]), 5).size == 0
+
+
+class TestScoreQuestions:
+    """题目评分测试"""
+
+    def test_difficulty_match_ranks_first(self):
+        """测试其他条件相同时难度最接近的题分数最高"""
+        scores = score_questions(
+            difficulty=np.array([1.0, 3.0, 5.0]),
+            quality=np.full(3, DEFAULT_QUALITY),
+            knowledge_count=np.ones(3),
+            usage_count=np.zeros(3),
+            target_difficulty=3.0
+        )
+
+        assert top_k(scores, 1).tolist() == [1]
+        assert np.all((scores >= 0) & (scores <= 1))
+
+    def test_quality_from_saves(self):
+        """测试没有收藏时为基准质量，收藏最多的为1"""
+        assert np.allclose(quality_from_saves(np.array([0, 0])), DEFAULT_QUALITY)
+
+        quality = quality_from_saves(np.array([0, 3, 30]))
+        assert quality[0] == DEFAULT_QUALITY
+        assert quality[2] == 1.0
+        assert quality[0] < quality[1] < quality[2]
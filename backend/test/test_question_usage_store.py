@@ -0,0 +1,42 @@
+# backend/test/test_question_usage_store.py
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+
+from app.ai.knowledge import question_usage_store as question_usage_store_module
+from app.ai.knowledge.question_usage_store import QuestionUsageStore
+
+NOW = datetime(2024, 3, 5, 9, 30)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(question_usage_store_module, "redis_client", client)
+    return client
+
+
+class TestQuestionUsageStore:
+    """题目使用计数测试"""
+
+    def test_counts_window_and_today(self, fake_redis):
+        """测试窗口内前几天与今天的计数相加，窗口外的不计入"""
+        store = QuestionUsageStore(window_days=3, enabled=True)
+        store.record(1, now=NOW)
+        store.record(1, now=NOW - timedelta(days=1), count=2)
+        store.record(2, now=NOW - timedelta(days=2))
+        store.record(2, now=NOW - timedelta(days=3), count=5)
+        assert store.counts([1, 2, 3], now=NOW) == {1: 3, 2: 1}
+
+    def test_empty_window_built_once_per_day(self, fake_redis):
+        """测试前几天没有计数时窗口集合也只生成一次"""
+        store = QuestionUsageStore(window_days=3, enabled=True)
+        store.record(1, now=NOW)
+        for _ in range(3):
+            assert store.counts([1], now=NOW) == {1: 1}
+        assert store.windows_built == 1
+        assert store.fallbacks == 0
+
+        store.counts([1], now=NOW + timedelta(days=1))
+        assert store.windows_built == 2
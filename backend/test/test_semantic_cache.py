@@ -0,0 +1,73 @@
+# backend/test/test_semantic_cache.py
+from app.ai.engines.semantic_cache import SemanticCache
+
+
+def make_cache(**kwargs) -> SemanticCache:
+    options = {"threshold": 0.8, "capacity_per_bucket": 100, "enabled": True, "n_features": 2 ** 12}
+    options.update(kwargs)
+    return SemanticCache(**options)
+
+
+class TestSemanticCache:
+    """语义缓存测试"""
+
+    def test_similar_question_hits(self):
+        """测试相似问题命中同一分区的回答"""
+        cache = make_cache()
+        cache.add("什么是一元二次方程的判别式？", "student", 1, {"content": "判别式"}, user_id=1)
+
+        answer = cache.lookup("什么是一元二次方程的判别式", "student", 1, user_id=1)
+
+        assert answer == {"content": "判别式"}
+        assert cache.stats()["hits"] == 1
+
+    def test_unrelated_question_misses(self):
+        """测试不相似的问题不命中"""
+        cache = make_cache()
+        cache.add("什么是一元二次方程的判别式？", "student", 1, {"content": "判别式"}, user_id=1)
+
+        assert cache.lookup("光合作用需要哪些条件", "student", 1, user_id=1) is None
+
+    def test_answers_not_shared_between_users(self):
+        """测试个性化回答不会返回给其他用户"""
+        cache = make_cache()
+        cache.add("我的薄弱知识点有哪些？", "student", 1, {"content": "张三的薄弱点"}, user_id=1)
+
+        assert cache.lookup("我的薄弱知识点有哪些？", "student", 1, user_id=2) is None
+        assert cache.lookup("我的薄弱知识点有哪些？", "student", 1, user_id=1) is not None
+
+    def test_partitioned_by_role_and_subject(self):
+        """测试按角色和学科分区"""
+        cache = make_cache()
+        cache.add("如何提高计算准确率？", "student", 1, {"content": "数学"}, user_id=1)
+
+        assert cache.lookup("如何提高计算准确率？", "teacher", 1, user_id=1) is None
+        assert cache.lookup("如何提高计算准确率？", "student", 2, user_id=1) is None
+
+    def test_least_recently_used_bucket_evicted(self):
+        """测试分区数超过上限时淘汰最久未使用的分区"""
+        cache = make_cache(max_buckets=2)
+        cache.add("问题一", "student", 1, {"content": "一"}, user_id=1)
+        cache.add("问题二", "student", 1, {"content": "二"}, user_id=2)
+        cache.lookup("问题一", "student", 1, user_id=1)
+        cache.add("问题三", "student", 1, {"content": "三"}, user_id=3)
+
+        assert cache.lookup("问题二", "student", 1, user_id=2) is None
+        assert cache.lookup("问题一", "student", 1, user_id=1) == {"content": "一"}
+        assert cache.stats()["evicted_buckets"] == 1
+
+    def test_disabled_cache(self):
+        """测试关闭缓存时不写入也不命中"""
+        cache = make_cache(enabled=False)
+        cache.add("问题一", "student", 1, {"content": "一"}, user_id=1)
+
+        assert cache.lookup("问题一", "student", 1, user_id=1) is None
+        assert cache.stats()["entries"] == 0
+
+    def test_bucket_bounded_without_lookups(self):
+        """测试只写不查时分区条数也不超过容量"""
+        cache = make_cache(capacity_per_bucket=8)
+        for i in range(50):
+            cache.add(f"第{i}题怎么做", "student", 1, {"content": str(i)}, user_id=1)
+
+        assert cache.stats()["entries"] <= 8
@@ -0,0 +1,147 @@
+# backend/test/test_single_flight.py
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.ai.engines import single_flight as single_flight_module
+from app.ai.engines.single_flight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(single_flight_module, "redis_client", client)
+    return client
+
+
+class Upstream:
+    """可控的上游调用：记录调用次数，在 release 之前一直挂起"""
+
+    def __init__(self, result="ok"):
+        self.result = result
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class TestSingleFlight:
+    """并发请求合并测试"""
+
+    def test_concurrent_requests_share_one_call(self):
+        """测试同键并发请求只调用一次上游"""
+        async def scenario():
+            flight = SingleFlight("test")
+            upstream = Upstream()
+            tasks = [asyncio.create_task(flight.do("k", upstream)) for _ in range(5)]
+            await asyncio.sleep(0.01)
+            upstream.release.set()
+            return await asyncio.gather(*tasks), upstream, flight
+
+        results, upstream, flight = asyncio.run(scenario())
+
+        assert results == ["ok"] * 5
+        assert upstream.calls == 1
+        assert flight.stats()["local_coalesced"] == 4
+        assert not flight._inflight
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        """测试发起者被取消时等待者仍拿到结果"""
+        async def scenario():
+            flight = SingleFlight("test")
+            upstream = Upstream()
+            leader = asyncio.create_task(flight.do("k", upstream))
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(flight.do("k", upstream))
+            await asyncio.sleep(0.01)
+
+            leader.cancel()
+            await asyncio.sleep(0.01)
+            upstream.release.set()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower, upstream
+
+        result, upstream = asyncio.run(scenario())
+
+        assert result == "ok"
+        assert upstream.calls == 1
+        assert not upstream.cancelled
+
+    def test_upstream_cancelled_when_all_waiters_leave(self):
+        """测试所有等待者都取消后取消上游调用，之后的请求重新发起"""
+        async def scenario():
+            flight = SingleFlight("test")
+            upstream = Upstream()
+            waiters = [asyncio.create_task(flight.do("k", upstream)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0.01)
+            cancelled = upstream.cancelled
+
+            upstream.release.set()
+            return cancelled, await flight.do("k", upstream), upstream, flight
+
+        cancelled, result, upstream, flight = asyncio.run(scenario())
+
+        assert cancelled
+        assert result == "ok"
+        assert upstream.calls == 2
+        assert flight.stats()["abandoned"] == 1
+
+    def test_exception_reaches_every_waiter(self):
+        """测试上游异常传递给所有等待者"""
+        async def scenario():
+            flight = SingleFlight("test")
+            upstream = Upstream(result=RuntimeError("upstream down"))
+            tasks = [asyncio.create_task(flight.do("k", upstream)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            upstream.release.set()
+            return await asyncio.gather(*tasks, return_exceptions=True), upstream
+
+        results, upstream = asyncio.run(scenario())
+
+        assert upstream.calls == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    def test_different_keys_not_coalesced(self):
+        """测试不同键分别调用上游"""
+        async def scenario():
+            flight = SingleFlight("test")
+            upstream = Upstream()
+            upstream.release.set()
+            return await asyncio.gather(flight.do("a", upstream), flight.do("b", upstream)), upstream
+
+        results, upstream = asyncio.run(scenario())
+
+        assert results == ["ok", "ok"]
+        assert upstream.calls == 2
+
+    def test_remote_result_reused(self, fake_redis):
+        """测试其他worker持有锁时轮询其发布的结果"""
+        fake_redis.set("test:lock:k", "other-flight")
+        fake_redis.set("test:result:other-flight", '"from other worker"')
+
+        async def scenario():
+            flight = SingleFlight("test", poll_interval=0.001)
+            upstream = Upstream()
+            return await flight.do("k", upstream), upstream, flight
+
+        result, upstream, flight = asyncio.run(scenario())
+
+        assert result == "from other worker"
+        assert upstream.calls == 0
+        assert flight.stats()["remote_coalesced"] == 1
@@ -0,0 +1,121 @@
+# backend/test/test_student_feature_store.py
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from app.ai.knowledge import student_feature_store as student_feature_store_module
+from app.ai.knowledge.student_feature_store import StudentFeatureStore, STALE_KEY, is_correct_of
+
+NOW = datetime(2024, 3, 5, 9, 30)
+DAY = NOW.strftime("%Y%m%d")
+
+
+class FakeTables:
+    """代替数据库表与原始数据重建"""
+
+    def __init__(self):
+        self.table = {}
+        self.source = {}
+        self.rebuilds = 0
+
+    def load_table(self, student_id):
+        return dict(self.table[student_id]) if student_id in self.table else None
+
+    def save_table(self, raws):
+        self.table.update({student_id: dict(raw) for student_id, raw in raws.items()})
+
+    def rebuild_raw(self, student_id, now=None):
+        self.rebuilds += 1
+        return dict(self.source.get(student_id, {}), built=NOW.isoformat())
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(student_feature_store_module, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def tables():
+    return FakeTables()
+
+
+@pytest.fixture
+def store(fake_redis, tables):
+    store = StudentFeatureStore(ttl=100, flush_interval=60, enabled=True)
+    store._load_table = tables.load_table
+    store._save_table = tables.save_table
+    store.rebuild_raw = tables.rebuild_raw
+    return store
+
+
+class TestStudentFeatureStore:
+    """学生特征存储测试"""
+
+    def test_seed_from_table(self, store, tables, fake_redis):
+        """测试缓存缺失时从表读取并写入缓存"""
+        tables.table[1] = {f"a:{DAY}:n": 3, "built": NOW.isoformat()}
+
+        raw = store.get_raw(1)
+
+        assert raw[f"a:{DAY}:n"] == 3
+        assert fake_redis.hget("student:features:1", f"a:{DAY}:n") == "3"
+        assert store.stats()["table_loads"] == 1
+        assert tables.rebuilds == 0
+
+    def test_increment_applied_to_built_features(self, store, fake_redis):
+        """测试特征已构建时累加"""
+        store._seed(1, {f"a:{DAY}:n": 1, "built": NOW.isoformat()})
+
+        store.record_activity(1, {"type": "view", "duration": 30}, now=NOW)
+
+        raw = store.get_raw(1)
+        assert float(raw[f"a:{DAY}:n"]) == 2
+        assert float(raw[f"a:{DAY}:t"]) == 30
+        assert store.stats()["updates"] == 1
+        assert fake_redis.sismember("student:features:dirty", 1)
+
+    def test_missed_increment_rebuilds_from_source(self, store, tables, fake_redis):
+        """测试缓存缺失期间的累加不丢失：下次读取跳过过期的表，从原始数据重建"""
+        tables.table[1] = {f"a:{DAY}:n": 1, "built": NOW.isoformat()}
+        tables.source[1] = {f"a:{DAY}:n": 2}
+
+        store.record_activity(1, {"type": "view"}, now=NOW)
+        assert fake_redis.sismember(STALE_KEY, 1)
+
+        raw = store.get_raw(1)
+
+        assert raw[f"a:{DAY}:n"] == 2
+        assert tables.rebuilds == 1
+        assert tables.table[1][f"a:{DAY}:n"] == 2
+        assert not fake_redis.sismember(STALE_KEY, 1)
+        assert store.stats()["missed_updates"] == 1
+
+    def test_seed_does_not_overwrite_increments(self, store, fake_redis):
+        """测试写入完整特征时不覆盖已有的缓存"""
+        store._seed(1, {f"a:{DAY}:n": 1, "built": NOW.isoformat()})
+        store.record_activity(1, {"type": "view"}, now=NOW)
+
+        store._seed(1, {f"a:{DAY}:n": 1, "built": NOW.isoformat()})
+
+        assert float(fake_redis.hget("student:features:1", f"a:{DAY}:n")) == 2
+
+    def test_answer_result_read_from_data(self, store):
+        """测试接口提交的行为从 data 中读取答题结果"""
+        store._seed(1, {"built": NOW.isoformat()})
+
+        store.record_activity(1, {"type": "answer_question", "data": {"question_id": 7, "is_correct": True}}, now=NOW)
+        store.record_activity(1, {"type": "answer_question", "is_correct": False}, now=NOW)
+
+        raw = store.get_raw(1)
+        assert float(raw[f"a:{DAY}:q"]) == 2
+        assert float(raw[f"a:{DAY}:c"]) == 1
+
+    def test_is_correct_of(self):
+        """测试两种位置的答题结果"""
+        assert is_correct_of({"is_correct": True}) is True
+        assert is_correct_of({"data": {"is_correct": False}}) is False
+        assert is_correct_of({"data": "text"}) is None
+        assert is_correct_of({}) is None